@@ -0,0 +1,136 @@
+"""
+Almacén compartido de datos temporales: tokens de recuperación de contraseña
+y contadores de intentos (login, recuperación).
+
+La caché por defecto sin ``CACHES`` configurado es memoria de cada proceso: un
+token emitido por un worker de gunicorn no existe para otro. Este almacén lo
+comparten todos los workers y nodos. ``ALMACEN_TEMPORAL`` elige dónde:
+
+- ``'db'`` (por defecto): tabla ``RegistroTemporal``, búsqueda por clave
+  primaria e índice sobre ``expira``. Lo vencido nunca se devuelve y
+  ``manage.py limpiar_almacen_temporal`` lo borra periódicamente.
+- ``'cache'``: la caché de Django ``ALMACEN_TEMPORAL_CACHE``, que debe ser
+  Redis o Memcached: ``add``, ``incr`` y ``delete`` tienen que ser atómicos
+  entre procesos para que los contadores no pierdan intentos y un token se
+  consuma una sola vez. FileBasedCache, LocMem o DatabaseCache no lo son y se
+  rechazan al arrancar. La caché vence sola.
+"""
+
+from datetime import timedelta
+from typing import Any
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import RegistroTemporal
+
+
+class AlmacenBD:
+
+    def _vigentes(self, clave: str):
+        return RegistroTemporal.objects.filter(clave=clave, expira__gt=timezone.now())
+
+    def guardar(self, clave: str, valor: Any, segundos: int):
+        RegistroTemporal.objects.update_or_create(
+            clave=clave, defaults={'valor': valor, 'contador': 0, 'expira': timezone.now() + timedelta(seconds=segundos)}
+        )
+
+    def obtener(self, clave: str) -> Any:
+        return self._vigentes(clave).values_list('valor', flat=True).first()
+
+    def consumir(self, clave: str) -> Any:
+        """Devuelve el valor y lo borra; si dos lo piden a la vez solo uno lo obtiene."""
+        valor = self.obtener(clave)
+        if valor is None or not self._vigentes(clave).delete()[0]:
+            return None
+        return valor
+
+    def incrementar(self, clave: str, segundos: int) -> int:
+        """Suma 1 al contador de la ventana actual (que dura ``segundos`` desde el primer intento)."""
+        for _ in range(3):
+            with transaction.atomic():
+                if self._vigentes(clave).update(contador=F('contador') + 1):
+                    return self._vigentes(clave).values_list('contador', flat=True).first() or 1
+            # Sin ventana vigente: se reemplaza la vencida, si la hay
+            RegistroTemporal.objects.filter(clave=clave, expira__lte=timezone.now()).delete()
+            try:
+                with transaction.atomic():
+                    RegistroTemporal.objects.create(
+                        clave=clave, contador=1, expira=timezone.now() + timedelta(seconds=segundos)
+                    )
+                return 1
+            except IntegrityError:
+                # Otro proceso abrió la ventana primero: se vuelve a intentar el UPDATE
+                continue
+        return self._vigentes(clave).values_list('contador', flat=True).first() or 1
+
+    def borrar(self, clave: str):
+        RegistroTemporal.objects.filter(clave=clave).delete()
+
+    def limpiar(self) -> int:
+        return RegistroTemporal.objects.filter(expira__lte=timezone.now()).delete()[0]
+
+
+class AlmacenCache:
+
+    # Backends con add/incr/delete atómicos entre procesos
+    ATOMICOS = ('redis', 'memcached')
+
+    def __init__(self, alias: str):
+        backend = settings.CACHES.get(alias, {}).get('BACKEND', '')
+        if not any(nombre in backend.lower() for nombre in self.ATOMICOS):
+            raise ImproperlyConfigured(
+                f"ALMACEN_TEMPORAL='cache' requiere Redis o Memcached; la caché {alias!r} usa {backend or 'nada'}"
+            )
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def guardar(self, clave: str, valor: Any, segundos: int):
+        self.cache.set(clave, valor, segundos)
+
+    def obtener(self, clave: str) -> Any:
+        return self.cache.get(clave)
+
+    def consumir(self, clave: str) -> Any:
+        valor = self.cache.get(clave)
+        # delete() devuelve si la clave existía: solo uno de dos pedidos simultáneos la borra
+        if valor is None or not self.cache.delete(clave):
+            return None
+        return valor
+
+    def incrementar(self, clave: str, segundos: int) -> int:
+        if self.cache.add(clave, 1, segundos):
+            return 1
+        try:
+            return self.cache.incr(clave)
+        except ValueError:
+            # Venció entre add() e incr()
+            self.cache.set(clave, 1, segundos)
+            return 1
+
+    def borrar(self, clave: str):
+        self.cache.delete(clave)
+
+    def limpiar(self) -> int:
+        return 0
+
+
+def _crear():
+    if getattr(settings, 'ALMACEN_TEMPORAL', 'db') == 'cache':
+        return AlmacenCache(getattr(settings, 'ALMACEN_TEMPORAL_CACHE', 'default'))
+    return AlmacenBD()
+
+
+almacen = _crear()
+
+
+def limite_superado(clave: str, maximo: int, segundos: int) -> bool:
+    """Cuenta un intento más en la ventana de ``segundos``; True si ya pasó de ``maximo``."""
+    return almacen.incrementar(clave, segundos) > maximo
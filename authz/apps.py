@@ -1,6 +1,6 @@
 from django.apps import AppConfig
 from django.db.models.signals import post_migrate
-from django.contrib.auth.hashers import make_password, identify_hasher
+from django.contrib.auth.hashers import make_password, identify_hasher, UNUSABLE_PASSWORD_PREFIX
 from django.conf import settings
 from django.db import connection
 import re
@@ -11,10 +11,14 @@ class AuthzConfig(AppConfig):
     name = 'authz'
 
     def ready(self):
+        from . import signals  # noqa: F401
         from .models import Usuario
         def hash_plain_passwords(sender, **kwargs):
             for usuario in Usuario.objects.all():
                 pwd = usuario.password
+                if pwd.startswith(UNUSABLE_PASSWORD_PREFIX):
+                    # Contraseña inutilizable (set_unusable_password): no es texto plano
+                    continue
                 # Si la contraseña parece estar en texto plano (no tiene formato hash)
                 try:
                     identify_hasher(pwd)
@@ -0,0 +1,52 @@
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .revocacion import lista
+from .roles import CLAIM_ROLES, CLAIM_VERSION, CLAIMS_USUARIO, roles_del_token
+
+
+class JWTRolesAuthentication(JWTAuthentication):
+    """
+    JWT que arma ``request.user`` desde los claims del token, sin consultar la
+    base: un ``Usuario`` con id, email, nombres, estado, permisos y roles
+    cargados y el resto de campos diferidos (el primero que se toca trae
+    todos, ver ``Usuario.refresh_from_db``).
+
+    Si el usuario cambió su acceso después de emitido el token (authz/revocacion.py)
+    o el token no trae los claims, se lee de la base como antes y se rechaza
+    si ya no está activo.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            usuario_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        if all(claim in validated_token for claim in (*CLAIMS_USUARIO, CLAIM_ROLES, CLAIM_VERSION)) \
+                and lista.token_vigente(usuario_id, validated_token['iat']):
+            return self._usuario_del_token(usuario_id, validated_token)
+
+        user = super().get_user(validated_token)
+        if user.estado != 'ACTIVO':
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        roles = roles_del_token(validated_token, user)
+        if roles is not None:
+            user._nombres_roles = roles
+        return user
+
+    def _usuario_del_token(self, usuario_id, token):
+        modelo = self.user_model
+        # El claim llega como texto; el id del objeto tiene que ser del tipo del campo
+        usuario_id = modelo._meta.get_field(api_settings.USER_ID_FIELD).to_python(usuario_id)
+        valores = {api_settings.USER_ID_FIELD: usuario_id, 'roles_version': token[CLAIM_VERSION]}
+        valores.update((campo, token[campo]) for campo in CLAIMS_USUARIO)
+        # from_db espera los valores en el orden de los campos del modelo
+        campos = [f.attname for f in modelo._meta.concrete_fields if f.attname in valores]
+        user = modelo.from_db(router.db_for_read(modelo), campos, [valores[c] for c in campos])
+        user._desde_token = True
+        user._nombres_roles = tuple(token[CLAIM_ROLES])
+        return user
@@ -0,0 +1,98 @@
+"""
+Hashers de contraseñas del proyecto.
+
+El costo de cada algoritmo se elige por despliegue en settings (``PBKDF2_ITERACIONES``,
+``ARGON2_*``, ``SCRYPT_WORK_FACTOR``, ``BCRYPT_ROUNDS``) y el algoritmo preferido con
+``HASHER_PREFERIDO``. Los identificadores son los de Django, así que los hashes ya
+guardados siguen verificando; si el costo o el algoritmo cambian, el hash se
+rehashea con la configuración vigente en el siguiente login correcto.
+``manage.py medir_hashers`` mide cuántos logins por segundo y por núcleo admite
+cada configuración.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher, BasePasswordHasher, BCryptSHA256PasswordHasher, PBKDF2PasswordHasher,
+    ScryptPasswordHasher, mask_hash,
+)
+from django.utils.crypto import constant_time_compare
+from django.utils.translation import gettext_noop as _
+
+
+class PBKDF2Hasher(PBKDF2PasswordHasher):
+    iterations = getattr(settings, 'PBKDF2_ITERACIONES', PBKDF2PasswordHasher.iterations)
+
+
+class Argon2Hasher(Argon2PasswordHasher):
+    time_cost = getattr(settings, 'ARGON2_TIME_COST', Argon2PasswordHasher.time_cost)
+    memory_cost = getattr(settings, 'ARGON2_MEMORY_COST', Argon2PasswordHasher.memory_cost)
+    parallelism = getattr(settings, 'ARGON2_PARALLELISM', Argon2PasswordHasher.parallelism)
+
+
+class ScryptHasher(ScryptPasswordHasher):
+    work_factor = getattr(settings, 'SCRYPT_WORK_FACTOR', ScryptPasswordHasher.work_factor)
+
+    @property
+    def maxmem(self):
+        # OpenSSL limita scrypt a 32 MiB por defecto: work_factor > 2**14 fallaría.
+        # Se usan 128 * n * r bytes; se deja el doble de margen
+        return 2 * 128 * self.work_factor * self.block_size
+
+
+class BCryptSHA256Hasher(BCryptSHA256PasswordHasher):
+    rounds = getattr(settings, 'BCRYPT_ROUNDS', BCryptSHA256PasswordHasher.rounds)
+
+
+# Algoritmo -> hasher configurable; HASHER_PREFERIDO elige uno de estos
+HASHERS = {
+    'pbkdf2_sha256': PBKDF2Hasher,
+    'argon2': Argon2Hasher,
+    'scrypt': ScryptHasher,
+    'bcrypt_sha256': BCryptSHA256Hasher,
+}
+# Atributos de costo de cada uno, en el orden en que los recibe medir_hashers
+PARAMETROS_COSTO = {
+    'pbkdf2_sha256': ('iterations',),
+    'argon2': ('time_cost', 'memory_cost', 'parallelism'),
+    'scrypt': ('work_factor',),
+    'bcrypt_sha256': ('rounds',),
+}
+
+
+class SHA256LegadoHasher(BasePasswordHasher):
+    """
+    SHA256 sin sal del sistema anterior (``sha256_legado$<hex>``), solo para
+    verificar cuentas importadas. No es el hasher preferido, así que Django
+    rehashea con el hasher preferido en el primer login correcto.
+    """
+
+    algorithm = 'sha256_legado'
+
+    @staticmethod
+    def envolver(hexdigest: str) -> str:
+        return f'sha256_legado${hexdigest.lower()}'
+
+    def salt(self):
+        return ''
+
+    def encode(self, password, salt):
+        return self.envolver(hashlib.sha256(password.encode()).hexdigest())
+
+    def decode(self, encoded):
+        algorithm, hexdigest = encoded.split('$', 1)
+        assert algorithm == self.algorithm
+        return {'algorithm': algorithm, 'hash': hexdigest, 'salt': ''}
+
+    def verify(self, password, encoded):
+        return constant_time_compare(self.encode(password, ''), encoded)
+
+    def safe_summary(self, encoded):
+        return {_('algorithm'): self.algorithm, _('hash'): mask_hash(self.decode(encoded)['hash'])}
+
+    def must_update(self, encoded):
+        return True
+
+    def harden_runtime(self, password, encoded):
+        pass
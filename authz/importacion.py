@@ -0,0 +1,303 @@
+"""
+Importación masiva de usuarios (``manage.py importar_usuarios``, ``cargar_usuarios``).
+
+Los registros se leen en streaming y se procesan por lotes:
+
+1. Se descartan los emails que ya existen (una consulta por lote, sin
+   distinguir mayúsculas) o que se repiten en el archivo. Con
+   ``roles_a_existentes`` los usuarios existentes reciben los roles del
+   registro (lo que hacía ``cargar_usuarios``).
+2. Las contraseñas en texto plano se hashean en un ``ProcessPoolExecutor``
+   con todos los núcleos: PBKDF2 es deliberadamente lento y en serie es lo
+   que domina la importación. El hasheo del lote siguiente corre mientras se
+   inserta el actual.
+3. Usuarios y vínculos con roles se insertan con ``bulk_create``. Los roles
+   se buscan entre los existentes (por id o nombre); los desconocidos se
+   informan en ``errores`` y no se crean.
+
+Contraseña de cada registro, en este orden:
+
+- ``password_sha256``: hex del SHA256 del sistema anterior. Se guarda como
+  ``sha256_legado$<hex>`` (authz/hashers.py) y Django lo rehashea con el
+  hasher preferido en el primer login correcto.
+- ``password``: si ya es un hash de Django se guarda tal cual; si no, se hashea.
+- Sin contraseña: inutilizable (``set_unusable_password``), entra por
+  recuperación.
+"""
+
+import csv
+import json
+import logging
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models.functions import Lower
+
+from .hashers import SHA256LegadoHasher
+from .models import Rol, Usuario
+from .signals import invalidar
+
+logger = logging.getLogger(__name__)
+
+TAMANO_LOTE = 1000
+CAMPOS = (
+    'nombres', 'apellidos', 'telefono', 'fecha_nacimiento', 'genero',
+    'documento_identidad', 'pais', 'estado', 'is_active', 'is_staff',
+)
+HEX = set('0123456789abcdef')
+VERDADEROS = {'true', 'si', 'sí', 'yes', '1', 't', 's'}
+FALSOS = {'false', 'no', '0', 'f', 'n'}
+
+
+@dataclass
+class ResumenImportacion:
+    creados: int = 0
+    existentes: int = 0
+    invalidos: int = 0
+    roles: int = 0
+    errores: List[str] = field(default_factory=list)
+
+
+# ----------------------------------------------------------------------
+# Lectura
+# ----------------------------------------------------------------------
+
+def leer_csv(ruta: str) -> Iterator[dict]:
+    """CSV con encabezado; ``roles`` separados por ``;`` o ``|``."""
+    with open(ruta, newline='', encoding='utf-8-sig') as archivo:
+        for fila in csv.DictReader(archivo):
+            fila = {k.strip(): (v.strip() if isinstance(v, str) else v) for k, v in fila.items() if k}
+            roles = fila.get('roles') or ''
+            fila['roles'] = [r.strip() for r in roles.replace('|', ';').split(';') if r.strip()]
+            yield fila
+
+
+def leer_jsonl(ruta: str) -> Iterator[dict]:
+    with open(ruta, encoding='utf-8') as archivo:
+        for linea in archivo:
+            if linea.strip():
+                yield json.loads(linea)
+
+
+def leer_fixture(ruta: str) -> Iterator[dict]:
+    """Arreglo JSON; acepta el formato de fixture de Django (``{"fields": {...}}``)."""
+    with open(ruta, encoding='utf-8') as archivo:
+        for registro in json.load(archivo):
+            yield registro.get('fields', registro)
+
+
+LECTORES = {'.csv': leer_csv, '.jsonl': leer_jsonl, '.ndjson': leer_jsonl, '.json': leer_fixture}
+
+
+def leer(ruta: str) -> Iterator[dict]:
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension not in LECTORES:
+        raise ValueError(f"Formato no soportado: {extension} (use .csv, .jsonl o .json)")
+    return LECTORES[extension](ruta)
+
+
+# ----------------------------------------------------------------------
+# Contraseñas
+# ----------------------------------------------------------------------
+
+def _iniciar_proceso():
+    # Con "spawn" (Windows, macOS) el proceso hijo arranca sin Django configurado
+    import django
+    django.setup()
+
+
+def _hashear(password: str) -> str:
+    return make_password(password)
+
+
+def _es_hash(valor: str) -> bool:
+    try:
+        identify_hasher(valor)
+        return True
+    except ValueError:
+        return False
+
+
+def _password(registro: dict) -> tuple:
+    """(hash listo, None) o (None, texto plano a hashear)."""
+    legado = str(registro.get('password_sha256') or '').strip().lower()
+    if legado:
+        if len(legado) != 64 or not set(legado) <= HEX:
+            raise ValueError("password_sha256 no es un SHA256 en hexadecimal")
+        return SHA256LegadoHasher.envolver(legado), None
+    password = registro.get('password')
+    if not password:
+        return make_password(None), None
+    if _es_hash(password):
+        return password, None
+    return None, password
+
+
+def _campos(registro: dict) -> dict:
+    """Valores de ``CAMPOS`` convertidos al tipo del modelo; ValidationError si alguno no sirve."""
+    datos = {}
+    for nombre in CAMPOS:
+        valor = registro.get(nombre)
+        if valor in (None, ''):
+            continue
+        campo = Usuario._meta.get_field(nombre)
+        if campo.get_internal_type() == 'BooleanField' and isinstance(valor, str):
+            texto = valor.strip().lower()
+            valor = True if texto in VERDADEROS else False if texto in FALSOS else valor
+        datos[nombre] = campo.to_python(valor)
+    datos.setdefault('estado', 'ACTIVO')
+    return datos
+
+
+# ----------------------------------------------------------------------
+# Importación
+# ----------------------------------------------------------------------
+
+class _Lote:
+    def __init__(self, usuarios: List[Usuario], roles: List[list], planos: List[int], hashes,
+                 existentes: List[Tuple[int, list]]):
+        self.usuarios = usuarios
+        self.roles = roles
+        # (id, roles) de usuarios que ya existían, con roles_a_existentes
+        self.existentes = existentes
+        # Índices de usuarios cuya contraseña llega del pool, en el orden de ``hashes``
+        self.planos = planos
+        self.hashes = hashes
+
+
+class Importador:
+
+    def __init__(self, pool: Executor, procesos: int, rol_defecto: Optional[str] = None,
+                 tamano_lote: int = TAMANO_LOTE, roles_a_existentes: bool = False):
+        self.pool = pool
+        self.procesos = procesos
+        self.rol_defecto = rol_defecto
+        self.tamano_lote = tamano_lote
+        self.roles_a_existentes = roles_a_existentes
+        self.resumen = ResumenImportacion()
+        self._vistos = set()
+        self._roles: Optional[Dict[str, Rol]] = None
+        self._desconocidos = set()
+
+    def _rol(self, nombre) -> Optional[Rol]:
+        """Rol existente por id (fixtures de Django) o por nombre; None si no existe."""
+        if self._roles is None:
+            roles = list(Rol.objects.all())
+            self._roles = {**{r.nombre: r for r in roles}, **{str(r.pk): r for r in roles}}
+        clave = str(nombre).strip()
+        rol = self._roles.get(clave)
+        if rol is None and clave not in self._desconocidos:
+            self._desconocidos.add(clave)
+            self.resumen.errores.append(f"Rol desconocido: {clave!r} (no se asigna)")
+        return rol
+
+    def _vinculos(self, usuario_ids: Iterable[int], roles: Iterable[list]) -> list:
+        Vinculo = Usuario.roles.through
+        return [
+            Vinculo(usuario_id=usuario_id, rol_id=rol.pk)
+            for usuario_id, nombres in zip(usuario_ids, roles)
+            for rol in filter(None, (self._rol(n) for n in nombres))
+        ]
+
+    def _roles_del_registro(self, registro: dict) -> list:
+        return registro.get('roles') or ([self.rol_defecto] if self.rol_defecto else [])
+
+    def _preparar(self, registros: List[dict]) -> _Lote:
+        emails = {}
+        for registro in registros:
+            email = Usuario.objects.normalize_email(str(registro.get('email') or '').strip())
+            if not email or '@' not in email:
+                self.resumen.invalidos += 1
+                self.resumen.errores.append(f"Registro sin email válido: {registro.get('email')!r}")
+                continue
+            if email.lower() in self._vistos:
+                self.resumen.existentes += 1
+                continue
+            self._vistos.add(email.lower())
+            emails[email] = registro
+
+        # Sin distinguir mayúsculas: "Ana@x.com" ya existe si está "ana@x.com"
+        existentes = dict(
+            Usuario.objects.annotate(email_minusculas=Lower('email'))
+            .filter(email_minusculas__in=[e.lower() for e in emails])
+            .values_list('email_minusculas', 'id')
+        )
+        usuarios, roles, planos, textos, ya_existian = [], [], [], [], []
+        for email, registro in emails.items():
+            if email.lower() in existentes:
+                self.resumen.existentes += 1
+                if self.roles_a_existentes:
+                    ya_existian.append((existentes[email.lower()], self._roles_del_registro(registro)))
+                continue
+            try:
+                hash_listo, texto = _password(registro)
+                datos = _campos(registro)
+            except (ValueError, ValidationError) as e:
+                self.resumen.invalidos += 1
+                mensaje = '; '.join(e.messages) if isinstance(e, ValidationError) else str(e)
+                self.resumen.errores.append(f"{email}: {mensaje}")
+                continue
+            usuario = Usuario(email=email, password=hash_listo or '', **datos)
+            if texto is not None:
+                planos.append(len(usuarios))
+                textos.append(texto)
+            usuarios.append(usuario)
+            roles.append(self._roles_del_registro(registro))
+
+        # chunksize: menos idas y vueltas entre procesos que de a una contraseña
+        chunk = max(1, len(textos) // (self.procesos * 4))
+        hashes = self.pool.map(_hashear, textos, chunksize=chunk) if textos else iter(())
+        return _Lote(usuarios, roles, planos, hashes, ya_existian)
+
+    def _insertar(self, lote: _Lote):
+        for indice, encoded in zip(lote.planos, lote.hashes):
+            lote.usuarios[indice].password = encoded
+        if not lote.usuarios and not lote.existentes:
+            return
+
+        with transaction.atomic():
+            creados = Usuario.objects.bulk_create(lote.usuarios, batch_size=self.tamano_lote)
+            if any(u.pk is None for u in creados):
+                # Bases que no devuelven ids en bulk_create
+                ids = dict(Usuario.objects.filter(email__in=[u.email for u in creados]).values_list('email', 'id'))
+                for usuario in creados:
+                    usuario.pk = ids[usuario.email]
+            vinculos = self._vinculos([u.pk for u in creados], lote.roles)
+            vinculos += self._vinculos([i for i, _ in lote.existentes], [r for _, r in lote.existentes])
+            # Los existentes pueden tener ya el rol: ignore_conflicts, como usuario.roles.add()
+            Usuario.roles.through.objects.bulk_create(vinculos, batch_size=self.tamano_lote, ignore_conflicts=True)
+            if lote.existentes:
+                # bulk_create no emite m2m_changed: se invalidan a mano los roles cacheados y los tokens
+                invalidar(Usuario.objects.filter(pk__in=[i for i, _ in lote.existentes]))
+
+        self.resumen.creados += len(creados)
+        self.resumen.roles += len(vinculos)
+        logger.info(f"Importación de usuarios: {self.resumen.creados} creados")
+
+    def importar(self, registros: Iterable[dict]) -> ResumenImportacion:
+        iterador = iter(registros)
+        anterior: Optional[_Lote] = None
+        while True:
+            registros_lote = list(islice(iterador, self.tamano_lote))
+            # Se arma el lote siguiente (su hasheo arranca en el pool) antes de insertar el anterior
+            actual = self._preparar(registros_lote) if registros_lote else None
+            if anterior is not None:
+                self._insertar(anterior)
+            if actual is None:
+                return self.resumen
+            anterior = actual
+
+
+def importar(registros: Iterable[dict], procesos: Optional[int] = None, rol_defecto: Optional[str] = None,
+             tamano_lote: int = TAMANO_LOTE, roles_a_existentes: bool = False) -> ResumenImportacion:
+    # La conexión del proceso padre no debe heredarse en los hijos (fork)
+    connection.close()
+    procesos = procesos or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_proceso) as pool:
+        return Importador(pool, procesos, rol_defecto, tamano_lote, roles_a_existentes).importar(registros)
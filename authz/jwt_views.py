@@ -2,23 +2,18 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework import status
-from django.contrib.auth.hashers import check_password
 from django.contrib.auth import get_user_model
 from .models import Usuario
 from rest_framework_simplejwt.tokens import RefreshToken
-import hashlib
+from rest_framework_simplejwt.settings import api_settings
+from .roles import agregar_claims, token_para
+from .almacen import almacen, limite_superado
+from django.conf import settings
 from drf_spectacular.utils import extend_schema, inline_serializer, OpenApiResponse
 from rest_framework import serializers as drf_serializers
+import logging
 
-def verify_password(plain, stored_hash):
-    # Primero intenta usar el verificador de Django (para contraseñas nuevas)
-    try:
-        if check_password(plain, stored_hash):
-            return True
-    except Exception:
-        pass
-    # Fallback legacy: comparar SHA256
-    return hashlib.sha256(plain.encode()).hexdigest() == stored_hash
+logger = logging.getLogger(__name__)
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
@@ -41,23 +36,30 @@ def verify_password(plain, stored_hash):
             },
         ),
         401: OpenApiResponse(description="Credenciales inválidas"),
+        429: OpenApiResponse(description="Demasiados intentos"),
     },
 )
 def login_view(request):
-    print("LOGIN BODY RECIBIDO:", request.data)
     email = request.data.get("email")
     password = request.data.get("password")
+    # Límite por email compartido entre workers; un login correcto lo reinicia
+    clave_intentos = f"intentos:login:{str(email or '').lower()}"
+    if limite_superado(clave_intentos, settings.LOGIN_MAX_INTENTOS, settings.LOGIN_VENTANA):
+        return Response({"detail":"Demasiados intentos, intenta más tarde."}, status=429)
     try:
         u = Usuario.objects.get(email=email, estado="ACTIVO")
-        print("USUARIO ENCONTRADO:", u.email, "ROLES:", list(u.roles.values_list('nombre', flat=True)))
     except Usuario.DoesNotExist:
-        print("NO SE ENCONTRÓ USUARIO:", email)
+        logger.debug("Login fallido: usuario no encontrado o inactivo (%s)", email)
         return Response({"detail":"Credenciales inválidas"}, status=401)
+    # Un solo intento de hash: los SHA256 legados se verifican con su hasher
+    # (authz/hashers.py) y, igual que un costo desactualizado, se rehashean aquí
     if not u.check_password(password):
-        print("CONTRASEÑA INCORRECTA para:", email)
+        logger.debug("Login fallido: contraseña incorrecta (%s)", email)
         return Response({"detail":"Credenciales inválidas"}, status=401)
-    print("LOGIN EXITOSO:", email)
-    refresh = RefreshToken.for_user(u)
+    logger.debug("Login correcto: %s", email)
+    almacen.borrar(clave_intentos)
+    # Roles y su versión en el token: las verificaciones de rol no consultan la base
+    refresh = token_para(u)
     return Response({"access": str(refresh.access_token), "refresh": str(refresh)})
 
 @api_view(["POST"])
@@ -89,6 +91,11 @@ def refresh_view(request):
     try:
         r = RefreshToken(token)
         new_access = r.access_token
-        return Response({"access": str(new_access)})
     except Exception:
         return Response({"detail":"Refresh inválido"}, status=401)
+    # Datos y roles vigentes al renovar, no los del login; un usuario dado de baja no renueva
+    u = Usuario.objects.filter(pk=r[api_settings.USER_ID_CLAIM], estado="ACTIVO", is_active=True).first()
+    if u is None:
+        return Response({"detail":"Refresh inválido"}, status=401)
+    agregar_claims(new_access, u)
+    return Response({"access": str(new_access)})
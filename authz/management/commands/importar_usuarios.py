@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+from authz import importacion
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa usuarios desde CSV, JSONL o JSON (fixture) por lotes, hasheando las contraseñas '
+        'en paralelo. Acepta hashes SHA256 del sistema anterior en la columna password_sha256'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo (.csv, .jsonl/.ndjson o .json)')
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=importacion.TAMANO_LOTE,
+            help=f'Usuarios por bloque y por transacción (default: {importacion.TAMANO_LOTE})'
+        )
+        parser.add_argument(
+            '--procesos',
+            type=int,
+            default=None,
+            help='Procesos para hashear contraseñas (default: todos los núcleos)'
+        )
+        parser.add_argument(
+            '--rol',
+            default='CLIENTE',
+            help='Rol para los registros sin columna roles (default: CLIENTE; "" para ninguno)'
+        )
+        parser.add_argument(
+            '--agregar-roles',
+            action='store_true',
+            help='Agregar los roles del registro a los usuarios que ya existen'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            registros = importacion.leer(options['archivo'])
+        except (ValueError, OSError) as e:
+            raise CommandError(str(e))
+
+        try:
+            resumen = importacion.importar(
+                registros,
+                procesos=options['procesos'],
+                rol_defecto=options['rol'] or None,
+                tamano_lote=options['lote'],
+                roles_a_existentes=options['agregar_roles'],
+            )
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'✗ Error importando usuarios: {e}'))
+            raise
+
+        for error in resumen.errores[:20]:
+            self.stdout.write(self.style.WARNING(f'  {error}'))
+        if len(resumen.errores) > 20:
+            self.stdout.write(self.style.WARNING(f'  ... y {len(resumen.errores) - 20} más'))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'✓ {resumen.creados} usuarios creados, {resumen.existentes} ya existían, '
+                f'{resumen.invalidos} inválidos, {resumen.roles} roles asignados'
+            )
+        )
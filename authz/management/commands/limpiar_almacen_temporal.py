@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from authz.almacen import almacen
+
+
+class Command(BaseCommand):
+    help = (
+        'Borra los tokens y contadores vencidos del almacén temporal '
+        '(ALMACEN_TEMPORAL="db"; con "cache" vencen solos). Pensado para cron'
+    )
+
+    def handle(self, *args, **options):
+        try:
+            borrados = almacen.limpiar()
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'✗ Error limpiando el almacén temporal: {e}'))
+            raise
+
+        self.stdout.write(self.style.SUCCESS(f'✓ {borrados} registros vencidos borrados'))
@@ -0,0 +1,121 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from authz.hashers import HASHERS, PARAMETROS_COSTO, SHA256LegadoHasher
+
+CONTRASENA = 'Contraseña-de-prueba-2024'
+
+
+def _iniciar_proceso():
+    import django
+    django.setup()
+
+
+def _hasher(algoritmo, costos):
+    hasher = SHA256LegadoHasher() if algoritmo == SHA256LegadoHasher.algorithm else HASHERS[algoritmo]()
+    for atributo, valor in zip(PARAMETROS_COSTO.get(algoritmo, ()), costos):
+        setattr(hasher, atributo, valor)
+    return hasher
+
+
+def _medir(algoritmo, costos, segundos):
+    """Verificaciones correctas (lo que cuesta un login) completadas en ``segundos`` por un proceso."""
+    hasher = _hasher(algoritmo, costos)
+    encoded = hasher.encode(CONTRASENA, hasher.salt())
+    cantidad, inicio = 0, time.perf_counter()
+    while True:
+        if not hasher.verify(CONTRASENA, encoded):
+            raise RuntimeError(f'{algoritmo}: la verificación falló')
+        cantidad += 1
+        transcurrido = time.perf_counter() - inicio
+        if transcurrido >= segundos:
+            return cantidad, transcurrido
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide logins por segundo y por núcleo (verificación de contraseña) para cada '
+        'configuración de hasher, para dimensionar los nodos de login y elegir el costo'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'configuraciones',
+            nargs='*',
+            help=(
+                'algoritmo[:costo...], p. ej. pbkdf2_sha256:600000, argon2:2:19456:1 '
+                '(time_cost:memory_cost:parallelism), scrypt:16384, bcrypt_sha256:12, sha256_legado '
+                '(default: cada algoritmo con el costo configurado en settings)'
+            )
+        )
+        parser.add_argument(
+            '--segundos',
+            type=float,
+            default=2.0,
+            help='Duración de cada medición (default: 2)'
+        )
+        parser.add_argument(
+            '--procesos',
+            type=int,
+            default=1,
+            help='Procesos midiendo a la vez; con todos los núcleos muestra el rendimiento del nodo (default: 1)'
+        )
+
+    def _configuraciones(self, textos):
+        if not textos:
+            return [
+                (algoritmo, tuple(getattr(clase, a) for a in PARAMETROS_COSTO[algoritmo]))
+                for algoritmo, clase in HASHERS.items()
+            ]
+        configuraciones = []
+        for texto in textos:
+            algoritmo, *costos = texto.split(':')
+            if algoritmo not in HASHERS and algoritmo != SHA256LegadoHasher.algorithm:
+                raise CommandError(f'Algoritmo desconocido: {algoritmo}')
+            parametros = PARAMETROS_COSTO.get(algoritmo, ())
+            if len(costos) > len(parametros):
+                raise CommandError(f'{algoritmo} admite a lo sumo {len(parametros)} costos: {", ".join(parametros)}')
+            try:
+                costos = [int(c) for c in costos]
+            except ValueError:
+                raise CommandError(f'Costo no numérico en {texto}')
+            # Los costos omitidos quedan como en settings
+            costos += [getattr(HASHERS[algoritmo], a) for a in parametros[len(costos):]]
+            configuraciones.append((algoritmo, tuple(costos)))
+        return configuraciones
+
+    def handle(self, *args, **options):
+        configuraciones = self._configuraciones(options['configuraciones'])
+        procesos = max(1, options['procesos'])
+        segundos = options['segundos']
+        vigente = (
+            settings.HASHER_PREFERIDO,
+            tuple(getattr(HASHERS[settings.HASHER_PREFERIDO], a) for a in PARAMETROS_COSTO[settings.HASHER_PREFERIDO]),
+        )
+
+        self.stdout.write(
+            f'{procesos} proceso(s) de {os.cpu_count()} núcleos, {segundos:g} s por configuración (* = vigente)'
+        )
+        self.stdout.write(f'  {"configuración":<56}{"ms/login":>10}{"logins/s/núcleo":>18}{"logins/s total":>17}')
+        with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_proceso) as pool:
+            for algoritmo, costos in configuraciones:
+                nombre = ' '.join(
+                    [algoritmo] + [f'{a}={c}' for a, c in zip(PARAMETROS_COSTO.get(algoritmo, ()), costos)]
+                )
+                marca = '*' if (algoritmo, costos) == vigente else ' '
+                try:
+                    mediciones = list(pool.map(_medir, *zip(*[(algoritmo, costos, segundos)] * procesos)))
+                except (ValueError, RuntimeError) as e:
+                    # Argon2 y bcrypt necesitan argon2-cffi / bcrypt instalados
+                    self.stdout.write(self.style.WARNING(f'{marca} {nombre:<56}no disponible: {e}'))
+                    continue
+                por_segundo = [cantidad / transcurrido for cantidad, transcurrido in mediciones]
+                total = sum(por_segundo)
+                self.stdout.write(
+                    f'{marca} {nombre:<56}{1000 * procesos / total:>10.2f}{total / procesos:>18.1f}{total:>17.1f}'
+                )
+
+        self.stdout.write(self.style.SUCCESS('✓ Medición terminada'))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authz', '0002_indices_paginacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='roles_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authz', '0003_usuario_roles_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='fecha_cambio_acceso',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
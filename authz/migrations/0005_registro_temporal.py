@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authz', '0004_usuario_fecha_cambio_acceso'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistroTemporal',
+            fields=[
+                ('clave', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('valor', models.JSONField(blank=True, null=True)),
+                ('contador', models.PositiveIntegerField(default=0)),
+                ('expira', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
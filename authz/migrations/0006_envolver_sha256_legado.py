@@ -0,0 +1,28 @@
+# Contraseñas del sistema anterior guardadas como SHA256 en hexadecimal, sin
+# prefijo de algoritmo: Django no sabe verificarlas. Se marcan como
+# sha256_legado$<hex> (authz.hashers.SHA256LegadoHasher) para que el login las
+# acepte y las rehashee con el hasher preferido.
+
+from django.db import migrations
+from django.db.models import Value
+from django.db.models.functions import Concat, Lower
+
+SHA256_HEX = r'^[0-9a-fA-F]{64}$'
+
+
+def envolver(apps, schema_editor):
+    Usuario = apps.get_model('authz', 'Usuario')
+    Usuario.objects.filter(password__regex=SHA256_HEX).update(
+        password=Concat(Value('sha256_legado$'), Lower('password'))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authz', '0005_registro_temporal'),
+    ]
+
+    operations = [
+        migrations.RunPython(envolver, migrations.RunPython.noop),
+    ]
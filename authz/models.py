@@ -1,4 +1,5 @@
 from django.db import models
+from django.contrib.auth.hashers import check_password
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
 
 class Rol(models.Model):
@@ -8,6 +9,16 @@ class Rol(models.Model):
     def __str__(self):
         return self.nombre
 
+class RegistroTemporal(models.Model):
+    """Tokens y contadores con vencimiento, compartidos por todos los procesos (ver authz/almacen.py)."""
+    clave = models.CharField(max_length=255, primary_key=True)
+    valor = models.JSONField(null=True, blank=True)
+    contador = models.PositiveIntegerField(default=0)
+    expira = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.clave
+
 class UsuarioManager(BaseUserManager):
     def create_user(self, usuario, correo, nombre, apellido, contraseña=None, **extra_fields):
         if not usuario:
@@ -47,6 +58,16 @@ class Usuario(AbstractBaseUser, PermissionsMixin):
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
     date_joined = models.DateTimeField(auto_now_add=True)
+    # Sube con cada cambio de roles: los tokens con otra versión no usan sus roles embebidos
+    roles_version = models.PositiveIntegerField(default=0)
+    # Último cambio de estado, roles, permisos o contraseña (ver authz/revocacion.py)
+    fecha_cambio_acceso = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Orden de la paginación por cursor del listado de usuarios
+            models.Index(fields=['-date_joined', '-id'], name='usuario_alta_idx'),
+        ]
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['nombres', 'apellidos']
@@ -63,3 +84,34 @@ class Usuario(AbstractBaseUser, PermissionsMixin):
     def get_short_name(self):
         """Retorna el primer nombre"""
         return self.nombres
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        # Usuario armado desde el JWT: el primer campo diferido que se toca trae todos los demás en una consulta
+        # (from_queryset existe desde Django 5.1, ver requirements.txt)
+        if fields is not None and getattr(self, '_desde_token', False):
+            self._desde_token = False
+            fields = list(set(fields) | self.get_deferred_fields())
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+
+    def check_password(self, raw_password):
+        # Hash legado o de costo distinto al configurado: se rehashea la misma contraseña.
+        # No es un cambio de acceso, así que no invalida los tokens emitidos (ver signals)
+        def rehashear(raw_password):
+            self.set_password(raw_password)
+            self._password = None
+            self._rehash = True
+            self.save(update_fields=['password'])
+
+        return check_password(raw_password, self.password, rehashear)
+
+    @property
+    def nombres_roles(self) -> tuple:
+        """
+        Nombres de los roles del usuario, en orden de id del rol. Los fija la
+        autenticación JWT desde el token; si no, una sola lectura cacheada por
+        versión (ver authz/roles.py).
+        """
+        if getattr(self, '_nombres_roles', None) is None:
+            from .roles import cargar_roles
+            self._nombres_roles = cargar_roles(self.pk, self.roles_version)
+        return self._nombres_roles
@@ -0,0 +1,63 @@
+"""
+Lista en memoria de usuarios cuyo acceso cambió hace poco.
+
+Un access token sin cambios posteriores del usuario se acepta tal cual: el
+usuario se arma desde sus claims, sin consultar la base. Cada proceso guarda
+los ids de usuarios con ``fecha_cambio_acceso`` dentro de la vida de un access
+token (estado, roles, permisos o contraseña) y la relee cada ``INTERVALO``
+segundos con una sola consulta. Un token emitido antes de ese cambio no confía
+en sus claims: el usuario se lee de la base y se rechaza si ya no está activo.
+
+Los cambios más viejos que ``ACCESS_TOKEN_LIFETIME`` no hace falta recordarlos:
+todo token anterior ya venció. El login rechaza usuarios inactivos y el
+refresh también, así que un token nuevo nunca nace de un usuario dado de baja.
+"""
+
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+
+INTERVALO = getattr(settings, 'JWT_REVOCACION_INTERVALO', 5)
+
+
+class ListaRevocacion:
+
+    def __init__(self):
+        self._cambios: Dict[str, datetime] = {}
+        self._vence = 0.0
+        self._lock = threading.Lock()
+
+    def _recargar(self):
+        from .models import Usuario
+
+        desde = timezone.now() - api_settings.ACCESS_TOKEN_LIFETIME
+        # Claves como texto: simplejwt guarda el id del usuario como string en el token
+        self._cambios = {
+            str(pk): cambio
+            for pk, cambio in Usuario.objects.filter(fecha_cambio_acceso__gte=desde).values_list('id', 'fecha_cambio_acceso')
+        }
+
+    def vencer(self):
+        """Relee en la próxima consulta (cambio hecho en este mismo proceso)."""
+        self._vence = 0.0
+
+    def cambio(self, usuario_id) -> Optional[datetime]:
+        if time.monotonic() >= self._vence:
+            with self._lock:
+                if time.monotonic() >= self._vence:
+                    self._recargar()
+                    self._vence = time.monotonic() + INTERVALO
+        return self._cambios.get(str(usuario_id))
+
+    def token_vigente(self, usuario_id, emitido: int) -> bool:
+        """True si el usuario no cambió su acceso después de ``emitido`` (claim ``iat``)."""
+        cambio = self.cambio(usuario_id)
+        return cambio is None or datetime.fromtimestamp(emitido, tz=dt_timezone.utc) > cambio
+
+
+lista = ListaRevocacion()
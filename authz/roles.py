@@ -0,0 +1,77 @@
+"""
+Roles del usuario sin consultar la base en cada verificación.
+
+El login y el refresh embeben en el access token los nombres de los roles
+(``roles``) y la versión de roles del usuario (``rv``). ``JWTRolesAuthentication``
+los pasa a ``request.user.nombres_roles`` si la versión del token coincide con
+la de la fila del usuario, que la autenticación ya lee. Si los roles
+cambiaron después de emitir el token, se leen una vez y quedan en la caché bajo
+la nueva versión.
+
+``roles_version`` sube con cada alta o baja de roles y cuando se renombra un
+rol (ver signals.py), así un token viejo nunca da permisos quitados.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken, Token
+
+CLAIM_ROLES = 'roles'
+CLAIM_VERSION = 'rv'
+# Campos del usuario que viajan en el token (ver authentication.py)
+CLAIMS_USUARIO = ('email', 'nombres', 'apellidos', 'estado', 'is_active', 'is_staff', 'is_superuser')
+
+# Segundos que se guardan los roles de una versión; la clave cambia con la versión
+TTL = getattr(settings, 'ROLES_CACHE_TTL', 3600)
+
+
+def _clave(usuario_id, version) -> str:
+    return f'authz:roles:{usuario_id}:{version}'
+
+
+def cargar_roles(usuario_id, version) -> tuple:
+    """Nombres en orden de creación del rol (id): es el orden de precedencia de las reglas."""
+    from .models import Rol
+
+    clave = _clave(usuario_id, version)
+    roles = cache.get(clave)
+    if roles is None:
+        roles = tuple(Rol.objects.filter(usuarios=usuario_id).order_by('id').values_list('nombre', flat=True))
+        # Se guarda al confirmar: si la transacción se revierte, la misma versión
+        # vuelve a usarse con otros roles y no debe encontrar estos
+        transaction.on_commit(lambda: cache.set(clave, roles, TTL))
+    return roles
+
+
+def olvidar(usuario):
+    """Borra los roles cacheados de un usuario eliminado (su id puede reutilizarse)."""
+    cache.delete_many([_clave(usuario.pk, version) for version in range(usuario.roles_version + 1)])
+
+
+def agregar_claims(token: Token, usuario) -> Token:
+    token[CLAIM_ROLES] = list(usuario.nombres_roles)
+    token[CLAIM_VERSION] = usuario.roles_version
+    for campo in CLAIMS_USUARIO:
+        token[campo] = getattr(usuario, campo)
+    return token
+
+
+def token_para(usuario) -> RefreshToken:
+    """Refresh token con los roles; su access token los hereda."""
+    return agregar_claims(RefreshToken.for_user(usuario), usuario)
+
+
+def roles_del_token(token: Token, usuario):
+    """Roles del token si siguen vigentes para ``usuario``; None si no los trae o cambiaron."""
+    roles = token.get(CLAIM_ROLES)
+    if roles is None or token.get(CLAIM_VERSION) != usuario.roles_version:
+        return None
+    return tuple(roles)
+
+
+def invalidar(usuarios):
+    """Sube la versión de roles de los usuarios (queryset de Usuario) y marca el cambio de acceso."""
+    usuarios.update(roles_version=F('roles_version') + 1, fecha_cambio_acceso=timezone.now())
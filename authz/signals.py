@@ -0,0 +1,80 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Rol, Usuario
+from .revocacion import lista
+from .roles import invalidar as invalidar_roles, olvidar as olvidar_roles
+
+# Campos cuyo cambio invalida los claims de los tokens ya emitidos
+CAMPOS_ACCESO = ('estado', 'is_active', 'is_staff', 'is_superuser', 'password')
+
+
+def invalidar(usuarios):
+    invalidar_roles(usuarios)
+    transaction.on_commit(lista.vencer)
+
+
+@receiver(pre_save, sender=Usuario)
+def marcar_cambio_acceso(sender, instance, update_fields=None, **kwargs):
+    """Baja, reactivación, permisos o contraseña nueva: los tokens anteriores dejan de confiar en sus claims."""
+    if instance._state.adding or instance.pk is None:
+        return
+    # Los campos diferidos (usuario armado desde el token) no se guardan: no pueden cambiar
+    diferidos = instance.get_deferred_fields()
+    if instance.__dict__.pop('_rehash', False):
+        # Misma contraseña con otro hash (Usuario.check_password)
+        diferidos = diferidos | {'password'}
+    campos = [c for c in CAMPOS_ACCESO if (update_fields is None or c in update_fields) and c not in diferidos]
+    if not campos:
+        return
+    anteriores = Usuario.objects.filter(pk=instance.pk).values(*campos).first()
+    if anteriores and any(anteriores[c] != getattr(instance, c) for c in campos):
+        instance.fecha_cambio_acceso = timezone.now()
+        if update_fields is not None:
+            # save(update_fields=[...]) no incluye la fecha: se guarda aparte en post_save
+            instance._cambio_acceso_pendiente = True
+        transaction.on_commit(lista.vencer)
+
+
+@receiver(post_save, sender=Usuario)
+def guardar_cambio_acceso(sender, instance, **kwargs):
+    if getattr(instance, '_cambio_acceso_pendiente', False):
+        instance._cambio_acceso_pendiente = False
+        Usuario.objects.filter(pk=instance.pk).update(fecha_cambio_acceso=instance.fecha_cambio_acceso)
+
+
+@receiver(post_delete, sender=Usuario)
+def usuario_eliminado(sender, instance, **kwargs):
+    transaction.on_commit(lambda: olvidar_roles(instance))
+
+
+@receiver(m2m_changed, sender=Usuario.roles.through)
+def roles_modificados(sender, instance, action, reverse, pk_set, **kwargs):
+    """Cualquier alta o baja de roles invalida los roles embebidos en los tokens del usuario."""
+    if reverse and action == 'pre_clear':
+        # rol.usuarios.clear(): después ya no se sabe a quiénes afectó
+        instance._usuarios_antes_de_limpiar = list(instance.usuarios.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        if action != 'post_clear' and not pk_set:
+            return
+        invalidar(Usuario.objects.filter(pk=instance.pk))
+        instance.refresh_from_db(fields=['roles_version'])
+        instance._nombres_roles = None
+    else:
+        if action == 'post_clear':
+            pk_set = instance.__dict__.pop('_usuarios_antes_de_limpiar', [])
+        if pk_set:
+            invalidar(Usuario.objects.filter(pk__in=pk_set))
+
+
+@receiver(post_save, sender=Rol)
+def rol_guardado(sender, instance, created, **kwargs):
+    """Un rol renombrado cambia el nombre que llevan los tokens de sus usuarios."""
+    if not created:
+        invalidar(Usuario.objects.filter(roles=instance))
@@ -0,0 +1,96 @@
+import re
+from datetime import timedelta
+
+from django.core import mail
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from authz.almacen import AlmacenBD, AlmacenCache
+from authz.models import RegistroTemporal, Usuario
+
+
+class AlmacenBDTest(TestCase):
+
+    def setUp(self):
+        self.almacen = AlmacenBD()
+
+    def vencer(self, clave):
+        RegistroTemporal.objects.filter(clave=clave).update(expira=timezone.now() - timedelta(seconds=1))
+
+    def test_consumir_entrega_el_valor_una_sola_vez(self):
+        self.almacen.guardar('t', {'usuario': 7}, 60)
+        self.assertEqual(self.almacen.obtener('t'), {'usuario': 7})
+        self.assertEqual(self.almacen.consumir('t'), {'usuario': 7})
+        self.assertIsNone(self.almacen.consumir('t'))
+
+        self.almacen.guardar('v', 1, 60)
+        self.vencer('v')
+        self.assertIsNone(self.almacen.obtener('v'))
+        self.assertIsNone(self.almacen.consumir('v'))
+        self.assertEqual(self.almacen.limpiar(), 1)
+
+    def test_contador_por_ventana(self):
+        self.assertEqual([self.almacen.incrementar('c', 60) for _ in range(3)], [1, 2, 3])
+        # Vencida la ventana se abre otra desde cero en la misma fila
+        self.vencer('c')
+        self.assertEqual(self.almacen.incrementar('c', 60), 1)
+        self.assertEqual(RegistroTemporal.objects.filter(clave='c').count(), 1)
+        self.almacen.borrar('c')
+        self.assertEqual(self.almacen.incrementar('c', 60), 1)
+
+    def test_cache_exige_backend_atomico(self):
+        with override_settings(CACHES={'local': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            with self.assertRaises(ImproperlyConfigured):
+                AlmacenCache('local')
+            with self.assertRaises(ImproperlyConfigured):
+                AlmacenCache('no_existe')
+
+
+@override_settings(LOGIN_MAX_INTENTOS=2, RECUPERACION_MAX_INTENTOS=2)
+class LimitesCompartidosTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create(email='ana@test.com', nombres='Ana', apellidos='T')
+        cls.usuario.set_password('correcta-123')
+        cls.usuario.save()
+
+    def setUp(self):
+        self.api = APIClient(SERVER_NAME='localhost')
+
+    def login(self, password, email='ana@test.com'):
+        return self.api.post('/api/auth/login/', {'email': email, 'password': password}, format='json').status_code
+
+    def test_limite_de_login_por_email_y_reinicio(self):
+        self.assertEqual([self.login('mal'), self.login('mal', email='ANA@test.com')], [401, 401])
+        # El contador vive en la base (lo comparten todos los workers) y no distingue mayúsculas
+        self.assertEqual(RegistroTemporal.objects.get(clave='intentos:login:ana@test.com').contador, 2)
+        self.assertEqual(self.login('correcta-123'), 429)
+
+        RegistroTemporal.objects.all().delete()
+        self.assertEqual(self.login('mal'), 401)
+        self.assertEqual(self.login('correcta-123'), 200)
+        # Un login correcto reinicia el contador
+        self.assertFalse(RegistroTemporal.objects.filter(clave='intentos:login:ana@test.com').exists())
+
+    def test_codigo_de_recuperacion_guardado_con_hash_y_de_un_solo_uso(self):
+        respuesta = self.api.post('/api/auth/solicitar-recuperacion-password/', {'email': 'ana@test.com'}, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        token = re.search(r'es: (\S+)', mail.outbox[0].body).group(1)
+
+        registro = RegistroTemporal.objects.get(clave__startswith='resetpw:')
+        self.assertRegex(registro.clave, r'^resetpw:[0-9a-f]{64}$')
+        self.assertNotIn(token, registro.clave)
+        self.assertEqual(registro.valor, self.usuario.pk)
+
+        datos = {'email': 'ana@test.com', 'token': token, 'password': 'nueva-clave-456'}
+        self.assertEqual(self.api.post('/api/auth/reset-password/', datos, format='json').status_code, 200)
+        self.assertEqual(self.api.post('/api/auth/reset-password/', datos, format='json').status_code, 400)
+        self.assertTrue(Usuario.objects.get(pk=self.usuario.pk).check_password('nueva-clave-456'))
+
+    def test_limite_de_canjes(self):
+        datos = {'email': 'ana@test.com', 'token': 'adivinado', 'password': 'nueva-clave-456'}
+        estados = [self.api.post('/api/auth/reset-password/', datos, format='json').status_code for _ in range(3)]
+        self.assertEqual(estados, [400, 400, 429])
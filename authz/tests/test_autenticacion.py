@@ -0,0 +1,110 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
+
+from authz.authentication import JWTRolesAuthentication
+from authz.models import Rol, Usuario
+from authz.revocacion import lista
+from authz.roles import token_para
+
+
+class UsuarioDesdeTokenTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Rol.objects.get_or_create(nombre='ADMIN')[0]
+        cls.cliente = Rol.objects.get_or_create(nombre='CLIENTE')[0]
+        cls.usuario = Usuario.objects.create(
+            email='u@test.com', nombres='Ana', apellidos='Pérez', telefono='555', pais='Perú',
+        )
+        cls.usuario.roles.add(cls.admin)
+        # El alta de roles cuenta como cambio de acceso: que no alcance a los tokens de las pruebas
+        Usuario.objects.filter(pk=cls.usuario.pk).update(fecha_cambio_acceso=None)
+
+    def setUp(self):
+        lista.vencer()
+        self.addCleanup(lista.vencer)
+        self.auth = JWTRolesAuthentication()
+
+    def autenticar(self, token):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        return self.auth.authenticate(request)[0]
+
+    def access(self, hace=0):
+        token = token_para(Usuario.objects.get(pk=self.usuario.pk)).access_token
+        # ``iat`` tiene resolución de segundos: un token del mismo segundo que un cambio no confía en sus claims
+        token['iat'] -= hace
+        return str(token)
+
+    def test_usuario_armado_desde_los_claims_sin_consultas(self):
+        token = self.access()
+        # La lista de revocación se relee cada INTERVALO segundos, no por request
+        lista.cambio(self.usuario.pk)
+
+        with self.assertNumQueries(0):
+            user = self.autenticar(token)
+            self.assertEqual((user.pk, user.email, user.nombres, user.estado), (self.usuario.pk, 'u@test.com', 'Ana', 'ACTIVO'))
+            self.assertTrue(user.is_active and user.is_authenticated)
+            self.assertEqual(user.nombres_roles, ('ADMIN',))
+        self.assertIsInstance(user.pk, int)
+
+    def test_campo_diferido_trae_todos_en_una_consulta(self):
+        lista.cambio(self.usuario.pk)
+        user = self.autenticar(self.access())
+        self.assertIn('telefono', user.get_deferred_fields())
+
+        with self.assertNumQueries(1):
+            self.assertEqual(user.telefono, '555')
+            self.assertEqual(user.pais, 'Perú')
+            self.assertIsNotNone(user.date_joined)
+        self.assertEqual(user.get_deferred_fields(), set())
+
+    def test_cambio_de_acceso_vuelve_a_leer_la_base(self):
+        token = self.access(hace=10)
+        usuario = Usuario.objects.get(pk=self.usuario.pk)
+        usuario.roles.add(self.cliente)
+        Usuario.objects.filter(pk=usuario.pk).update(fecha_cambio_acceso=timezone.now() - timedelta(seconds=5))
+
+        with self.assertNumQueries(2):
+            # Relee la lista de revocación y al usuario
+            user = self.autenticar(token)
+        self.assertFalse(getattr(user, '_desde_token', False))
+        self.assertEqual(user.get_deferred_fields(), set())
+        self.assertEqual(user.nombres_roles, ('ADMIN', 'CLIENTE'))
+
+        # Un token emitido después del cambio vuelve a confiar en sus claims
+        nuevo = self.access()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.autenticar(nuevo).nombres_roles, ('ADMIN', 'CLIENTE'))
+
+    def test_usuario_dado_de_baja_se_rechaza(self):
+        token = self.access(hace=10)
+        usuario = Usuario.objects.get(pk=self.usuario.pk)
+        usuario.estado = 'INACTIVO'
+        with self.captureOnCommitCallbacks(execute=True):
+            usuario.save(update_fields=['estado'])
+        self.assertIsNotNone(Usuario.objects.get(pk=usuario.pk).fecha_cambio_acceso)
+
+        with self.assertRaises(AuthenticationFailed):
+            self.autenticar(token)
+
+    def test_guardar_un_usuario_del_token_no_es_cambio_de_acceso(self):
+        lista.cambio(self.usuario.pk)
+        user = self.autenticar(self.access())
+        user.telefono = '777'
+        # Sin update_fields: Django guarda solo los campos cargados, la contraseña diferida no se toca
+        user.save()
+
+        usuario = Usuario.objects.get(pk=self.usuario.pk)
+        self.assertEqual((usuario.telefono, usuario.password), ('777', self.usuario.password))
+        self.assertIsNone(usuario.fecha_cambio_acceso)
+
+    def test_token_sin_claims_lee_la_base(self):
+        token = AccessToken.for_user(self.usuario)
+        user = self.autenticar(str(token))
+        self.assertFalse(getattr(user, '_desde_token', False))
+        self.assertEqual(user.telefono, '555')
@@ -0,0 +1,86 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher, identify_hasher
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+
+from authz.hashers import SHA256LegadoHasher
+from authz.models import Usuario
+
+
+def sha256(password):
+    return hashlib.sha256(password.encode()).hexdigest()
+
+
+class SHA256LegadoTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.legado = SHA256LegadoHasher.envolver(sha256('vieja-clave-1'))
+        cls.usuario = Usuario.objects.create(
+            email='legado@test.com', nombres='L', apellidos='T', password=cls.legado,
+        )
+
+    def login(self, password):
+        api = APIClient(SERVER_NAME='localhost')
+        return api.post('/api/auth/login/', {'email': 'legado@test.com', 'password': password}, format='json')
+
+    def test_login_correcto_rehashea_con_el_hasher_preferido(self):
+        respuesta = self.login('vieja-clave-1')
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+
+        usuario = Usuario.objects.get(pk=self.usuario.pk)
+        self.assertEqual(identify_hasher(usuario.password).algorithm, get_hasher().algorithm)
+        self.assertEqual(get_hasher().algorithm, settings.HASHER_PREFERIDO)
+        self.assertTrue(usuario.check_password('vieja-clave-1'))
+        # Rehashear no es un cambio de acceso: el token recién emitido sigue confiando en sus claims
+        self.assertIsNone(usuario.fecha_cambio_acceso)
+
+        self.assertEqual(self.login('vieja-clave-1').status_code, 200)
+
+    def test_login_fallido_no_toca_el_hash(self):
+        self.assertEqual(self.login('otra-clave').status_code, 401)
+        self.assertEqual(Usuario.objects.get(pk=self.usuario.pk).password, self.legado)
+
+    def test_verifica_solo_la_misma_contraseña(self):
+        hasher = SHA256LegadoHasher()
+        self.assertTrue(hasher.verify('vieja-clave-1', self.legado))
+        self.assertFalse(hasher.verify('Vieja-clave-1', self.legado))
+        self.assertTrue(hasher.must_update(self.legado))
+        self.assertEqual(identify_hasher(self.legado).algorithm, 'sha256_legado')
+
+
+class MigracionEnvolverSHA256Test(TransactionTestCase):
+    antes = [('authz', '0005_registro_temporal')]
+    despues = [('authz', '0006_envolver_sha256_legado')]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.antes)
+        self.apps = executor.loader.project_state(self.antes).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_envuelve_solo_los_sha256_sin_prefijo(self):
+        Usuario = self.apps.get_model('authz', 'Usuario')
+        crudo = sha256('vieja-clave-1').upper()
+        otros = {
+            'pbkdf2@test.com': 'pbkdf2_sha256$1000$sal$abc=',
+            'corto@test.com': crudo[:-1],
+            'sin@test.com': '!no-usable',
+        }
+        Usuario.objects.create(email='crudo@test.com', nombres='C', apellidos='T', password=crudo)
+        for email, password in otros.items():
+            Usuario.objects.create(email=email, nombres='O', apellidos='T', password=password)
+
+        MigrationExecutor(connection).migrate(self.despues)
+
+        passwords = dict(Usuario.objects.values_list('email', 'password'))
+        self.assertEqual(passwords.pop('crudo@test.com'), f'sha256_legado${crudo.lower()}')
+        self.assertEqual(passwords, otros)
@@ -0,0 +1,106 @@
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.test import TestCase
+
+from authz import importacion
+from authz.models import Rol, Usuario
+
+
+class ImportacionUsuariosTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = Rol.objects.get_or_create(nombre='CLIENTE')[0]
+        cls.admin = Rol.objects.get_or_create(nombre='ADMIN')[0]
+        cls.existente = Usuario.objects.create(email='ya@test.com', nombres='Ya', apellidos='Existe')
+
+    def importar(self, registros, **opciones):
+        # Hilos en lugar de procesos: mismo contrato de Executor, sin cerrar la conexión de la prueba
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            opciones.setdefault('rol_defecto', 'CLIENTE')
+            return importacion.Importador(pool, 2, **opciones).importar(registros)
+
+    def registro(self, email, **campos):
+        return {'email': email, 'nombres': 'N', 'apellidos': 'A', **campos}
+
+    def test_emails_repetidos_sin_distinguir_mayusculas(self):
+        resumen = self.importar([
+            self.registro('Ana@Test.com'),
+            self.registro('ana@test.com'),
+            self.registro('YA@test.com'),
+            self.registro('beto@test.com'),
+            self.registro('sin-arroba'),
+        ], tamano_lote=2)
+
+        self.assertEqual((resumen.creados, resumen.existentes, resumen.invalidos), (2, 2, 1))
+        # normalize_email solo pasa a minúsculas el dominio
+        self.assertCountEqual(
+            Usuario.objects.exclude(pk=self.existente.pk).values_list('email', flat=True),
+            ['Ana@test.com', 'beto@test.com'],
+        )
+        self.assertEqual(self.importar([self.registro('ANA@TEST.COM')]).existentes, 1)
+
+    def test_contraseñas(self):
+        legado = hashlib.sha256(b'legado-123').hexdigest()
+        resumen = self.importar([
+            self.registro('plano@test.com', password='plana-123'),
+            self.registro('hash@test.com', password=make_password('hasheada-123')),
+            self.registro('legado@test.com', password_sha256=legado.upper()),
+            self.registro('sin@test.com'),
+            self.registro('mal@test.com', password_sha256='xyz'),
+        ])
+
+        self.assertEqual((resumen.creados, resumen.invalidos), (4, 1))
+        self.assertIn('mal@test.com', resumen.errores[0])
+        usuarios = {u.email: u for u in Usuario.objects.all()}
+        self.assertTrue(usuarios['plano@test.com'].password.startswith('pbkdf2_sha256$'))
+        self.assertTrue(usuarios['plano@test.com'].check_password('plana-123'))
+        self.assertTrue(usuarios['hash@test.com'].check_password('hasheada-123'))
+        self.assertEqual(usuarios['legado@test.com'].password, f'sha256_legado${legado}')
+        self.assertFalse(usuarios['sin@test.com'].has_usable_password())
+        self.assertFalse(usuarios['sin@test.com'].check_password(''))
+
+    def test_roles_existentes_por_nombre_o_id_y_desconocidos(self):
+        resumen = self.importar([
+            self.registro('a@test.com', roles=['ADMIN', 'SUPERVISOR']),
+            self.registro('b@test.com', roles=[str(self.admin.pk), 'SUPERVISOR']),
+            self.registro('c@test.com'),
+        ])
+
+        self.assertEqual(resumen.roles, 3)
+        self.assertEqual(resumen.errores, ["Rol desconocido: 'SUPERVISOR' (no se asigna)"])
+        self.assertFalse(Rol.objects.filter(nombre='SUPERVISOR').exists())
+        roles = {u.email: u.nombres_roles for u in Usuario.objects.all()}
+        self.assertEqual((roles['a@test.com'], roles['b@test.com'], roles['c@test.com']), (('ADMIN',), ('ADMIN',), ('CLIENTE',)))
+
+    def test_roles_a_existentes_invalida_sus_roles_cacheados(self):
+        self.existente.roles.add(self.cliente)
+        # Los roles cacheados sobreviven al rollback de la prueba y los ids se reutilizan
+        self.addCleanup(cache.clear)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(Usuario.objects.get(pk=self.existente.pk).nombres_roles, ('CLIENTE',))
+
+        resumen = self.importar([self.registro('ya@test.com', roles=['CLIENTE', 'ADMIN'])], roles_a_existentes=True)
+
+        self.assertEqual((resumen.creados, resumen.existentes), (0, 1))
+        usuario = Usuario.objects.get(pk=self.existente.pk)
+        self.assertEqual(usuario.nombres_roles, ('CLIENTE', 'ADMIN'))
+        self.assertIsNotNone(usuario.fecha_cambio_acceso)
+
+    def test_leer_csv(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as archivo:
+            archivo.write('email,nombres,apellidos,is_staff,roles\n')
+            archivo.write(' csv@test.com ,Ana,Pérez,sí,ADMIN| CLIENTE\n')
+        self.addCleanup(os.unlink, archivo.name)
+
+        self.assertEqual(self.importar(importacion.leer(archivo.name)).creados, 1)
+        usuario = Usuario.objects.get(email='csv@test.com')
+        self.assertTrue(usuario.is_staff)
+        self.assertEqual(usuario.nombres_roles, ('CLIENTE', 'ADMIN'))
+        with self.assertRaises(ValueError):
+            importacion.leer('usuarios.xml')
@@ -0,0 +1,105 @@
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from authz import roles
+from authz.models import Rol, Usuario
+
+
+class CacheRolesTest(TransactionTestCase):
+
+    def setUp(self):
+        self.admin = Rol.objects.get_or_create(nombre='ADMIN')[0]
+        self.cliente = Rol.objects.get_or_create(nombre='CLIENTE')[0]
+
+    def releer(self, pk):
+        return Usuario.objects.get(pk=pk).nombres_roles
+
+    def test_roles_leidos_en_una_transaccion_revertida_no_se_cachean(self):
+        usuario = Usuario.objects.create(email='u@test.com', nombres='U', apellidos='T')
+        try:
+            with transaction.atomic():
+                usuario.roles.add(self.admin)
+                self.assertEqual(self.releer(usuario.pk), ('ADMIN',))
+                raise RuntimeError
+        except RuntimeError:
+            pass
+
+        # La misma versión de roles vuelve a usarse, ahora con otro rol
+        Usuario.objects.get(pk=usuario.pk).roles.add(self.cliente)
+        self.assertEqual(self.releer(usuario.pk), ('CLIENTE',))
+
+    def test_id_reutilizado_no_hereda_los_roles_del_eliminado(self):
+        eliminado = Usuario.objects.create(email='viejo@test.com', nombres='V', apellidos='T')
+        eliminado.roles.add(self.admin)
+        self.assertEqual(self.releer(eliminado.pk), ('ADMIN',))
+        pk = eliminado.pk
+        eliminado.delete()
+
+        nuevo = Usuario.objects.create(pk=pk, email='nuevo@test.com', nombres='N', apellidos='T')
+        nuevo.roles.add(self.cliente)
+        self.assertEqual(self.releer(pk), ('CLIENTE',))
+
+
+class RolesEnTokenTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Rol.objects.get_or_create(nombre='ADMIN')[0]
+        cls.cliente = Rol.objects.get_or_create(nombre='CLIENTE')[0]
+        cls.usuario = Usuario.objects.create(email='u@test.com', nombres='U', apellidos='T')
+        cls.usuario.set_password('secreta-123')
+        cls.usuario.save()
+        # Orden inverso al de creación: el token los lleva por id del rol
+        cls.usuario.roles.add(cls.cliente, cls.admin)
+
+    def setUp(self):
+        self.api = APIClient(SERVER_NAME='localhost')
+
+    def login(self):
+        respuesta = self.api.post('/api/auth/login/', {'email': 'u@test.com', 'password': 'secreta-123'}, format='json')
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        return respuesta.data
+
+    def test_login_y_refresh_embeben_roles_y_version(self):
+        tokens = self.login()
+        usuario = Usuario.objects.get(pk=self.usuario.pk)
+        for token in (AccessToken(tokens['access']), RefreshToken(tokens['refresh'])):
+            self.assertEqual(token[roles.CLAIM_ROLES], ['ADMIN', 'CLIENTE'])
+            self.assertEqual(token[roles.CLAIM_VERSION], usuario.roles_version)
+
+        # El refresh toma los roles vigentes, no los del login
+        usuario.roles.remove(self.admin)
+        respuesta = self.api.post('/api/auth/refresh/', {'refresh': tokens['refresh']}, format='json')
+        access = AccessToken(respuesta.data['access'])
+        self.assertEqual(access[roles.CLAIM_ROLES], ['CLIENTE'])
+        self.assertEqual(access[roles.CLAIM_VERSION], usuario.roles_version)
+
+    def test_token_con_otra_version_no_usa_sus_roles(self):
+        token = AccessToken(self.login()['access'])
+        usuario = Usuario.objects.get(pk=self.usuario.pk)
+        self.assertEqual(roles.roles_del_token(token, usuario), ('ADMIN', 'CLIENTE'))
+
+        version = usuario.roles_version
+        usuario.roles.remove(self.admin)
+        self.assertEqual(usuario.roles_version, version + 1)
+        self.assertIsNone(roles.roles_del_token(token, usuario))
+
+        # Sin roles al día en el token se leen una vez y quedan cacheados por versión
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(Usuario.objects.get(pk=usuario.pk).nombres_roles, ('CLIENTE',))
+        releido = Usuario.objects.get(pk=usuario.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(releido.nombres_roles, ('CLIENTE',))
+
+    def test_renombrar_o_vaciar_un_rol_sube_la_version(self):
+        version = Usuario.objects.get(pk=self.usuario.pk).roles_version
+        self.admin.nombre = 'ADMINISTRADOR'
+        self.admin.save()
+        self.assertEqual(Usuario.objects.get(pk=self.usuario.pk).roles_version, version + 1)
+
+        self.cliente.usuarios.clear()
+        usuario = Usuario.objects.get(pk=self.usuario.pk)
+        self.assertEqual(usuario.roles_version, version + 2)
+        self.assertIsNotNone(usuario.fecha_cambio_acceso)
@@ -6,9 +6,13 @@ from rest_framework.permissions import AllowAny
 from django.db import transaction
 from rest_framework_simplejwt.tokens import RefreshToken
 from .models import Usuario, Rol
+from core.paginacion import CursorPaginacionUsuarios
 from .serializers import UsuarioSerializer, UsuarioCreateSerializer, RolSerializer, UsuarioRegistroSerializer
+import logging
 # --- FIN IMPORTS ---
 
+logger = logging.getLogger(__name__)
+
 # Endpoint para cambio de contraseña autenticado
 from drf_spectacular.utils import extend_schema, OpenApiResponse, inline_serializer
 from rest_framework import serializers as drf_serializers
@@ -53,8 +57,14 @@ import datetime
 from django.utils import timezone
 from django.db import models
 
-# Modelo simple para almacenar tokens de recuperación (puedes migrar a un modelo real si lo deseas)
-from django.core.cache import cache
+# Tokens de recuperación y límites de intentos compartidos entre workers
+from .almacen import almacen, limite_superado
+import hashlib
+
+
+def _clave_recuperacion(email, token):
+    # Se guarda el hash: quien lea la tabla no obtiene códigos válidos
+    return "resetpw:" + hashlib.sha256(f"{email.lower()}:{token}".encode()).hexdigest()
 
 # Endpoint para solicitar recuperación de contraseña
 @api_view(["POST"])
@@ -66,21 +76,26 @@ from django.core.cache import cache
         name="RecuperarPasswordRequest",
         fields={"email": drf_serializers.EmailField()},
     ),
-    responses={200: OpenApiResponse(description="Email enviado si existe el usuario")},
+    responses={
+        200: OpenApiResponse(description="Email enviado si existe el usuario"),
+        429: OpenApiResponse(description="Demasiados intentos"),
+    },
 )
 def solicitar_recuperacion_password(request):
     email = request.data.get("email")
     if not email:
         return Response({"detail": "Falta email"}, status=400)
+    # Se cuenta aunque el email no exista: la respuesta no revela cuáles existen
+    if limite_superado(f"intentos:recuperacion:{email.lower()}", settings.RECUPERACION_MAX_SOLICITUDES, settings.RECUPERACION_VENTANA):
+        return Response({"detail": "Demasiados intentos, intenta más tarde."}, status=429)
     try:
         usuario = Usuario.objects.get(email=email)
     except Usuario.DoesNotExist:
         # No revelar si existe o no
         return Response({"detail": "Si el email existe, se enviará un enlace de recuperación."}, status=200)
-    # Generar token único y guardar en cache (puedes usar modelo real si prefieres)
+    # Token en el almacén compartido: lo ve cualquier worker que reciba el canje
     token = get_random_string(48)
-    cache_key = f"resetpw:{email}:{token}"
-    cache.set(cache_key, usuario.id, timeout=60*60)   # type: ignore
+    almacen.guardar(_clave_recuperacion(email, token), usuario.id, settings.RECUPERACION_TOKEN_TTL)
     # Enviar email SOLO con el código/token, visualmente atractivo
     html_message = f"""
     <div style='font-family: Arial, sans-serif; color: #222; background: #f7f7fa; padding: 32px;'>
@@ -120,7 +135,10 @@ def solicitar_recuperacion_password(request):
             "password": drf_serializers.CharField(min_length=8),
         },
     ),
-    responses={200: OpenApiResponse(description="Contraseña restablecida correctamente")},
+    responses={
+        200: OpenApiResponse(description="Contraseña restablecida correctamente"),
+        429: OpenApiResponse(description="Demasiados intentos"),
+    },
 )
 def resetear_password(request):
     email = request.data.get("email")
@@ -128,8 +146,10 @@ def resetear_password(request):
     password = request.data.get("password")
     if not email or not token or not password:
         return Response({"detail": "Faltan campos"}, status=400)
-    cache_key = f"resetpw:{email}:{token}"
-    usuario_id = cache.get(cache_key)
+    if limite_superado(f"intentos:canje:{email.lower()}", settings.RECUPERACION_MAX_INTENTOS, settings.RECUPERACION_VENTANA):
+        return Response({"detail": "Demasiados intentos, intenta más tarde."}, status=429)
+    # consumir(): un código sirve una sola vez aunque llegue a dos workers a la vez
+    usuario_id = almacen.consumir(_clave_recuperacion(email, token))
     if not usuario_id:
         return Response({"detail": "Token inválido o expirado"}, status=400)
     try:
@@ -138,7 +158,6 @@ def resetear_password(request):
         return Response({"detail": "Usuario no encontrado"}, status=404)
     usuario.set_password(password)
     usuario.save()
-    cache.delete(cache_key)
     return Response({"detail": "Contraseña restablecida correctamente."}, status=200)
 
 class RolViewSet(viewsets.ModelViewSet):
@@ -151,24 +170,20 @@ class UsuarioViewSet(viewsets.ModelViewSet):
     def editar_datos_admin(self, request, pk=None):
         """Permite al admin editar los datos de cualquier usuario."""
         usuario_actual = request.user
-        print("ADMIN EDIT REQUEST - USER:", usuario_actual.email, "ROLES:", list(usuario_actual.roles.values_list('nombre', flat=True)))
-        print("BODY RECIBIDO:", request.data)
-        if not usuario_actual.roles.filter(nombre="ADMIN").exists():
-            print("NO TIENE ROL ADMIN")
+        if not "ADMIN" in usuario_actual.nombres_roles:
             return Response({"detail": "No tienes permisos para editar usuarios."}, status=403)
         usuario = self.get_object()
         serializer = UsuarioSerializer(usuario, data=request.data, partial=(request.method=="PATCH"))
         if serializer.is_valid():
             serializer.save()
-            print("EDICIÓN EXITOSA DE USUARIO:", usuario.email)
+            logger.debug("Usuario %s editado por %s", usuario.email, usuario_actual.email)
             return Response(serializer.data)
-        print("ERRORES DE VALIDACIÓN:", serializer.errors)
         return Response(serializer.errors, status=400)
     @action(detail=False, methods=["get"], url_path="clientes", permission_classes=[permissions.IsAuthenticated])
     def listar_clientes(self, request):
         usuario_actual = request.user
         # Verifica si el usuario tiene el rol ADMIN
-        if not usuario_actual.roles.filter(nombre="ADMIN").exists():
+        if not "ADMIN" in usuario_actual.nombres_roles:
             return Response({"detail": "No tienes permisos para ver clientes."}, status=403)
         clientes = Usuario.objects.filter(roles__nombre="CLIENTE").distinct()
         serializer = UsuarioSerializer(clientes, many=True)
@@ -178,7 +193,7 @@ class UsuarioViewSet(viewsets.ModelViewSet):
     def inhabilitar(self, request, pk=None):
         """Permite al ADMIN inhabilitar (deshabilitar) cualquier usuario."""
         usuario_actual = request.user
-        if not usuario_actual.roles.filter(nombre="ADMIN").exists():
+        if not "ADMIN" in usuario_actual.nombres_roles:
             return Response({"detail": "No tienes permisos para inhabilitar usuarios."}, status=403)
         usuario = self.get_object()
         if usuario.estado == "INACTIVO":
@@ -190,8 +205,7 @@ class UsuarioViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=["post"], url_path="reactivar", permission_classes=[permissions.IsAuthenticated])
     def reactivar(self, request, pk=None):
         """Permite a un usuario con rol ADMIN reactivar una cuenta de usuario inactiva."""
-        usuario_admin = Usuario.objects.get(email=request.user.email)
-        if not usuario_admin.roles.filter(nombre="ADMIN").exists():
+        if "ADMIN" not in request.user.nombres_roles:
             return Response({"detail": "No tienes permisos para realizar esta acción."}, status=403)
         usuario = self.get_object()
         if usuario.estado != "INACTIVO":
@@ -202,17 +216,19 @@ class UsuarioViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=["get", "put", "patch"], url_path="me")
     def me(self, request):
         """Permite al usuario autenticado ver y actualizar sus propios datos."""
-        usuario = Usuario.objects.get(email=request.user.email)
         if request.method == "GET":
-            return Response(UsuarioSerializer(usuario).data)
+            # request.user viene del token; los campos que faltan se cargan juntos al serializar
+            return Response(UsuarioSerializer(request.user).data)
         elif request.method in ["PUT", "PATCH"]:
+            usuario = Usuario.objects.get(pk=request.user.pk)
             serializer = UsuarioSerializer(usuario, data=request.data, partial=(request.method=="PATCH"))
             if serializer.is_valid():
                 serializer.save()
                 return Response(serializer.data)
             return Response(serializer.errors, status=400)
-    queryset = Usuario.objects.all()
+    queryset = Usuario.objects.all().prefetch_related("roles")
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CursorPaginacionUsuarios
 
     from rest_framework.serializers import Serializer
     def get_serializer_class(self):  # type: ignore
@@ -229,7 +245,7 @@ class UsuarioViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=["post"], url_path="asignar-rol")
     def asignar_rol(self, request, pk=None):
         usuario_actual = request.user
-        if not usuario_actual.roles.filter(nombre="ADMIN").exists():
+        if not "ADMIN" in usuario_actual.nombres_roles:
             return Response({"detail": "No tienes permisos para asignar roles."}, status=403)
         usuario = self.get_object()
         nombre_rol = request.data.get("rol")
@@ -88,13 +88,50 @@ WSGI_APPLICATION = "backend.wsgi.application"
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "authz.authentication.JWTRolesAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticatedOrReadOnly",
     ),
 }
 
+# Segundos que se cachean los roles de un usuario cuando su token no los trae al día
+ROLES_CACHE_TTL = int(os.getenv("ROLES_CACHE_TTL", 3600))
+
+# Segundos entre relecturas de los usuarios con cambios de acceso recientes
+# (bajas, roles, contraseña); hasta entonces otro proceso puede aceptar sus tokens viejos
+JWT_REVOCACION_INTERVALO = int(os.getenv("JWT_REVOCACION_INTERVALO", 5))
+
+# Segundos que un proceso reutiliza la versión leída de reglas y precios sin
+# volver a consultarla; los cambios de otros procesos se ven a lo sumo con ese retraso
+VERSIONADO_TTL = float(os.getenv("VERSIONADO_TTL", 2))
+
+# Paginación por cursor de los listados grandes (ver core/paginacion.py)
+PAGINACION_TAMANO_PAGINA = int(os.getenv("PAGINACION_TAMANO_PAGINA", 20))
+PAGINACION_TAMANO_MAXIMO = int(os.getenv("PAGINACION_TAMANO_MAXIMO", 100))
+
+# Dashboard de soporte: segundos de vigencia de la foto y de servicio "stale"
+# mientras se recalcula en segundo plano (0 = recalcular en el request)
+SOPORTE_DASHBOARD_TTL = int(os.getenv("SOPORTE_DASHBOARD_TTL", 30))
+SOPORTE_DASHBOARD_STALE = int(os.getenv("SOPORTE_DASHBOARD_STALE", 0))
+
+# Eventos SSE de soporte: eventos guardados por canal para Last-Event-ID,
+# segundos entre latidos y eventos sin leer antes de pedir resync al cliente
+SOPORTE_SSE_HISTORIAL = int(os.getenv("SOPORTE_SSE_HISTORIAL", 200))
+SOPORTE_SSE_LATIDO = int(os.getenv("SOPORTE_SSE_LATIDO", 15))
+SOPORTE_SSE_COLA = int(os.getenv("SOPORTE_SSE_COLA", 100))
+# Segundos para canjear el ticket de un solo uso con el que se abre un flujo SSE
+SOPORTE_SSE_TICKET_TTL = int(os.getenv("SOPORTE_SSE_TICKET_TTL", 30))
+
+# Barrido de SLA: solicitudes vencidas escaladas por transacción
+SOPORTE_SLA_TAMANO_LOTE = int(os.getenv("SOPORTE_SLA_TAMANO_LOTE", 500))
+
+# Auto-cierre de resueltas y recordatorios al cliente: solicitudes por transacción
+SOPORTE_CIERRE_TAMANO_LOTE = int(os.getenv("SOPORTE_CIERRE_TAMANO_LOTE", 1000))
+
+# Avisos al cliente por respuestas de soporte: segundos que se agrupan en un correo
+SOPORTE_AVISO_VENTANA = int(os.getenv("SOPORTE_AVISO_VENTANA", 120))
+
 SPECTACULAR_SETTINGS = {
     "TITLE": "Turismo API",
     "VERSION": "1.0.0",
@@ -121,10 +158,62 @@ DATABASES = {
     'default': {
        'ENGINE': 'django.db.backends.sqlite3',
        'NAME': BASE_DIR / 'db.sqlite3',
-        
+       # SQLite no tiene bloqueo por fila: las transacciones toman el lock de
+       # escritura al empezar y esperan su turno (timeout) en lugar de fallar
+       # con "database is locked" al pasar de lectura a escritura
+       # (transaction_mode requiere Django >= 5.1)
+       'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20},
    }
 }
 
+# Tokens de recuperación de contraseña y límites de intentos, compartidos por
+# todos los workers (ver authz/almacen.py): "db" (tabla authz_registrotemporal)
+# o "cache" (la caché "compartida"; solo Redis o Memcached, que incrementan y
+# borran de forma atómica entre procesos)
+ALMACEN_TEMPORAL = os.getenv("ALMACEN_TEMPORAL", "db")
+ALMACEN_TEMPORAL_CACHE = "compartida"
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "compartida": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("ALMACEN_TEMPORAL_REDIS", "redis://127.0.0.1:6379/1"),
+    },
+}
+
+# Hashers de contraseñas. HASHER_PREFERIDO (pbkdf2_sha256, argon2, scrypt o
+# bcrypt_sha256) hashea las contraseñas nuevas; los demás solo verifican las
+# existentes, que se rehashean al iniciar sesión. El costo se ajusta por
+# despliegue (medir con manage.py medir_hashers); cambiarlo también rehashea
+# en el siguiente login. sha256_legado verifica cuentas del sistema anterior.
+HASHER_PREFERIDO = os.getenv("HASHER_PREFERIDO", "pbkdf2_sha256")
+PBKDF2_ITERACIONES = int(os.getenv("PBKDF2_ITERACIONES", 1_000_000))
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", 2))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", 102400))  # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", 8))
+SCRYPT_WORK_FACTOR = int(os.getenv("SCRYPT_WORK_FACTOR", 2**14))
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+
+_HASHERS_CONFIGURABLES = {
+    "pbkdf2_sha256": "authz.hashers.PBKDF2Hasher",
+    "argon2": "authz.hashers.Argon2Hasher",
+    "scrypt": "authz.hashers.ScryptHasher",
+    "bcrypt_sha256": "authz.hashers.BCryptSHA256Hasher",
+}
+PASSWORD_HASHERS = [
+    _HASHERS_CONFIGURABLES[HASHER_PREFERIDO],
+    *(ruta for nombre, ruta in _HASHERS_CONFIGURABLES.items() if nombre != HASHER_PREFERIDO),
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "authz.hashers.SHA256LegadoHasher",
+]
+
+# Intentos permitidos por ventana (segundos): login por email, pedidos de
+# recuperación por email y canjes de código por email
+LOGIN_MAX_INTENTOS = int(os.getenv("LOGIN_MAX_INTENTOS", 5))
+LOGIN_VENTANA = int(os.getenv("LOGIN_VENTANA", 900))
+RECUPERACION_MAX_SOLICITUDES = int(os.getenv("RECUPERACION_MAX_SOLICITUDES", 3))
+RECUPERACION_MAX_INTENTOS = int(os.getenv("RECUPERACION_MAX_INTENTOS", 10))
+RECUPERACION_VENTANA = int(os.getenv("RECUPERACION_VENTANA", 3600))
+RECUPERACION_TOKEN_TTL = int(os.getenv("RECUPERACION_TOKEN_TTL", 3600))
 
 
 STATIC_URL = "/static/"
@@ -1,5 +1,8 @@
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from core.models import Categoria, Servicio, Itinerario, Paquete
+from core.api.reservas.disponibilidad import DisponibilidadQuerySerializer, calendario
 from .serializers import CategoriaSerializer, ServicioSerializer, ItinerarioSerializer, PaqueteSerializer
 
 class CategoriaViewSet(viewsets.ModelViewSet):
@@ -17,3 +20,16 @@ class ItinerarioViewSet(viewsets.ModelViewSet):
 class PaqueteViewSet(viewsets.ModelViewSet):
     queryset = Paquete.objects.all()  # Si estás usando prefetch_related, asegúrate de que no esté sobrecargado
     serializer_class = PaqueteSerializer
+
+    @action(detail=True, methods=['get'])
+    def disponibilidad(self, request, pk=None):
+        """
+        Cupos restantes por día del paquete.
+
+        GET /api/paquetes/{id}/disponibilidad/?desde=2025-10-01&hasta=2025-10-31
+        Sin parámetros devuelve los próximos 30 días.
+        """
+        paquete = self.get_object()
+        query = DisponibilidadQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        return Response(calendario(paquete, **query.validated_data))
@@ -17,11 +17,8 @@ class IsOperadorOrReadOnly(BasePermission):
         if getattr(user, "is_superuser", False):
             return True
 
-        # Tu modelo: user.roles (M2M) con campo 'nombre'
-        try:
-            roles = set(r.upper() for r in user.roles.values_list("nombre", flat=True))
-        except Exception:
-            roles = set()
+        # Roles del token (authz.authentication.JWTRolesAuthentication)
+        roles = {r.upper() for r in getattr(user, "nombres_roles", ())}
 
         # Solo estos pueden escribir (POST/PUT/PATCH/DELETE)
         return bool(roles & {"OPERADOR", "ADMIN"})
@@ -0,0 +1,185 @@
+"""
+Resolución de acompañantes de una o varias reservas con un número fijo de consultas.
+
+El payload de ``acompanantes`` acepta, por cada elemento:
+``{"acompanante": {..datos..} | <id>, "estado": "CONFIRMADO", "es_titular": true}``
+o directamente el dict de datos del acompañante.
+
+En lugar de buscar/crear persona por persona, se recogen todos los ids y
+documentos del payload, se leen en una consulta cada uno, se crean los que
+faltan con ``bulk_create`` y las asociaciones ``ReservaAcompanante`` también se
+insertan en bloque. ``Acompanante.documento`` es único (salvo vacío), así que
+dos peticiones concurrentes con el mismo documento terminan en la misma fila.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Hashable, List, Optional
+
+from core.models import Acompanante, ReservaAcompanante
+
+CAMPOS_NUEVO = ('nombre', 'apellido', 'fecha_nacimiento')
+
+
+class Entrada:
+    """Un elemento del payload ya normalizado."""
+    __slots__ = ('datos', 'estado', 'es_titular', 'acompanante')
+
+    def __init__(self, datos, estado, es_titular):
+        self.datos = datos
+        self.estado = estado
+        self.es_titular = es_titular
+        self.acompanante: Optional[Acompanante] = datos if isinstance(datos, Acompanante) else None
+
+
+def normalizar(payload) -> Entrada:
+    if isinstance(payload, dict):
+        datos = payload['acompanante'] if 'acompanante' in payload else payload
+        return Entrada(datos, payload.get('estado'), bool(payload.get('es_titular', False)))
+    return Entrada(payload, None, False)
+
+
+def _parsear_fecha(datos: Dict[str, Any]) -> Optional[str]:
+    fecha_nacimiento = datos.get('fecha_nacimiento')
+    if isinstance(fecha_nacimiento, str) and fecha_nacimiento:
+        try:
+            datos['fecha_nacimiento'] = datetime.strptime(fecha_nacimiento, "%Y-%m-%d").date()
+        except ValueError:
+            return f"Formato de fecha inválido para '{fecha_nacimiento}'. Usa YYYY-MM-DD."
+    return None
+
+
+class ResolucionAcompanantes:
+    """
+    Resuelve los acompañantes de varios grupos (uno por reserva).
+
+    Uso::
+
+        resolucion = ResolucionAcompanantes({clave: payload_list, ...})
+        resolucion.errores            # {clave: mensaje} de los grupos inválidos
+        resolucion.guardar([clave])   # crea faltantes y devuelve las entradas por clave
+    """
+
+    def __init__(self, grupos: Dict[Hashable, List[Any]], requiere_documento: bool = True):
+        self.requiere_documento = requiere_documento
+        self.errores: Dict[Hashable, str] = {}
+        self.grupos: Dict[Hashable, List[Entrada]] = {}
+
+        for clave, payload in grupos.items():
+            entradas = [normalizar(rv) for rv in payload or []]
+            error = self._validar_formato(entradas)
+            if error:
+                self.errores[clave] = error
+            else:
+                self.grupos[clave] = entradas
+
+        self._leer_existentes()
+        for clave in list(self.grupos):
+            error = self._validar_contra_existentes(self.grupos[clave])
+            if error:
+                self.errores[clave] = error
+                del self.grupos[clave]
+
+    def _validar_formato(self, entradas: List[Entrada]) -> Optional[str]:
+        for entrada in entradas:
+            datos = entrada.datos
+            if isinstance(datos, dict):
+                if self.requiere_documento and not datos.get('documento'):
+                    return "Faltan campos obligatorios para crear acompañante: documento"
+                error = _parsear_fecha(datos)
+                if error:
+                    return error
+            elif not isinstance(datos, (int, Acompanante)):
+                return "Formato de acompañante no reconocido."
+        if sum(1 for e in entradas if e.es_titular) > 1:
+            return "Solo puede haber un titular por reserva."
+        return None
+
+    def _leer_existentes(self):
+        ids, documentos = set(), set()
+        for entradas in self.grupos.values():
+            for entrada in entradas:
+                if isinstance(entrada.datos, int):
+                    ids.add(entrada.datos)
+                elif isinstance(entrada.datos, dict) and entrada.datos.get('documento'):
+                    documentos.add(entrada.datos['documento'])
+        self.por_id = Acompanante.objects.in_bulk(ids) if ids else {}
+        self.por_documento = {
+            a.documento: a for a in Acompanante.objects.filter(documento__in=documentos)
+        } if documentos else {}
+
+    def _validar_contra_existentes(self, entradas: List[Entrada]) -> Optional[str]:
+        for entrada in entradas:
+            datos = entrada.datos
+            if isinstance(datos, int):
+                if datos not in self.por_id:
+                    return f"Acompañante con id {datos} no encontrado."
+                entrada.acompanante = self.por_id[datos]
+            elif isinstance(datos, dict):
+                documento = datos.get('documento')
+                if documento and documento in self.por_documento:
+                    entrada.acompanante = self.por_documento[documento]
+                    continue
+                missing = [campo for campo in CAMPOS_NUEVO if not datos.get(campo)]
+                if missing:
+                    if documento:
+                        return f"Faltan campos para crear acompañante con documento '{documento}': {', '.join(missing)}"
+                    return f"Faltan campos para crear acompañante: {', '.join(missing)}"
+        return None
+
+    @staticmethod
+    def _nuevo(datos: Dict[str, Any]) -> Acompanante:
+        return Acompanante(
+            documento=datos.get('documento') or '',
+            nombres=datos['nombre'],
+            apellidos=datos['apellido'],
+            fecha_nacimiento=datos['fecha_nacimiento'],
+            nacionalidad=datos.get('nacionalidad'),
+            email=datos.get('email'),
+            telefono=datos.get('telefono'),
+        )
+
+    def guardar(self, claves: Optional[List[Hashable]] = None) -> Dict[Hashable, List[Entrada]]:
+        """Crea los acompañantes que faltan para ``claves`` (por defecto todas) en bloque."""
+        claves = list(self.grupos) if claves is None else [c for c in claves if c in self.grupos]
+        pendientes = [e for c in claves for e in self.grupos[c] if e.acompanante is None]
+
+        con_documento: Dict[str, Dict[str, Any]] = {}
+        sin_documento: List[Entrada] = []
+        for entrada in pendientes:
+            documento = entrada.datos.get('documento')
+            if documento:
+                con_documento.setdefault(documento, entrada.datos)
+            else:
+                sin_documento.append(entrada)
+
+        if con_documento:
+            # ignore_conflicts: si otra transacción insertó el mismo documento, se reutiliza su fila
+            Acompanante.objects.bulk_create(
+                [self._nuevo(datos) for datos in con_documento.values()], ignore_conflicts=True
+            )
+            for acompanante in Acompanante.objects.filter(documento__in=list(con_documento)):
+                self.por_documento[acompanante.documento] = acompanante
+        if sin_documento:
+            creados = Acompanante.objects.bulk_create([self._nuevo(e.datos) for e in sin_documento])
+            for entrada, acompanante in zip(sin_documento, creados):
+                entrada.acompanante = acompanante
+
+        for entrada in pendientes:
+            if entrada.acompanante is None:
+                entrada.acompanante = self.por_documento[entrada.datos['documento']]
+        return {c: self.grupos[c] for c in claves}
+
+
+def asociaciones(reserva, entradas: List[Entrada], estado_defecto: str = 'CONFIRMADO') -> List[ReservaAcompanante]:
+    """Filas ``ReservaAcompanante`` para una reserva (un acompañante repetido se asocia una vez)."""
+    filas, vistos = [], set()
+    for entrada in entradas:
+        acompanante = entrada.acompanante
+        if acompanante is None or acompanante.pk in vistos:
+            continue
+        vistos.add(acompanante.pk)
+        filas.append(ReservaAcompanante(
+            reserva=reserva, acompanante=acompanante,
+            estado=entrada.estado or estado_defecto, es_titular=entrada.es_titular,
+        ))
+    return filas
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from core.models import Reserva, ReservaServicio, Acompanante, ReservaAcompanante, HistorialReprogramacion
+from core.models import Reserva, ReservaServicio, Acompanante, ReservaAcompanante, HistorialReprogramacion, OutboxEvento
 
 
 class ReservaServicioInline(admin.TabularInline):
@@ -229,3 +229,25 @@ class ConfiguracionGlobalAdmin(admin.ModelAdmin):
         self.message_user(request, f"{count} configuraciones desactivadas.")
     
     desactivar_configs.short_description = "Desactivar configuraciones"  # type: ignore
+
+
+# ============================================================================
+# ADMIN PARA LEDGER DE CUPOS
+# ============================================================================
+
+from core.models import CupoDiario
+
+@admin.register(CupoDiario)
+class CupoDiarioAdmin(admin.ModelAdmin):
+    list_display = ['fecha', 'paquete', 'servicio', 'reservados', 'capacidad', 'updated_at']
+    list_filter = ['fecha']
+    search_fields = ['paquete__nombre', 'servicio__titulo']
+    readonly_fields = ['reservados', 'updated_at']
+    ordering = ['-fecha']
+
+
+@admin.register(OutboxEvento)
+class OutboxEventoAdmin(admin.ModelAdmin):
+    list_display = ['id', 'tipo', 'estado', 'intentos', 'proximo_intento', 'created_at', 'procesado_at']
+    list_filter = ['estado', 'tipo']
+    readonly_fields = ['created_at', 'procesado_at', 'ultimo_error']
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class BookingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core.api.reservas'
+
+    def ready(self):
+        """Importar signals cuando la app esté lista."""
+        import core.api.reservas.signals
@@ -0,0 +1,230 @@
+"""
+Creación masiva de reservas (POST /api/reservas/bulk/).
+
+Valida todas las reservas del lote juntas y las guarda en una sola transacción:
+usuarios, servicios, paquetes, cupones y acompañantes se resuelven con una
+consulta por tipo (``in_bulk``) y las filas de ``Reserva``, ``ReservaServicio``
+y ``ReservaAcompanante`` se insertan con ``bulk_create``.
+
+Con ``atomico=True`` cualquier error cancela todo el lote; con ``atomico=False``
+se guardan las reservas válidas y se informan los errores por índice.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+
+from authz.models import Usuario
+from core.models import (
+    Cupon, Reserva, ReservaAcompanante, ReservaServicio, Servicio
+)
+from . import capacidad, precios
+from .acompanantes import ResolucionAcompanantes, asociaciones
+
+MAX_ITEMS = getattr(settings, 'RESERVAS_BULK_MAX_ITEMS', 500)
+
+
+class LineaLoteSerializer(serializers.Serializer):
+    servicio = serializers.IntegerField()
+    cantidad = serializers.IntegerField(min_value=1, default=1)
+
+
+class ReservaLoteItemSerializer(serializers.Serializer):
+    """Una reserva del lote. Solo valida formato: no toca la base de datos."""
+    usuario = serializers.IntegerField(required=False)
+    fecha_inicio = serializers.DateTimeField()
+    fecha_fin = serializers.DateTimeField(required=False)
+    estado = serializers.ChoiceField(choices=Reserva.ESTADOS, default='PENDIENTE')
+    cupon = serializers.IntegerField(required=False, allow_null=True)
+    moneda = serializers.CharField(max_length=10, default='BOB')
+    total = serializers.DecimalField(max_digits=12, decimal_places=2, required=False)
+    detalles = LineaLoteSerializer(many=True, allow_empty=False)
+    acompanantes = serializers.ListField(child=serializers.JSONField(), required=False, default=list)
+
+    def validate(self, attrs):
+        fecha_fin = attrs.get('fecha_fin')
+        if fecha_fin and fecha_fin < attrs['fecha_inicio']:
+            raise serializers.ValidationError({'fecha_fin': 'La fecha de fin debe ser posterior a la de inicio.'})
+        return attrs
+
+
+class ReservaLoteSerializer(serializers.Serializer):
+    reservas = serializers.ListField(child=serializers.JSONField(), allow_empty=False, max_length=MAX_ITEMS)
+    atomico = serializers.BooleanField(default=True)
+
+
+class _LoteAbortado(Exception):
+    """Interrumpe la transacción del lote en modo atómico."""
+
+
+class CargaMasivaReservas:
+    """Valida y persiste un lote de reservas."""
+
+    def __init__(self, solicitante, roles: List[str], atomico: bool = True):
+        self.solicitante = solicitante
+        # Igual que perform_create: un CLIENTE siempre reserva a su nombre
+        self.puede_asignar_usuario = 'CLIENTE' not in roles
+        self.atomico = atomico
+        self.errores: Dict[int, Any] = {}
+        self.items: Dict[int, Dict[str, Any]] = {}
+
+    # ------------------------------------------------------------------
+    # Validación
+    # ------------------------------------------------------------------
+
+    def _validar_formato(self, payloads: List[Any]):
+        for indice, payload in enumerate(payloads):
+            item = ReservaLoteItemSerializer(data=payload)
+            if item.is_valid():
+                self.items[indice] = dict(item.validated_data)  # type: ignore
+            else:
+                self.errores[indice] = item.errors
+
+    def _resolver_referencias(self):
+        servicio_ids = {l['servicio'] for it in self.items.values() for l in it['detalles']}
+        usuario_ids = {it['usuario'] for it in self.items.values() if it.get('usuario')}
+        cupon_ids = {it['cupon'] for it in self.items.values() if it.get('cupon')}
+
+        self.servicios = Servicio.objects.in_bulk(servicio_ids)
+        self.usuarios = Usuario.objects.in_bulk(usuario_ids) if self.puede_asignar_usuario else {}
+        self.cupones = Cupon.objects.in_bulk(cupon_ids)
+        self.catalogo = precios.catalogo()
+        self.paquetes_por_servicio = self.catalogo.paquetes_por_servicio(servicio_ids)
+
+        for indice, item in list(self.items.items()):
+            errores = {}
+            faltantes = [l['servicio'] for l in item['detalles'] if l['servicio'] not in self.servicios]
+            if faltantes:
+                errores['detalles'] = f"Servicios no encontrados: {', '.join(map(str, faltantes))}"
+            if item.get('usuario') and self.puede_asignar_usuario and item['usuario'] not in self.usuarios:
+                errores['usuario'] = f"Usuario con id {item['usuario']} no encontrado."
+            if item.get('cupon') and item['cupon'] not in self.cupones:
+                errores['cupon'] = f"Cupón con id {item['cupon']} no encontrado."
+            if errores:
+                self._descartar(indice, errores)
+
+    def _validar_acompanantes(self):
+        self.acompanantes = ResolucionAcompanantes(
+            {indice: item['acompanantes'] for indice, item in self.items.items()}
+        )
+        for indice, error in self.acompanantes.errores.items():
+            self._descartar(indice, {'acompanantes': error})
+
+    def _descartar(self, indice: int, errores):
+        self.items.pop(indice, None)
+        self.errores[indice] = errores
+
+    # ------------------------------------------------------------------
+    # Persistencia
+    # ------------------------------------------------------------------
+
+    def _preparar_reserva(self, item) -> Reserva:
+        lineas = []
+        suma = Decimal('0')
+        for linea in item['detalles']:
+            servicio = self.servicios[linea['servicio']]
+            cantidad = linea['cantidad']
+            precio = self.catalogo.precio_linea(servicio, cantidad, item.get('total', Decimal('0')))
+            suma += Decimal(str(precio.precio_unitario)) * cantidad
+            lineas.append((servicio, cantidad, precio))
+        item['lineas'] = lineas
+
+        usuario = self.solicitante
+        if self.puede_asignar_usuario and item.get('usuario'):
+            usuario = self.usuarios[item['usuario']]
+        return Reserva(
+            usuario=usuario,
+            fecha_inicio=item['fecha_inicio'],
+            fecha_fin=item.get('fecha_fin') or item['fecha_inicio'],
+            estado=item['estado'],
+            cupon=self.cupones.get(item['cupon']) if item.get('cupon') else None,
+            moneda=item['moneda'],
+            total=suma,
+        )
+
+    def _ocupar_cupos(self, indice: int, item) -> bool:
+        if item['estado'] not in capacidad.ESTADOS_CON_CUPO:
+            return True
+        lineas = defaultdict(int)
+        for servicio, cantidad, _ in item['lineas']:
+            lineas[servicio.pk] += cantidad
+        try:
+            capacidad.reservar_cupos(item['fecha_inicio'], dict(lineas), self.paquetes_por_servicio)
+        except capacidad.CupoInsuficiente as exc:
+            self._descartar(indice, exc.detail)
+            if self.atomico:
+                raise _LoteAbortado()
+            return False
+        return True
+
+    def _persistir(self):
+        reservas = {}
+        for indice in sorted(self.items):
+            item = self.items[indice]
+            reserva = self._preparar_reserva(item)
+            if self._ocupar_cupos(indice, item):
+                reservas[indice] = reserva
+        if not reservas:
+            return {}
+
+        Reserva.objects.bulk_create(list(reservas.values()))
+
+        ReservaServicio.objects.bulk_create([
+            ReservaServicio(reserva=reserva, servicio=servicio, cantidad=cantidad, precio_unitario=precio.precio_unitario)
+            for indice, reserva in reservas.items()
+            for servicio, cantidad, precio in self.items[indice]['lineas']
+        ])
+
+        entradas = self.acompanantes.guardar(list(reservas))
+        ReservaAcompanante.objects.bulk_create([
+            fila for indice, reserva in reservas.items() for fila in asociaciones(reserva, entradas[indice])
+        ])
+        return reservas
+
+    def ejecutar(self, payloads: List[Any]) -> Dict[str, Any]:
+        self._validar_formato(payloads)
+        if self.items:
+            self._resolver_referencias()
+        if self.items:
+            self._validar_acompanantes()
+
+        creadas: Dict[int, Reserva] = {}
+        if self.items and not (self.atomico and self.errores):
+            try:
+                with transaction.atomic():
+                    creadas = self._persistir()
+            except _LoteAbortado:
+                creadas = {}
+
+        resultados = []
+        for indice in range(len(payloads)):
+            if indice in creadas:
+                reserva = creadas[indice]
+                resultados.append({
+                    'indice': indice,
+                    'ok': True,
+                    'id': reserva.pk,
+                    'total': reserva.total,
+                    # Regla de precio aplicada a cada línea, para auditoría
+                    'lineas': [
+                        {'servicio': servicio.pk, 'precio_unitario': precio.precio_unitario,
+                         'regla': precio.regla, 'paquete': precio.paquete_id}
+                        for servicio, _, precio in self.items[indice]['lineas']
+                    ],
+                })
+            else:
+                resultados.append({
+                    'indice': indice,
+                    'ok': False,
+                    'errores': self.errores.get(indice, 'No procesada: el lote es atómico y otra reserva falló.'),
+                })
+        return {
+            'atomico': self.atomico,
+            'creadas': len(creadas),
+            'fallidas': len(payloads) - len(creadas),
+            'resultados': resultados,
+        }
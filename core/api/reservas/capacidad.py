@@ -0,0 +1,290 @@
+"""
+Ledger de cupos diarios para paquetes y servicios.
+
+Cada fila de ``CupoDiario`` guarda cuántas personas están reservadas para un
+paquete (o un servicio suelto) en un día, junto con la capacidad del paquete
+(``Paquete.max_personas``). Crear, cancelar y reprogramar una reserva actualiza
+el ledger dentro de la misma transacción, bloqueando las filas afectadas, así
+que consultar disponibilidad es una búsqueda indexada por (paquete, fecha) en
+lugar de sumar ``ReservaServicio`` en Python.
+"""
+
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from core.models import CupoDiario, Paquete, ReservaServicio
+
+# Estados en los que una reserva ocupa cupo. Solo la cancelación libera: una
+# reserva COMPLETADA usó su lugar ese día, y marcarla antes de que termine el
+# día no debe abrir cupo para otra
+ESTADOS_CON_CUPO = ('PENDIENTE', 'CONFIRMADA', 'PAGADA', 'REPROGRAMADA', 'COMPLETADA')
+
+# ('paquete', id) o ('servicio', id)
+Clave = Tuple[str, int]
+
+
+class CupoInsuficiente(ValidationError):
+    """No hay cupo suficiente en la fecha solicitada."""
+    default_code = 'cupo_insuficiente'
+
+
+def a_fecha(valor) -> date:
+    """Normaliza un datetime al día local (mismo criterio que ``fecha_inicio__date``)."""
+    if isinstance(valor, datetime):
+        return timezone.localdate(valor) if timezone.is_aware(valor) else valor.date()
+    return valor
+
+
+def ocupa_cupo(reserva) -> bool:
+    return reserva.estado in ESTADOS_CON_CUPO
+
+
+def lineas_de_reserva(reserva) -> Dict[int, int]:
+    """Cantidad de personas por servicio de una reserva ya guardada."""
+    lineas: Dict[int, int] = defaultdict(int)
+    for servicio_id, cantidad in reserva.servicios.values_list('servicio_id', 'cantidad'):
+        lineas[servicio_id] += cantidad
+    return dict(lineas)
+
+
+def paquetes_por_servicio(servicio_ids: Iterable[int]) -> Dict[int, List[int]]:
+    """Mapa servicio_id -> [paquete_id] en una sola consulta a la tabla M2M."""
+    mapa: Dict[int, List[int]] = defaultdict(list)
+    relaciones = Paquete.servicios.through.objects.filter(
+        servicio_id__in=list(servicio_ids)
+    ).values_list('servicio_id', 'paquete_id')
+    for servicio_id, paquete_id in relaciones:
+        mapa[servicio_id].append(paquete_id)
+    return dict(mapa)
+
+
+def calcular_ocupacion(lineas: Dict[int, int], paquetes: Optional[Dict[int, List[int]]] = None) -> Dict[Clave, int]:
+    """
+    Traduce {servicio_id: cantidad} a la ocupación que genera en el ledger.
+
+    Cada servicio suma su cantidad. Un paquete cuenta a las personas una sola
+    vez aunque la reserva incluya varios de sus servicios (se toma el máximo).
+    """
+    if not lineas:
+        return {}
+    if paquetes is None:
+        paquetes = paquetes_por_servicio(lineas.keys())
+
+    ocupacion: Dict[Clave, int] = {}
+    for servicio_id, cantidad in lineas.items():
+        ocupacion[('servicio', servicio_id)] = cantidad
+        for paquete_id in paquetes.get(servicio_id, []):
+            clave = ('paquete', paquete_id)
+            ocupacion[clave] = max(ocupacion.get(clave, 0), cantidad)
+    return ocupacion
+
+
+def _filtro_claves(claves: Iterable[Clave]) -> Q:
+    paquete_ids = sorted(i for tipo, i in claves if tipo == 'paquete')
+    servicio_ids = sorted(i for tipo, i in claves if tipo == 'servicio')
+    return Q(paquete_id__in=paquete_ids) | Q(servicio_id__in=servicio_ids)
+
+
+def _bloquear_cupos(dia: date, claves: List[Clave]) -> Dict[Clave, CupoDiario]:
+    """Obtiene (creando si falta) y bloquea las filas del ledger para un día."""
+    def leer():
+        filas = CupoDiario.objects.select_for_update().filter(_filtro_claves(claves), fecha=dia).order_by('id')
+        return {cupo.clave: cupo for cupo in filas}
+
+    cupos = leer()
+    faltantes = [clave for clave in claves if clave not in cupos]
+    if faltantes:
+        capacidades = dict(Paquete.objects.filter(
+            id__in=[i for tipo, i in faltantes if tipo == 'paquete']
+        ).values_list('id', 'max_personas'))
+        CupoDiario.objects.bulk_create([
+            CupoDiario(
+                fecha=dia,
+                paquete_id=i if tipo == 'paquete' else None,
+                servicio_id=i if tipo == 'servicio' else None,
+                capacidad=capacidades.get(i) if tipo == 'paquete' else None,
+            )
+            for tipo, i in faltantes
+        ], ignore_conflicts=True)
+        cupos = leer()
+    return cupos
+
+
+def _error_cupo(cupo: CupoDiario, cantidad: int) -> CupoInsuficiente:
+    if cupo.paquete_id is not None:  # type: ignore
+        nombre = Paquete.objects.filter(pk=cupo.paquete_id).values_list('nombre', flat=True).first()  # type: ignore
+        mensaje = (f"No hay cupo suficiente en el paquete '{nombre}' para el {cupo.fecha:%d/%m/%Y}. "
+                   f"Cupo máximo: {cupo.capacidad}, reservados: {cupo.reservados}, solicitados: {cantidad}")
+    else:
+        mensaje = f"No hay cupo suficiente para el {cupo.fecha:%d/%m/%Y}."
+    return CupoInsuficiente({'detalles': mensaje})
+
+
+def _invalidar_calendario(dia: date, ocupacion: Dict[Clave, int]):
+    from . import disponibilidad  # disponibilidad importa este módulo
+    disponibilidad.invalidar_dias([i for tipo, i in ocupacion if tipo == 'paquete'], [dia])
+
+
+def _sumar(dia: date, ocupacion: Dict[Clave, int]):
+    cupos = _bloquear_cupos(dia, sorted(ocupacion))
+    for clave in sorted(ocupacion):
+        cantidad = ocupacion[clave]
+        cupo = cupos[clave]
+        # UPDATE condicionado: sigue siendo atómico aunque el motor ignore select_for_update (SQLite)
+        actualizadas = CupoDiario.objects.filter(pk=cupo.pk).filter(
+            Q(capacidad__isnull=True) | Q(reservados__lte=F('capacidad') - cantidad)
+        ).update(reservados=F('reservados') + cantidad, updated_at=timezone.now())
+        if not actualizadas:
+            cupo.refresh_from_db()
+            raise _error_cupo(cupo, cantidad)
+    _invalidar_calendario(dia, ocupacion)
+
+
+def _restar(dia: date, ocupacion: Dict[Clave, int]):
+    cupos = _bloquear_cupos(dia, sorted(ocupacion))
+    for clave in sorted(ocupacion):
+        cupo = cupos[clave]
+        cupo.reservados = max(cupo.reservados - ocupacion[clave], 0)
+        cupo.save(update_fields=['reservados', 'updated_at'])
+    _invalidar_calendario(dia, ocupacion)
+
+
+def reservar_cupos(fecha, lineas: Dict[int, int], paquetes: Optional[Dict[int, List[int]]] = None):
+    """Ocupa cupo para las líneas dadas. Lanza ``CupoInsuficiente`` si algún paquete se llenaría."""
+    ocupacion = calcular_ocupacion(lineas, paquetes)
+    if ocupacion:
+        with transaction.atomic():
+            _sumar(a_fecha(fecha), ocupacion)
+
+
+def liberar_cupos(fecha, lineas: Dict[int, int]):
+    """Devuelve al ledger el cupo ocupado por las líneas dadas."""
+    ocupacion = calcular_ocupacion(lineas)
+    if ocupacion:
+        with transaction.atomic():
+            _restar(a_fecha(fecha), ocupacion)
+
+
+def mover_cupos(fecha_anterior, fecha_nueva, lineas: Dict[int, int]):
+    """Traslada la ocupación de un día a otro de forma atómica (reprogramación)."""
+    anterior, nueva = a_fecha(fecha_anterior), a_fecha(fecha_nueva)
+    ocupacion = calcular_ocupacion(lineas)
+    if not ocupacion or anterior == nueva:
+        return
+    with transaction.atomic():
+        _restar(anterior, ocupacion)
+        _sumar(nueva, ocupacion)
+
+
+def actualizar_cupos(fecha_anterior, lineas_anteriores: Dict[int, int], fecha_nueva, lineas_nuevas: Dict[int, int]):
+    """
+    Reemplaza la ocupación de una reserva editada (fecha, estado o cantidades).
+
+    ``None`` como fecha indica que esa versión de la reserva no ocupa cupo
+    (por ejemplo, CANCELADA). Si la nueva ocupación no cabe se lanza
+    ``CupoInsuficiente`` y la anterior queda intacta.
+    """
+    anterior = calcular_ocupacion(lineas_anteriores) if fecha_anterior is not None else {}
+    nueva = calcular_ocupacion(lineas_nuevas) if fecha_nueva is not None else {}
+    dia_anterior = a_fecha(fecha_anterior) if anterior else None
+    dia_nuevo = a_fecha(fecha_nueva) if nueva else None
+    if dia_anterior == dia_nuevo and anterior == nueva:
+        return
+    with transaction.atomic():
+        if anterior:
+            _restar(dia_anterior, anterior)  # type: ignore[arg-type]
+        if nueva:
+            _sumar(dia_nuevo, nueva)  # type: ignore[arg-type]
+
+
+def reconstruir(desde: date, guardar: bool = True) -> List[CupoDiario]:
+    """
+    Recalcula el ledger desde ``desde`` a partir de las reservas que ocupan cupo
+    y, con ``guardar``, reemplaza sus filas. Devuelve las filas calculadas.
+    (La migración 0014 lleva una copia propia de esta lógica.)
+    """
+
+    # Una sola pasada por las líneas de reservas que ocupan cupo
+    lineas_por_reserva: Dict[int, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+    dia_por_reserva = {}
+    filas = ReservaServicio.objects.filter(
+        reserva__estado__in=ESTADOS_CON_CUPO,
+        reserva__fecha_inicio__date__gte=desde,
+    ).values_list('reserva_id', 'reserva__fecha_inicio', 'servicio_id', 'cantidad').order_by('reserva_id')
+    for reserva_id, fecha_inicio, servicio_id, cantidad in filas.iterator():
+        dia_por_reserva[reserva_id] = a_fecha(fecha_inicio)
+        lineas_por_reserva[reserva_id][servicio_id] += cantidad
+
+    servicio_ids = {sid for lineas in lineas_por_reserva.values() for sid in lineas}
+    paquetes: Dict[int, List[int]] = defaultdict(list)
+    relaciones = Paquete.servicios.through.objects.filter(
+        servicio_id__in=servicio_ids
+    ).values_list('servicio_id', 'paquete_id')
+    for servicio_id, paquete_id in relaciones:
+        paquetes[servicio_id].append(paquete_id)
+
+    totales: Dict[Tuple[date, Clave], int] = defaultdict(int)
+    for reserva_id, lineas in lineas_por_reserva.items():
+        dia = dia_por_reserva[reserva_id]
+        for clave, cantidad in calcular_ocupacion(dict(lineas), paquetes).items():
+            totales[(dia, clave)] += cantidad
+
+    capacidades = dict(Paquete.objects.values_list('id', 'max_personas'))
+    cupos = [
+        CupoDiario(
+            fecha=dia,
+            paquete_id=id_ if tipo == 'paquete' else None,
+            servicio_id=id_ if tipo == 'servicio' else None,
+            capacidad=capacidades.get(id_) if tipo == 'paquete' else None,
+            reservados=cantidad,
+        )
+        for (dia, (tipo, id_)), cantidad in totales.items()
+    ]
+    if guardar:
+        with transaction.atomic():
+            CupoDiario.objects.filter(fecha__gte=desde).delete()
+            CupoDiario.objects.bulk_create(cupos, batch_size=1000)
+    return cupos
+
+
+def cupos_restantes(fecha, claves: Iterable[Clave]) -> Dict[Clave, Optional[int]]:
+    """Cupo restante por clave para un día (``None`` = sin límite)."""
+    claves = list(claves)
+    dia = a_fecha(fecha)
+    restantes: Dict[Clave, Optional[int]] = {}
+    for cupo in CupoDiario.objects.filter(_filtro_claves(claves), fecha=dia):
+        restantes[cupo.clave] = cupo.restantes
+    faltantes = [i for tipo, i in claves if tipo == 'paquete' and ('paquete', i) not in restantes]
+    if faltantes:
+        for paquete_id, max_personas in Paquete.objects.filter(id__in=faltantes).values_list('id', 'max_personas'):
+            restantes[('paquete', paquete_id)] = max_personas
+    for clave in claves:
+        restantes.setdefault(clave, None)
+    return restantes
+
+
+def hay_cupo(fecha, lineas: Dict[int, int], reserva_actual=None) -> bool:
+    """
+    Indica si las líneas caben en la fecha indicada.
+
+    Si ``reserva_actual`` ya ocupa cupo ese mismo día, su propia ocupación no
+    cuenta en contra.
+    """
+    ocupacion = calcular_ocupacion(lineas)
+    if not ocupacion:
+        return True
+    restantes = cupos_restantes(fecha, ocupacion.keys())
+    propia = {}
+    if reserva_actual is not None and ocupa_cupo(reserva_actual) and a_fecha(reserva_actual.fecha_inicio) == a_fecha(fecha):
+        propia = ocupacion
+    for clave, cantidad in ocupacion.items():
+        disponible = restantes.get(clave)
+        if disponible is not None and cantidad > disponible + propia.get(clave, 0):
+            return False
+    return True
@@ -0,0 +1,178 @@
+"""
+Calendario de cupos restantes por paquete (GET /api/paquetes/{id}/disponibilidad/).
+
+La ocupación de un rango de fechas se obtiene con una sola consulta agrupada
+sobre ``ReservaServicio`` por reserva, día y estado (una reserva cuenta a sus
+personas una vez por paquete, igual que el ledger de ``capacidad.py``) y se
+combina con ``Paquete.fechas_disponibles`` y ``max_personas``.
+
+El resultado se guarda en la caché local por (paquete, mes), bajo una clave que
+incluye dos versiones guardadas en la base de datos (ver ``versionado.py``):
+la del paquete y la del mes. Cuando el ledger suma o resta cupo de un paquete
+en un día, o se guarda una reserva que lo incluye, cambia solo la versión del
+mes afectado; un cambio del propio paquete cambia la suya e invalida todos sus
+meses. Como las versiones son compartidas, todos los procesos dejan de usar su
+copia en cuanto se confirma la transacción que hizo el cambio.
+"""
+
+import calendar
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from rest_framework import serializers
+
+from core.models import Paquete, ReservaServicio
+from . import versionado
+from .capacidad import ESTADOS_CON_CUPO
+
+# Días máximos que se pueden pedir en una consulta
+MAX_DIAS = getattr(settings, 'RESERVAS_DISPONIBILIDAD_MAX_DIAS', 366)
+# La invalidación es explícita; el TTL solo acota datos huérfanos
+TTL = getattr(settings, 'RESERVAS_DISPONIBILIDAD_TTL', 24 * 3600)
+
+Mes = Tuple[int, int]
+
+
+class DisponibilidadQuerySerializer(serializers.Serializer):
+    desde = serializers.DateField(required=False)
+    hasta = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        desde = attrs.get('desde') or timezone.localdate()
+        hasta = attrs.get('hasta') or desde + timedelta(days=30)
+        if hasta < desde:
+            raise serializers.ValidationError({'hasta': "'hasta' debe ser igual o posterior a 'desde'."})
+        if (hasta - desde).days >= MAX_DIAS:
+            raise serializers.ValidationError({'hasta': f"El rango no puede superar {MAX_DIAS} días."})
+        return {'desde': desde, 'hasta': hasta}
+
+
+# ----------------------------------------------------------------------
+# Claves de caché
+# ----------------------------------------------------------------------
+
+def _clave_version(paquete_id: int, mes: Optional[Mes] = None) -> str:
+    """Versión del paquete o, con ``mes``, de ese mes del paquete."""
+    clave = f'reservas:disponibilidad:{paquete_id}'
+    return f'{clave}:{mes[0]:04d}-{mes[1]:02d}' if mes else clave
+
+
+def _clave_mes(paquete_id: int, version: str, version_mes: str, mes: Mes) -> str:
+    return f'reservas:disponibilidad:{paquete_id}:{version}:{version_mes}:{mes[0]:04d}-{mes[1]:02d}'
+
+
+def _meses(desde: date, hasta: date) -> List[Mes]:
+    meses, actual = [], (desde.year, desde.month)
+    while actual <= (hasta.year, hasta.month):
+        meses.append(actual)
+        actual = (actual[0] + 1, 1) if actual[1] == 12 else (actual[0], actual[1] + 1)
+    return meses
+
+
+def invalidar_dias(paquete_ids: Iterable[int], dias: Iterable[date]):
+    """Invalida los meses de los paquetes indicados que contienen esos días."""
+    meses = {(dia.year, dia.month) for dia in dias}
+    versionado.subir(_clave_version(paquete_id, mes) for paquete_id in set(paquete_ids) for mes in meses)
+
+
+def invalidar_paquete(paquete_id: int):
+    """Invalida todos los meses de un paquete (cambió su capacidad, fechas o servicios)."""
+    versionado.subir([_clave_version(paquete_id)])
+
+
+# ----------------------------------------------------------------------
+# Cálculo
+# ----------------------------------------------------------------------
+
+def _fechas_operativas(paquete: Paquete) -> Optional[set]:
+    """Fechas de ``fechas_disponibles`` como ``date``; ``None`` si el paquete no las restringe."""
+    fechas = paquete.fechas_disponibles
+    if not isinstance(fechas, list) or not fechas:
+        return None
+    operativas = set()
+    for valor in fechas:
+        try:
+            operativas.add(date.fromisoformat(str(valor)[:10]))
+        except ValueError:
+            continue
+    return operativas
+
+
+def _ocupacion(paquete: Paquete, desde: date, hasta: date) -> Dict[date, Dict[str, int]]:
+    """Personas por día y estado con una sola consulta agrupada."""
+    filas = ReservaServicio.objects.filter(
+        servicio__paquete=paquete,
+        reserva__fecha_inicio__date__gte=desde,
+        reserva__fecha_inicio__date__lte=hasta,
+    ).values(
+        'reserva_id', 'reserva__estado', dia=TruncDate('reserva__fecha_inicio'),
+    ).annotate(personas=Max('cantidad')).order_by()
+
+    por_dia: Dict[date, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for fila in filas:
+        por_dia[fila['dia']][fila['reserva__estado']] += fila['personas']
+    return por_dia
+
+
+def calcular(paquete: Paquete, meses: List[Mes]) -> Dict[Mes, Dict[str, Dict[str, Any]]]:
+    """Calendario completo de los meses indicados: {mes: {'AAAA-MM-DD': día}}."""
+    desde = date(meses[0][0], meses[0][1], 1)
+    hasta = date(meses[-1][0], meses[-1][1], calendar.monthrange(*meses[-1])[1])
+    ocupacion = _ocupacion(paquete, desde, hasta)
+    operativas = _fechas_operativas(paquete)
+    capacidad = paquete.max_personas
+
+    resultado: Dict[Mes, Dict[str, Dict[str, Any]]] = {}
+    for mes in meses:
+        dias = {}
+        for numero in range(1, calendar.monthrange(*mes)[1] + 1):
+            dia = date(mes[0], mes[1], numero)
+            por_estado = dict(ocupacion.get(dia, {}))
+            reservados = sum(n for estado, n in por_estado.items() if estado in ESTADOS_CON_CUPO)
+            opera = operativas is None or dia in operativas
+            dias[dia.isoformat()] = {
+                'fecha': dia.isoformat(),
+                'opera': opera,
+                'reservados': reservados,
+                'restantes': max(capacidad - reservados, 0) if opera else 0,
+                'por_estado': por_estado,
+            }
+        resultado[mes] = dias
+    return resultado
+
+
+def calendario(paquete: Paquete, desde: date, hasta: date) -> Dict[str, Any]:
+    """Cupos por día entre ``desde`` y ``hasta`` (incluidos), leyendo de caché lo que haya."""
+    meses = _meses(desde, hasta)
+    versiones = versionado.leer([_clave_version(paquete.pk)] + [_clave_version(paquete.pk, mes) for mes in meses])
+    version = versiones[_clave_version(paquete.pk)]
+    claves = {
+        mes: _clave_mes(paquete.pk, version, versiones[_clave_version(paquete.pk, mes)], mes) for mes in meses
+    }
+    en_cache = cache.get_many(list(claves.values()))
+
+    por_mes = {mes: en_cache[clave] for mes, clave in claves.items() if clave in en_cache}
+    faltantes = [mes for mes in meses if mes not in por_mes]
+    if faltantes:
+        calculados = calcular(paquete, faltantes)
+        cache.set_many({claves[mes]: dias for mes, dias in calculados.items()}, TTL)
+        por_mes.update(calculados)
+
+    dias = []
+    actual = desde
+    while actual <= hasta:
+        dias.append(por_mes[(actual.year, actual.month)][actual.isoformat()])
+        actual += timedelta(days=1)
+    return {
+        'paquete': paquete.pk,
+        'capacidad': paquete.max_personas,
+        'desde': desde,
+        'hasta': hasta,
+        'dias': dias,
+    }
@@ -1,8 +1,5 @@
 from django.core.management.base import BaseCommand
-from django.utils import timezone
-from datetime import timedelta
-from core.models import Reserva
-from core.api.reservas.notifications import NotificacionReprogramacion
+from core.api.reservas import recordatorios
 import logging
 
 logger = logging.getLogger(__name__)
@@ -23,21 +20,19 @@ class Command(BaseCommand):
             action='store_true',
             help='Solo mostrar qué recordatorios se enviarían sin enviarlos realmente'
         )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=recordatorios.TAMANO_LOTE,
+            help=f'Reservas por bloque de envío (default: {recordatorios.TAMANO_LOTE})'
+        )
 
     def handle(self, *args, **options):
         dias_antes = options['dias_antes']
         dry_run = options['dry_run']
         
-        # Calcular la fecha objetivo para los recordatorios
-        fecha_objetivo = timezone.now().date() + timedelta(days=dias_antes)
-        
-        # Buscar reservas reprogramadas que necesiten recordatorio
-        reservas_para_recordatorio = Reserva.objects.filter(
-            fecha_inicio__date=fecha_objetivo,
-            estado='REPROGRAMADA',
-            numero_reprogramaciones__gte=1
-        ).select_related('usuario')
-        
+        # Reservas de la fecha objetivo que todavía no recibieron este recordatorio
+        reservas_para_recordatorio = recordatorios.pendientes(dias_antes)
         total_reservas = reservas_para_recordatorio.count()
         
         if total_reservas == 0:
@@ -54,64 +49,31 @@ class Command(BaseCommand):
             )
         )
         
-        exitosos = 0
-        fallidos = 0
-        
-        for reserva in reservas_para_recordatorio:
-            try:
-                if dry_run:
-                    self.stdout.write(
-                        f'[DRY RUN] Recordatorio para reserva #{reserva.pk} - {reserva.usuario.email}'
-                    )
-                    exitosos += 1
-                else:
-                    # Enviar recordatorio
-                    resultado = NotificacionReprogramacion.enviar_recordatorio_reprogramacion(
-                        reserva, dias_antes
-                    )
-                    
-                    if resultado:
-                        self.stdout.write(
-                            self.style.SUCCESS(
-                                f'✓ Recordatorio enviado para reserva #{reserva.pk} - {reserva.usuario.email}'
-                            )
-                        )
-                        exitosos += 1
-                    else:
-                        self.stdout.write(
-                            self.style.ERROR(
-                                f'✗ Error enviando recordatorio para reserva #{reserva.pk} - {reserva.usuario.email}'
-                            )
-                        )
-                        fallidos += 1
-                        
-            except Exception as e:
+        if dry_run:
+            for reserva in reservas_para_recordatorio.iterator():
                 self.stdout.write(
-                    self.style.ERROR(
-                        f'✗ Error procesando reserva #{reserva.pk}: {str(e)}'
-                    )
+                    f'[DRY RUN] Recordatorio para reserva #{reserva.pk} - {reserva.usuario.email}'
                 )
-                fallidos += 1
-                logger.error(f'Error en recordatorio para reserva {reserva.pk}: {str(e)}')
-        
-        # Resumen final
-        if dry_run:
             self.stdout.write(
                 self.style.SUCCESS(
-                    f'\n[DRY RUN] Se habrían enviado {exitosos} recordatorios.'
+                    f'\n[DRY RUN] Se habrían enviado {total_reservas} recordatorios.'
                 )
             )
-        else:
+            return
+        
+        resumen = recordatorios.enviar(dias_antes, tamano_lote=options['lote'])
+        
+        # Resumen final
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\n✓ Recordatorios enviados exitosamente: {resumen.enviados}'
+            )
+        )
+        if resumen.fallidos > 0:
             self.stdout.write(
-                self.style.SUCCESS(
-                    f'\n✓ Recordatorios enviados exitosamente: {exitosos}'
+                self.style.ERROR(
+                    f'✗ Recordatorios fallidos: {resumen.fallidos} (se reintentarán en la próxima ejecución)'
                 )
             )
-            if fallidos > 0:
-                self.stdout.write(
-                    self.style.ERROR(
-                        f'✗ Recordatorios fallidos: {fallidos}'
-                    )
-                )
-            
-            logger.info(f'Comando recordatorios completado: {exitosos} exitosos, {fallidos} fallidos')
\ No newline at end of file
+        
+        logger.info(f'Comando recordatorios completado: {resumen.enviados} exitosos, {resumen.fallidos} fallidos')
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from datetime import datetime
+from core.api.reservas import capacidad
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el ledger de cupos diarios (CupoDiario) a partir de las reservas existentes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--desde',
+            type=str,
+            default=None,
+            help='Fecha inicial YYYY-MM-DD (default: hoy). Los cupos anteriores no se tocan.'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo mostrar cuántas filas se generarían sin escribirlas'
+        )
+
+    def handle(self, *args, **options):
+        desde = timezone.localdate()
+        if options['desde']:
+            desde = datetime.strptime(options['desde'], '%Y-%m-%d').date()
+
+        cupos = capacidad.reconstruir(desde, guardar=not options['dry_run'])
+
+        if options['dry_run']:
+            self.stdout.write(
+                self.style.WARNING(f'[DRY RUN] Se generarían {len(cupos)} filas de cupo desde {desde}.')
+            )
+            return
+
+        sobrevendidos = [c for c in cupos if c.capacidad is not None and c.reservados > c.capacidad]
+        for cupo in sobrevendidos:
+            self.stdout.write(
+                self.style.ERROR(f'✗ Paquete {cupo.paquete_id} sobrevendido el {cupo.fecha}: {cupo.reservados}/{cupo.capacidad}')  # type: ignore
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Ledger reconstruido desde {desde}: {len(cupos)} filas')
+        )
+        logger.info(f'Ledger de cupos reconstruido: {len(cupos)} filas desde {desde}')
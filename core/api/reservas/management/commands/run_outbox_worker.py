@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from concurrent.futures import ThreadPoolExecutor
+from core.api.reservas import outbox
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _procesar(evento):
+    """Cada hilo usa su propia conexión; se cierra al terminar el evento."""
+    try:
+        return outbox.procesar(evento)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Procesa el outbox de notificaciones (emails de reprogramación y de soporte, avisos a soporte)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hilos',
+            type=int,
+            default=4,
+            help='Envíos en paralelo (default: 4)'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=50,
+            help='Eventos tomados por vuelta (default: 50)'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=2.0,
+            help='Segundos de espera cuando no hay eventos pendientes (default: 2)'
+        )
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Vaciar lo pendiente y terminar en lugar de quedarse escuchando'
+        )
+
+    def handle(self, *args, **options):
+        enviados = fallidos = 0
+        self.stdout.write(f"Outbox worker iniciado con {options['hilos']} hilos")
+
+        with ThreadPoolExecutor(max_workers=options['hilos']) as pool:
+            try:
+                while True:
+                    eventos = outbox.reclamar(options['lote'])
+                    if not eventos:
+                        if options['una_vez']:
+                            break
+                        time.sleep(options['intervalo'])
+                        continue
+
+                    for ok in pool.map(_procesar, eventos):
+                        if ok:
+                            enviados += 1
+                        else:
+                            fallidos += 1
+                    logger.info(f'Outbox: lote de {len(eventos)} eventos procesado')
+            except KeyboardInterrupt:
+                self.stdout.write(self.style.WARNING('Worker detenido'))
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Outbox: {enviados} enviados, {fallidos} con error (se reintentarán o quedaron fallidos)')
+        )
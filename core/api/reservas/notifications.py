@@ -1,4 +1,4 @@
-from django.core.mail import send_mail, EmailMultiAlternatives
+from django.core.mail import send_mail, EmailMessage, EmailMultiAlternatives
 from django.conf import settings
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
@@ -24,7 +24,7 @@ class NotificacionReprogramacion:
                 'fecha_anterior': fecha_anterior,
                 'fecha_nueva': reserva.fecha_inicio,
                 'motivo': motivo,
-                'servicios': reserva.detalles.all(),
+                'servicios': reserva.servicios.select_related('servicio'),
             }
             
             # Crear el email
@@ -107,14 +107,14 @@ Teléfono: {reserva.usuario.telefono or 'No proporcionado'}
 Detalles de la reprogramación:
 - Fecha anterior: {fecha_anterior.strftime('%d/%m/%Y %H:%M')}
 - Nueva fecha: {reserva.fecha_inicio.strftime('%d/%m/%Y %H:%M')}
-- Reprogramado por: {reprogramado_por.nombres} {reprogramado_por.apellidos}
+- Reprogramado por: {f"{reprogramado_por.nombres} {reprogramado_por.apellidos}" if reprogramado_por else 'Sistema'}
 - Número de reprogramaciones: {reserva.numero_reprogramaciones}
 - Total: {reserva.total} {reserva.moneda}
 
 {f'Motivo: {motivo}' if motivo else 'Sin motivo especificado'}
 
 Servicios incluidos:
-{chr(10).join([f"- {detalle.servicio.titulo} (x{detalle.cantidad})" for detalle in reserva.detalles.all()])}
+{chr(10).join([f"- {detalle.servicio.titulo} (x{detalle.cantidad})" for detalle in reserva.servicios.select_related('servicio')])}
 
 Por favor, revisa y confirma la disponibilidad de recursos para la nueva fecha.
             """
@@ -129,14 +129,11 @@ Por favor, revisa y confirma la disponibilidad de recursos para la nueva fecha.
 
             # Crear notificación en el panel de soporte
             solicitud = TicketSoporte.objects.create(
-                cliente=reserva.usuario,
+                usuario=reserva.usuario,
                 tipo_solicitud=TicketSoporte.TipoSolicitud.REPROGRAMACION,
                 prioridad=prioridad,
                 asunto=asunto,
                 descripcion=descripcion,
-                reserva=reserva,
-                canal_origen='SISTEMA_AUTOMATICO',
-                tags='reprogramacion,automatica'
             )
             
             logger.info(f"Notificación de reprogramación creada en panel soporte #{solicitud.numero_ticket} para reserva {reserva.pk}")
@@ -147,40 +144,44 @@ Por favor, revisa y confirma la disponibilidad de recursos para la nueva fecha.
             return False
     
     @staticmethod
-    def enviar_recordatorio_reprogramacion(reserva, dias_antes=1):
-        """Envía recordatorio de la nueva fecha programada"""
-        try:
-            fecha_recordatorio = reserva.fecha_inicio - timezone.timedelta(days=dias_antes)
-            
-            if timezone.now().date() == fecha_recordatorio.date():
-                usuario = reserva.usuario
-                
-                asunto = f"Recordatorio: Tu reserva #{reserva.pk} es mañana"
-                mensaje = f"""
+    def construir_recordatorio(reserva, dias_antes=1) -> EmailMessage:
+        """Arma el email de recordatorio sin enviarlo (lo usa el envío masivo)."""
+        usuario = reserva.usuario
+        cuando = "mañana" if dias_antes == 1 else f"en {dias_antes} días"
+        
+        asunto = f"Recordatorio: Tu reserva #{reserva.pk} es {cuando}"
+        mensaje = f"""
 Hola {usuario.nombres},
 
-Te recordamos que tu reserva reprogramada #{reserva.pk} es mañana:
+Te recordamos que tu reserva reprogramada #{reserva.pk} es {cuando}:
 
-Fecha: {reserva.fecha_inicio.strftime('%d/%m/%Y a las %H:%M')}
+Fecha: {timezone.localtime(reserva.fecha_inicio).strftime('%d/%m/%Y a las %H:%M')}
 Total: {reserva.total} {reserva.moneda}
 
 ¡Esperamos verte!
 
 Saludos,
 Equipo de Turismo
-                """
-                
-                send_mail(
-                    subject=asunto,
-                    message=mensaje,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[usuario.email],
-                    fail_silently=True
-                )
+        """
+        return EmailMessage(
+            subject=asunto,
+            body=mensaje,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[usuario.email],
+        )
+    
+    @staticmethod
+    def enviar_recordatorio_reprogramacion(reserva, dias_antes=1):
+        """Envía recordatorio de la nueva fecha programada"""
+        try:
+            fecha_recordatorio = reserva.fecha_inicio - timezone.timedelta(days=dias_antes)
+            
+            if timezone.localdate() == timezone.localdate(fecha_recordatorio):
+                NotificacionReprogramacion.construir_recordatorio(reserva, dias_antes).send(fail_silently=True)
                 
                 logger.info(f"Recordatorio enviado para reserva reprogramada {reserva.pk}")
                 return True
                 
         except Exception as e:
             logger.error(f"Error enviando recordatorio para reserva {reserva.pk}: {str(e)}")
-            return False
\ No newline at end of file
+            return False
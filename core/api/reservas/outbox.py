@@ -0,0 +1,214 @@
+"""
+Outbox transaccional para las notificaciones de reprogramación.
+
+Las vistas solo insertan filas ``OutboxEvento`` dentro de la transacción de la
+reprogramación; el envío de correos y la creación del aviso para soporte los
+hace ``manage.py run_outbox_worker`` fuera del request. Si el envío falla, el
+evento se reintenta con espera exponencial hasta ``MAX_INTENTOS``.
+
+Cada notificación es un evento independiente para que un reintento del correo
+no vuelva a crear el ticket de soporte (y al revés).
+
+También transporta los correos de soporte:
+
+- ``RECORDATORIO_SOPORTE``: recordatorio a clientes en ESPERANDO_CLIENTE, lo
+  encola ``cierre.py`` de soporte.
+- ``NUEVA_SOLICITUD_SOPORTE`` y ``RESPUESTA_SOPORTE``: confirmación de una
+  solicitud nueva y aviso de respuestas del equipo, los encolan las señales de
+  soporte al confirmar. Las respuestas se agrupan: mientras haya un aviso
+  pendiente de la misma solicitud no se encola otro, y el que sale cuenta
+  todos los mensajes que el cliente aún no leyó.
+"""
+
+import logging
+from datetime import timedelta
+from typing import Callable, Dict, List
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models import HistorialReprogramacion, OutboxEvento, TicketSoporte
+from .notifications import NotificacionReprogramacion
+
+logger = logging.getLogger(__name__)
+
+MAX_INTENTOS = getattr(settings, 'OUTBOX_MAX_INTENTOS', 8)
+# Espera antes del reintento n: ESPERA_BASE * 2**(n-1), como máximo ESPERA_MAXIMA (segundos)
+ESPERA_BASE = getattr(settings, 'OUTBOX_ESPERA_BASE', 30)
+ESPERA_MAXIMA = getattr(settings, 'OUTBOX_ESPERA_MAXIMA', 3600)
+# Un evento en PROCESANDO más tiempo que esto (worker caído) vuelve a estar disponible
+BLOQUEO = getattr(settings, 'OUTBOX_BLOQUEO', 300)
+
+REPROGRAMACION_CLIENTE = 'REPROGRAMACION_CLIENTE'
+REPROGRAMACION_SOPORTE = 'REPROGRAMACION_SOPORTE'
+RECORDATORIO_SOPORTE = 'RECORDATORIO_SOPORTE'
+NUEVA_SOLICITUD_SOPORTE = 'NUEVA_SOLICITUD_SOPORTE'
+RESPUESTA_SOPORTE = 'RESPUESTA_SOPORTE'
+
+
+class EnvioFallido(Exception):
+    """El manejador no pudo completar el envío; el evento se reintenta."""
+
+
+# ----------------------------------------------------------------------
+# Encolado (dentro de la transacción del request)
+# ----------------------------------------------------------------------
+
+def encolar_reprogramacion(historial: HistorialReprogramacion, motivo: str = '') -> List[OutboxEvento]:
+    """Registra el correo al cliente y el aviso a soporte de una reprogramación."""
+    payload = {'historial_id': historial.pk, 'motivo': motivo}
+    return OutboxEvento.objects.bulk_create([
+        OutboxEvento(tipo=REPROGRAMACION_CLIENTE, payload=payload),
+        OutboxEvento(tipo=REPROGRAMACION_SOPORTE, payload=payload),
+    ])
+
+
+def encolar_aviso_soporte(tipo: str, solicitud_id: int, espera: int = 0) -> bool:
+    """
+    Encola un correo de soporte para dentro de ``espera`` segundos, salvo que
+    ya haya uno del mismo tipo y solicitud sin procesar: ese lo cubre. Devuelve
+    True si creó el evento.
+    """
+    pendiente = OutboxEvento.objects.filter(
+        tipo=tipo, estado='PENDIENTE', intentos=0, payload__solicitud_id=solicitud_id
+    )
+    if pendiente.exists():
+        return False
+    OutboxEvento.objects.create(
+        tipo=tipo, payload={'solicitud_id': solicitud_id},
+        proximo_intento=timezone.now() + timedelta(seconds=espera),
+    )
+    return True
+
+
+# ----------------------------------------------------------------------
+# Manejadores (en el worker)
+# ----------------------------------------------------------------------
+
+def _historial(payload) -> HistorialReprogramacion:
+    return HistorialReprogramacion.objects.select_related(
+        'reserva__usuario', 'reprogramado_por'
+    ).get(pk=payload['historial_id'])
+
+
+def _notificar_cliente(payload):
+    historial = _historial(payload)
+    if not NotificacionReprogramacion.notificar_cliente(historial.reserva, historial.fecha_anterior, payload.get('motivo')):
+        raise EnvioFallido(f"No se pudo notificar al cliente de la reserva {historial.reserva_id}")  # type: ignore
+
+
+def _notificar_soporte(payload):
+    historial = _historial(payload)
+    if not NotificacionReprogramacion.notificar_administrador(
+        historial.reserva, historial.fecha_anterior, historial.reprogramado_por, payload.get('motivo')
+    ):
+        raise EnvioFallido(f"No se pudo crear el aviso de soporte de la reserva {historial.reserva_id}")  # type: ignore
+
+
+def _solicitud(payload):
+    return TicketSoporte.objects.select_related('usuario').filter(pk=payload['solicitud_id']).first()
+
+
+def _recordar_solicitud(payload):
+    from core.api.soporte.signals import enviar_recordatorio_cliente
+
+    ticket = _solicitud(payload)
+    if ticket is not None and not enviar_recordatorio_cliente(ticket):
+        raise EnvioFallido(f"No se pudo enviar el recordatorio de la solicitud {ticket.pk}")
+
+
+def _confirmar_solicitud(payload):
+    from core.api.soporte.signals import enviar_notificacion_nueva_solicitud
+
+    ticket = _solicitud(payload)
+    if ticket is not None and not enviar_notificacion_nueva_solicitud(ticket):
+        raise EnvioFallido(f"No se pudo confirmar la solicitud {ticket.pk} al cliente")
+
+
+def _avisar_respuesta(payload):
+    from core.api.soporte.signals import enviar_notificacion_mensaje_cliente
+
+    ticket = _solicitud(payload)
+    if ticket is not None and not enviar_notificacion_mensaje_cliente(ticket):
+        raise EnvioFallido(f"No se pudo avisar la respuesta de la solicitud {ticket.pk}")
+
+
+MANEJADORES: Dict[str, Callable[[dict], None]] = {
+    REPROGRAMACION_CLIENTE: _notificar_cliente,
+    REPROGRAMACION_SOPORTE: _notificar_soporte,
+    RECORDATORIO_SOPORTE: _recordar_solicitud,
+    NUEVA_SOLICITUD_SOPORTE: _confirmar_solicitud,
+    RESPUESTA_SOPORTE: _avisar_respuesta,
+}
+
+# Tipos que cuentan para ``HistorialReprogramacion.notificacion_enviada``
+TIPOS_REPROGRAMACION = (REPROGRAMACION_CLIENTE, REPROGRAMACION_SOPORTE)
+
+
+def _marcar_historial(historial_id: int):
+    """Marca la notificación como enviada cuando ya no queda nada pendiente de ese historial."""
+    pendientes = OutboxEvento.objects.filter(
+        tipo__in=TIPOS_REPROGRAMACION, payload__historial_id=historial_id
+    ).exclude(estado='ENVIADO')
+    if not pendientes.exists():
+        HistorialReprogramacion.objects.filter(pk=historial_id).update(notificacion_enviada=True)
+
+
+# ----------------------------------------------------------------------
+# Procesamiento
+# ----------------------------------------------------------------------
+
+def reclamar(limite: int) -> List[OutboxEvento]:
+    """
+    Toma hasta ``limite`` eventos vencidos y los pasa a PROCESANDO con un
+    bloqueo temporal, para que otro worker no los procese a la vez.
+    """
+    ahora = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            OutboxEvento.objects.select_for_update(skip_locked=True)
+            .filter(Q(estado='PENDIENTE') | Q(estado='PROCESANDO'), proximo_intento__lte=ahora)
+            .order_by('proximo_intento', 'id')
+            .values_list('id', flat=True)[:limite]
+        )
+        if not ids:
+            return []
+        OutboxEvento.objects.filter(id__in=ids).update(
+            estado='PROCESANDO', proximo_intento=ahora + timedelta(seconds=BLOQUEO)
+        )
+    return list(OutboxEvento.objects.filter(id__in=ids).order_by('id'))
+
+
+def espera(intentos: int) -> timedelta:
+    return timedelta(seconds=min(ESPERA_BASE * 2 ** max(intentos - 1, 0), ESPERA_MAXIMA))
+
+
+def procesar(evento: OutboxEvento) -> bool:
+    """Ejecuta el manejador del evento y guarda el resultado. Devuelve True si se envió."""
+    manejador = MANEJADORES.get(evento.tipo)
+    evento.intentos += 1
+    try:
+        if manejador is None:
+            raise EnvioFallido(f"Tipo de evento desconocido: {evento.tipo}")
+        manejador(evento.payload)
+    except Exception as e:
+        evento.ultimo_error = str(e)
+        if evento.intentos >= MAX_INTENTOS or manejador is None:
+            evento.estado = 'FALLIDO'
+            logger.error(f"Outbox {evento.pk} ({evento.tipo}) descartado tras {evento.intentos} intentos: {e}")
+        else:
+            evento.estado = 'PENDIENTE'
+            evento.proximo_intento = timezone.now() + espera(evento.intentos)
+            logger.warning(f"Outbox {evento.pk} ({evento.tipo}) falló, reintento {evento.intentos}: {e}")
+        evento.save(update_fields=['estado', 'intentos', 'proximo_intento', 'ultimo_error'])
+        return False
+
+    evento.estado = 'ENVIADO'
+    evento.procesado_at = timezone.now()
+    evento.ultimo_error = ''
+    evento.save(update_fields=['estado', 'intentos', 'procesado_at', 'ultimo_error'])
+    if evento.tipo in TIPOS_REPROGRAMACION:
+        _marcar_historial(evento.payload['historial_id'])
+    return True
@@ -0,0 +1,112 @@
+"""
+Reglas de precio para las líneas de una reserva.
+
+El frontend envía el total de la reserva; si el servicio pertenece a un paquete
+y ese total coincide con el precio del paquete (compartido o por persona) se usa
+el precio del paquete, si no el costo del servicio.
+
+Para no consultar paquetes línea por línea, ``catalogo()`` mantiene en memoria
+el costo de cada servicio y los paquetes que lo contienen con su precio ya
+convertido a ``Decimal``. El catálogo lleva una versión guardada en la base de
+datos (ver ``versionado.py``); las señales de ``Paquete``, ``Servicio`` y de la
+tabla M2M la cambian (ver ``signals.py``) y cada proceso reconstruye su copia al
+ver una versión distinta.
+"""
+
+import logging
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from core.models import Paquete, Servicio
+from .versionado import CacheVersionada
+
+logger = logging.getLogger(__name__)
+
+REGLA_SERVICIO = 'SERVICIO'
+REGLA_PAQUETE_POR_PERSONA = 'PAQUETE_POR_PERSONA'
+REGLA_PAQUETE_COMPARTIDO = 'PAQUETE_COMPARTIDO'
+
+TOLERANCIA = Decimal('0.01')
+
+CLAVE_VERSION = 'reservas:precios:version'
+
+
+class PrecioLinea(NamedTuple):
+    """Precio unitario elegido para una línea y la regla que lo produjo."""
+    precio_unitario: Decimal
+    regla: str
+    paquete_id: Optional[int] = None
+
+
+def parsear_precio(valor) -> Optional[Decimal]:
+    """``Paquete.precio`` es un CharField; devuelve ``None`` si no es numérico."""
+    try:
+        return Decimal(str(valor).strip())
+    except (InvalidOperation, ValueError):
+        return None
+
+
+def resolver_precio_linea(costo_servicio: Decimal, paquetes: Iterable[Tuple[int, Optional[Decimal]]],
+                          total_frontend: Decimal, cantidad: int) -> PrecioLinea:
+    """
+    Elige el precio unitario de una línea.
+
+    ``paquetes`` son pares ``(paquete_id, precio)`` de los paquetes que
+    contienen al servicio, con el precio ya parseado (``None`` si no es numérico).
+    """
+    total_frontend = total_frontend or Decimal('0')
+    precio_por_persona = total_frontend / cantidad if cantidad > 0 else total_frontend
+    for paquete_id, precio_paquete in paquetes:
+        if precio_paquete is None:
+            continue
+        # Caso 1: el total coincide con el precio del paquete (paquete compartido)
+        if abs(total_frontend - precio_paquete) < TOLERANCIA:
+            return PrecioLinea(precio_por_persona, REGLA_PAQUETE_COMPARTIDO, paquete_id)
+        # Caso 2: el precio por persona coincide con el del paquete
+        if abs(precio_por_persona - precio_paquete) < TOLERANCIA:
+            return PrecioLinea(precio_paquete, REGLA_PAQUETE_POR_PERSONA, paquete_id)
+    return PrecioLinea(costo_servicio, REGLA_SERVICIO)
+
+
+class CatalogoPrecios:
+    """Foto inmutable de costos de servicios y precios de paquetes."""
+
+    def __init__(self, version: str, costos: Dict[int, Decimal], paquetes: Dict[int, List[Tuple[int, Optional[Decimal]]]]):
+        self.version = version
+        self.costos = costos
+        self.paquetes = paquetes
+
+    @classmethod
+    def construir(cls, version: str) -> 'CatalogoPrecios':
+        costos = dict(Servicio.objects.values_list('id', 'costo'))
+        paquetes: Dict[int, List[Tuple[int, Optional[Decimal]]]] = defaultdict(list)
+        relaciones = Paquete.servicios.through.objects.order_by('paquete_id').values_list(
+            'servicio_id', 'paquete_id', 'paquete__precio'
+        )
+        for servicio_id, paquete_id, precio in relaciones:
+            precio_paquete = parsear_precio(precio)
+            if precio_paquete is None:
+                # Se conserva igual: el paquete sigue contando para el cupo
+                logger.warning(f"Paquete {paquete_id} tiene un precio no numérico: {precio!r}")
+            paquetes[servicio_id].append((paquete_id, precio_paquete))
+        return cls(version, costos, dict(paquetes))
+
+    def paquetes_por_servicio(self, servicio_ids: Iterable[int]) -> Dict[int, List[int]]:
+        """Mismo formato que ``capacidad.paquetes_por_servicio`` pero sin consultar la base."""
+        return {
+            servicio_id: [paquete_id for paquete_id, _ in self.paquetes[servicio_id]]
+            for servicio_id in servicio_ids if servicio_id in self.paquetes
+        }
+
+    def precio_linea(self, servicio: Servicio, cantidad: int, total_frontend: Decimal) -> PrecioLinea:
+        costo = self.costos.get(servicio.pk, servicio.costo)
+        return resolver_precio_linea(costo, self.paquetes.get(servicio.pk, []), total_frontend, cantidad)
+
+
+_catalogo = CacheVersionada(CLAVE_VERSION, CatalogoPrecios.construir)
+
+# Catálogo vigente (se reconstruye solo si cambió la versión)
+catalogo = _catalogo.obtener
+invalidar = _catalogo.invalidar
+version_actual = _catalogo.version_actual
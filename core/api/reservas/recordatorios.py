@@ -0,0 +1,92 @@
+"""
+Envío masivo de recordatorios de reservas reprogramadas.
+
+Las reservas se leen en streaming (``.iterator()``) excluyendo las que ya
+tienen ``RecordatorioEnviado`` para ese ``dias_antes``; los emails se arman por
+bloques y se envían por una única conexión SMTP abierta al inicio
+(``get_connection``). Al terminar cada bloque se registran las
+marcas de los enviados, así que volver a correr el comando no repite envíos.
+"""
+
+import logging
+import smtplib
+from datetime import date, timedelta
+from itertools import islice
+from typing import Iterator, List, NamedTuple
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from core.models import RecordatorioEnviado, Reserva
+from .notifications import NotificacionReprogramacion
+
+logger = logging.getLogger(__name__)
+
+TAMANO_LOTE = getattr(settings, 'RECORDATORIOS_TAMANO_LOTE', 500)
+
+
+class ResumenEnvio(NamedTuple):
+    enviados: int
+    fallidos: int
+
+
+def fecha_objetivo(dias_antes: int) -> date:
+    return timezone.localdate() + timedelta(days=dias_antes)
+
+
+def pendientes(dias_antes: int):
+    """Reservas reprogramadas de la fecha objetivo que aún no recibieron este recordatorio."""
+    ya_enviado = RecordatorioEnviado.objects.filter(reserva=OuterRef('pk'), dias_antes=dias_antes)
+    return Reserva.objects.filter(
+        fecha_inicio__date=fecha_objetivo(dias_antes),
+        estado='REPROGRAMADA',
+        numero_reprogramaciones__gte=1,
+    ).exclude(Exists(ya_enviado)).select_related('usuario').only(
+        'id', 'fecha_inicio', 'total', 'moneda', 'usuario__nombres', 'usuario__email',
+    ).order_by('id')
+
+
+def _lotes(reservas, tamano: int) -> Iterator[List[Reserva]]:
+    iterador = reservas.iterator(chunk_size=tamano)
+    while True:
+        lote = list(islice(iterador, tamano))
+        if not lote:
+            return
+        yield lote
+
+
+def _enviar(conexion, mensaje) -> bool:
+    """Envía por la conexión compartida; si el servidor la cerró, reabre y reintenta una vez."""
+    try:
+        return conexion.send_messages([mensaje]) == 1
+    except smtplib.SMTPServerDisconnected:
+        conexion.close()
+        conexion.open()
+        return conexion.send_messages([mensaje]) == 1
+
+
+def enviar(dias_antes: int = 1, tamano_lote: int = TAMANO_LOTE) -> ResumenEnvio:
+    enviados = fallidos = 0
+    conexion = get_connection()
+    conexion.open()
+    try:
+        for lote in _lotes(pendientes(dias_antes), tamano_lote):
+            marcas = []
+            for reserva in lote:
+                try:
+                    ok = _enviar(conexion, NotificacionReprogramacion.construir_recordatorio(reserva, dias_antes))
+                except Exception as e:
+                    ok = False
+                    logger.error(f"Error enviando recordatorio para reserva {reserva.pk}: {e}")
+                if ok:
+                    marcas.append(RecordatorioEnviado(reserva=reserva, dias_antes=dias_antes))
+                else:
+                    fallidos += 1
+            RecordatorioEnviado.objects.bulk_create(marcas, ignore_conflicts=True)
+            enviados += len(marcas)
+            logger.info(f"Recordatorios: lote de {len(lote)} procesado ({enviados} enviados en total)")
+    finally:
+        conexion.close()
+    return ResumenEnvio(enviados, fallidos)
@@ -0,0 +1,154 @@
+"""
+Foto compilada de las reglas de reprogramación.
+
+Todas las reglas activas se leen una vez y se guardan en una tabla
+(tipo_regla, rol) -> regla ganadora (mayor prioridad, luego la más reciente),
+que es el mismo criterio de ``ReglasReprogramacion.obtener_regla_activa``.
+Los valores se dejan ya interpretados: días y horas blackout y servicios
+restringidos como conjuntos, números como ``int``/``float``.
+
+La foto se invalida por versión (ver ``versionado.py``) cuando se guarda o
+elimina una regla o una ``ConfiguracionGlobalReprogramacion``, así que validar
+una reprogramación no consulta reglas en la base de datos.
+"""
+
+import json
+import unicodedata
+from decimal import Decimal
+from typing import Any, Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+
+from core.models import ConfiguracionGlobalReprogramacion, ReglasReprogramacion
+from .versionado import CacheVersionada
+
+CLAVE_VERSION = 'reservas:reglas:version'
+
+DIAS_SEMANA = ['lunes', 'martes', 'miercoles', 'jueves', 'viernes', 'sabado', 'domingo']
+
+TIPOS_NUMERICOS = {
+    'TIEMPO_MINIMO', 'TIEMPO_MAXIMO', 'LIMITE_REPROGRAMACIONES', 'LIMITE_DIARIO',
+    'CAPACIDAD_MAXIMA', 'DESCUENTO_PENALIZACION',
+}
+
+
+def _sin_acentos(texto: str) -> str:
+    return ''.join(
+        c for c in unicodedata.normalize('NFD', texto.lower().strip()) if unicodedata.category(c) != 'Mn'
+    )
+
+
+def _lista(valor) -> List[Any]:
+    """Acepta una lista, un JSON (``["domingo"]``) o texto separado por comas."""
+    if isinstance(valor, str):
+        try:
+            valor = json.loads(valor)
+        except ValueError:
+            valor = valor.split(',')
+    if not isinstance(valor, (list, tuple, set)):
+        valor = [valor]
+    return [v.strip() if isinstance(v, str) else v for v in valor if v not in (None, '')]
+
+
+def _dias(valor) -> FrozenSet[int]:
+    """Días de la semana como ``weekday()`` (0=lunes). Acepta nombres o índices."""
+    dias = set()
+    for dia in _lista(valor):
+        if isinstance(dia, int) or (isinstance(dia, str) and dia.isdigit()):
+            dias.add(int(dia) % 7)
+        elif isinstance(dia, str) and _sin_acentos(dia) in DIAS_SEMANA:
+            dias.add(DIAS_SEMANA.index(_sin_acentos(dia)))
+    return frozenset(dias)
+
+
+def _horas(valor) -> FrozenSet[int]:
+    horas = set()
+    for hora in _lista(valor):
+        try:
+            horas.add(int(hora))
+        except (TypeError, ValueError):
+            continue
+    return frozenset(horas)
+
+
+def compilar_valor(regla: ReglasReprogramacion):
+    valor = regla.obtener_valor()
+    if regla.tipo_regla == 'DIAS_BLACKOUT':
+        return _dias(valor)
+    if regla.tipo_regla == 'HORAS_BLACKOUT':
+        return _horas(valor)
+    if regla.tipo_regla == 'SERVICIOS_RESTRINGIDOS':
+        return frozenset(str(s) for s in _lista(valor))
+    if regla.tipo_regla in TIPOS_NUMERICOS and isinstance(valor, Decimal):
+        return float(valor)
+    return valor
+
+
+class ReglaCompilada(NamedTuple):
+    regla: ReglasReprogramacion
+    valor: Any
+
+    @property
+    def mensaje_error(self) -> Optional[str]:
+        return self.regla.mensaje_error
+
+    def es_numerica(self) -> bool:
+        return isinstance(self.valor, (int, float)) and not isinstance(self.valor, bool)
+
+    def como_dict(self, rol: str) -> Dict[str, Any]:
+        return {
+            'tipo': self.regla.tipo_regla,
+            'rol': rol,
+            'nombre': self.regla.nombre,
+            'valor': self.regla.obtener_valor(),
+            'prioridad': self.regla.prioridad,
+        }
+
+
+class ReglasCompiladas:
+    """Tabla (tipo_regla, rol) -> regla ganadora, más la configuración global tipada."""
+
+    def __init__(self, version: str, reglas: Dict[Tuple[str, str], ReglaCompilada], configuracion: Dict[str, Any]):
+        self.version = version
+        self.reglas = reglas
+        self.configuracion = configuracion
+
+    @classmethod
+    def construir(cls, version: str) -> 'ReglasCompiladas':
+        reglas: Dict[Tuple[str, str], ReglaCompilada] = {}
+        for regla in ReglasReprogramacion.objects.filter(activa=True).order_by('-prioridad', '-created_at'):
+            reglas.setdefault((regla.tipo_regla, regla.aplicable_a), ReglaCompilada(regla, compilar_valor(regla)))
+        configuracion = {
+            config.clave: config.obtener_valor_tipado()
+            for config in ConfiguracionGlobalReprogramacion.objects.filter(activa=True)
+        }
+        return cls(version, reglas, configuracion)
+
+    def regla(self, tipo_regla: str, rol: str) -> Optional[ReglaCompilada]:
+        return self.reglas.get((tipo_regla, rol))
+
+    def primera(self, tipo_regla: str, roles: Iterable[str]) -> Optional[ReglaCompilada]:
+        """Primera regla encontrada recorriendo los roles en orden (el primero gana)."""
+        for rol in roles:
+            compilada = self.reglas.get((tipo_regla, rol))
+            if compilada:
+                return compilada
+        return None
+
+    def primera_con_rol(self, tipo_regla: str, roles: Iterable[str]) -> Tuple[Optional[str], Optional[ReglaCompilada]]:
+        for rol in roles:
+            compilada = self.reglas.get((tipo_regla, rol))
+            if compilada:
+                return rol, compilada
+        return None, None
+
+    def valor(self, tipo_regla: str, roles: Iterable[str] = ('ALL',), default=None):
+        compilada = self.primera(tipo_regla, roles)
+        return compilada.valor if compilada else default
+
+    def config(self, clave: str, default=None):
+        return self.configuracion.get(clave, default)
+
+
+_reglas = CacheVersionada(CLAVE_VERSION, ReglasCompiladas.construir)
+
+snapshot = _reglas.obtener
+invalidar = _reglas.invalidar
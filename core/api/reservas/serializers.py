@@ -8,7 +8,13 @@ from rest_framework.exceptions import ValidationError
 from rest_framework.fields import Field
 from typing import cast
 from django.utils import timezone
-from datetime import timedelta, datetime
+from datetime import timedelta
+from django.db import transaction
+from . import capacidad, precios, reglas
+from .acompanantes import ResolucionAcompanantes, asociaciones
+import logging
+
+logger = logging.getLogger(__name__)
 
 class ReservaServicioSerializer(serializers.ModelSerializer):
     tipo = serializers.CharField(source="servicio.tipo", read_only=True)
@@ -61,9 +67,7 @@ class ReservaAcompananteSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if request is not None:
             user = request.user
-            roles = []
-            if hasattr(user, 'roles'):
-                roles = list(user.roles.values_list('nombre', flat=True))
+            roles = getattr(user, 'nombres_roles', frozenset())
             if 'CLIENTE' in roles and reserva and reserva.usuario != user:
                 raise serializers.ValidationError({"detail": "No puedes agregar acompañantes a una reserva que no es tuya."})
 
@@ -81,33 +85,30 @@ class ReservaSerializer(serializers.ModelSerializer):
         ]
     read_only_fields = ["usuario"]
 
+    @transaction.atomic
     def create(self, validated_data):
-        from core.models import ReservaServicio, ReservaAcompanante, Acompanante as AcompananteModel
+        from core.models import ReservaServicio, ReservaAcompanante
 
-        import sys
-        print('DEBUG validated_data:', validated_data, file=sys.stderr)
         request = self.context.get('request')
-        if request is not None:
-            print('DEBUG request.data:', request.data, file=sys.stderr)
 
         detalles = validated_data.pop('detalles', [])
         # Prefer validated nested data; when nested serializer is read-only for 'acompanante'
         # the client's nested object may not appear in validated_data. Fall back to raw
         # request data to accept companion objects sent by the frontend.
         # SIEMPRE tomar los acompañantes desde request.data para asegurar que llegan completos
-        acompanantes = []
-        if request is not None:
-            acompanantes = request.data.get('acompanantes', [])
+        validated_data.pop('acompanantes', None)
+        acompanantes = request.data.get('acompanantes', []) if request is not None else []
 
-        # Calcular precio real desde catalogo y total
+        # Calcular precio real desde el catálogo en memoria y el total enviado.
+        # LÓGICA AUTOMÁTICA: si el servicio pertenece a un paquete y el total del
+        # frontend coincide con su precio (total o por persona) se usa el del paquete
+        catalogo = precios.catalogo()
+        total_frontend = validated_data.get('total', Decimal('0'))
         suma = Decimal('0')
         detalles_para_crear = []
-        validated_data.pop('acompanantes', None)
-        acompanantes = request.data.get('acompanantes', []) if request is not None else []  # Tomar acompañantes desde request.data
         for d in detalles:
             servicio_val = d.get('servicio')
             cantidad = int(d.get('cantidad', 1))
-            fecha_servicio = d.get('fecha_servicio')
 
             # El campo nested puede venir ya convertido a instancia Servicio
             if isinstance(servicio_val, Servicio):
@@ -118,225 +119,60 @@ class ReservaSerializer(serializers.ModelSerializer):
                 except Servicio.DoesNotExist:
                     raise ValidationError({"detalles": f"Servicio con id {servicio_val} no encontrado."})
 
-            # VALIDACIÓN DE CUPO USANDO max_personas DEL PAQUETE
-            paquete = getattr(servicio_obj, 'paquete', None)
-            if paquete is not None:
-                max_personas = getattr(paquete, 'max_personas', None)
-                if max_personas is not None:
-                    # Contar personas ya reservadas para ese paquete
-                    from core.models import ReservaServicio
-                    reservas_servicio = ReservaServicio.objects.filter(servicio=servicio_obj)
-                    total_personas_reservadas = sum([rs.cantidad for rs in reservas_servicio])
-                    personas_nueva_reserva = cantidad
-                    if total_personas_reservadas + personas_nueva_reserva > max_personas:
-                        raise ValidationError({
-                            'detalles': f"No hay cupo suficiente en el paquete '{paquete.nombre}'. Cupo máximo: {max_personas}, reservados: {total_personas_reservadas}"
-                        })
-
-            # 🔍 DEBUG: Información recibida del frontend
-            print(f"🔍 RECIBIDO: total={validated_data.get('total')}, cantidad={cantidad}", file=sys.stderr)
-            
-            # LÓGICA AUTOMÁTICA: Detectar automáticamente si el servicio pertenece a un paquete
-            # y usar el precio más apropiado basado en el contexto del negocio
-            precio_real = servicio_obj.costo  # Default: precio del servicio individual
-            
-            # DETECCIÓN AUTOMÁTICA: Buscar si este servicio pertenece a algún paquete
-            # y si el total enviado por el frontend coincide con el precio del paquete
-            paquetes_contenedores = Paquete.objects.filter(servicios=servicio_obj)
-            
-            if paquetes_contenedores.exists():
-                # El servicio pertenece a uno o más paquetes
-                # Verificar si el total enviado coincide con algún precio de paquete
-                total_frontend = validated_data.get('total', Decimal('0'))
-                
-                print(f"🔍 VERIFICACIÓN: Total frontend {total_frontend}, cantidad {cantidad}", file=sys.stderr)
-                print(f"🔍 PAQUETES DISPONIBLES: {[f'{p.nombre}: ${p.precio}' for p in paquetes_contenedores]}", file=sys.stderr)
-                
-                for paquete_contenedor in paquetes_contenedores:
-                    precio_paquete = Decimal(str(paquete_contenedor.precio))
-                    
-                    # LÓGICA CORREGIDA: El frontend puede enviar el total de dos formas:
-                    # 1. Total = precio_paquete × cantidad (paquete por persona)
-                    # 2. Total = precio_paquete (paquete total para todas las personas)
-                    
-                    precio_por_persona = total_frontend / cantidad if cantidad > 0 else total_frontend
-                    print(f"🔍 COMPARANDO: Total ${total_frontend} para {cantidad} personas", file=sys.stderr)
-                    print(f"🔍 OPCIÓN A - Precio por persona: ${precio_por_persona} vs Precio paquete: ${precio_paquete}", file=sys.stderr)
-                    print(f"🔍 OPCIÓN B - Total: ${total_frontend} vs Precio paquete: ${precio_paquete}", file=sys.stderr)
-                    
-                    # Caso 1: Total coincide con precio del paquete (paquete total compartido)
-                    if abs(total_frontend - precio_paquete) < Decimal('0.01'):
-                        # El precio total coincide con el paquete, dividir entre personas
-                        precio_real = precio_por_persona  # Total / cantidad personas
-                        print(f'🔍 ✅ DETECCIÓN AUTOMÁTICA (paquete total) - "{paquete_contenedor.nombre}" ${precio_paquete} total para {cantidad} personas = ${precio_real} por persona', file=sys.stderr)
-                        break
-                    # Caso 2: Precio por persona coincide con precio del paquete (paquete por persona)
-                    elif abs(precio_por_persona - precio_paquete) < Decimal('0.01'):
-                        # El precio por persona coincide con el paquete, usar ese precio
-                        precio_real = precio_paquete  # Precio del paquete por persona
-                        print(f'🔍 ✅ DETECCIÓN AUTOMÁTICA (paquete por persona) - "{paquete_contenedor.nombre}" ${precio_paquete} por persona', file=sys.stderr)
-                        break
-                else:
-                    # Si no coincide con ningún paquete, usar precio del servicio
-                    print(f'🔍 ❌ Total frontend (${total_frontend}) no coincide con ningún paquete, usando precio de servicio: ${precio_real}', file=sys.stderr)
-            else:
-                print(f'🔍 ℹ️ Servicio no pertenece a ningún paquete, usando precio de servicio: ${precio_real}', file=sys.stderr)
-            
-            subtotal = Decimal(str(precio_real)) * cantidad
-            print(f"🔍 CALCULADO: {precio_real} × {cantidad} = {subtotal}", file=sys.stderr)
-            suma += subtotal
+            precio = catalogo.precio_linea(servicio_obj, cantidad, total_frontend)
+            logger.debug(
+                f"Precio servicio {servicio_obj.pk}: {precio.precio_unitario} x {cantidad} "
+                f"(regla {precio.regla}, paquete {precio.paquete_id}, total frontend {total_frontend})"
+            )
+            suma += Decimal(str(precio.precio_unitario)) * cantidad
+            # fecha_servicio se acepta en el payload pero ReservaServicio no la guarda
             detalles_para_crear.append({
                 'servicio': servicio_obj,
                 'cantidad': cantidad,
-                'precio_unitario': precio_real,
-                'fecha_servicio': fecha_servicio,
+                'precio_unitario': precio.precio_unitario,
             })
 
         # Sobrescribir total con la suma calculada
         validated_data['total'] = suma
 
-        # Crear la reserva
+        # VALIDACIÓN DE CUPO: el ledger diario bloquea las filas (paquete, día) y
+        # rechaza la reserva si supera max_personas del paquete
+        if validated_data.get('estado', 'PENDIENTE') in capacidad.ESTADOS_CON_CUPO:
+            lineas = {}
+            for detalle in detalles_para_crear:
+                servicio_id = detalle['servicio'].pk
+                lineas[servicio_id] = lineas.get(servicio_id, 0) + detalle['cantidad']
+            capacidad.reservar_cupos(validated_data['fecha_inicio'], lineas, catalogo.paquetes_por_servicio(lineas))
+
+        # Crear la reserva; sin fecha de fin explícita termina el mismo día (igual que la carga masiva)
+        validated_data.setdefault('fecha_fin', validated_data['fecha_inicio'])
         reserva = Reserva.objects.create(**validated_data)
 
         # Crear detalles con precio real
-        for detalle in detalles_para_crear:
-            ReservaServicio.objects.create(reserva=reserva, **detalle)
+        ReservaServicio.objects.bulk_create([
+            ReservaServicio(reserva=reserva, **detalle) for detalle in detalles_para_crear
+        ])
 
         # Procesar acompañantes si vienen en el payload
         # El formato aceptado por acompanantes será una lista de objetos con la forma:
         # { "acompanante": {..datos..} | <id>, "estado": "CONFIRMADO", "es_titular": true }
-        titular_count = 0
-
-        for rv in acompanantes:
-            # rv puede ser un dict que contenga 'acompanante' o directamente los campos del acompanante
-            v = rv.get('acompanante') if isinstance(rv, dict) and 'acompanante' in rv else rv
-            estado = rv.get('estado') if isinstance(rv, dict) else None
-            es_titular = rv.get('es_titular', False) if isinstance(rv, dict) else False
-
-            acompanante_obj = None
-            # v puede ser instancia de Acompanante, un pk (int) o dict con datos
-            if isinstance(v, AcompananteModel):
-                acompanante_obj = v
-            elif isinstance(v, int):
-                acompanante_obj = AcompananteModel.objects.get(pk=v)
-            elif isinstance(v, dict):
-                # Validar campos requeridos antes de crear
-                documento = v.get('documento')
-                nombre = v.get('nombre')
-                apellido = v.get('apellido')
-                fecha_nacimiento = v.get('fecha_nacimiento')
-                # Normalizar fecha_nacimiento si viene como string
-                if isinstance(fecha_nacimiento, str):
-                    try:
-                         fecha_nacimiento = datetime.strptime(fecha_nacimiento, "%Y-%m-%d").date()
-                    except ValueError:
-                        raise ValidationError({
-                            "acompanantes": f"Formato de fecha inválido para '{fecha_nacimiento}'. Usa YYYY-MM-DD."
-                    })
-                # Si nos dan documento, intentar obtener; si no existe y faltan campos requeridos, lanzar error
-                if documento:
-                    acompanante_obj = AcompananteModel.objects.filter(documento=documento).first()
-                    if not acompanante_obj:
-                        # Para crear nuevo acompañante se requieren nombre, apellido y fecha_nacimiento
-                        missing = []
-                        if not nombre:
-                            missing.append('nombre')
-                        if not apellido:
-                            missing.append('apellido')
-                        if not fecha_nacimiento:
-                            missing.append('fecha_nacimiento')
-                        if missing:
-                            raise ValidationError({
-                                'acompanantes': f"Faltan campos para crear acompañante con documento '{documento}': {', '.join(missing)}"
-                            })
-                        acompanante_obj = AcompananteModel.objects.create(
-                            documento=documento,
-                            nombre=nombre,
-                            apellido=apellido,
-                            fecha_nacimiento=fecha_nacimiento,
-                            nacionalidad=v.get('nacionalidad'),
-                            email=v.get('email'),
-                            telefono=v.get('telefono'),
-                        )
-
+        # Se resuelven todos juntos: una consulta por ids, una por documentos y bulk_create
         if acompanantes:
-            for rv in acompanantes:
-                # Permitir ambos formatos: plano y anidado
-                datos = None
-                estado = None
-                es_titular = False
-                if isinstance(rv, dict):
-                    if 'acompanante' in rv and isinstance(rv['acompanante'], dict):
-                        datos = rv['acompanante']
-                        estado = rv.get('estado')
-                        es_titular = rv.get('es_titular', False)
-                    else:
-                        datos = rv
-                        estado = rv.get('estado')
-                        es_titular = rv.get('es_titular', False)
+            resolucion = ResolucionAcompanantes({reserva.pk: acompanantes})
+            if resolucion.errores:
+                raise ValidationError({"acompanantes": resolucion.errores[reserva.pk]})
+            entradas = resolucion.guardar()[reserva.pk]
+            ReservaAcompanante.objects.bulk_create(asociaciones(reserva, entradas))
 
-                else:
-                    datos = rv
-
-                acompanante_obj = None
-                # datos puede ser instancia de Acompanante, un pk (int) o dict con datos
-                if isinstance(datos, AcompananteModel):
-                    acompanante_obj = datos
-                elif isinstance(datos, int):
-                    acompanante_obj = AcompananteModel.objects.get(pk=datos)
-                elif isinstance(datos, dict):
-                    # Si el dict tiene los campos de persona, usarlos siempre
-                    documento = datos.get('documento', '')
-                    nombre = datos.get('nombre', '')
-                    apellido = datos.get('apellido', '')
-                    fecha_nacimiento = datos.get('fecha_nacimiento', None)
-                    nacionalidad = datos.get('nacionalidad')
-                    email = datos.get('email')
-                    telefono = datos.get('telefono')
-
-                    # Validar todos los campos obligatorios antes de crear
-                    missing = []
-                    if not documento:
-                        missing.append('documento')
-                    if not nombre:
-                        missing.append('nombre')
-                    if not apellido:
-                        missing.append('apellido')
-                    if not fecha_nacimiento:
-                        missing.append('fecha_nacimiento')
-                    if missing:
-                        raise ValidationError({
-                            'acompanantes': f"Faltan campos obligatorios para crear acompañante: {', '.join(missing)}"
-                        })
-
-                    # Si nos dan documento, intentar obtener; si no existe, crear
-                    acompanante_obj = AcompananteModel.objects.filter(documento=documento).first()
-                    if not acompanante_obj:
-                        acompanante_obj = AcompananteModel.objects.create(
-                            documento=documento,
-                            nombre=nombre,
-                            apellido=apellido,
-                            fecha_nacimiento=fecha_nacimiento,
-                            nacionalidad=nacionalidad,
-                            email=email,
-                            telefono=telefono,
-                        )
-
-                if es_titular:
-                    titular_count += 1
-
-                ReservaAcompanante.objects.create(reserva=reserva, acompanante=acompanante_obj, estado=estado or 'CONFIRMADO', es_titular=es_titular)
-
-            if titular_count > 1:
-                raise ValidationError({"acompanantes": "Solo puede haber un titular por reserva."})
-
-        # 🔍 DEBUG: Información de respuesta final
-        print(f"🔍 RESPUESTA: total={reserva.total}, estado={reserva.estado}, pk={reserva.pk}", file=sys.stderr)
-        
         return reserva
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        from core.models import ReservaServicio, ReservaAcompanante, Acompanante as AcompananteModel
+        from core.models import ReservaServicio, ReservaAcompanante
+
+        # Ocupación antes de la edición: estado, fecha y cantidades pueden cambiarla
+        lineas_anteriores = capacidad.lineas_de_reserva(instance)
+        fecha_anterior = instance.fecha_inicio if capacidad.ocupa_cupo(instance) else None
 
         detalles = validated_data.pop('detalles', None)
         # Prefer validated nested data; if missing, use raw request payload (allows nested acompanante dicts)
@@ -355,7 +191,7 @@ class ReservaSerializer(serializers.ModelSerializer):
         # Si vienen detalles, sincronizarlos: crear/actualizar/eliminar
         if detalles is not None:
             # Mapear servicios existentes por id
-            existentes = {rs.servicio_id: rs for rs in instance.detalles.all()}
+            existentes = {rs.servicio_id: rs for rs in instance.servicios.all()}
             nuevos_servicios = set()
             suma = Decimal('0')
             for d in detalles:
@@ -382,7 +218,8 @@ class ReservaSerializer(serializers.ModelSerializer):
                     rs.fecha_servicio = fecha_servicio
                     rs.save()
                 else:
-                    ReservaServicio.objects.create(reserva=instance, servicio=servicio_obj, cantidad=cantidad, precio_unitario=precio_real, fecha_servicio=fecha_servicio)
+                    # fecha_servicio no es un campo de ReservaServicio (ver ReservaServicioSerializer)
+                    ReservaServicio.objects.create(reserva=instance, servicio=servicio_obj, cantidad=cantidad, precio_unitario=precio_real)
                 nuevos_servicios.add(servicio_id)
 
             # Eliminar los que quedaron en existentes
@@ -392,95 +229,45 @@ class ReservaSerializer(serializers.ModelSerializer):
             # Actualizar total con suma calculada
             instance.total = suma
 
+        # Mismo ledger que create/cancelar/reprogramar: libera lo anterior y
+        # ocupa lo nuevo; CupoInsuficiente revierte toda la edición
+        capacidad.actualizar_cupos(
+            fecha_anterior, lineas_anteriores,
+            instance.fecha_inicio if capacidad.ocupa_cupo(instance) else None,
+            capacidad.lineas_de_reserva(instance),
+        )
+
         # Procesar acompañantes: sincronizar asociaciones
         if acompanantes is not None:
+            resolucion = ResolucionAcompanantes({instance.pk: acompanantes}, requiere_documento=False)
+            if resolucion.errores:
+                raise ValidationError({"acompanantes": resolucion.errores[instance.pk]})
+            entradas = resolucion.guardar()[instance.pk]
+
             # Construir lista actual de acompanantes por id
             actuales = {ra.acompanante_id: ra for ra in instance.acompanantes.all()}
-            titular_count = 0
-            for rv in acompanantes:
-                v = rv.get('acompanante') if isinstance(rv, dict) and 'acompanante' in rv else rv
-                estado = rv.get('estado') if isinstance(rv, dict) else None
-                es_titular = rv.get('es_titular', False) if isinstance(rv, dict) else False
-
-                acompanante_obj = None
-                if isinstance(v, AcompananteModel):
-                    acompanante_obj = v
-                elif isinstance(v, int):
-                    acompanante_obj = AcompananteModel.objects.get(pk=v)
-                elif isinstance(v, dict):
-                    documento = v.get('documento')
-                    nombre = v.get('nombre')
-                    apellido = v.get('apellido')
-                    fecha_nacimiento = v.get('fecha_nacimiento')
-
-                    if documento:
-                        acompanante_obj = AcompananteModel.objects.filter(documento=documento).first()
-                        if not acompanante_obj:
-                            missing = []
-                            if not nombre:
-                                missing.append('nombre')
-                            if not apellido:
-                                missing.append('apellido')
-                            if not fecha_nacimiento:
-                                missing.append('fecha_nacimiento')
-                            if missing:
-                                raise ValidationError({
-                                    'acompanantes': f"Faltan campos para crear acompañante con documento '{documento}': {', '.join(missing)}"
-                                })
-                            acompanante_obj = AcompananteModel.objects.create(
-                                documento=documento,
-                                nombre=nombre,
-                                apellido=apellido,
-                                fecha_nacimiento=fecha_nacimiento,
-                                nacionalidad=v.get('nacionalidad'),
-                                email=v.get('email'),
-                                telefono=v.get('telefono'),
-                            )
-                    else:
-                        missing = []
-                        if not nombre:
-                            missing.append('nombre')
-                        if not apellido:
-                            missing.append('apellido')
-                        if not fecha_nacimiento:
-                            missing.append('fecha_nacimiento')
-                        if missing:
-                            raise ValidationError({'acompanantes': f"Faltan campos para crear acompañante: {', '.join(missing)}"})
-                        acompanante_obj = AcompananteModel.objects.create(
-                            documento=v.get('documento', ''),
-                            nombre=nombre,
-                            apellido=apellido,
-                            fecha_nacimiento=fecha_nacimiento,
-                            nacionalidad=v.get('nacionalidad'),
-                            email=v.get('email'),
-                            telefono=v.get('telefono'),
-                        )
-                else:
-                    # no se reconoce el formato, saltar
+            nuevas = []
+            vistos = set()
+            for entrada in entradas:
+                acompanante_id = entrada.acompanante.pk
+                if acompanante_id in vistos:
                     continue
-
-                # Ayuda a los analizadores estáticos a inferir el tipo
-                acompanante_obj = cast(Acompanante, acompanante_obj)
-
-                if es_titular:
-                    titular_count += 1
-
-                acompanante_id = getattr(acompanante_obj, 'pk', None)
+                vistos.add(acompanante_id)
                 if acompanante_id in actuales:
                     ra = actuales.pop(acompanante_id)
-                    ra.estado = estado or ra.estado
-                    ra.es_titular = es_titular
+                    ra.estado = entrada.estado or ra.estado
+                    ra.es_titular = entrada.es_titular
                     ra.save()
                 else:
-                    ReservaAcompanante.objects.create(reserva=instance, acompanante=acompanante_obj, estado=estado or 'CONFIRMADO', es_titular=es_titular)
+                    nuevas.append(ReservaAcompanante(
+                        reserva=instance, acompanante=entrada.acompanante,
+                        estado=entrada.estado or 'CONFIRMADO', es_titular=entrada.es_titular,
+                    ))
+            ReservaAcompanante.objects.bulk_create(nuevas)
 
             # Eliminar asociaciones que no vinieron en el payload
-            for rem in actuales.values():
-                rem.delete()
-                
-
-            if titular_count > 1:
-                raise ValidationError({"acompanantes": "Solo puede haber un titular por reserva."})
+            if actuales:
+                ReservaAcompanante.objects.filter(pk__in=[ra.pk for ra in actuales.values()]).delete()
 
         instance.save()
         return instance
@@ -525,79 +312,45 @@ class ReprogramacionReservaSerializer(serializers.Serializer):
         roles = []
         if request and hasattr(request, 'user'):
             user = request.user
-            if isinstance(user, Usuario) and hasattr(user, 'roles'):
-                roles = list(user.roles.values_list('nombre', flat=True))
+            roles = list(getattr(user, 'nombres_roles', ()))
         
+        foto = reglas.snapshot()
+        roles_con_all = roles + ['ALL']
+
         # Aplicar reglas dinámicas de tiempo mínimo
-        tiempo_minimo = None
-        for rol in roles + ['ALL']:
-            regla = ReglasReprogramacion.obtener_regla_activa('TIEMPO_MINIMO', rol)
-            if regla:
-                tiempo_minimo = regla.obtener_valor()
-                break
-        
+        regla = foto.primera('TIEMPO_MINIMO', roles_con_all)
         # Si no hay regla específica, usar 24 horas por defecto
-        if tiempo_minimo is None:
-            tiempo_minimo = 24
+        tiempo_minimo = regla.valor if regla else 24
         
         if isinstance(tiempo_minimo, (int, float)):
             tiempo_requerido = ahora + timedelta(hours=tiempo_minimo)
             if value <= tiempo_requerido:
-                regla_activa = ReglasReprogramacion.obtener_regla_activa('TIEMPO_MINIMO', roles[0] if roles else 'ALL')
-                mensaje = (regla_activa.mensaje_error if regla_activa and regla_activa.mensaje_error 
+                mensaje = (regla.mensaje_error if regla and regla.mensaje_error
                           else f"La reprogramación debe hacerse con al menos {tiempo_minimo} horas de anticipación.")
                 raise ValidationError(mensaje)
         
         # Aplicar reglas dinámicas de tiempo máximo
-        tiempo_maximo = None
-        for rol in roles + ['ALL']:
-            regla = ReglasReprogramacion.obtener_regla_activa('TIEMPO_MAXIMO', rol)
-            if regla:
-                tiempo_maximo = regla.obtener_valor()
-                break
-        
+        regla = foto.primera('TIEMPO_MAXIMO', roles_con_all)
         # Si no hay regla específica, usar 1 año por defecto
-        if tiempo_maximo is None:
-            tiempo_maximo = 365 * 24  # 1 año en horas
+        tiempo_maximo = regla.valor if regla else 365 * 24
         
         if isinstance(tiempo_maximo, (int, float)):
             tiempo_limite = ahora + timedelta(hours=tiempo_maximo)
             if value > tiempo_limite:
-                regla_activa = ReglasReprogramacion.obtener_regla_activa('TIEMPO_MAXIMO', roles[0] if roles else 'ALL')
-                mensaje = (regla_activa.mensaje_error if regla_activa and regla_activa.mensaje_error 
+                mensaje = (regla.mensaje_error if regla and regla.mensaje_error
                           else f"No se puede reprogramar más de {tiempo_maximo/24:.0f} días en el futuro.")
                 raise ValidationError(mensaje)
         
-        # Verificar días blackout
-        for rol in roles + ['ALL']:
-            regla = ReglasReprogramacion.obtener_regla_activa('DIAS_BLACKOUT', rol)
-            if regla:
-                try:
-                    dias_blackout = regla.obtener_valor()
-                    if isinstance(dias_blackout, list):
-                        dia_semana = value.weekday()  # 0=lunes, 6=domingo
-                        nombres_dias = ['lunes', 'martes', 'miercoles', 'jueves', 'viernes', 'sabado', 'domingo']
-                        if nombres_dias[dia_semana] in [d.lower() for d in dias_blackout]:
-                            mensaje = (regla.mensaje_error if regla.mensaje_error 
-                                     else f"No se puede reprogramar en {nombres_dias[dia_semana]}.")
-                            raise ValidationError(mensaje)
-                except:
-                    pass
+        # Verificar días blackout (conjunto de weekday(), 0=lunes)
+        # Como el resto de reglas: gana la del primer rol que tenga una (igual que ValidadorReprogramacionDinamico)
+        regla = foto.primera('DIAS_BLACKOUT', roles_con_all)
+        if regla and value.weekday() in regla.valor:
+            raise ValidationError(regla.mensaje_error or f"No se puede reprogramar en {reglas.DIAS_SEMANA[value.weekday()]}.")
         
         # Verificar horas blackout
-        for rol in roles + ['ALL']:
-            regla = ReglasReprogramacion.obtener_regla_activa('HORAS_BLACKOUT', rol)
-            if regla:
-                try:
-                    horas_blackout = regla.obtener_valor()
-                    if isinstance(horas_blackout, list):
-                        hora_nueva = value.hour
-                        if hora_nueva in horas_blackout:
-                            mensaje = (regla.mensaje_error if regla.mensaje_error 
-                                     else f"No se puede reprogramar a las {hora_nueva}:00 horas.")
-                            raise ValidationError(mensaje)
-                except:
-                    pass
+        regla = foto.primera('HORAS_BLACKOUT', roles_con_all)
+        if regla and value.hour in regla.valor:
+            raise ValidationError(regla.mensaje_error or f"No se puede reprogramar a las {value.hour}:00 horas.")
         
         return value
     
@@ -615,25 +368,19 @@ class ReprogramacionReservaSerializer(serializers.Serializer):
             roles = []
             if request and hasattr(request, 'user'):
                 user = request.user
-                if isinstance(user, Usuario) and hasattr(user, 'roles'):
-                    roles = list(user.roles.values_list('nombre', flat=True))
+                roles = list(getattr(user, 'nombres_roles', ()))
             
+            foto = reglas.snapshot()
+            roles_con_all = roles + ['ALL']
+
             # Aplicar límite dinámico de reprogramaciones
-            limite_reprogramaciones = None
-            for rol in roles + ['ALL']:
-                regla = ReglasReprogramacion.obtener_regla_activa('LIMITE_REPROGRAMACIONES', rol)
-                if regla:
-                    limite_reprogramaciones = regla.obtener_valor()
-                    break
-            
+            regla = foto.primera('LIMITE_REPROGRAMACIONES', roles_con_all)
             # Si no hay regla específica, usar 3 por defecto
-            if limite_reprogramaciones is None:
-                limite_reprogramaciones = 3
+            limite_reprogramaciones = regla.valor if regla else 3
             
             if isinstance(limite_reprogramaciones, (int, float)):
                 if reserva.numero_reprogramaciones >= int(limite_reprogramaciones):
-                    regla_activa = ReglasReprogramacion.obtener_regla_activa('LIMITE_REPROGRAMACIONES', roles[0] if roles else 'ALL')
-                    mensaje = (regla_activa.mensaje_error if regla_activa and regla_activa.mensaje_error 
+                    mensaje = (regla.mensaje_error if regla and regla.mensaje_error
                               else f"Esta reserva ya ha sido reprogramada el máximo número de veces permitido ({limite_reprogramaciones}).")
                     raise ValidationError(mensaje)
             
@@ -644,24 +391,21 @@ class ReprogramacionReservaSerializer(serializers.Serializer):
                     raise ValidationError("La nueva fecha debe ser diferente a la fecha actual.")
             
             # Verificar servicios restringidos
-            for rol in roles + ['ALL']:
-                regla = ReglasReprogramacion.obtener_regla_activa('SERVICIOS_RESTRINGIDOS', rol)
-                if regla:
-                    try:
-                        servicios_restringidos = regla.obtener_valor()
-                        if isinstance(servicios_restringidos, list):
-                            servicios_reserva = list(reserva.detalles.values_list('servicio__titulo', flat=True))
-                            for servicio in servicios_reserva:
-                                if servicio in servicios_restringidos:
-                                    mensaje = (regla.mensaje_error if regla.mensaje_error 
-                                             else f"El servicio '{servicio}' tiene restricciones para reprogramar.")
-                                    raise ValidationError(mensaje)
-                    except:
-                        pass
+            regla = foto.primera('SERVICIOS_RESTRINGIDOS', roles_con_all)
+            if regla and regla.valor:
+                for servicio in reserva.servicios.values_list('servicio__titulo', flat=True):
+                    if servicio in regla.valor:
+                        raise ValidationError(regla.mensaje_error or f"El servicio '{servicio}' tiene restricciones para reprogramar.")
         
         return attrs
 
 
+class SugerenciaFechasSerializer(serializers.Serializer):
+    """Parámetros de GET /api/reservas/{id}/sugerir-fechas/."""
+    fecha = serializers.DateTimeField(required=False, help_text="Fecha deseada; por defecto la fecha actual de la reserva")
+    cantidad = serializers.IntegerField(required=False, default=5, min_value=1, max_value=20)
+
+
 class ReservaConHistorialSerializer(ReservaSerializer):
     """Extiende ReservaSerializer para incluir información de reprogramaciones"""
     historial_reprogramaciones = HistorialReprogramacionSerializer(many=True, read_only=True)
@@ -727,9 +471,8 @@ class ReglasReprogramacionSerializer(serializers.ModelSerializer):
             return True
         
         user = request.user
-        if isinstance(user, Usuario) and hasattr(user, 'roles'):
-            roles = list(user.roles.values_list('nombre', flat=True))
-            for rol in roles:
+        if hasattr(user, 'nombres_roles'):
+            for rol in user.nombres_roles:
                 if obj.es_aplicable_a_rol(rol):
                     return True
         return False
@@ -848,7 +591,7 @@ class ValidadorReglasSerializer(serializers.Serializer):
     
     def validate(self, attrs):
         """Aplica todas las reglas activas y retorna errores si las viola."""
-        from core.models import Reserva, ReglasReprogramacion
+        from core.models import Reserva
         
         reserva_id = attrs.get('reserva_id')
         nueva_fecha = attrs.get('nueva_fecha')
@@ -865,70 +608,43 @@ class ValidadorReglasSerializer(serializers.Serializer):
             raise ValidationError('Usuario no autenticado.')
         
         user = request.user
-        roles = []
-        if isinstance(user, Usuario) and hasattr(user, 'roles'):
-            roles = list(user.roles.values_list('nombre', flat=True))
+        roles = list(getattr(user, 'nombres_roles', ()))
         
         errores = []
+        foto = reglas.snapshot()
+        hasta_fecha = (nueva_fecha - timezone.now()).total_seconds()
         
         # Aplicar cada tipo de regla
         for rol in roles + ['ALL']:
             # Tiempo mínimo de anticipación
-            regla = ReglasReprogramacion.obtener_regla_activa('TIEMPO_MINIMO', rol)
-            if regla:
-                horas_minimas = regla.obtener_valor()
-                if horas_minimas is not None and isinstance(horas_minimas, (int, float)):
-                    tiempo_anticipacion = nueva_fecha - timezone.now()
-                    if tiempo_anticipacion.total_seconds() < (horas_minimas * 3600):
-                        errores.append(regla.mensaje_error or 
-                                     f"Debe reprogramar con al menos {horas_minimas} horas de anticipación.")
+            regla = foto.regla('TIEMPO_MINIMO', rol)
+            if regla and regla.es_numerica() and hasta_fecha < regla.valor * 3600:
+                errores.append(regla.mensaje_error or
+                             f"Debe reprogramar con al menos {regla.valor} horas de anticipación.")
             
             # Tiempo máximo para reprogramar
-            regla = ReglasReprogramacion.obtener_regla_activa('TIEMPO_MAXIMO', rol)
-            if regla:
-                horas_maximas = regla.obtener_valor()
-                if horas_maximas is not None and isinstance(horas_maximas, (int, float)):
-                    tiempo_hasta_fecha = nueva_fecha - timezone.now()
-                    if tiempo_hasta_fecha.total_seconds() > (horas_maximas * 3600):
-                        errores.append(regla.mensaje_error or 
-                                     f"No puede reprogramar con más de {horas_maximas} horas de anticipación.")
+            regla = foto.regla('TIEMPO_MAXIMO', rol)
+            if regla and regla.es_numerica() and hasta_fecha > regla.valor * 3600:
+                errores.append(regla.mensaje_error or
+                             f"No puede reprogramar con más de {regla.valor} horas de anticipación.")
             
             # Límite de reprogramaciones
-            regla = ReglasReprogramacion.obtener_regla_activa('LIMITE_REPROGRAMACIONES', rol)
-            if regla:
-                limite = regla.obtener_valor()
-                if limite is not None and isinstance(limite, (int, float)):
-                    if reserva.numero_reprogramaciones >= int(limite):
-                        errores.append(regla.mensaje_error or 
-                                     f"Ha alcanzado el límite de {limite} reprogramaciones para esta reserva.")
+            regla = foto.regla('LIMITE_REPROGRAMACIONES', rol)
+            if regla and regla.es_numerica() and reserva.numero_reprogramaciones >= int(regla.valor):
+                errores.append(regla.mensaje_error or
+                             f"Ha alcanzado el límite de {regla.valor} reprogramaciones para esta reserva.")
             
             # Días blackout
-            regla = ReglasReprogramacion.obtener_regla_activa('DIAS_BLACKOUT', rol)
-            if regla:
-                try:
-                    import json
-                    dias_blackout = regla.obtener_valor()
-                    if isinstance(dias_blackout, list):
-                        dia_semana = nueva_fecha.weekday()  # 0=lunes, 6=domingo
-                        nombres_dias = ['lunes', 'martes', 'miercoles', 'jueves', 'viernes', 'sabado', 'domingo']
-                        if nombres_dias[dia_semana] in [d.lower() for d in dias_blackout]:
-                            errores.append(regla.mensaje_error or 
-                                         f"No se puede reprogramar en {nombres_dias[dia_semana]}.")
-                except:
-                    pass
+            regla = foto.regla('DIAS_BLACKOUT', rol)
+            if regla and nueva_fecha.weekday() in regla.valor:
+                errores.append(regla.mensaje_error or
+                             f"No se puede reprogramar en {reglas.DIAS_SEMANA[nueva_fecha.weekday()]}.")
             
             # Horas blackout
-            regla = ReglasReprogramacion.obtener_regla_activa('HORAS_BLACKOUT', rol)
-            if regla:
-                try:
-                    horas_blackout = regla.obtener_valor()
-                    if isinstance(horas_blackout, list):
-                        hora_nueva = nueva_fecha.hour
-                        if hora_nueva in horas_blackout:
-                            errores.append(regla.mensaje_error or 
-                                         f"No se puede reprogramar a las {hora_nueva}:00 horas.")
-                except:
-                    pass
+            regla = foto.regla('HORAS_BLACKOUT', rol)
+            if regla and nueva_fecha.hour in regla.valor:
+                errores.append(regla.mensaje_error or
+                             f"No se puede reprogramar a las {nueva_fecha.hour}:00 horas.")
         
         if errores:
             raise ValidationError({'reglas_violadas': errores})
@@ -948,23 +664,23 @@ class ResumenReglasSerializer(serializers.Serializer):
         
         if request and hasattr(request, 'user'):
             user = request.user
-            if isinstance(user, Usuario) and hasattr(user, 'roles'):
-                roles.extend(list(user.roles.values_list('nombre', flat=True)))
+            roles.extend(getattr(user, 'nombres_roles', ()))
         
         resumen = {}
+        foto = reglas.snapshot()
         
         for tipo_regla, descripcion in ReglasReprogramacion.TIPOS_REGLA:
-            for rol in roles:
-                regla = ReglasReprogramacion.obtener_regla_activa(tipo_regla, rol)
-                if regla and tipo_regla not in resumen:
-                    resumen[tipo_regla] = {
-                        'descripcion': descripcion,
-                        'valor': regla.obtener_valor(),
-                        'aplicable_a': regla.aplicable_a,
-                        'mensaje': regla.mensaje_error or f"Regla: {descripcion}",
-                        'activa_desde': regla.fecha_inicio_vigencia,
-                        'activa_hasta': regla.fecha_fin_vigencia,
-                    }
+            compilada = foto.primera(tipo_regla, roles)
+            if compilada:
+                regla = compilada.regla
+                resumen[tipo_regla] = {
+                    'descripcion': descripcion,
+                    'valor': regla.obtener_valor(),
+                    'aplicable_a': regla.aplicable_a,
+                    'mensaje': regla.mensaje_error or f"Regla: {descripcion}",
+                    'activa_desde': regla.fecha_inicio_vigencia,
+                    'activa_hasta': regla.fecha_fin_vigencia,
+                }
         
         return {
             'reglas_activas': resumen,
@@ -0,0 +1,92 @@
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from core.models import Paquete, Servicio, CupoDiario, Reserva, ReservaServicio, ReglasReprogramacion, ConfiguracionGlobalReprogramacion
+from . import capacidad, disponibilidad, precios, reglas
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Paquete)
+def actualizar_capacidad_cupos(sender, instance, created, **kwargs):
+    """Propaga cambios de max_personas a los cupos futuros del ledger."""
+    if created:
+        return
+    actualizados = CupoDiario.objects.filter(
+        paquete=instance,
+        fecha__gte=timezone.localdate()
+    ).exclude(capacidad=instance.max_personas).update(capacidad=instance.max_personas)
+    if actualizados:
+        logger.info(f"Capacidad de {actualizados} cupos actualizada para paquete {instance.pk}")
+
+
+@receiver(post_save, sender=Paquete)
+@receiver(post_delete, sender=Paquete)
+@receiver(post_save, sender=Servicio)
+@receiver(post_delete, sender=Servicio)
+@receiver(m2m_changed, sender=Paquete.servicios.through)
+def invalidar_catalogo_precios(sender, **kwargs):
+    """Cualquier cambio de precios o de servicios de un paquete invalida el catálogo en memoria."""
+    precios.invalidar()
+
+
+@receiver(post_save, sender=ReglasReprogramacion)
+@receiver(post_delete, sender=ReglasReprogramacion)
+@receiver(post_save, sender=ConfiguracionGlobalReprogramacion)
+@receiver(post_delete, sender=ConfiguracionGlobalReprogramacion)
+def invalidar_reglas_compiladas(sender, **kwargs):
+    """Cambios en reglas o configuración global invalidan la foto compilada."""
+    reglas.invalidar()
+
+
+@receiver(post_save, sender=Paquete)
+@receiver(m2m_changed, sender=Paquete.servicios.through)
+def invalidar_calendario_paquete(sender, instance, **kwargs):
+    """Capacidad, fechas o servicios del paquete cambiaron: se descartan todos sus meses."""
+    if not kwargs.get('action', 'post_').startswith('post_'):
+        return
+    paquete_ids = [instance.pk] if isinstance(instance, Paquete) else kwargs.get('pk_set') or []
+    for paquete_id in paquete_ids:
+        disponibilidad.invalidar_paquete(paquete_id)
+
+
+@receiver(pre_save, sender=Reserva)
+def recordar_fecha_reserva(sender, instance, **kwargs):
+    """Guarda la fecha_inicio anterior para invalidar también el mes que la reserva deja."""
+    if instance._state.adding or instance.pk is None:
+        return
+    instance._fecha_inicio_anterior = Reserva.objects.filter(pk=instance.pk).values_list(
+        'fecha_inicio', flat=True
+    ).first()
+
+
+@receiver(post_save, sender=Reserva)
+def invalidar_calendario_reserva(sender, instance, **kwargs):
+    """
+    Un cambio de la reserva (estado, fecha) invalida el mes de su fecha actual y
+    el de la anterior en los paquetes que incluye.
+    """
+    anterior = instance.__dict__.pop('_fecha_inicio_anterior', None)
+    if kwargs.get('created'):
+        return
+    dias = [capacidad.a_fecha(f) for f in (anterior, instance.fecha_inicio) if f]
+    if not dias:
+        return
+    servicio_ids = instance.servicios.values_list('servicio_id', flat=True)
+    paquete_ids = {
+        paquete_id
+        for ids in precios.catalogo().paquetes_por_servicio(servicio_ids).values()
+        for paquete_id in ids
+    }
+    disponibilidad.invalidar_dias(paquete_ids, dias)
+
+
+@receiver(post_save, sender=ReservaServicio)
+@receiver(post_delete, sender=ReservaServicio)
+def invalidar_calendario_linea(sender, instance, **kwargs):
+    """Líneas creadas o borradas fuera del ledger (admin, scripts) también invalidan el mes."""
+    fecha_inicio = Reserva.objects.filter(pk=instance.reserva_id).values_list('fecha_inicio', flat=True).first()
+    if fecha_inicio:
+        paquete_ids = precios.catalogo().paquetes_por_servicio([instance.servicio_id]).get(instance.servicio_id, [])
+        disponibilidad.invalidar_dias(paquete_ids, [capacidad.a_fecha(fecha_inicio)])
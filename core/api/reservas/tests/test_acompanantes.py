@@ -0,0 +1,114 @@
+from datetime import date
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+
+from authz.models import Usuario
+from core.api.reservas.acompanantes import ResolucionAcompanantes
+from core.models import Acompanante
+
+
+def persona(documento, nombre='Ana'):
+    return {'documento': documento, 'nombre': nombre, 'apellido': 'Pérez', 'fecha_nacimiento': '1990-01-01'}
+
+
+class ResolucionAcompanantesTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.existente = Acompanante.objects.create(
+            nombres='Luis', apellidos='Rojas', documento='100', fecha_nacimiento=date(1985, 5, 5),
+        )
+
+    def grupos(self, cantidad, prefijo):
+        return {
+            indice: [persona(f'{prefijo}{indice}-{n}') for n in range(3)] + [{'nombre': 'Sin', 'apellido': 'Doc', 'fecha_nacimiento': '2000-01-01'}]
+            for indice in range(cantidad)
+        }
+
+    def resolver(self, grupos):
+        resolucion = ResolucionAcompanantes(grupos, requiere_documento=False)
+        return resolucion, resolucion.guardar()
+
+    def test_consultas_constantes_sin_importar_el_tamano(self):
+        # lectura por documento, alta con documento, relectura, alta sin documento
+        with self.assertNumQueries(4):
+            self.resolver(self.grupos(2, 'A'))
+        with self.assertNumQueries(4):
+            self.resolver(self.grupos(10, 'B'))
+
+        grupos = self.grupos(5, 'C')
+        grupos[0].append(self.existente.pk)
+        with self.assertNumQueries(5):
+            # más la lectura por id
+            self.resolver(grupos)
+
+    def test_reutiliza_existentes_por_documento_y_por_id(self):
+        grupos = {
+            'a': [persona('100', nombre='Otro nombre'), persona('200')],
+            'b': [self.existente.pk, persona('200')],
+        }
+        resolucion, entradas = self.resolver(grupos)
+
+        self.assertEqual(resolucion.errores, {})
+        self.assertEqual(entradas['a'][0].acompanante.pk, self.existente.pk)
+        self.assertEqual(entradas['b'][0].acompanante.pk, self.existente.pk)
+        # El mismo documento en dos grupos termina en una sola fila
+        self.assertEqual(entradas['a'][1].acompanante.pk, entradas['b'][1].acompanante.pk)
+        self.assertEqual(Acompanante.objects.filter(documento='200').count(), 1)
+        self.assertEqual(Acompanante.objects.get(pk=self.existente.pk).nombres, 'Luis')
+
+    def test_errores_por_grupo(self):
+        resolucion = ResolucionAcompanantes({
+            'id_inexistente': [999999],
+            'incompleto': [{'documento': '300', 'nombre': 'X'}],
+            'dos_titulares': [dict(persona('400'), es_titular=True), dict(persona('401'), es_titular=True)],
+            'valido': [persona('500')],
+        })
+
+        self.assertEqual(set(resolucion.errores), {'id_inexistente', 'incompleto', 'dos_titulares'})
+        self.assertEqual(list(resolucion.guardar()), ['valido'])
+        self.assertFalse(Acompanante.objects.filter(documento__in=['300', '400', '401']).exists())
+
+
+class MigracionDocumentoUnicoTest(TransactionTestCase):
+    antes = [('core', '0002_cupodiario')]
+    despues = [('core', '0003_acompanante_documento_unico')]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.antes)
+        self.apps = executor.loader.project_state(self.antes).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_fusiona_duplicados_y_reasigna_sus_reservas(self):
+        Reserva = self.apps.get_model('core', 'Reserva')
+        Acompanante = self.apps.get_model('core', 'Acompanante')
+        ReservaAcompanante = self.apps.get_model('core', 'ReservaAcompanante')
+
+        usuario = Usuario.objects.create(email='mig@test.com', nombres='M', apellidos='T')
+        fecha = '2030-01-01T10:00:00Z'
+        r1, r2, r3 = (Reserva.objects.create(usuario_id=usuario.pk, fecha_inicio=fecha, fecha_fin=fecha) for _ in range(3))
+        viejo = Acompanante.objects.create(nombres='Ana', apellidos='P', documento='777')
+        nuevo = Acompanante.objects.create(nombres='Ana', apellidos='P', documento='777', email='ana@test.com')
+        otro = Acompanante.objects.create(nombres='Ana', apellidos='P', documento='777')
+        ReservaAcompanante.objects.create(reserva=r1, acompanante=viejo)
+        ReservaAcompanante.objects.create(reserva=r1, acompanante=nuevo, es_titular=True)
+        ReservaAcompanante.objects.create(reserva=r2, acompanante=nuevo)
+        ReservaAcompanante.objects.create(reserva=r3, acompanante=otro)
+
+        with self.assertLogs('core.migrations', level='WARNING') as registros:
+            MigrationExecutor(connection).migrate(self.despues)
+
+        self.assertIn('777', registros.output[0])
+        Acompanante = MigrationExecutor(connection).loader.project_state(self.despues).apps.get_model('core', 'Acompanante')
+        conservado = Acompanante.objects.get(documento='777')
+        self.assertEqual(conservado.pk, viejo.pk)
+        self.assertEqual(conservado.email, 'ana@test.com')
+        filas = sorted(ReservaAcompanante.objects.values_list('reserva_id', 'acompanante_id', 'es_titular'))
+        self.assertEqual(filas, [(r1.pk, viejo.pk, True), (r2.pk, viejo.pk, False), (r3.pk, viejo.pk, False)])
@@ -0,0 +1,138 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from authz.models import Rol, Usuario
+from core.api.reservas import capacidad
+from core.models import Acompanante, Categoria, CupoDiario, Paquete, Reserva, ReservaAcompanante, ReservaServicio, Servicio
+
+URL = '/api/reservas/bulk/'
+
+
+class CargaMasivaReservasTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        categoria = Categoria.objects.create(nombre='Aventura')
+        cls.servicio = Servicio.objects.create(titulo='Trekking', tipo='TOUR', costo=Decimal('100'), categoria=categoria)
+        cls.paquete = Paquete.objects.create(
+            nombre='Salar', ubicacion='Uyuni', descripcion_corta='-', descripcion_completa='-',
+            calificacion=Decimal('4.5'), numero_reseñas=0, precio='100', precio_original='100',
+            duracion='1 día', max_personas=3, dificultad='Media', imagenes=[], categoria=categoria,
+            incluido=[], no_incluido=[], fechas_disponibles=[],
+        )
+        cls.paquete.servicios.add(cls.servicio)
+        cls.admin = Usuario.objects.create(email='admin@test.com', nombres='A', apellidos='B')
+        cls.admin.roles.add(Rol.objects.get_or_create(nombre='ADMIN')[0])
+        cls.cliente = Usuario.objects.create(email='cliente@test.com', nombres='C', apellidos='D')
+        cls.cliente.roles.add(Rol.objects.get_or_create(nombre='CLIENTE')[0])
+        cls.dia = timezone.now() + timedelta(days=10)
+
+    def enviar(self, reservas, atomico=True, usuario=None):
+        cliente = APIClient(SERVER_NAME='localhost')
+        cliente.force_authenticate(usuario or self.admin)
+        return cliente.post(URL, {'reservas': reservas, 'atomico': atomico}, format='json')
+
+    def item(self, cantidad=1, servicio=None, **extra):
+        return {
+            'fecha_inicio': self.dia.isoformat(),
+            'detalles': [{'servicio': servicio or self.servicio.pk, 'cantidad': cantidad}],
+            **extra,
+        }
+
+    def reservados(self):
+        cupo = CupoDiario.objects.filter(paquete=self.paquete, fecha=capacidad.a_fecha(self.dia)).first()
+        return cupo.reservados if cupo else 0
+
+    def test_lote_valido_201(self):
+        acompanante = {'documento': '123', 'nombre': 'Ana', 'apellido': 'P', 'fecha_nacimiento': '1990-01-01'}
+        respuesta = self.enviar([
+            self.item(acompanantes=[dict(acompanante, es_titular=True)]),
+            self.item(usuario=self.cliente.pk, acompanantes=[acompanante]),
+        ])
+
+        self.assertEqual(respuesta.status_code, 201, respuesta.content)
+        self.assertEqual((respuesta.data['creadas'], respuesta.data['fallidas']), (2, 0))
+        ids = [r['id'] for r in respuesta.data['resultados']]
+        self.assertEqual(Reserva.objects.get(pk=ids[1]).usuario, self.cliente)
+        self.assertEqual(Reserva.objects.get(pk=ids[0]).fecha_fin, Reserva.objects.get(pk=ids[0]).fecha_inicio)
+        self.assertEqual(ReservaServicio.objects.filter(reserva_id__in=ids).count(), 2)
+        # El mismo documento en dos reservas es una sola persona
+        self.assertEqual(Acompanante.objects.filter(documento='123').count(), 1)
+        self.assertEqual(ReservaAcompanante.objects.filter(reserva_id__in=ids).count(), 2)
+        self.assertEqual(self.reservados(), 2)
+
+    def test_atomico_con_un_error_no_guarda_nada_400(self):
+        respuesta = self.enviar([self.item(), self.item(servicio=999999)])
+
+        self.assertEqual(respuesta.status_code, 400, respuesta.content)
+        self.assertEqual(respuesta.data['creadas'], 0)
+        self.assertIn('no procesada', str(respuesta.data['resultados'][0]['errores']).lower())
+        self.assertIn('detalles', respuesta.data['resultados'][1]['errores'])
+        self.assertFalse(Reserva.objects.exists())
+        self.assertEqual(self.reservados(), 0)
+
+    def test_no_atomico_guarda_las_validas_207(self):
+        respuesta = self.enviar([self.item(), self.item(servicio=999999), {'detalles': []}], atomico=False)
+
+        self.assertEqual(respuesta.status_code, 207, respuesta.content)
+        self.assertEqual((respuesta.data['creadas'], respuesta.data['fallidas']), (1, 2))
+        self.assertEqual([r['ok'] for r in respuesta.data['resultados']], [True, False, False])
+        self.assertEqual(Reserva.objects.count(), 1)
+
+    def test_lote_vacio_o_invalido_400(self):
+        self.assertEqual(self.enviar([]).status_code, 400)
+        respuesta = self.enviar([{'detalles': []}], atomico=False)
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(respuesta.data['creadas'], 0)
+
+    def test_sin_cupo_atomico_revierte_el_lote(self):
+        respuesta = self.enviar([self.item(cantidad=2), self.item(cantidad=2)])
+
+        self.assertEqual(respuesta.status_code, 400, respuesta.content)
+        self.assertFalse(Reserva.objects.exists())
+        # Lo reservado por la primera también se revierte
+        self.assertEqual(self.reservados(), 0)
+
+    def test_sin_cupo_no_atomico_rechaza_solo_la_que_no_cabe(self):
+        respuesta = self.enviar([self.item(cantidad=2), self.item(cantidad=2), self.item(cantidad=1)], atomico=False)
+
+        self.assertEqual(respuesta.status_code, 207, respuesta.content)
+        self.assertEqual([r['ok'] for r in respuesta.data['resultados']], [True, False, True])
+        self.assertEqual(Reserva.objects.count(), 2)
+        self.assertEqual(self.reservados(), 3)
+
+    def test_canceladas_no_ocupan_cupo(self):
+        respuesta = self.enviar([self.item(cantidad=3), self.item(cantidad=3, estado='CANCELADA')])
+
+        self.assertEqual(respuesta.status_code, 201, respuesta.content)
+        self.assertEqual(self.reservados(), 3)
+
+    def test_cliente_siempre_reserva_a_su_nombre(self):
+        respuesta = self.enviar([self.item(usuario=self.admin.pk)], usuario=self.cliente)
+
+        self.assertEqual(respuesta.status_code, 201, respuesta.content)
+        self.assertEqual(Reserva.objects.get().usuario, self.cliente)
+
+    def test_consultas_no_crecen_con_el_lote(self):
+        """Todo se resuelve por tipo; solo el cupo se reserva reserva por reserva (para rechazarlas de a una)."""
+        self.paquete.max_personas = 100
+        self.paquete.save()
+
+        def consultas(cantidad, prefijo):
+            items = [
+                self.item(acompanantes=[{'documento': f'{prefijo}{n}', 'nombre': 'A', 'apellido': 'B', 'fecha_nacimiento': '1990-01-01'}])
+                for n in range(cantidad)
+            ]
+            with CaptureQueriesContext(connection) as capturadas:
+                self.assertEqual(self.enviar(items).status_code, 201)
+            por_reserva = ('core_cupodiario', 'core_selloversion', 'SAVEPOINT')
+            return len([q for q in capturadas.captured_queries if not any(t in q['sql'] for t in por_reserva)])
+
+        consultas(1, 'w')
+        self.assertEqual(consultas(2, 'x'), consultas(8, 'y'))
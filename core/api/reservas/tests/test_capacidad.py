@@ -0,0 +1,150 @@
+from datetime import timedelta
+from importlib import import_module
+from decimal import Decimal
+
+from django.apps import apps
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from authz.models import Rol, Usuario
+from core.api.reservas import capacidad, disponibilidad
+from core.models import Categoria, CupoDiario, Paquete, Reserva, ReservaServicio, Servicio
+
+
+class LedgerCuposTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        categoria = Categoria.objects.create(nombre='Aventura')
+        cls.servicio = Servicio.objects.create(titulo='Trekking', tipo='TOUR', costo=Decimal('100'), categoria=categoria)
+        cls.paquete = Paquete.objects.create(
+            nombre='Salar', ubicacion='Uyuni', descripcion_corta='-', descripcion_completa='-',
+            calificacion=Decimal('4.5'), numero_reseñas=0, precio='100', precio_original='100',
+            duracion='1 día', max_personas=3, dificultad='Media', imagenes=[], categoria=categoria,
+            incluido=[], no_incluido=[], fechas_disponibles=[],
+        )
+        cls.paquete.servicios.add(cls.servicio)
+        cls.admin = Usuario.objects.create(email='admin@test.com', nombres='A', apellidos='B')
+        cls.admin.roles.add(Rol.objects.get_or_create(nombre='ADMIN')[0])
+        cls.dia = timezone.now() + timedelta(days=10)
+
+    def reservados(self, fecha):
+        cupo = CupoDiario.objects.filter(paquete=self.paquete, fecha=capacidad.a_fecha(fecha)).first()
+        return cupo.reservados if cupo else 0
+
+    def crear_reserva(self, cantidad, fecha=None, estado='PENDIENTE'):
+        fecha = fecha or self.dia
+        capacidad.reservar_cupos(fecha, {self.servicio.pk: cantidad})
+        reserva = Reserva.objects.create(
+            usuario=self.admin, fecha_inicio=fecha, fecha_fin=fecha + timedelta(days=1), estado=estado,
+        )
+        ReservaServicio.objects.create(reserva=reserva, servicio=self.servicio, cantidad=cantidad)
+        return reserva
+
+    def cliente(self):
+        cliente = APIClient(SERVER_NAME='localhost')
+        cliente.force_authenticate(self.admin)
+        return cliente
+
+    def test_crear_por_la_api_ocupa_cupo_y_rechaza_el_exceso(self):
+        cliente_usuario = Usuario.objects.create(email='cliente@test.com', nombres='C', apellidos='D')
+        cliente_usuario.roles.add(Rol.objects.get_or_create(nombre='CLIENTE')[0])
+        cliente = APIClient(SERVER_NAME='localhost')
+        cliente.force_authenticate(cliente_usuario)
+        datos = {'fecha_inicio': self.dia.isoformat(), 'detalles': [{'servicio': self.servicio.pk, 'cantidad': 2}]}
+
+        respuesta = cliente.post('/api/reservas/', datos, format='json')
+        self.assertEqual(respuesta.status_code, 201, respuesta.content)
+        reserva = Reserva.objects.get(pk=respuesta.data['id'])
+        self.assertEqual(reserva.fecha_fin, reserva.fecha_inicio)
+        self.assertEqual(self.reservados(self.dia), 2)
+
+        respuesta = cliente.post('/api/reservas/', datos, format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(self.reservados(self.dia), 2)
+        self.assertEqual(Reserva.objects.count(), 1)
+
+    def test_update_condicionado_no_supera_la_capacidad(self):
+        capacidad.reservar_cupos(self.dia, {self.servicio.pk: 2})
+        with self.assertRaises(capacidad.CupoInsuficiente):
+            capacidad.reservar_cupos(self.dia, {self.servicio.pk: 2})
+        self.assertEqual(self.reservados(self.dia), 2)
+        capacidad.reservar_cupos(self.dia, {self.servicio.pk: 1})
+        self.assertEqual(self.reservados(self.dia), 3)
+
+    def test_mover_cupos_sin_cupo_revierte_la_resta(self):
+        otro_dia = self.dia + timedelta(days=1)
+        capacidad.reservar_cupos(self.dia, {self.servicio.pk: 2})
+        capacidad.reservar_cupos(otro_dia, {self.servicio.pk: 3})
+        with self.assertRaises(capacidad.CupoInsuficiente):
+            capacidad.mover_cupos(self.dia, otro_dia, {self.servicio.pk: 2})
+        self.assertEqual(self.reservados(self.dia), 2)
+        self.assertEqual(self.reservados(otro_dia), 3)
+
+    def test_cancelar_libera_el_cupo(self):
+        reserva = self.crear_reserva(2)
+        respuesta = self.cliente().post(f'/api/reservas/{reserva.pk}/cancelar/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(self.reservados(self.dia), 0)
+
+    def test_editar_estado_a_cancelada_libera_el_cupo(self):
+        reserva = self.crear_reserva(2)
+        respuesta = self.cliente().patch(f'/api/reservas/{reserva.pk}/', {'estado': 'CANCELADA'}, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(self.reservados(self.dia), 0)
+
+    def test_completar_no_libera_el_cupo(self):
+        reserva = self.crear_reserva(3)
+        respuesta = self.cliente().patch(f'/api/reservas/{reserva.pk}/', {'estado': 'COMPLETADA'}, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(self.reservados(self.dia), 3)
+        with self.assertRaises(capacidad.CupoInsuficiente):
+            capacidad.reservar_cupos(self.dia, {self.servicio.pk: 1})
+
+    def test_editar_fecha_mueve_el_cupo(self):
+        reserva = self.crear_reserva(2)
+        otro_dia = self.dia + timedelta(days=3)
+        respuesta = self.cliente().patch(f'/api/reservas/{reserva.pk}/', {'fecha_inicio': otro_dia.isoformat()}, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(self.reservados(self.dia), 0)
+        self.assertEqual(self.reservados(otro_dia), 2)
+
+    def test_editar_cantidades_sin_cupo_revierte_la_edicion(self):
+        reserva = self.crear_reserva(2)
+        respuesta = self.cliente().patch(
+            f'/api/reservas/{reserva.pk}/', {'detalles': [{'servicio': self.servicio.pk, 'cantidad': 4}]}, format='json'
+        )
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(self.reservados(self.dia), 2)
+        self.assertEqual(reserva.servicios.get().cantidad, 2)
+
+    def test_reconstruir_cuenta_las_reservas_existentes(self):
+        self.crear_reserva(2)
+        self.crear_reserva(1, estado='CANCELADA')
+        CupoDiario.objects.all().delete()
+        capacidad.reconstruir(timezone.localdate())
+        self.assertEqual(self.reservados(self.dia), 2)
+
+    def test_migracion_de_poblado_coincide_con_reconstruir(self):
+        self.crear_reserva(2)
+        self.crear_reserva(1, fecha=self.dia + timedelta(days=1), estado='COMPLETADA')
+        self.crear_reserva(1, estado='CANCELADA')
+        esperado = sorted(
+            ((c.fecha, c.paquete_id, c.servicio_id, c.capacidad, c.reservados)
+             for c in capacidad.reconstruir(timezone.localdate(), guardar=False)), key=str
+        )
+        CupoDiario.objects.all().delete()
+        import_module('core.migrations.0014_poblar_cupos').poblar(apps, None)
+        self.assertEqual(sorted(CupoDiario.objects.values_list(
+            'fecha', 'paquete_id', 'servicio_id', 'capacidad', 'reservados'
+        ), key=str), esperado)
+
+    def test_mover_la_reserva_invalida_el_mes_anterior_del_calendario(self):
+        reserva = self.crear_reserva(2)
+        dia = capacidad.a_fecha(self.dia)
+        self.assertEqual(disponibilidad.calendario(self.paquete, dia, dia)['dias'][0]['reservados'], 2)
+        # Cambio de fecha fuera del ledger (admin): el mes que deja también se invalida
+        reserva.fecha_inicio = self.dia + timedelta(days=45)
+        reserva.save()
+        self.assertEqual(disponibilidad.calendario(self.paquete, dia, dia)['dias'][0]['reservados'], 0)
@@ -0,0 +1,116 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from authz.models import Usuario
+from core.api.reservas import outbox
+from core.models import HistorialReprogramacion, OutboxEvento, Reserva
+
+PRUEBA = 'PRUEBA'
+
+
+def falla(payload):
+    raise outbox.EnvioFallido('smtp caído')
+
+
+class ProcesarOutboxTest(TestCase):
+
+    def evento(self, tipo=PRUEBA, **campos):
+        return OutboxEvento.objects.create(tipo=tipo, payload=campos.pop('payload', {}), **campos)
+
+    def test_reintento_con_espera_exponencial(self):
+        evento = self.evento()
+        with mock.patch.dict(outbox.MANEJADORES, {PRUEBA: falla}):
+            for intento, segundos in ((1, 30), (2, 60), (3, 120)):
+                antes = timezone.now()
+                self.assertFalse(outbox.procesar(evento))
+                evento.refresh_from_db()
+                self.assertEqual((evento.estado, evento.intentos), ('PENDIENTE', intento))
+                self.assertEqual(evento.ultimo_error, 'smtp caído')
+                self.assertAlmostEqual((evento.proximo_intento - antes).total_seconds(), segundos, delta=1)
+
+        self.assertEqual(outbox.espera(30), timedelta(seconds=outbox.ESPERA_MAXIMA))
+
+    def test_fallido_al_agotar_los_intentos(self):
+        evento = self.evento(intentos=outbox.MAX_INTENTOS - 1)
+        with mock.patch.dict(outbox.MANEJADORES, {PRUEBA: falla}):
+            self.assertFalse(outbox.procesar(evento))
+        evento.refresh_from_db()
+        self.assertEqual((evento.estado, evento.intentos), ('FALLIDO', outbox.MAX_INTENTOS))
+        # FALLIDO no se vuelve a tomar
+        self.assertEqual(outbox.reclamar(10), [])
+
+    def test_tipo_desconocido_falla_sin_reintentos(self):
+        evento = self.evento(tipo='NO_EXISTE')
+        self.assertFalse(outbox.procesar(evento))
+        evento.refresh_from_db()
+        self.assertEqual((evento.estado, evento.intentos), ('FALLIDO', 1))
+
+    def test_exito_despues_de_un_fallo(self):
+        evento = self.evento()
+        with mock.patch.dict(outbox.MANEJADORES, {PRUEBA: falla}):
+            outbox.procesar(evento)
+        with mock.patch.dict(outbox.MANEJADORES, {PRUEBA: lambda payload: None}):
+            self.assertTrue(outbox.procesar(evento))
+        evento.refresh_from_db()
+        self.assertEqual((evento.estado, evento.intentos, evento.ultimo_error), ('ENVIADO', 2, ''))
+        self.assertIsNotNone(evento.procesado_at)
+
+    def test_reclamar_bloquea_y_recupera_al_vencer_el_bloqueo(self):
+        vencido = self.evento()
+        self.evento(proximo_intento=timezone.now() + timedelta(minutes=5))
+
+        tomados = outbox.reclamar(10)
+        self.assertEqual([e.pk for e in tomados], [vencido.pk])
+        self.assertEqual(tomados[0].estado, 'PROCESANDO')
+        # Mientras dura el bloqueo nadie más lo toma
+        self.assertEqual(outbox.reclamar(10), [])
+
+        # El worker murió: al vencer el bloqueo el evento vuelve a estar disponible
+        OutboxEvento.objects.filter(pk=vencido.pk).update(proximo_intento=timezone.now() - timedelta(seconds=1))
+        self.assertEqual([e.pk for e in outbox.reclamar(10)], [vencido.pk])
+
+    def test_reclamar_respeta_el_limite_y_el_orden(self):
+        ahora = timezone.now()
+        ids = [self.evento(proximo_intento=ahora - timedelta(minutes=m)).pk for m in (1, 3, 2)]
+        self.assertEqual([e.pk for e in outbox.reclamar(2)], sorted([ids[1], ids[2]]))
+
+    def test_historial_marcado_cuando_salen_los_dos_avisos(self):
+        usuario = Usuario.objects.create(email='c@test.com', nombres='C', apellidos='D')
+        ahora = timezone.now()
+        reserva = Reserva.objects.create(usuario=usuario, fecha_inicio=ahora, fecha_fin=ahora)
+        historial = HistorialReprogramacion.objects.create(
+            reserva=reserva, fecha_anterior=ahora, fecha_nueva=ahora + timedelta(days=1), motivo='x',
+        )
+        cliente, soporte = outbox.encolar_reprogramacion(historial)
+
+        ok = lambda payload: None
+        with mock.patch.dict(outbox.MANEJADORES, {outbox.REPROGRAMACION_CLIENTE: ok, outbox.REPROGRAMACION_SOPORTE: falla}):
+            outbox.procesar(cliente)
+            outbox.procesar(soporte)
+        historial.refresh_from_db()
+        self.assertFalse(historial.notificacion_enviada)
+
+        with mock.patch.dict(outbox.MANEJADORES, {outbox.REPROGRAMACION_SOPORTE: ok}):
+            outbox.procesar(soporte)
+        historial.refresh_from_db()
+        self.assertTrue(historial.notificacion_enviada)
+
+
+class WorkerOutboxTest(TransactionTestCase):
+
+    def test_una_vez_vacia_lo_pendiente_y_termina(self):
+        enviados = [OutboxEvento.objects.create(tipo=PRUEBA).pk for _ in range(3)]
+        fallido = OutboxEvento.objects.create(tipo='NO_EXISTE').pk
+        salida = StringIO()
+
+        with mock.patch.dict(outbox.MANEJADORES, {PRUEBA: lambda payload: None}):
+            call_command('run_outbox_worker', '--una-vez', stdout=salida)
+
+        self.assertEqual(OutboxEvento.objects.filter(pk__in=enviados, estado='ENVIADO').count(), 3)
+        self.assertEqual(OutboxEvento.objects.get(pk=fallido).estado, 'FALLIDO')
+        self.assertIn('3 enviados, 1 con error', salida.getvalue())
@@ -0,0 +1,94 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from authz.models import Rol, Usuario
+from core.models import Acompanante, Reserva
+from core.paginacion import CursorPaginacion
+
+
+class PaginacionCursorTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create(email='admin@test.com', nombres='A', apellidos='B')
+        cls.admin.roles.add(Rol.objects.get_or_create(nombre='ADMIN')[0])
+        cls.base = timezone.now() - timedelta(days=1)
+
+    def setUp(self):
+        self.api = APIClient(SERVER_NAME='localhost')
+        self.api.force_authenticate(self.admin)
+
+    def reserva(self, minutos):
+        reserva = Reserva.objects.create(usuario=self.admin, fecha_inicio=self.base, fecha_fin=self.base)
+        # created_at es auto_now_add: se fija con update para controlar el orden
+        Reserva.objects.filter(pk=reserva.pk).update(created_at=self.base + timedelta(minutes=minutos))
+        return reserva.pk
+
+    def recorrer(self, url):
+        ids, paginas = [], 0
+        while url:
+            respuesta = self.api.get(url)
+            self.assertEqual(respuesta.status_code, 200, respuesta.content)
+            self.assertNotIn('count', respuesta.data)
+            ids += [fila['id'] for fila in respuesta.data['results']]
+            url = respuesta.data['next']
+            paginas += 1
+        return ids, paginas
+
+    def test_reservas_mas_recientes_primero_con_desempate_por_id(self):
+        # Orden de inserción distinto del de created_at; dos con la misma fecha
+        viejo, nuevo, empate_a, empate_b = self.reserva(1), self.reserva(30), self.reserva(10), self.reserva(10)
+
+        ids, paginas = self.recorrer('/api/reservas/?page_size=1')
+
+        self.assertEqual(ids, [nuevo, empate_b, empate_a, viejo])
+        self.assertEqual(paginas, 4)
+
+    def test_el_cursor_no_repite_ni_salta_filas_con_inserciones(self):
+        existentes = [self.reserva(minutos) for minutos in range(1, 6)]
+        primera = self.api.get('/api/reservas/?page_size=2')
+        vistos = [fila['id'] for fila in primera.data['results']]
+
+        # Entre página y página llegan reservas nuevas (más recientes que todo lo visto)
+        nuevas = [self.reserva(100 + n) for n in range(3)]
+        resto, _ = self.recorrer(primera.data['next'])
+
+        self.assertEqual(vistos + resto, existentes[::-1])
+        self.assertFalse(set(nuevas) & set(resto))
+        # Las nuevas aparecen al volver a la primera página
+        self.assertEqual(
+            [fila['id'] for fila in self.api.get('/api/reservas/?page_size=3').data['results']],
+            nuevas[::-1],
+        )
+
+    def test_page_size_respeta_el_maximo(self):
+        for minutos in range(3):
+            self.reserva(minutos)
+        self.assertEqual(len(self.api.get('/api/reservas/?page_size=2').data['results']), 2)
+        with mock.patch.object(CursorPaginacion, 'max_page_size', 1):
+            self.assertEqual(len(self.api.get('/api/reservas/?page_size=50').data['results']), 1)
+
+    def test_acompanantes_por_id_descendente(self):
+        ids = [
+            Acompanante.objects.create(nombres='N', apellidos='A', documento=str(n)).pk
+            for n in range(5)
+        ]
+        recorridos, paginas = self.recorrer('/api/acompanantes/?page_size=2')
+        self.assertEqual(recorridos, ids[::-1])
+        self.assertEqual(paginas, 3)
+
+    def test_usuarios_por_fecha_de_alta(self):
+        otros = []
+        for n in range(3):
+            usuario = Usuario.objects.create(email=f'u{n}@test.com', nombres='U', apellidos=str(n))
+            Usuario.objects.filter(pk=usuario.pk).update(date_joined=self.base + timedelta(minutes=n))
+            otros.append(usuario.pk)
+        Usuario.objects.filter(pk=self.admin.pk).update(date_joined=self.base - timedelta(days=1))
+
+        ids, _ = self.recorrer('/api/usuarios/?page_size=2')
+
+        self.assertEqual(ids, otros[::-1] + [self.admin.pk])
@@ -0,0 +1,82 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from authz.models import Rol, Usuario
+from core.api.reservas.validators import GeneradorRecomendaciones, ValidadorReprogramacionDinamico
+from core.models import Categoria, Reserva, ReservaServicio, Servicio
+
+
+class RecomendacionesTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        categoria = Categoria.objects.create(nombre='Aventura')
+        cls.servicio = Servicio.objects.create(titulo='Trekking', tipo='TOUR', costo=Decimal('100'), categoria=categoria)
+        otro = Servicio.objects.create(titulo='Museo', tipo='TOUR', costo=Decimal('50'), categoria=categoria)
+        cls.usuario = Usuario.objects.create(email='cliente@test.com', nombres='C', apellidos='D')
+        cls.usuario.roles.add(Rol.objects.get_or_create(nombre='CLIENTE')[0])
+        cls.deseada = (timezone.localtime() + timedelta(days=20)).replace(hour=10, minute=0, second=0, microsecond=0)
+
+        def reserva(dias, servicio, estado='PENDIENTE'):
+            fecha = cls.deseada + timedelta(days=dias)
+            r = Reserva.objects.create(usuario=cls.usuario, fecha_inicio=fecha, fecha_fin=fecha, estado=estado)
+            ReservaServicio.objects.create(reserva=r, servicio=servicio, cantidad=1)
+            return r
+
+        cls.reserva = reserva(0, cls.servicio)
+        # Conflictos con el mismo servicio cerca de la fecha deseada
+        reserva(1, cls.servicio)
+        reserva(-1, cls.servicio)
+        reserva(-1, cls.servicio)
+        # No cuentan: otro servicio, o cancelada
+        reserva(2, otro)
+        reserva(3, cls.servicio, estado='CANCELADA')
+
+    def validador(self):
+        return ValidadorReprogramacionDinamico(self.usuario)
+
+    def test_devuelve_el_top_global_por_score(self):
+        candidatas = GeneradorRecomendaciones.candidatas(self.deseada)
+        # Oráculo: validación completa candidata por candidata
+        puntuadas = []
+        for fecha in candidatas:
+            completa = self.validador().validar_reprogramacion_completa(self.reserva, fecha)
+            if completa['valida']:
+                puntuadas.append((GeneradorRecomendaciones._calcular_score(self.deseada, fecha, completa), fecha))
+        puntuadas.sort(key=lambda par: par[0], reverse=True)
+
+        sugerencias = GeneradorRecomendaciones.sugerir_fechas_alternativas(self.reserva, self.deseada, self.usuario, cantidad=5)
+
+        self.assertEqual([s['fecha'] for s in sugerencias], [fecha for _, fecha in puntuadas[:5]])
+        scores = [s['score'] for s in sugerencias]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        # Las primeras candidatas generadas (una semana antes) no son las mejores
+        self.assertNotEqual(sugerencias[0]['fecha'], candidatas[0])
+        self.assertTrue(all(s['disponible'] for s in sugerencias))
+
+    def test_coincide_con_la_validacion_completa(self):
+        candidatas = [self.deseada + timedelta(days=d) for d in (-1, 1, 2, 3, 5)]
+        for resultado in self.validador().validar_candidatas(self.reserva, candidatas):
+            completa = self.validador().validar_reprogramacion_completa(self.reserva, resultado['fecha'])
+            self.assertEqual(resultado['valida'], completa['valida'])
+            self.assertEqual(resultado['disponibilidad']['conflictos'], completa['disponibilidad']['conflictos'])
+        conflictos = {r['fecha']: r['disponibilidad']['conflictos'] for r in self.validador().validar_candidatas(self.reserva, candidatas)}
+        self.assertEqual(list(conflictos.values()), [2, 1, 0, 0, 0])
+
+    def test_ocupacion_en_una_sola_consulta_agrupada(self):
+        def consultas(dias):
+            candidatas = [self.deseada + timedelta(days=d) for d in range(1, dias + 1)]
+            with CaptureQueriesContext(connection) as capturadas:
+                self.validador().validar_candidatas(self.reserva, candidatas)
+            return [q['sql'] for q in capturadas.captured_queries]
+
+        consultas(1)  # foto de reglas ya armada
+        pocas, muchas = consultas(3), consultas(60)
+        self.assertEqual(len(pocas), len(muchas))
+        agrupadas = [sql for sql in muchas if 'FROM "core_reserva"' in sql and 'GROUP BY' in sql]
+        self.assertEqual(len(agrupadas), 1)
@@ -0,0 +1,87 @@
+from datetime import datetime, time, timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from authz.models import Usuario
+from core.api.reservas import recordatorios
+from core.api.reservas.notifications import NotificacionReprogramacion
+from core.models import RecordatorioEnviado, Reserva
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class EnviarRecordatoriosTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create(email='cliente@test.com', nombres='Carla', apellidos='D')
+
+    def reserva(self, dias=1, estado='REPROGRAMADA', reprogramaciones=1):
+        inicio = timezone.make_aware(datetime.combine(recordatorios.fecha_objetivo(dias), time(12)))
+        return Reserva.objects.create(
+            usuario=self.usuario, fecha_inicio=inicio, fecha_fin=inicio + timedelta(hours=2),
+            estado=estado, numero_reprogramaciones=reprogramaciones,
+        )
+
+    def test_envia_solo_las_reprogramadas_de_la_fecha_objetivo(self):
+        a, b = self.reserva(), self.reserva()
+        self.reserva(dias=2)
+        self.reserva(estado='CONFIRMADA')
+        self.reserva(reprogramaciones=0)
+
+        resumen = recordatorios.enviar(1, tamano_lote=1)
+
+        self.assertEqual(resumen, recordatorios.ResumenEnvio(2, 0))
+        self.assertEqual(
+            sorted(m.subject for m in mail.outbox),
+            sorted(f"Recordatorio: Tu reserva #{r.pk} es mañana" for r in (a, b)),
+        )
+        self.assertTrue(all(m.to == ['cliente@test.com'] for m in mail.outbox))
+        self.assertCountEqual(RecordatorioEnviado.objects.values_list('reserva_id', 'dias_antes'), [(a.pk, 1), (b.pk, 1)])
+
+    def test_volver_a_correr_no_repite_envios(self):
+        reserva = self.reserva()
+        recordatorios.enviar(1)
+        self.assertEqual(len(mail.outbox), 1)
+
+        self.assertEqual(recordatorios.enviar(1), recordatorios.ResumenEnvio(0, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertFalse(recordatorios.pendientes(1).exists())
+
+        # La marca es por ``dias_antes``: el recordatorio de otra anticipación es distinto
+        RecordatorioEnviado.objects.create(reserva=self.reserva(dias=3), dias_antes=1)
+        self.assertEqual(recordatorios.enviar(3), recordatorios.ResumenEnvio(1, 0))
+        self.assertEqual(RecordatorioEnviado.objects.filter(reserva=reserva).count(), 1)
+
+    def test_fallido_no_se_marca_y_se_reintenta(self):
+        falla, ok = self.reserva(), self.reserva()
+        construir = NotificacionReprogramacion.construir_recordatorio
+
+        def construir_fallando(reserva, dias_antes):
+            if reserva.pk == falla.pk:
+                raise ValueError('email inválido')
+            return construir(reserva, dias_antes)
+
+        with mock.patch.object(NotificacionReprogramacion, 'construir_recordatorio', construir_fallando):
+            with self.assertLogs('core.api.reservas.recordatorios', 'ERROR'):
+                self.assertEqual(recordatorios.enviar(1), recordatorios.ResumenEnvio(1, 1))
+        self.assertEqual(list(RecordatorioEnviado.objects.values_list('reserva_id', flat=True)), [ok.pk])
+
+        self.assertEqual(recordatorios.enviar(1), recordatorios.ResumenEnvio(1, 0))
+        self.assertEqual(mail.outbox[-1].subject, f"Recordatorio: Tu reserva #{falla.pk} es mañana")
+
+    def test_comando_y_dry_run(self):
+        self.reserva()
+        salida = StringIO()
+        call_command('enviar_recordatorios', '--dry-run', stdout=salida)
+        self.assertIn('[DRY RUN] Se habrían enviado 1 recordatorios', salida.getvalue())
+        self.assertEqual(mail.outbox, [])
+        self.assertFalse(RecordatorioEnviado.objects.exists())
+
+        call_command('enviar_recordatorios', stdout=salida)
+        self.assertIn('Recordatorios enviados exitosamente: 1', salida.getvalue())
+        self.assertEqual(len(mail.outbox), 1)
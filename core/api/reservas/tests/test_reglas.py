@@ -0,0 +1,63 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from authz.models import Rol, Usuario
+from core.api.reservas.serializers import ReprogramacionReservaSerializer
+from core.api.reservas.validators import ValidadorReprogramacionDinamico
+from core.models import ReglasReprogramacion, Reserva
+
+
+class Solicitud:
+    def __init__(self, user):
+        self.user = user
+
+
+def proximo(dia_semana, hora=10):
+    """Próxima fecha (a más de una semana) en ese weekday() y hora."""
+    fecha = (timezone.localtime() + timedelta(days=8)).replace(hour=hora, minute=0, second=0, microsecond=0)
+    return fecha + timedelta(days=(dia_semana - fecha.weekday()) % 7)
+
+
+class BlackoutTest(TestCase):
+    """Los dos caminos de validación resuelven los blackout igual: gana el primer rol con regla, ``ALL`` al final."""
+
+    @classmethod
+    def setUpTestData(cls):
+        def usuario(email, rol):
+            u = Usuario.objects.create(email=email, nombres='N', apellidos='A')
+            u.roles.add(Rol.objects.get_or_create(nombre=rol)[0])
+            return u
+
+        cls.cliente = usuario('cliente@test.com', 'CLIENTE')
+        cls.admin = usuario('admin@test.com', 'ADMIN')
+        cls.operador = usuario('operador@test.com', 'OPERADOR')
+        def regla(tipo, rol, valor):
+            ReglasReprogramacion.objects.create(nombre=f'{tipo} {rol}', tipo_regla=tipo, aplicable_a=rol, valor_texto=valor)
+
+        regla('DIAS_BLACKOUT', 'ALL', '["sabado"]')
+        regla('DIAS_BLACKOUT', 'CLIENTE', '["domingo"]')
+        regla('HORAS_BLACKOUT', 'ALL', '[22, 23]')
+        regla('HORAS_BLACKOUT', 'ADMIN', '[]')
+
+    def rechazos(self, usuario, fecha):
+        reserva = Reserva.objects.create(usuario=usuario, fecha_inicio=proximo(2), fecha_fin=proximo(2))
+        validador = ValidadorReprogramacionDinamico(usuario).validar_reprogramacion_completa(reserva, fecha)
+        serializer = ReprogramacionReservaSerializer(
+            data={'nueva_fecha': fecha.isoformat()}, context={'request': Solicitud(usuario), 'reserva': reserva},
+        )
+        return not validador['valida'], not serializer.is_valid()
+
+    def test_regla_del_rol_reemplaza_a_la_de_all(self):
+        self.assertEqual(self.rechazos(self.cliente, proximo(6)), (True, True))
+        # El sábado de ALL no aplica: el cliente tiene su propia regla de días
+        self.assertEqual(self.rechazos(self.cliente, proximo(5)), (False, False))
+
+    def test_sin_regla_propia_aplica_all(self):
+        self.assertEqual(self.rechazos(self.operador, proximo(5)), (True, True))
+        self.assertEqual(self.rechazos(self.operador, proximo(6)), (False, False))
+        self.assertEqual(self.rechazos(self.operador, proximo(1, hora=22)), (True, True))
+
+    def test_lista_vacia_exime_del_blackout_general(self):
+        self.assertEqual(self.rechazos(self.admin, proximo(1, hora=22)), (False, False))
@@ -0,0 +1,119 @@
+from unittest import mock
+
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+
+from core.api.reservas import reglas, versionado
+from core.api.reservas.versionado import CacheVersionada
+from core.models import ReglasReprogramacion
+
+
+class CacheVersionadaTest(TestCase):
+
+    def setUp(self):
+        self.construcciones = []
+        # Dos instancias con la misma clave hacen de dos procesos distintos
+        self.a = CacheVersionada('test:version', self.construir, ttl=60)
+        self.b = CacheVersionada('test:version', self.construir, ttl=60)
+
+    def construir(self, version):
+        self.construcciones.append(version)
+        return len(self.construcciones)
+
+    def test_invalidar_en_una_instancia_reconstruye_la_otra(self):
+        self.assertEqual(self.a.obtener(), 1)
+        self.assertEqual(self.b.obtener(), 2)
+        self.assertEqual(self.b.obtener(), 2)
+
+        self.a.invalidar()
+
+        self.assertEqual(self.b.obtener(), 3)
+        self.assertEqual(self.a.obtener(), 4)
+        self.assertEqual(self.b.obtener(), 3)
+
+    def test_token_de_transaccion_revertida_no_se_reutiliza(self):
+        self.a.invalidar()
+        confirmada = self.a.version_actual()
+        try:
+            with transaction.atomic():
+                self.a.invalidar()
+                self.b.obtener()
+                revertida = self.b.version_actual()
+                raise RuntimeError
+        except RuntimeError:
+            pass
+
+        self.assertNotEqual(revertida, confirmada)
+        self.assertEqual(self.a.version_actual(), confirmada)
+        # La copia armada con datos revertidos queda descartada
+        self.b.obtener()
+        self.assertEqual(self.construcciones[-1], confirmada)
+
+    def test_subir_varias_claves(self):
+        versionado.subir(['test:x', 'test:y'])
+        antes = versionado.leer(['test:x', 'test:y', 'test:z'])
+        self.assertEqual(antes['test:z'], '')
+        self.assertEqual(antes['test:x'], antes['test:y'])
+
+        versionado.subir(['test:y'])
+        despues = versionado.leer(['test:x', 'test:y'])
+        self.assertEqual(despues['test:x'], antes['test:x'])
+        self.assertNotEqual(despues['test:y'], antes['test:y'])
+
+
+class VersionVigenteTest(TransactionTestCase):
+    """Fuera de una transacción la versión leída se reutiliza ``ttl`` segundos."""
+
+    def setUp(self):
+        self.reloj = 1000.0
+        parche = mock.patch.object(versionado.time, 'monotonic', lambda: self.reloj)
+        parche.start()
+        self.addCleanup(parche.stop)
+        self.construcciones = []
+        self.a = CacheVersionada('test:ttl', self.construcciones.append, ttl=2)
+        self.b = CacheVersionada('test:ttl', self.construcciones.append, ttl=2)
+
+    def test_no_consulta_la_version_mientras_esta_vigente(self):
+        self.a.obtener()
+        with self.assertNumQueries(0):
+            self.a.obtener()
+            self.a.obtener()
+
+        self.reloj += 2
+        with self.assertNumQueries(1):
+            self.a.obtener()
+
+    def test_otro_proceso_se_ve_al_vencer_y_el_propio_al_instante(self):
+        self.a.obtener()
+        self.b.obtener()
+
+        self.b.invalidar()
+        self.b.obtener()
+        self.a.obtener()
+        self.assertEqual(len(self.construcciones), 3)
+
+        self.reloj += 2
+        self.a.obtener()
+        self.assertEqual(len(self.construcciones), 4)
+        self.assertEqual(self.construcciones[-1], self.construcciones[-2])
+
+    def test_version_leida_en_una_transaccion_no_se_reutiliza(self):
+        with transaction.atomic():
+            self.a.obtener()
+            with self.assertNumQueries(1):
+                self.a.obtener()
+        with self.assertNumQueries(1):
+            self.a.obtener()
+        with self.assertNumQueries(0):
+            self.a.obtener()
+
+    def test_regla_activa_sin_consultas(self):
+        # La foto de reglas es global: que las pruebas siguientes no hereden la vigencia
+        self.addCleanup(reglas.invalidar)
+        ReglasReprogramacion.objects.create(
+            nombre='Mínimo', tipo_regla='TIEMPO_MINIMO', aplicable_a='ALL', valor_numerico=24,
+        )
+        reglas.snapshot()
+        with self.assertNumQueries(0):
+            for _ in range(5):
+                self.assertEqual(ReglasReprogramacion.obtener_regla_activa('TIEMPO_MINIMO', 'ALL').valor_numerico, 24)
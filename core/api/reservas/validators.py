@@ -7,7 +7,17 @@ from typing import List, Dict, Any, Optional
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from datetime import timedelta
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
 from authz.models import Usuario
+from .reglas import DIAS_SEMANA
+from . import capacidad, reglas
+
+TIPOS_REGLAS_VALIDADAS = [
+    'TIEMPO_MINIMO', 'TIEMPO_MAXIMO', 'LIMITE_REPROGRAMACIONES',
+    'LIMITE_DIARIO', 'DIAS_BLACKOUT', 'HORAS_BLACKOUT',
+    'SERVICIOS_RESTRINGIDOS', 'CAPACIDAD_MAXIMA', 'DESCUENTO_PENALIZACION'
+]
 
 
 class ValidadorReprogramacionDinamico:
@@ -21,17 +31,15 @@ class ValidadorReprogramacionDinamico:
         self.roles = self._obtener_roles_usuario()
         self.errores: List[str] = []
         self.warnings: List[str] = []
+        self._cache_reprogramaciones_hoy: Optional[int] = None
+        self._cache_servicios: Optional[List[str]] = None
     
     def _obtener_roles_usuario(self) -> List[str]:
         """Obtiene los roles del usuario actual."""
-        if not self.usuario or not isinstance(self.usuario, Usuario):
-            return ['ALL']
-        
-        try:
-            roles = list(self.usuario.roles.values_list('nombre', flat=True))
-            return roles + ['ALL']  # Siempre incluir ALL
-        except AttributeError:
+        if not self.usuario:
             return ['ALL']
+        # Siempre incluir ALL
+        return list(getattr(self.usuario, 'nombres_roles', ())) + ['ALL']
     
     def validar_reprogramacion_completa(self, reserva, nueva_fecha, motivo: str = "") -> Dict[str, Any]:
         """
@@ -40,10 +48,11 @@ class ValidadorReprogramacionDinamico:
         Returns:
             Dict con resultado de validación, errores, warnings y datos adicionales.
         """
-        from core.models import ReglasReprogramacion
-        
         self.errores.clear()
         self.warnings.clear()
+        # Una sola foto de reglas para toda la validación (sin consultas de reglas)
+        self.reglas = reglas.snapshot()
+        self._cache_servicios = None
         
         # Validaciones básicas
         self._validar_fecha_basica(nueva_fecha)
@@ -61,6 +70,7 @@ class ValidadorReprogramacionDinamico:
         
         # Calcular penalizaciones
         penalizacion = self._calcular_penalizacion(reserva)
+        reglas_aplicadas = self._obtener_reglas_aplicadas()
         
         return {
             'valida': len(self.errores) == 0,
@@ -68,11 +78,11 @@ class ValidadorReprogramacionDinamico:
             'warnings': self.warnings,
             'disponibilidad': disponibilidad,
             'penalizacion': penalizacion,
-            'reglas_aplicadas': self._obtener_reglas_aplicadas(),
+            'reglas_aplicadas': reglas_aplicadas,
             'metadatos': {
                 'usuario_roles': self.roles,
                 'fecha_validacion': timezone.now(),
-                'numero_reglas_evaluadas': len(self._obtener_reglas_aplicadas())
+                'numero_reglas_evaluadas': len(reglas_aplicadas)
             }
         }
     
@@ -94,175 +104,112 @@ class ValidadorReprogramacionDinamico:
     
     def _aplicar_reglas_tiempo(self, nueva_fecha):
         """Aplica reglas de tiempo mínimo y máximo."""
-        from core.models import ReglasReprogramacion
-        
         ahora = timezone.now()
         
         # Tiempo mínimo
-        for rol in self.roles:
-            regla = ReglasReprogramacion.obtener_regla_activa('TIEMPO_MINIMO', rol)
-            if regla:
-                valor = regla.obtener_valor()
-                if isinstance(valor, (int, float)):
-                    tiempo_requerido = ahora + timedelta(hours=valor)
-                    if nueva_fecha <= tiempo_requerido:
-                        mensaje = regla.mensaje_error or f"Debe reprogramar con al menos {valor} horas de anticipación."
-                        self.errores.append(mensaje)
-                break
+        regla = self.reglas.primera('TIEMPO_MINIMO', self.roles)
+        if regla and regla.es_numerica():
+            tiempo_requerido = ahora + timedelta(hours=regla.valor)
+            if nueva_fecha <= tiempo_requerido:
+                self.errores.append(regla.mensaje_error or f"Debe reprogramar con al menos {regla.valor} horas de anticipación.")
         
         # Tiempo máximo
-        for rol in self.roles:
-            regla = ReglasReprogramacion.obtener_regla_activa('TIEMPO_MAXIMO', rol)
-            if regla:
-                valor = regla.obtener_valor()
-                if isinstance(valor, (int, float)):
-                    tiempo_limite = ahora + timedelta(hours=valor)
-                    if nueva_fecha > tiempo_limite:
-                        mensaje = regla.mensaje_error or f"No puede reprogramar más de {valor/24:.0f} días en el futuro."
-                        self.errores.append(mensaje)
-                break
+        regla = self.reglas.primera('TIEMPO_MAXIMO', self.roles)
+        if regla and regla.es_numerica():
+            tiempo_limite = ahora + timedelta(hours=regla.valor)
+            if nueva_fecha > tiempo_limite:
+                self.errores.append(regla.mensaje_error or f"No puede reprogramar más de {regla.valor/24:.0f} días en el futuro.")
     
     def _aplicar_reglas_limites(self, reserva):
         """Aplica reglas de límites de reprogramaciones."""
-        from core.models import ReglasReprogramacion
-        
         # Límite por reserva
-        for rol in self.roles:
-            regla = ReglasReprogramacion.obtener_regla_activa('LIMITE_REPROGRAMACIONES', rol)
-            if regla:
-                limite = regla.obtener_valor()
-                if isinstance(limite, (int, float)) and reserva.numero_reprogramaciones >= int(limite):
-                    mensaje = regla.mensaje_error or f"Ha alcanzado el límite de {limite} reprogramaciones."
-                    self.errores.append(mensaje)
-                break
+        regla = self.reglas.primera('LIMITE_REPROGRAMACIONES', self.roles)
+        if regla and regla.es_numerica() and reserva.numero_reprogramaciones >= int(regla.valor):
+            self.errores.append(regla.mensaje_error or f"Ha alcanzado el límite de {regla.valor} reprogramaciones.")
         
         # Límite diario (por usuario)
-        for rol in self.roles:
-            regla = ReglasReprogramacion.obtener_regla_activa('LIMITE_DIARIO', rol)
-            if regla and self.usuario:
-                limite = regla.obtener_valor()
-                if isinstance(limite, (int, float)):
-                    hoy = timezone.now().date()
-                    from core.models import HistorialReprogramacion
-                    reprogramaciones_hoy = HistorialReprogramacion.objects.filter(
-                        reprogramado_por=self.usuario,
-                        created_at__date=hoy
-                    ).count()
-                    
-                    if reprogramaciones_hoy >= int(limite):
-                        mensaje = regla.mensaje_error or f"Ha alcanzado el límite diario de {limite} reprogramaciones."
-                        self.errores.append(mensaje)
-                break
+        regla = self.reglas.primera('LIMITE_DIARIO', self.roles)
+        if regla and self.usuario and regla.es_numerica():
+            if self._reprogramaciones_hoy() >= int(regla.valor):
+                self.errores.append(regla.mensaje_error or f"Ha alcanzado el límite diario de {regla.valor} reprogramaciones.")
+    
+    def _reprogramaciones_hoy(self) -> int:
+        """Reprogramaciones hechas hoy por el usuario (se cuenta una vez por validador)."""
+        if self._cache_reprogramaciones_hoy is None:
+            from core.models import HistorialReprogramacion
+            self._cache_reprogramaciones_hoy = HistorialReprogramacion.objects.filter(
+                reprogramado_por=self.usuario,
+                created_at__date=timezone.now().date()
+            ).count()
+        return self._cache_reprogramaciones_hoy
     
     def _aplicar_reglas_blackout(self, nueva_fecha):
         """Aplica reglas de días y horas blackout."""
-        from core.models import ReglasReprogramacion
-        
-        # Días blackout
-        for rol in self.roles:
-            regla = ReglasReprogramacion.obtener_regla_activa('DIAS_BLACKOUT', rol)
-            if regla:
-                try:
-                    dias_blackout = regla.obtener_valor()
-                    if isinstance(dias_blackout, list):
-                        dia_semana = nueva_fecha.weekday()  # 0=lunes, 6=domingo
-                        nombres_dias = ['lunes', 'martes', 'miercoles', 'jueves', 'viernes', 'sabado', 'domingo']
-                        if nombres_dias[dia_semana] in [d.lower() for d in dias_blackout]:
-                            mensaje = regla.mensaje_error or f"No se puede reprogramar en {nombres_dias[dia_semana]}."
-                            self.errores.append(mensaje)
-                except (ValueError, TypeError):
-                    pass
-                break
+        # Días blackout (conjunto de weekday(), 0=lunes)
+        regla = self.reglas.primera('DIAS_BLACKOUT', self.roles)
+        if regla and nueva_fecha.weekday() in regla.valor:
+            nombre_dia = DIAS_SEMANA[nueva_fecha.weekday()]
+            self.errores.append(regla.mensaje_error or f"No se puede reprogramar en {nombre_dia}.")
         
         # Horas blackout
-        for rol in self.roles:
-            regla = ReglasReprogramacion.obtener_regla_activa('HORAS_BLACKOUT', rol)
-            if regla:
-                try:
-                    horas_blackout = regla.obtener_valor()
-                    if isinstance(horas_blackout, list):
-                        hora_nueva = nueva_fecha.hour
-                        if hora_nueva in horas_blackout:
-                            mensaje = regla.mensaje_error or f"No se puede reprogramar a las {hora_nueva}:00 horas."
-                            self.errores.append(mensaje)
-                except (ValueError, TypeError):
-                    pass
-                break
+        regla = self.reglas.primera('HORAS_BLACKOUT', self.roles)
+        if regla and nueva_fecha.hour in regla.valor:
+            self.errores.append(regla.mensaje_error or f"No se puede reprogramar a las {nueva_fecha.hour}:00 horas.")
     
     def _aplicar_reglas_servicios(self, reserva):
         """Aplica reglas específicas de servicios."""
-        from core.models import ReglasReprogramacion
-        
-        for rol in self.roles:
-            regla = ReglasReprogramacion.obtener_regla_activa('SERVICIOS_RESTRINGIDOS', rol)
-            if regla:
-                try:
-                    servicios_restringidos = regla.obtener_valor()
-                    if isinstance(servicios_restringidos, list):
-                        servicios_reserva = list(reserva.detalles.values_list('servicio__titulo', flat=True))
-                        for servicio in servicios_reserva:
-                            if servicio in servicios_restringidos:
-                                mensaje = regla.mensaje_error or f"El servicio '{servicio}' tiene restricciones para reprogramar."
-                                self.errores.append(mensaje)
-                except (ValueError, TypeError):
-                    pass
-                break
+        regla = self.reglas.primera('SERVICIOS_RESTRINGIDOS', self.roles)
+        if regla and regla.valor:
+            for servicio in self._titulos_servicios(reserva):
+                if servicio in regla.valor:
+                    self.errores.append(regla.mensaje_error or f"El servicio '{servicio}' tiene restricciones para reprogramar.")
+    
+    def _titulos_servicios(self, reserva) -> List[str]:
+        if self._cache_servicios is None:
+            self._cache_servicios = list(reserva.servicios.values_list('servicio__titulo', flat=True))
+        return self._cache_servicios
     
     def _aplicar_reglas_capacidad(self, nueva_fecha, reserva):
         """Aplica reglas de capacidad máxima."""
-        from core.models import ReglasReprogramacion, Reserva
+        from core.models import Reserva
         
-        for rol in self.roles:
-            regla = ReglasReprogramacion.obtener_regla_activa('CAPACIDAD_MAXIMA', rol)
-            if regla:
-                try:
-                    capacidad_maxima = regla.obtener_valor()
-                    if isinstance(capacidad_maxima, (int, float)):
-                        # Contar reservas en la nueva fecha
-                        reservas_fecha = Reserva.objects.filter(
-                            fecha_inicio__date=nueva_fecha.date(),
-                            estado__in=['PENDIENTE', 'PAGADA', 'REPROGRAMADA']
-                        ).exclude(id=reserva.id).count()
-                        
-                        if reservas_fecha >= int(capacidad_maxima):
-                            mensaje = regla.mensaje_error or f"La fecha alcanzó la capacidad máxima de {capacidad_maxima} reservas."
-                            self.errores.append(mensaje)
-                except (ValueError, TypeError):
-                    pass
-                break
+        regla = self.reglas.primera('CAPACIDAD_MAXIMA', self.roles)
+        if regla and regla.es_numerica():
+            # Contar reservas en la nueva fecha
+            reservas_fecha = Reserva.objects.filter(
+                fecha_inicio__date=nueva_fecha.date(),
+                estado__in=['PENDIENTE', 'PAGADA', 'REPROGRAMADA']
+            ).exclude(id=reserva.id).count()
+            
+            if reservas_fecha >= int(regla.valor):
+                self.errores.append(regla.mensaje_error or f"La fecha alcanzó la capacidad máxima de {regla.valor} reservas.")
     
     def _verificar_disponibilidad(self, nueva_fecha, reserva) -> Dict[str, Any]:
         """Verifica disponibilidad detallada de servicios en la nueva fecha."""
         from core.models import Reserva
         
-        servicios_ids = list(reserva.detalles.values_list('servicio_id', flat=True))
+        servicios_ids = list(reserva.servicios.values_list('servicio_id', flat=True))
         
         # Buscar conflictos
         conflictos = Reserva.objects.filter(
             fecha_inicio__date=nueva_fecha.date(),
             estado__in=['PENDIENTE', 'PAGADA', 'REPROGRAMADA'],
-            detalles__servicio_id__in=servicios_ids
+            servicios__servicio_id__in=servicios_ids
         ).exclude(id=reserva.id)
         
         return {
             'disponible': not conflictos.exists(),
             'conflictos': conflictos.count(),
-            'servicios_conflictivos': list(conflictos.values_list('detalles__servicio__titulo', flat=True))
+            'servicios_conflictivos': list(conflictos.values_list('servicios__servicio__titulo', flat=True))
         }
     
     def _calcular_penalizacion(self, reserva) -> Dict[str, Any]:
         """Calcula penalizaciones por reprogramar."""
-        from core.models import ReglasReprogramacion
-        
         penalizacion_pct = 0
         
-        for rol in self.roles:
-            regla = ReglasReprogramacion.obtener_regla_activa('DESCUENTO_PENALIZACION', rol)
-            if regla:
-                valor = regla.obtener_valor()
-                if isinstance(valor, (int, float)):
-                    penalizacion_pct = valor
-                break
+        regla = self.reglas.primera('DESCUENTO_PENALIZACION', self.roles)
+        if regla and regla.es_numerica():
+            penalizacion_pct = regla.valor
         
         penalizacion_monto = 0
         if penalizacion_pct > 0:
@@ -277,31 +224,101 @@ class ValidadorReprogramacionDinamico:
     
     def _obtener_reglas_aplicadas(self) -> List[Dict[str, Any]]:
         """Obtiene información de todas las reglas que se aplicaron."""
-        from core.models import ReglasReprogramacion
-        
         reglas_aplicadas = []
         
-        tipos_reglas = [
-            'TIEMPO_MINIMO', 'TIEMPO_MAXIMO', 'LIMITE_REPROGRAMACIONES',
-            'LIMITE_DIARIO', 'DIAS_BLACKOUT', 'HORAS_BLACKOUT',
-            'SERVICIOS_RESTRINGIDOS', 'CAPACIDAD_MAXIMA', 'DESCUENTO_PENALIZACION'
-        ]
-        
-        for tipo_regla in tipos_reglas:
-            for rol in self.roles:
-                regla = ReglasReprogramacion.obtener_regla_activa(tipo_regla, rol)
-                if regla:
-                    reglas_aplicadas.append({
-                        'tipo': tipo_regla,
-                        'rol': rol,
-                        'nombre': regla.nombre,
-                        'valor': regla.obtener_valor(),
-                        'prioridad': regla.prioridad
-                    })
-                    break
+        for tipo_regla in TIPOS_REGLAS_VALIDADAS:
+            rol, regla = self.reglas.primera_con_rol(tipo_regla, self.roles)
+            if regla:
+                reglas_aplicadas.append(regla.como_dict(rol))  # type: ignore[arg-type]
         
         return reglas_aplicadas
     
+    def validar_candidatas(self, reserva, candidatas: List[Any]) -> List[Dict[str, Any]]:
+        """
+        Valida muchas fechas candidatas para la misma reserva en una pasada.
+
+        Las reglas que solo dependen de la reserva se evalúan una vez, las de
+        fecha (tiempo y blackout) se aplican en memoria sobre cada candidata y
+        la capacidad y los conflictos de todo el rango salen de una sola
+        consulta agrupada por día. Devuelve, por candidata, lo mismo que
+        ``validar_reprogramacion_completa`` salvo reglas aplicadas y metadatos.
+        """
+        if not candidatas:
+            return []
+        self.errores.clear()
+        self.warnings.clear()
+        self.reglas = reglas.snapshot()
+        self._cache_servicios = None
+
+        # Reglas que no dependen de la fecha
+        self._validar_estado_reserva(reserva)
+        self._aplicar_reglas_limites(reserva)
+        self._aplicar_reglas_servicios(reserva)
+        errores_reserva = list(self.errores)
+        penalizacion = self._calcular_penalizacion(reserva)
+
+        ocupacion = self._ocupacion_por_dia(reserva, candidatas)
+        regla_capacidad = self.reglas.primera('CAPACIDAD_MAXIMA', self.roles)
+
+        resultados = []
+        for fecha in candidatas:
+            self.errores = list(errores_reserva)
+            self._validar_fecha_basica(fecha)
+            self._aplicar_reglas_tiempo(fecha)
+            self._aplicar_reglas_blackout(fecha)
+
+            reservas_dia, conflictos, titulos = ocupacion.get(capacidad.a_fecha(fecha), (0, 0, []))
+            if regla_capacidad and regla_capacidad.es_numerica() and reservas_dia >= int(regla_capacidad.valor):
+                self.errores.append(regla_capacidad.mensaje_error or
+                                    f"La fecha alcanzó la capacidad máxima de {regla_capacidad.valor} reservas.")
+
+            resultados.append({
+                'fecha': fecha,
+                'valida': len(self.errores) == 0,
+                'errores': self.errores,
+                'disponibilidad': {
+                    'disponible': conflictos == 0,
+                    'conflictos': conflictos,
+                    'servicios_conflictivos': titulos,
+                },
+                'penalizacion': penalizacion,
+            })
+        self.errores = []
+        return resultados
+
+    def _ocupacion_por_dia(self, reserva, candidatas: List[Any]) -> Dict[Any, Any]:
+        """
+        {día: (reservas activas, reservas en conflicto, servicios en conflicto)}
+        para todo el rango de candidatas, en una sola consulta agrupada por día.
+        """
+        from core.models import Reserva
+
+        dias = [capacidad.a_fecha(fecha) for fecha in candidatas]
+        servicios = dict(reserva.servicios.values_list('servicio_id', 'servicio__titulo'))
+        # Un conteo condicional por servicio de la reserva (suelen ser pocos)
+        por_servicio = {
+            f'servicio_{servicio_id}': Count('id', distinct=True, filter=Q(servicios__servicio_id=servicio_id))
+            for servicio_id in servicios
+        }
+        filas = Reserva.objects.filter(
+            fecha_inicio__date__gte=min(dias),
+            fecha_inicio__date__lte=max(dias),
+            estado__in=['PENDIENTE', 'PAGADA', 'REPROGRAMADA'],
+        ).exclude(id=reserva.id).values(dia=TruncDate('fecha_inicio')).annotate(
+            reservas=Count('id', distinct=True),
+            conflictos=Count('id', distinct=True, filter=Q(servicios__servicio_id__in=list(servicios))),
+            **por_servicio,
+        ).order_by()
+
+        return {
+            fila['dia']: (
+                fila['reservas'],
+                fila['conflictos'],
+                [titulo for servicio_id, titulo in servicios.items() if fila[f'servicio_{servicio_id}']],
+            )
+            for fila in filas
+        }
+
     @classmethod
     def validar_rapido(cls, reserva, nueva_fecha, usuario=None) -> bool:
         """Validación rápida que solo retorna True/False."""
@@ -320,47 +337,45 @@ class ValidadorReprogramacionDinamico:
 class GeneradorRecomendaciones:
     """Genera recomendaciones inteligentes para reprogramaciones."""
     
+    # Desplazamientos probados alrededor de la fecha deseada
+    OFFSETS_DIAS = [d for d in range(-7, 15) if d != 0]  # Una semana antes, dos semanas después
+    OFFSETS_HORAS = [0, 1, -1, 2, -2]
+
+    @staticmethod
+    def candidatas(fecha_deseada) -> List[Any]:
+        """Fechas a evaluar, de la más cercana a la más lejana en el orden original."""
+        from datetime import timedelta
+
+        return [
+            fecha_deseada + timedelta(days=dias_offset, hours=hora_offset)
+            for dias_offset in GeneradorRecomendaciones.OFFSETS_DIAS
+            for hora_offset in GeneradorRecomendaciones.OFFSETS_HORAS
+        ]
+
     @staticmethod
     def sugerir_fechas_alternativas(reserva, fecha_deseada, usuario=None, cantidad=5) -> List[Dict[str, Any]]:
         """
         Sugiere fechas alternativas basadas en las reglas y disponibilidad.
+
+        Todas las candidatas se validan juntas (``validar_candidatas``) y se
+        ordenan por score en memoria, en lugar de una validación completa por
+        candidata.
         """
-        from datetime import timedelta
-        
         validador = ValidadorReprogramacionDinamico(usuario)
-        sugerencias = []
-        
-        # Probar fechas cercanas a la deseada
-        for dias_offset in range(-7, 15):  # Una semana antes, dos semanas después
-            if dias_offset == 0:
-                continue  # Saltar la fecha deseada original
-            
-            fecha_candidata = fecha_deseada + timedelta(days=dias_offset)
-            
-            # Probar diferentes horas si es necesario
-            for hora_offset in [0, 1, -1, 2, -2]:
-                fecha_con_hora = fecha_candidata + timedelta(hours=hora_offset)
-                
-                resultado = validador.validar_reprogramacion_completa(reserva, fecha_con_hora)
-                
-                if resultado['valida']:
-                    disponibilidad = resultado['disponibilidad']
-                    
-                    sugerencias.append({
-                        'fecha': fecha_con_hora,
-                        'disponible': disponibilidad['disponible'],
-                        'conflictos': disponibilidad['conflictos'],
-                        'penalizacion': resultado['penalizacion'],
-                        'score': GeneradorRecomendaciones._calcular_score(fecha_deseada, fecha_con_hora, resultado)
-                    })
-                    
-                    if len(sugerencias) >= cantidad:
-                        break
-            
-            if len(sugerencias) >= cantidad:
-                break
+        resultados = validador.validar_candidatas(reserva, GeneradorRecomendaciones.candidatas(fecha_deseada))
+
+        sugerencias = [
+            {
+                'fecha': resultado['fecha'],
+                'disponible': resultado['disponibilidad']['disponible'],
+                'conflictos': resultado['disponibilidad']['conflictos'],
+                'penalizacion': resultado['penalizacion'],
+                'score': GeneradorRecomendaciones._calcular_score(fecha_deseada, resultado['fecha'], resultado)
+            }
+            for resultado in resultados if resultado['valida']
+        ]
         
-        # Ordenar por score (mejores primero)
+        # Ordenar por score (mejores primero); a igual score se mantiene el orden de cercanía
         sugerencias.sort(key=lambda x: x['score'], reverse=True)
         
         return sugerencias[:cantidad]
@@ -0,0 +1,85 @@
+"""
+Objetos de solo lectura cacheados en memoria e invalidados por versión.
+
+La versión vive en la base de datos (``SelloVersion``), así que todos los
+procesos ven la misma. Invalidar escribe un token aleatorio nuevo dentro de la
+transacción en curso: los demás procesos lo ven recién al confirmarse, junto
+con los datos que lo motivaron, y si la transacción se revierte el token
+desaparece con ella y nadie vuelve a usarlo. Cada proceso compara su copia con
+la versión actual y la reconstruye si cambió.
+
+Para no leer la versión en cada llamada, la leída fuera de una transacción se
+reutiliza ``VERSIONADO_TTL`` segundos: los cambios de otros procesos se ven con
+ese retraso como máximo, los del propio proceso (``invalidar``) al instante. Una
+versión leída dentro de una transacción no se reutiliza, porque la transacción
+puede revertirse y con ella el token.
+"""
+
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Generic, Iterable, Optional, TypeVar
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from core.models import SelloVersion
+
+T = TypeVar('T')
+
+
+def leer(claves: Iterable[str]) -> Dict[str, str]:
+    """Versión de cada clave en una sola consulta; ``''`` si nunca se invalidó."""
+    claves = list(claves)
+    versiones = dict(SelloVersion.objects.filter(clave__in=claves).values_list('clave', 'version'))
+    return {clave: versiones.get(clave, '') for clave in claves}
+
+
+def subir(claves: Iterable[str]):
+    """Da a cada clave un token nuevo (crea las filas que falten)."""
+    claves = set(claves)
+    if not claves:
+        return
+    token = uuid.uuid4().hex
+    filas = SelloVersion.objects.filter(clave__in=claves)
+    if filas.update(version=token, updated_at=timezone.now()) < len(claves):
+        SelloVersion.objects.bulk_create(
+            [SelloVersion(clave=clave, version=token) for clave in claves], ignore_conflicts=True
+        )
+        # Las filas que otra transacción creó en medio también deben quedar con el token nuevo
+        filas.update(version=token, updated_at=timezone.now())
+
+
+class CacheVersionada(Generic[T]):
+    """``construir(version)`` arma el objeto; se llama solo cuando cambia la versión."""
+
+    def __init__(self, clave_version: str, construir: Callable[[str], T], ttl: Optional[float] = None):
+        self.clave_version = clave_version
+        self.construir = construir
+        self.ttl = getattr(settings, 'VERSIONADO_TTL', 2) if ttl is None else ttl
+        self._valor: Optional[T] = None
+        self._version: Optional[str] = None
+        self._vigente_hasta = 0.0
+        self._lock = threading.Lock()
+
+    def version_actual(self) -> str:
+        return leer([self.clave_version])[self.clave_version]
+
+    def invalidar(self):
+        subir([self.clave_version])
+        self._version = None
+        self._vigente_hasta = 0.0
+
+    def obtener(self) -> T:
+        if self._version is not None and time.monotonic() < self._vigente_hasta:
+            return self._valor  # type: ignore[return-value]
+        version = self.version_actual()
+        with self._lock:
+            if self._version != version:
+                # La versión se lee antes de consultar: si alguien invalida durante
+                # la construcción, la próxima llamada verá otra versión y reconstruirá
+                self._valor = self.construir(version)
+                self._version = version
+            self._vigente_hasta = 0.0 if connection.in_atomic_block else time.monotonic() + self.ttl
+            return self._valor  # type: ignore[return-value]
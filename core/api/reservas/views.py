@@ -14,16 +14,21 @@ from typing import List, Any, Dict, cast
 from core.models import Reserva, Acompanante, ReservaAcompanante, HistorialReprogramacion
 from .serializers import (
     ReservaSerializer, AcompananteSerializer, ReservaAcompananteSerializer,
-    ReprogramacionReservaSerializer, ReservaConHistorialSerializer, HistorialReprogramacionSerializer
+    ReprogramacionReservaSerializer, ReservaConHistorialSerializer, HistorialReprogramacionSerializer,
+    SugerenciaFechasSerializer
 )
-from .notifications import NotificacionReprogramacion
+from core.paginacion import CursorPaginacion, CursorPaginacionId
+from . import capacidad, outbox
+from .bulk import CargaMasivaReservas, ReservaLoteSerializer
+from .validators import GeneradorRecomendaciones
 
 logger = logging.getLogger(__name__)
 
 class ReservaViewSet(viewsets.ModelViewSet):
-    queryset = Reserva.objects.all().select_related("usuario", "cupon").prefetch_related("detalles", "acompanantes__acompanante")
+    queryset = Reserva.objects.all().select_related("usuario", "cupon").prefetch_related("servicios", "acompanantes__acompanante")
     serializer_class = ReservaSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CursorPaginacion
     # Habilitar filtro por estado usando django-filter
     from django_filters.rest_framework import DjangoFilterBackend
     filter_backends = [DjangoFilterBackend]
@@ -34,23 +39,17 @@ class ReservaViewSet(viewsets.ModelViewSet):
     # Puedes editar el campo estado a cualquiera de estos valores usando PATCH o PUT.
 
     def get_user_roles(self) -> List[str]:
-        user = self.request.user
-        # Verificar que el usuario sea una instancia de nuestro modelo Usuario personalizado
-        if isinstance(user, Usuario) and hasattr(user, 'roles'):
-            try:
-                return list(user.roles.values_list('nombre', flat=True))
-            except AttributeError:
-                pass
-        return []
+        # Roles del token (JWTRolesAuthentication): sin consulta a la base
+        return list(getattr(self.request.user, 'nombres_roles', ()))
 
     def get_queryset(self) -> QuerySet:  # type: ignore[reportIncompatibleMethodOverride]
     # Nota: anotación de tipo para ayudar al analizador estático (Pylance).
         roles = self.get_user_roles()
         user = self.request.user
         if 'ADMIN' in roles or 'OPERADOR' in roles:
-            return Reserva.objects.all().select_related("usuario", "cupon").prefetch_related("detalles", "acompanantes__acompanante")
+            return Reserva.objects.all().select_related("usuario", "cupon").prefetch_related("servicios", "acompanantes__acompanante")
         if 'CLIENTE' in roles:
-            return Reserva.objects.filter(usuario=user).select_related("usuario", "cupon").prefetch_related("detalles", "acompanantes__acompanante")
+            return Reserva.objects.filter(usuario=user).select_related("usuario", "cupon").prefetch_related("servicios", "acompanantes__acompanante")
         return Reserva.objects.none()
 
     def perform_create(self, serializer):
@@ -72,7 +71,29 @@ class ReservaViewSet(viewsets.ModelViewSet):
         roles = self.get_user_roles()
         if 'ADMIN' not in roles:
             raise PermissionDenied("Solo el rol ADMIN puede eliminar reservas.")
-        instance.delete()
+        with transaction.atomic():
+            if capacidad.ocupa_cupo(instance):
+                capacidad.liberar_cupos(instance.fecha_inicio, capacidad.lineas_de_reserva(instance))
+            instance.delete()
+
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk(self, request):
+        """Crea varias reservas en una sola transacción. Ver ``bulk.CargaMasivaReservas``."""
+        roles = self.get_user_roles()
+        if not any(r in roles for r in ['ADMIN', 'OPERADOR', 'CLIENTE']):
+            raise PermissionDenied("No tienes permisos para crear reservas.")
+        lote = ReservaLoteSerializer(data=request.data)
+        lote.is_valid(raise_exception=True)
+        datos = cast(Dict[str, Any], lote.validated_data)
+
+        resultado = CargaMasivaReservas(request.user, roles, atomico=datos['atomico']).ejecutar(datos['reservas'])
+        if resultado['fallidas'] == 0:
+            codigo = status.HTTP_201_CREATED
+        elif resultado['creadas'] == 0:
+            codigo = status.HTTP_400_BAD_REQUEST
+        else:
+            codigo = status.HTTP_207_MULTI_STATUS
+        return Response(resultado, status=codigo)
 
     @action(detail=True, methods=["post"], url_path="cancelar")
     def cancelar(self, request, pk=None):
@@ -83,8 +104,12 @@ class ReservaViewSet(viewsets.ModelViewSet):
         # Solo el titular/propietario o admin/operador pueden cancelar
         if 'CLIENTE' in roles and reserva.usuario != request.user:
             raise PermissionDenied("No puedes cancelar una reserva que no es tuya.")
-        reserva.estado = 'CANCELADA'
-        reserva.save()
+        with transaction.atomic():
+            # Liberar el cupo del día solo si la reserva lo estaba ocupando
+            if capacidad.ocupa_cupo(reserva):
+                capacidad.liberar_cupos(reserva.fecha_inicio, capacidad.lineas_de_reserva(reserva))
+            reserva.estado = 'CANCELADA'
+            reserva.save()
         return Response(self.get_serializer(reserva).data)
 
     @action(detail=True, methods=["post"], url_path="pagar")
@@ -131,6 +156,16 @@ class ReservaViewSet(viewsets.ModelViewSet):
         with transaction.atomic():
             fecha_anterior = reserva.fecha_inicio
             
+            # Trasladar el cupo al nuevo día; bloquea las filas del ledger y
+            # evita sobreventa si otra reserva tomó el cupo entre tanto
+            try:
+                self._mover_cupo_reprogramacion(reserva, nueva_fecha)
+            except capacidad.CupoInsuficiente:
+                return Response(
+                    {"detail": "La nueva fecha no está disponible."}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
             # Guardar fecha original si es la primera reprogramación
             if not reserva.fecha_original:
                 reserva.fecha_original = fecha_anterior
@@ -153,17 +188,8 @@ class ReservaViewSet(viewsets.ModelViewSet):
                 reprogramado_por=request.user
             )
             
-            # Enviar notificaciones
-            notificacion_cliente = NotificacionReprogramacion.notificar_cliente(
-                reserva, fecha_anterior, motivo
-            )
-            notificacion_soporte = NotificacionReprogramacion.notificar_administrador(
-                reserva, fecha_anterior, request.user, motivo
-            )
-            
-            # Marcar si las notificaciones fueron enviadas
-            historial.notificacion_enviada = notificacion_cliente and notificacion_soporte
-            historial.save()
+            # Notificaciones en el outbox: las envía run_outbox_worker tras el commit
+            outbox.encolar_reprogramacion(historial, motivo)
         
         # Usar el serializador con historial para la respuesta
         response_serializer = ReservaConHistorialSerializer(reserva)
@@ -174,42 +200,23 @@ class ReservaViewSet(viewsets.ModelViewSet):
             "detail": "Reserva reprogramada con éxito.",
             "reserva": response_serializer.data,
             "notificaciones_enviadas": {
-                "cliente": notificacion_cliente,
-                "soporte": notificacion_soporte
+                "cliente": "PENDIENTE",
+                "soporte": "PENDIENTE"
             }
         }, status=status.HTTP_200_OK)
     
     def _is_fecha_disponible(self, nueva_fecha, reserva_actual):
-        """Verificar disponibilidad de la nueva fecha"""
-        # Obtener servicios de la reserva actual
-        servicios_ids = list(reserva_actual.detalles.values_list('servicio_id', flat=True))
-        
-        # Buscar reservas conflictivas en la nueva fecha
-        reservas_conflictivas = Reserva.objects.filter(
-            fecha_inicio__date=nueva_fecha.date(),
-            estado__in=['PENDIENTE', 'PAGADA', 'REPROGRAMADA'],
-            detalles__servicio_id__in=servicios_ids
-        ).exclude(id=reserva_actual.id)
-        
-        if reservas_conflictivas.exists():
-            # Verificar capacidad de los servicios/paquetes
-            for detalle in reserva_actual.detalles.all():
-                servicio = detalle.servicio
-                # Si el servicio está asociado a un paquete, verificar cupo
-                if hasattr(servicio, 'paquetes') and servicio.paquetes.exists():
-                    paquete = servicio.paquetes.first()
-                    if hasattr(paquete, 'max_personas'):
-                        # Contar personas ya reservadas para esa fecha
-                        personas_reservadas = sum([
-                            rs.cantidad for rs in reservas_conflictivas.filter(
-                                detalles__servicio=servicio
-                            ).values_list('detalles__cantidad', flat=True)
-                        ])
-                        
-                        if personas_reservadas + detalle.cantidad > paquete.max_personas:
-                            return False
-        
-        return True
+        """Verificar disponibilidad de la nueva fecha (lectura indexada del ledger de cupos)"""
+        return capacidad.hay_cupo(nueva_fecha, capacidad.lineas_de_reserva(reserva_actual), reserva_actual)
+
+    @staticmethod
+    def _mover_cupo_reprogramacion(reserva, nueva_fecha):
+        """Traslada (o toma, si la reserva no ocupaba cupo) la ocupación del ledger al nuevo día."""
+        lineas = capacidad.lineas_de_reserva(reserva)
+        if capacidad.ocupa_cupo(reserva):
+            capacidad.mover_cupos(reserva.fecha_inicio, nueva_fecha, lineas)
+        else:
+            capacidad.reservar_cupos(nueva_fecha, lineas)
 
     @action(detail=True, methods=["get"], url_path="historial-reprogramaciones")
     def historial_reprogramaciones(self, request, pk=None):
@@ -245,10 +252,33 @@ class ReservaViewSet(viewsets.ModelViewSet):
             "fecha_actual": reserva.fecha_inicio
         })
 
+    @action(detail=True, methods=["get"], url_path="sugerir-fechas")
+    def sugerir_fechas(self, request, pk=None):
+        """
+        Fechas alternativas válidas para reprogramar, ordenadas por score.
+
+        GET /api/reservas/{id}/sugerir-fechas/?fecha=2025-10-15T14:30:00Z&cantidad=5
+        """
+        reserva = self.get_object()
+        serializer = SugerenciaFechasSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        fecha_deseada = serializer.validated_data.get('fecha') or reserva.fecha_inicio
+
+        sugerencias = GeneradorRecomendaciones.sugerir_fechas_alternativas(
+            reserva, fecha_deseada, usuario=request.user, cantidad=serializer.validated_data['cantidad']
+        )
+        return Response({
+            "reserva_id": reserva.id,
+            "fecha_deseada": fecha_deseada,
+            "sugerencias": sugerencias,
+        })
+
+
 class AcompananteViewSet(viewsets.ModelViewSet):
     queryset = Acompanante.objects.all()
     serializer_class = AcompananteSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CursorPaginacionId
 
 class ReservaAcompananteViewSet(viewsets.ModelViewSet):
     queryset = ReservaAcompanante.objects.all()
@@ -277,13 +307,8 @@ class GestionReprogramacionAPIView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_user_roles(self) -> List[str]:
-        user = self.request.user
-        if isinstance(user, Usuario) and hasattr(user, 'roles'):
-            try:
-                return list(user.roles.values_list('nombre', flat=True))
-            except AttributeError:
-                pass
-        return []
+        # Roles del token (JWTRolesAuthentication): sin consulta a la base
+        return list(getattr(self.request.user, 'nombres_roles', ()))
     
     def post(self, request, reserva_id):
         """Reprogramar una reserva con validaciones completas"""
@@ -324,6 +349,9 @@ class GestionReprogramacionAPIView(APIView):
                 
                 fecha_anterior = reserva.fecha_inicio
                 
+                # Trasladar el cupo con las filas del ledger bloqueadas
+                ReservaViewSet._mover_cupo_reprogramacion(reserva, nueva_fecha)
+                
                 # Actualizar reserva
                 if not reserva.fecha_original:
                     reserva.fecha_original = fecha_anterior
@@ -350,16 +378,8 @@ class GestionReprogramacionAPIView(APIView):
                     reprogramado_por=request.user
                 )
                 
-                # Enviar notificaciones
-                notificacion_cliente = NotificacionReprogramacion.notificar_cliente(
-                    reserva, fecha_anterior, motivo
-                )
-                notificacion_soporte = NotificacionReprogramacion.notificar_administrador(
-                    reserva, fecha_anterior, request.user, motivo
-                )
-                
-                historial.notificacion_enviada = notificacion_cliente and notificacion_soporte
-                historial.save()
+                # Notificaciones en el outbox: las envía run_outbox_worker tras el commit
+                outbox.encolar_reprogramacion(historial, motivo)
                 
                 logger.info(f"Reprogramación exitosa - Reserva {reserva.pk} por usuario {request.user.pk}")
                 
@@ -369,11 +389,16 @@ class GestionReprogramacionAPIView(APIView):
                     "reserva": ReservaConHistorialSerializer(reserva).data,
                     "cambio_precio": cambio_precio,
                     "notificaciones": {
-                        "cliente": notificacion_cliente,
-                        "soporte": notificacion_soporte
+                        "cliente": "PENDIENTE",
+                        "soporte": "PENDIENTE"
                     }
                 }, status=status.HTTP_200_OK)
                 
+        except capacidad.CupoInsuficiente:
+            return Response({
+                "error": "FECHA_NO_DISPONIBLE",
+                "detail": "La nueva fecha no está disponible para todos los servicios de la reserva."
+            }, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             logger.error(f"Error en reprogramación de reserva {reserva_id}: {str(e)}")
             return Response({
@@ -384,36 +409,8 @@ class GestionReprogramacionAPIView(APIView):
     def _verificar_disponibilidad_completa(self, nueva_fecha, reserva):
         """Verificación completa de disponibilidad incluyendo cupos y restricciones"""
         try:
-            servicios_reserva = reserva.detalles.all()
-            
-            for detalle in servicios_reserva:
-                servicio = detalle.servicio
-                cantidad_solicitada = detalle.cantidad
-                
-                # Verificar si el servicio tiene restricciones de fecha
-                if hasattr(servicio, 'fechas_disponibles') and servicio.fechas_disponibles:
-                    # Aquí puedes agregar lógica específica para fechas disponibles
-                    pass
-                
-                # Verificar cupo en paquetes
-                if hasattr(servicio, 'paquetes'):
-                    for paquete in servicio.paquetes.all():
-                        if hasattr(paquete, 'max_personas') and paquete.max_personas:
-                            # Contar reservas existentes para esa fecha
-                            reservas_existentes = Reserva.objects.filter(
-                                fecha_inicio__date=nueva_fecha.date(),
-                                estado__in=['PENDIENTE', 'PAGADA', 'REPROGRAMADA'],
-                                detalles__servicio__paquetes=paquete
-                            ).exclude(id=reserva.id)
-                            
-                            personas_reservadas = sum([
-                                rs.cantidad for rs in reservas_existentes.values_list('detalles__cantidad', flat=True)
-                            ])
-                            
-                            if personas_reservadas + cantidad_solicitada > paquete.max_personas:
-                                return False
-            
-            return True
+            # Cupo de paquetes y servicios: lectura del ledger diario por (paquete, día)
+            return capacidad.hay_cupo(nueva_fecha, capacidad.lineas_de_reserva(reserva), reserva)
             
         except Exception as e:
             logger.error(f"Error verificando disponibilidad: {str(e)}")
@@ -482,13 +479,8 @@ class ReglasReprogramacionViewSet(viewsets.ModelViewSet):
     
     def get_user_roles(self) -> List[str]:
         """Obtiene los roles del usuario actual."""
-        user = self.request.user
-        if isinstance(user, Usuario) and hasattr(user, 'roles'):
-            try:
-                return list(user.roles.values_list('nombre', flat=True))
-            except AttributeError:
-                pass
-        return []
+        # Roles del token (JWTRolesAuthentication): sin consulta a la base
+        return list(getattr(self.request.user, 'nombres_roles', ()))
     
     def check_admin_permission(self):
         """Verifica que el usuario sea administrador."""
@@ -611,13 +603,8 @@ class ConfiguracionGlobalViewSet(viewsets.ModelViewSet):
     
     def get_user_roles(self) -> List[str]:
         """Obtiene los roles del usuario actual."""
-        user = self.request.user
-        if isinstance(user, Usuario) and hasattr(user, 'roles'):
-            try:
-                return list(user.roles.values_list('nombre', flat=True))
-            except AttributeError:
-                pass
-        return []
+        # Roles del token (JWTRolesAuthentication): sin consulta a la base
+        return list(getattr(self.request.user, 'nombres_roles', ()))
     
     def check_admin_permission(self):
         """Verifica que el usuario sea administrador."""
@@ -706,13 +693,8 @@ class GestionConfiguracionAPIView(APIView):
     
     def get_user_roles(self) -> List[str]:
         """Obtiene los roles del usuario actual."""
-        user = self.request.user
-        if isinstance(user, Usuario) and hasattr(user, 'roles'):
-            try:
-                return list(user.roles.values_list('nombre', flat=True))
-            except AttributeError:
-                pass
-        return []
+        # Roles del token (JWTRolesAuthentication): sin consulta a la base
+        return list(getattr(self.request.user, 'nombres_roles', ()))
     
     def check_admin_permission(self):
         """Verifica que el usuario sea administrador."""
@@ -0,0 +1,154 @@
+"""
+Búsqueda de texto completo en solicitudes (asunto y descripción) y mensajes.
+
+El índice lo crea la migración ``0013_busqueda_soporte`` y lo mantiene la
+propia base al insertar, editar o borrar filas:
+
+- SQLite: tabla FTS5 ``soporte_busqueda`` con triggers; orden por ``bm25``
+  (el asunto pesa 4 veces más) y fragmento con ``snippet``.
+- PostgreSQL: columnas ``tsvector`` generadas con índice GIN; orden por
+  ``ts_rank`` y fragmento con ``ts_headline`` solo para los resultados.
+- Otras bases: ``icontains`` sin orden por relevancia.
+
+Cada solicitud aparece una vez, con la relevancia y el fragmento de su mejor
+coincidencia. Los clientes solo buscan en sus solicitudes y nunca en las
+notas internas.
+"""
+
+import html
+import re
+from typing import List, NamedTuple, Optional
+
+from django.db import connection
+from django.db.models import Q
+
+from core.models import MensajeSoporte, TicketSoporte
+
+# Coincidencias que se leen del índice antes de agrupar por solicitud
+CANDIDATOS_POR_RESULTADO = 10
+# Marcas de inicio/fin del término en el fragmento, reemplazadas por <mark> tras escapar el HTML
+INICIO, FIN = '\x02', '\x03'
+
+
+class Resultado(NamedTuple):
+    ticket_id: int
+    relevancia: float
+    fragmento: Optional[str]
+
+
+def _terminos(texto: str) -> List[str]:
+    return re.findall(r'\w+', texto or '')
+
+
+def _resaltar(fragmento: Optional[str]) -> Optional[str]:
+    if not fragmento:
+        return None
+    return html.escape(fragmento).replace(INICIO, '<mark>').replace(FIN, '</mark>')
+
+
+def _consulta_fts5(terminos: List[str]) -> str:
+    # Cada término entre comillas (sin operadores de FTS5); el último como prefijo para buscar mientras se escribe
+    frases = [f'"{t}"' for t in terminos]
+    frases[-1] += '*'
+    return ' '.join(frases)
+
+
+def _buscar_sqlite(terminos, usuario_id, incluir_internos, limite) -> List[Resultado]:
+    filtros, parametros = '', [_consulta_fts5(terminos)]
+    if not incluir_internos:
+        filtros += ' AND interno = 0'
+    if usuario_id is not None:
+        filtros += ' AND ticket_id IN (SELECT id FROM core_ticketsoporte WHERE usuario_id = %s)'
+        parametros.append(usuario_id)
+    parametros += [limite * CANDIDATOS_POR_RESULTADO, limite]
+    # MATERIALIZED: bm25/snippet solo funcionan en la consulta FTS5 misma, no dentro de un GROUP BY
+    sql = f"""
+        WITH r AS MATERIALIZED (
+            SELECT ticket_id, bm25(soporte_busqueda, 4.0, 1.0) AS rango,
+                   snippet(soporte_busqueda, -1, char(2), char(3), '…', 12) AS fragmento
+            FROM soporte_busqueda
+            WHERE soporte_busqueda MATCH %s{filtros}
+            ORDER BY rango
+            LIMIT %s
+        )
+        SELECT ticket_id, MIN(rango), fragmento FROM r
+        GROUP BY ticket_id
+        ORDER BY 2
+        LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, parametros)
+        # bm25 es negativo (menor es mejor): se invierte para que mayor sea más relevante
+        return [Resultado(pk, round(-rango, 4), _resaltar(fragmento)) for pk, rango, fragmento in cursor.fetchall()]
+
+
+def _buscar_postgresql(texto, usuario_id, incluir_internos, limite) -> List[Resultado]:
+    filtro_ticket = filtro_mensaje = ''
+    parametros_ticket, parametros_mensaje = [texto], [texto]
+    if usuario_id is not None:
+        filtro_ticket += ' AND t.usuario_id = %s'
+        parametros_ticket.append(usuario_id)
+        filtro_mensaje += ' AND t.usuario_id = %s'
+        parametros_mensaje.append(usuario_id)
+    if not incluir_internos:
+        filtro_mensaje += ' AND NOT m.es_interno'
+
+    coincidencias = f"""
+        SELECT t.id AS ticket_id, t.asunto || ' — ' || t.descripcion AS texto, ts_rank(t.busqueda, q) AS rango
+        FROM core_ticketsoporte t, websearch_to_tsquery('spanish', %s) q
+        WHERE t.busqueda @@ q{filtro_ticket}
+        UNION ALL
+        SELECT m.ticket_id, m.mensaje, ts_rank(m.busqueda, q) * 0.5
+        FROM core_mensajesoporte m JOIN core_ticketsoporte t ON t.id = m.ticket_id,
+             websearch_to_tsquery('spanish', %s) q
+        WHERE m.busqueda @@ q{filtro_mensaje}
+    """
+    # ts_headline es costoso: se calcula después del LIMIT, solo para la mejor coincidencia de cada solicitud
+    sql = f"""
+        WITH mejores AS (
+            SELECT DISTINCT ON (ticket_id) ticket_id, texto, rango
+            FROM ({coincidencias}) c
+            ORDER BY ticket_id, rango DESC
+        ), pagina AS (
+            SELECT * FROM mejores ORDER BY rango DESC LIMIT %s
+        )
+        SELECT p.ticket_id, p.rango, ts_headline('spanish', p.texto, websearch_to_tsquery('spanish', %s), %s)
+        FROM pagina p
+        ORDER BY p.rango DESC
+    """
+    opciones = f'StartSel={INICIO}, StopSel={FIN}, MaxWords=25, MinWords=8'
+    with connection.cursor() as cursor:
+        cursor.execute(sql, parametros_ticket + parametros_mensaje + [limite, texto, opciones])
+        return [Resultado(pk, round(rango, 4), _resaltar(fragmento)) for pk, rango, fragmento in cursor.fetchall()]
+
+
+def _buscar_icontains(terminos, usuario_id, incluir_internos, limite) -> List[Resultado]:
+    solicitudes = TicketSoporte.objects.all()
+    if usuario_id is not None:
+        solicitudes = solicitudes.filter(usuario_id=usuario_id)
+    for termino in terminos:
+        mensajes = MensajeSoporte.objects.filter(mensaje__icontains=termino)
+        if not incluir_internos:
+            mensajes = mensajes.filter(es_interno=False)
+        solicitudes = solicitudes.filter(
+            Q(asunto__icontains=termino) | Q(descripcion__icontains=termino)
+            | Q(id__in=mensajes.values('ticket_id'))
+        )
+    ids = solicitudes.order_by('-fecha_creacion').values_list('id', flat=True)[:limite]
+    return [Resultado(pk, 0.0, None) for pk in ids]
+
+
+def buscar(texto: str, usuario_id: Optional[int] = None, incluir_internos: bool = False,
+           limite: int = 50) -> List[Resultado]:
+    """
+    Solicitudes que coinciden con ``texto``, de la más a la menos relevante.
+    ``usuario_id`` restringe a las solicitudes de ese cliente.
+    """
+    terminos = _terminos(texto)
+    if not terminos:
+        return []
+    if connection.vendor == 'sqlite':
+        return _buscar_sqlite(terminos, usuario_id, incluir_internos, limite)
+    if connection.vendor == 'postgresql':
+        return _buscar_postgresql(' '.join(terminos), usuario_id, incluir_internos, limite)
+    return _buscar_icontains(terminos, usuario_id, incluir_internos, limite)
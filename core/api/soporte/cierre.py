@@ -0,0 +1,107 @@
+"""
+Mantenimiento periódico de solicitudes de soporte.
+
+- Cierra las RESUELTO con más de ``dias_auto_cierre_resueltas`` días.
+- Encola en el outbox un recordatorio para las ESPERANDO_CLIENTE que llevan
+  ``recordatorio_cliente_dias`` días sin actividad ni recordatorio.
+
+Ambas tareas recorren la tabla por bloques de id (índice ``(estado, id)``) y
+confirman cada bloque por separado, así que nunca retienen bloqueos largos y se
+pueden correr cada pocos minutos. Cada ``UPDATE`` repite el filtro completo:
+una solicitud que cambió de estado entre la lectura del bloque y la escritura
+no se toca.
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Iterator, List, NamedTuple, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.api.reservas import outbox
+from core.models import ConfiguracionSoporte, OutboxEvento, TicketSoporte
+
+logger = logging.getLogger(__name__)
+
+TAMANO_LOTE = getattr(settings, 'SOPORTE_CIERRE_TAMANO_LOTE', 1000)
+
+Estado = TicketSoporte.EstadoSolicitud
+
+
+class ResumenMantenimiento(NamedTuple):
+    cerradas: int
+    recordatorios: int
+
+
+def _bloques(queryset, tamano: int) -> Iterator[List[int]]:
+    """Ids del queryset en bloques ascendentes (keyset por pk, sin OFFSET)."""
+    ultimo = 0
+    while True:
+        ids = list(queryset.filter(pk__gt=ultimo).order_by('pk').values_list('pk', flat=True)[:tamano])
+        if not ids:
+            return
+        yield ids
+        ultimo = ids[-1]
+
+
+def resueltas_para_cerrar(config: ConfiguracionSoporte, ahora: datetime):
+    corte = ahora - timedelta(days=config.dias_auto_cierre_resueltas)
+    return TicketSoporte.objects.filter(estado=Estado.RESUELTO).filter(
+        # Las resueltas antes de registrar fecha_resolucion usan su última modificación
+        Q(fecha_resolucion__lte=corte) | Q(fecha_resolucion__isnull=True, updated_at__lte=corte)
+    )
+
+
+def esperando_recordatorio(config: ConfiguracionSoporte, ahora: datetime):
+    corte = ahora - timedelta(days=config.recordatorio_cliente_dias)
+    return TicketSoporte.objects.filter(estado=Estado.ESPERANDO_CLIENTE, updated_at__lte=corte).filter(
+        Q(fecha_ultimo_recordatorio__isnull=True) | Q(fecha_ultimo_recordatorio__lte=corte)
+    )
+
+
+def cerrar_resueltas(config: ConfiguracionSoporte, tamano_lote: int = TAMANO_LOTE,
+                     ahora: Optional[datetime] = None) -> int:
+    ahora = ahora or timezone.now()
+    pendientes = resueltas_para_cerrar(config, ahora)
+    cerradas = 0
+    for ids in _bloques(pendientes, tamano_lote):
+        with transaction.atomic():
+            cerradas += pendientes.filter(pk__in=ids).update(
+                estado=Estado.CERRADO, fecha_cierre=ahora, updated_at=ahora,
+            )
+        logger.info(f"Auto-cierre: bloque hasta id {ids[-1]} ({cerradas} cerradas en total)")
+    return cerradas
+
+
+def encolar_recordatorios(config: ConfiguracionSoporte, tamano_lote: int = TAMANO_LOTE,
+                          ahora: Optional[datetime] = None) -> int:
+    ahora = ahora or timezone.now()
+    pendientes = esperando_recordatorio(config, ahora)
+    encolados = 0
+    for ids in _bloques(pendientes, tamano_lote):
+        with transaction.atomic():
+            # Otra ejecución en paralelo salta las filas que ya tomó esta (y al revés)
+            elegidas = list(
+                pendientes.filter(pk__in=ids).select_for_update(skip_locked=True).values_list('pk', flat=True)
+            )
+            if not elegidas:
+                continue
+            OutboxEvento.objects.bulk_create([
+                OutboxEvento(tipo=outbox.RECORDATORIO_SOPORTE, payload={'solicitud_id': pk}) for pk in elegidas
+            ])
+            TicketSoporte.objects.filter(pk__in=elegidas).update(fecha_ultimo_recordatorio=ahora)
+        encolados += len(elegidas)
+    return encolados
+
+
+def ejecutar(tamano_lote: int = TAMANO_LOTE) -> ResumenMantenimiento:
+    # Sin configuración guardada se usan los valores por defecto del modelo
+    config = ConfiguracionSoporte.obtener_configuracion() or ConfiguracionSoporte()
+    ahora = timezone.now()
+    return ResumenMantenimiento(
+        cerradas=cerrar_resueltas(config, tamano_lote, ahora),
+        recordatorios=encolar_recordatorios(config, tamano_lote, ahora),
+    )
@@ -0,0 +1,100 @@
+"""
+Cola de solicitudes sin asignar ("tomar la siguiente").
+
+Orden: prioridad (CRITICA a BAJA) y dentro de cada una la más antigua primero.
+Se consulta una prioridad a la vez para que cada búsqueda sea un rango del
+índice ``(estado, prioridad, fecha_creacion)`` en vez de ordenar toda la cola.
+
+Con ``SELECT ... FOR UPDATE SKIP LOCKED`` (PostgreSQL) cada agente salta las
+filas que otro está tomando en ese momento, sin esperarlo. En bases sin
+``skip_locked`` (SQLite) se toma con un ``UPDATE`` condicional
+(``agente_soporte IS NULL``) y, si otro lo ganó, se prueba la siguiente. Con
+``transaction_mode: IMMEDIATE`` (settings) cada transacción toma el lock de
+escritura de la base al empezar, así los pedidos simultáneos esperan su turno
+en lugar de fallar, y nunca se asigna dos veces.
+"""
+
+import logging
+from typing import Optional
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.models import ConfiguracionSoporte, TicketSoporte
+
+logger = logging.getLogger(__name__)
+
+Prioridad = TicketSoporte.PrioridadSolicitud
+Estado = TicketSoporte.EstadoSolicitud
+
+ORDEN_PRIORIDAD = (Prioridad.CRITICA, Prioridad.ALTA, Prioridad.MEDIA, Prioridad.BAJA)
+# Intentos por prioridad cuando otro agente gana la misma fila (solo sin skip_locked)
+MAX_INTENTOS = 5
+
+
+class LimiteAlcanzado(Exception):
+    """El agente ya tiene el máximo de solicitudes activas."""
+
+
+def sin_asignar(prioridad: str):
+    return TicketSoporte.objects.filter(
+        estado=Estado.PENDIENTE, prioridad=prioridad, agente_soporte__isnull=True,
+    ).order_by('fecha_creacion', 'id')
+
+
+def _tomar(ticket: TicketSoporte, agente):
+    ticket.agente_soporte = agente
+    ticket.estado = Estado.EN_PROCESO
+    ticket.save(update_fields=['agente_soporte', 'estado', 'updated_at'])
+
+
+def _siguiente_skip_locked(agente) -> Optional[TicketSoporte]:
+    for prioridad in ORDEN_PRIORIDAD:
+        ticket = sin_asignar(prioridad).select_for_update(skip_locked=True).first()
+        if ticket is not None:
+            _tomar(ticket, agente)
+            return ticket
+    return None
+
+
+def _siguiente_condicional(agente) -> Optional[TicketSoporte]:
+    for prioridad in ORDEN_PRIORIDAD:
+        for _ in range(MAX_INTENTOS):
+            ticket = sin_asignar(prioridad).first()
+            if ticket is None:
+                break
+            tomado = TicketSoporte.objects.filter(
+                pk=ticket.pk, estado=Estado.PENDIENTE, agente_soporte__isnull=True,
+            ).update(agente_soporte=agente, estado=Estado.EN_PROCESO, updated_at=timezone.now())
+            if tomado:
+                # Ya es de este agente; save() con los mismos valores para que las señales publiquen el cambio
+                _tomar(ticket, agente)
+                return ticket
+    return None
+
+
+def reclamar_siguiente(agente, config: Optional[ConfiguracionSoporte] = None) -> Optional[TicketSoporte]:
+    """
+    Asigna al agente la siguiente solicitud de la cola y la pasa a EN_PROCESO.
+    Devuelve None si la cola está vacía; ``LimiteAlcanzado`` si el agente
+    ya tiene ``max_solicitudes_por_agente`` activas.
+    """
+    if config is None:
+        config = ConfiguracionSoporte.obtener_configuracion()
+    maximo = config.max_solicitudes_por_agente if config else 10
+
+    with transaction.atomic():
+        # Bloquear la fila del agente serializa solo sus propios pedidos, no los de otros agentes
+        type(agente).objects.select_for_update().filter(pk=agente.pk).first()
+        activas = TicketSoporte.objects.filter(agente_soporte=agente, estado__in=TicketSoporte.ESTADOS_ACTIVOS).count()
+        if activas >= maximo:
+            raise LimiteAlcanzado(f"Ya tienes {activas} solicitudes activas (máximo {maximo})")
+
+        if connection.features.has_select_for_update_skip_locked:
+            ticket = _siguiente_skip_locked(agente)
+        else:
+            ticket = _siguiente_condicional(agente)
+
+    if ticket is not None:
+        logger.info(f"Ticket {ticket.pk} tomado de la cola por {agente.get_full_name()}")
+    return ticket
@@ -0,0 +1,142 @@
+"""
+Métricas del dashboard de soporte.
+
+Se calculan con agregados condicionales en lugar de un ``count()`` por métrica:
+una consulta para contadores y promedios, otra agrupada por día/tipo/prioridad
+para la tendencia y las distribuciones, y una anotada para la carga por agente.
+
+El resultado se guarda como foto en la caché durante ``SOPORTE_DASHBOARD_TTL``
+segundos. Con ``SOPORTE_DASHBOARD_STALE`` > 0, pasado el TTL se sigue
+sirviendo la foto anterior mientras un solo hilo por proceso la recalcula en
+segundo plano.
+"""
+
+import logging
+import threading
+import time
+from datetime import timedelta
+from typing import Any, Dict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from core.models import TicketSoporte
+
+logger = logging.getLogger(__name__)
+
+TTL = getattr(settings, 'SOPORTE_DASHBOARD_TTL', 30)
+STALE = getattr(settings, 'SOPORTE_DASHBOARD_STALE', 0)
+
+CLAVE = 'soporte:dashboard'
+CLAVE_RECALCULO = 'soporte:dashboard:recalculando'
+
+Estado = TicketSoporte.EstadoSolicitud
+
+
+def _horas(duracion) -> float:
+    return duracion.total_seconds() / 3600 if duracion else 0
+
+
+def calcular() -> Dict[str, Any]:
+    ahora = timezone.now()
+    hoy = timezone.localdate()
+    hace_7_dias = hoy - timedelta(days=7)
+    recientes = Q(fecha_creacion__date__gte=hace_7_dias)
+
+    # Contadores y promedios en una sola consulta
+    metricas = TicketSoporte.objects.aggregate(
+        pendientes=Count('id', filter=Q(estado=Estado.PENDIENTE)),
+        en_proceso=Count('id', filter=Q(estado=Estado.EN_PROCESO)),
+        vencidas=Count('id', filter=Q(
+            fecha_limite_respuesta__lt=ahora,
+            estado__in=[Estado.PENDIENTE, Estado.EN_PROCESO],
+        )),
+        resueltas_hoy=Count('id', filter=Q(fecha_resolucion__date=hoy)),
+        respuesta=Avg(
+            ExpressionWrapper(F('fecha_primera_respuesta') - F('fecha_creacion'), output_field=DurationField()),
+            filter=recientes & Q(fecha_primera_respuesta__isnull=False),
+        ),
+        resolucion=Avg('tiempo_total_resolucion', filter=recientes & Q(fecha_resolucion__isnull=False)),
+        satisfaccion=Avg('satisfaccion_cliente', filter=recientes),
+    )
+
+    # Tendencia y distribuciones de la última semana en una consulta agrupada
+    por_tipo: Dict[str, int] = {}
+    por_prioridad: Dict[str, int] = {}
+    por_dia: Dict[Any, int] = {}
+    filas = TicketSoporte.objects.filter(recientes).values(
+        'tipo_solicitud', 'prioridad', dia=TruncDate('fecha_creacion'),
+    ).annotate(total=Count('id')).order_by()
+    for fila in filas:
+        por_tipo[fila['tipo_solicitud']] = por_tipo.get(fila['tipo_solicitud'], 0) + fila['total']
+        por_prioridad[fila['prioridad']] = por_prioridad.get(fila['prioridad'], 0) + fila['total']
+        por_dia[fila['dia']] = por_dia.get(fila['dia'], 0) + fila['total']
+
+    tendencia_semanal = []
+    for i in range(6, -1, -1):
+        fecha = hoy - timedelta(days=i)
+        tendencia_semanal.append({'fecha': fecha.strftime('%Y-%m-%d'), 'solicitudes': por_dia.get(fecha, 0)})
+
+    agentes = get_user_model().objects.filter(groups__name='Soporte', is_active=True).annotate(
+        solicitudes_activas=Count('solicitudes_asignadas', filter=Q(solicitudes_asignadas__estado__in=TicketSoporte.ESTADOS_ACTIVOS)),
+    ).order_by('id')
+    carga_por_agente = [
+        {'agente': agente.get_full_name(), 'solicitudes_activas': agente.solicitudes_activas, 'email': agente.email}
+        for agente in agentes
+    ]
+
+    return {
+        'solicitudes_pendientes': metricas['pendientes'],
+        'solicitudes_en_proceso': metricas['en_proceso'],
+        'solicitudes_vencidas': metricas['vencidas'],
+        'solicitudes_resueltas_hoy': metricas['resueltas_hoy'],
+        'tiempo_promedio_respuesta': round(_horas(metricas['respuesta']), 2),
+        'tiempo_promedio_resolucion': round(metricas['resolucion'] or 0, 2),
+        'satisfaccion_promedio': round(metricas['satisfaccion'] or 0, 2),
+        'solicitudes_por_tipo': por_tipo,
+        'solicitudes_por_prioridad': por_prioridad,
+        'carga_por_agente': carga_por_agente,
+        'tendencia_semanal': tendencia_semanal,
+        'generado_en': ahora,
+    }
+
+
+def _guardar(datos: Dict[str, Any]):
+    cache.set(CLAVE, {'datos': datos, 'hasta': time.time() + TTL}, TTL + STALE)
+
+
+def _recalcular_en_segundo_plano():
+    # cache.add es atómico dentro del proceso (LocMem): un solo hilo recalcula a la vez.
+    # Otros workers pueden recalcular en paralelo su propia foto; solo es trabajo repetido
+    if not cache.add(CLAVE_RECALCULO, 1, max(TTL, 5)):
+        return
+
+    def tarea():
+        try:
+            _guardar(calcular())
+        except Exception as e:
+            logger.error(f"Error recalculando dashboard de soporte: {e}")
+        finally:
+            cache.delete(CLAVE_RECALCULO)
+            connection.close()
+
+    threading.Thread(target=tarea, daemon=True).start()
+
+
+def obtener() -> Dict[str, Any]:
+    """Foto vigente del dashboard (ver docstring del módulo)."""
+    foto = cache.get(CLAVE)
+    if foto is not None:
+        if time.time() < foto['hasta']:
+            return foto['datos']
+        if STALE > 0:
+            _recalcular_en_segundo_plano()
+            return foto['datos']
+    datos = calcular()
+    _guardar(datos)
+    return datos
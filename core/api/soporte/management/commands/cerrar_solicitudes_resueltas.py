@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from core.api.soporte import cierre
+
+
+class Command(BaseCommand):
+    help = (
+        'Cierra las solicitudes resueltas hace más de dias_auto_cierre_resueltas y encola '
+        'recordatorios para las que esperan al cliente (seguro para correr cada pocos minutos)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=cierre.TAMANO_LOTE,
+            help=f'Solicitudes por bloque y por transacción (default: {cierre.TAMANO_LOTE})'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            resumen = cierre.ejecutar(options['lote'])
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'✗ Error en el mantenimiento de solicitudes: {e}'))
+            raise
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'✓ {resumen.cerradas} solicitudes cerradas, {resumen.recordatorios} recordatorios encolados'
+            )
+        )
@@ -0,0 +1,32 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from core.api.soporte import metricas
+
+
+class Command(BaseCommand):
+    help = 'Recalcula la tabla de métricas diarias de soporte a partir de las solicitudes (backfill)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--desde',
+            type=str,
+            help='Recalcular solo desde esta fecha (AAAA-MM-DD); por defecto todo el historial'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=2000,
+            help='Solicitudes leídas por consulta (default: 2000)'
+        )
+
+    def handle(self, *args, **options):
+        desde = None
+        if options['desde']:
+            try:
+                desde = date.fromisoformat(options['desde'])
+            except ValueError:
+                raise CommandError('--desde debe tener el formato AAAA-MM-DD')
+
+        filas = metricas.reconstruir(desde, options['lote'])
+        alcance = f'desde {desde}' if desde else 'completas'
+        self.stdout.write(self.style.SUCCESS(f'✓ Métricas de soporte {alcance}: {filas} filas diarias'))
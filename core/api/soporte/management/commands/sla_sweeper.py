@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from core.api.soporte import sla
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Escala las solicitudes de soporte con el plazo de respuesta vencido (prioridad o reasignación)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=sla.TAMANO_LOTE,
+            help=f'Solicitudes vencidas tomadas por vuelta (default: {sla.TAMANO_LOTE})'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=60.0,
+            help='Espera máxima en segundos entre barridos cuando no hay vencidas (default: 60)'
+        )
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Procesar lo vencido y terminar en lugar de quedarse escuchando'
+        )
+
+    def handle(self, *args, **options):
+        vencidas = escaladas = reasignadas = 0
+        self.stdout.write('Barrido de SLA iniciado')
+
+        try:
+            while True:
+                resumen = sla.barrer(options['lote'])
+                vencidas += resumen.vencidas
+                escaladas += resumen.escaladas
+                reasignadas += resumen.reasignadas
+                if resumen.vencidas == options['lote']:
+                    # Lote lleno: puede haber más vencidas, seguir sin esperar
+                    continue
+                if options['una_vez']:
+                    break
+
+                # Dormir hasta el próximo vencimiento, como máximo --intervalo
+                espera = options['intervalo']
+                proximo = sla.proximo_vencimiento()
+                if proximo is not None:
+                    espera = min(espera, max((proximo - timezone.now()).total_seconds(), 0.5))
+                time.sleep(espera)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('Barrido detenido'))
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ SLA: {vencidas} vencidas, {escaladas} escaladas, {reasignadas} reasignadas')
+        )
@@ -0,0 +1,234 @@
+"""
+Métricas históricas de soporte en ``MetricaDiariaSoporte``.
+
+Cada solicitud aporta a las filas (día, tipo, prioridad, agente):
+
+- ``creadas`` el día de creación.
+- ``resueltas`` y las horas de resolución el día de ``fecha_resolucion``.
+- Las horas hasta la primera respuesta el día de ``fecha_primera_respuesta``.
+- La satisfacción el día de resolución (o de creación si no se resolvió).
+
+Al guardar una solicitud se aplica la diferencia entre su aporte anterior (los
+valores leídos de la base) y el nuevo, así que un cambio de prioridad o de
+agente también mueve lo ya contado. ``reconstruir`` calcula lo mismo desde
+cero con la misma función, para el backfill.
+
+Las filas son aditivas: se actualiza la existente con ``F()`` o se inserta una
+nueva, y las lecturas siempre suman. Si dos transacciones insertan la misma
+combinación a la vez el total sigue siendo correcto.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.utils import timezone
+
+from core.models import MetricaDiariaSoporte, TicketSoporte
+
+logger = logging.getLogger(__name__)
+
+Clave = Tuple[date, str, str, Optional[int]]
+Aporte = Dict[Clave, Dict[str, float]]
+
+CONTADORES = (
+    'creadas', 'resueltas',
+    'primera_respuesta_horas', 'primera_respuesta_cantidad',
+    'resolucion_horas', 'resolucion_cantidad',
+    'satisfaccion_suma', 'satisfaccion_cantidad',
+)
+
+
+def _horas(desde, hasta) -> float:
+    return (hasta - desde).total_seconds() / 3600
+
+
+def aporte(valores: Optional[dict]) -> Aporte:
+    """Lo que suma una solicitud (dict con ``CAMPOS_SEGUIDOS``) a cada fila diaria."""
+    resultado: Aporte = defaultdict(lambda: defaultdict(float))
+    if not valores or valores.get('fecha_creacion') is None:
+        return resultado
+
+    def fila(momento) -> Dict[str, float]:
+        clave = (
+            timezone.localdate(momento), valores['tipo_solicitud'],
+            valores['prioridad'], valores['agente_soporte_id'],
+        )
+        return resultado[clave]
+
+    creacion = valores['fecha_creacion']
+    fila(creacion)['creadas'] += 1
+
+    resolucion = valores['fecha_resolucion']
+    if resolucion is not None:
+        fila(resolucion)['resueltas'] += 1
+        if valores['tiempo_total_resolucion'] is not None:
+            fila(resolucion)['resolucion_horas'] += valores['tiempo_total_resolucion']
+            fila(resolucion)['resolucion_cantidad'] += 1
+
+    primera = valores['fecha_primera_respuesta']
+    if primera is not None:
+        fila(primera)['primera_respuesta_horas'] += _horas(creacion, primera)
+        fila(primera)['primera_respuesta_cantidad'] += 1
+
+    if valores['satisfaccion_cliente'] is not None:
+        fila(resolucion or creacion)['satisfaccion_suma'] += valores['satisfaccion_cliente']
+        fila(resolucion or creacion)['satisfaccion_cantidad'] += 1
+
+    return resultado
+
+
+def diferencia(antes: Aporte, despues: Aporte) -> Aporte:
+    resultado: Aporte = {}
+    for clave in set(antes) | set(despues):
+        deltas = {
+            campo: despues.get(clave, {}).get(campo, 0) - antes.get(clave, {}).get(campo, 0)
+            for campo in CONTADORES
+        }
+        deltas = {campo: valor for campo, valor in deltas.items() if valor}
+        if deltas:
+            resultado[clave] = deltas
+    return resultado
+
+
+def aplicar(cambios: Aporte):
+    """Suma los deltas a las filas diarias: UPDATE con F() o, si no existe la fila, INSERT."""
+    for (fecha, tipo, prioridad, agente_id), deltas in cambios.items():
+        filas = MetricaDiariaSoporte.objects.filter(fecha=fecha, tipo_solicitud=tipo, prioridad=prioridad)
+        filas = filas.filter(agente__isnull=True) if agente_id is None else filas.filter(agente_id=agente_id)
+        # Solo la fila más antigua: si hay duplicadas, los deltas no se aplican dos veces
+        primera = filas.order_by('id').values_list('id', flat=True)[:1]
+        actualizadas = MetricaDiariaSoporte.objects.filter(id__in=list(primera)).update(
+            **{campo: F(campo) + valor for campo, valor in deltas.items()}
+        )
+        if not actualizadas:
+            MetricaDiariaSoporte.objects.create(
+                fecha=fecha, tipo_solicitud=tipo, prioridad=prioridad, agente_id=agente_id, **deltas
+            )
+
+
+def valores_actuales(ticket: TicketSoporte) -> dict:
+    return {campo: getattr(ticket, campo) for campo in TicketSoporte.CAMPOS_SEGUIDOS}
+
+
+def registrar_cambio(ticket: TicketSoporte, creada: bool = False):
+    """Aplica lo que cambió la solicitud desde que se leyó (llamado desde post_save)."""
+    antes = None if creada else getattr(ticket, '_originales', None)
+    if antes is None and not creada:
+        # Instancia con campos diferidos: no se sabe qué aportaba, se corrige con reconstruir_metricas_soporte
+        logger.warning(f"Métricas: cambio de la solicitud {ticket.pk} sin valores originales, no se registra")
+        return
+    cambios = diferencia(aporte(antes), aporte(valores_actuales(ticket)))
+    if cambios:
+        aplicar(cambios)
+
+
+def registrar_cambios_masivos(antes: Iterable[dict], despues: Iterable[dict]):
+    """Para ``UPDATE`` masivos (barrido de SLA): aplica la diferencia agregada de varias solicitudes."""
+    total_antes: Aporte = defaultdict(lambda: defaultdict(float))
+    total_despues: Aporte = defaultdict(lambda: defaultdict(float))
+    for destino, filas in ((total_antes, antes), (total_despues, despues)):
+        for valores in filas:
+            for clave, contadores in aporte(valores).items():
+                for campo, valor in contadores.items():
+                    destino[clave][campo] += valor
+    cambios = diferencia(total_antes, total_despues)
+    if cambios:
+        aplicar(cambios)
+
+
+# ----------------------------------------------------------------------
+# Backfill
+# ----------------------------------------------------------------------
+
+def reconstruir(desde: Optional[date] = None, tamano_lote: int = 2000) -> int:
+    """
+    Recalcula las filas diarias desde ``desde`` (todas si es None) a partir de
+    las solicitudes. Devuelve cuántas filas quedaron.
+    """
+    solicitudes = TicketSoporte.objects.all()
+    if desde is not None:
+        inicio = timezone.make_aware(datetime.combine(desde, time.min))
+        solicitudes = solicitudes.filter(
+            Q(fecha_creacion__gte=inicio) | Q(fecha_resolucion__gte=inicio) | Q(fecha_primera_respuesta__gte=inicio)
+        )
+
+    total: Aporte = defaultdict(lambda: defaultdict(float))
+    for valores in solicitudes.values(*TicketSoporte.CAMPOS_SEGUIDOS).iterator(chunk_size=tamano_lote):
+        for clave, contadores in aporte(valores).items():
+            if desde is None or clave[0] >= desde:
+                for campo, valor in contadores.items():
+                    total[clave][campo] += valor
+
+    filas = [
+        MetricaDiariaSoporte(fecha=fecha, tipo_solicitud=tipo, prioridad=prioridad, agente_id=agente_id, **contadores)
+        for (fecha, tipo, prioridad, agente_id), contadores in total.items()
+    ]
+    with transaction.atomic():
+        existentes = MetricaDiariaSoporte.objects.all()
+        if desde is not None:
+            existentes = existentes.filter(fecha__gte=desde)
+        existentes.delete()
+        MetricaDiariaSoporte.objects.bulk_create(filas, batch_size=tamano_lote)
+    return len(filas)
+
+
+# ----------------------------------------------------------------------
+# Consultas
+# ----------------------------------------------------------------------
+
+AGRUPACIONES = {'dia': None, 'semana': TruncWeek, 'mes': TruncMonth}
+
+
+def _promedio(suma, cantidad) -> float:
+    return round(suma / cantidad, 2) if cantidad else 0
+
+
+def _resumen(fila: dict) -> dict:
+    return {
+        'creadas': fila['creadas'] or 0,
+        'resueltas': fila['resueltas'] or 0,
+        'tiempo_promedio_respuesta': _promedio(fila['primera_respuesta_horas'], fila['primera_respuesta_cantidad']),
+        'tiempo_promedio_resolucion': _promedio(fila['resolucion_horas'], fila['resolucion_cantidad']),
+        'satisfaccion_promedio': _promedio(fila['satisfaccion_suma'], fila['satisfaccion_cantidad']),
+    }
+
+
+def tendencia(dias: int, agrupar: str = 'dia', **filtros) -> dict:
+    """
+    Serie de los últimos ``dias`` días (incluido hoy) agrupada por día, semana
+    o mes, más los totales del período. ``filtros``: tipo_solicitud,
+    prioridad, agente_id.
+    """
+    hasta = timezone.localdate()
+    desde = hasta - timedelta(days=dias - 1)
+    filas = MetricaDiariaSoporte.objects.filter(
+        fecha__gte=desde, fecha__lte=hasta, **{k: v for k, v in filtros.items() if v is not None}
+    )
+    sumas = {campo: Sum(campo) for campo in CONTADORES}
+
+    totales = _resumen(filas.aggregate(**sumas))
+    truncar = AGRUPACIONES[agrupar]
+    periodo = truncar('fecha') if truncar else F('fecha')
+    por_periodo = {
+        fila['periodo']: _resumen(fila)
+        for fila in filas.values(periodo=periodo).annotate(**sumas).order_by('periodo')
+    }
+
+    if truncar is None:
+        # Serie diaria completa, con ceros en los días sin actividad
+        periodos = [desde + timedelta(days=i) for i in range(dias)]
+    else:
+        periodos = sorted(por_periodo)
+    vacio = _resumen({campo: 0 for campo in CONTADORES})
+    return {
+        'desde': desde,
+        'hasta': hasta,
+        'agrupar': agrupar,
+        'totales': totales,
+        'serie': [{'periodo': p, **por_periodo.get(p, vacio)} for p in periodos],
+    }
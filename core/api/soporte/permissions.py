@@ -44,16 +44,16 @@ class EsClienteOSoporte(permissions.BasePermission):
         - Cliente: solo puede acceder a sus propias solicitudes
         - Soporte: puede acceder a todas las solicitudes
         """
-        if hasattr(obj, 'cliente'):
-            # Es una solicitud de soporte
+        if hasattr(obj, 'ticket'):
+            # Es un mensaje de soporte
             return (
-                request.user == obj.cliente or 
+                request.user.id == obj.ticket.usuario_id or 
                 request.user.groups.filter(name='Soporte').exists()
             )
-        elif hasattr(obj, 'solicitud'):
-            # Es un mensaje de soporte
+        elif hasattr(obj, 'usuario_id'):
+            # Es una solicitud de soporte
             return (
-                request.user == obj.solicitud.cliente or 
+                request.user.id == obj.usuario_id or 
                 request.user.groups.filter(name='Soporte').exists()
             )
         
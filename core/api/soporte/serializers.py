@@ -1,11 +1,14 @@
 # soporte/serializers.py
 
 from rest_framework import serializers
-from django.contrib.auth.models import User
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Q, Subquery
 from django.utils import timezone
 from core.models import TicketSoporte, MensajeSoporte, ConfiguracionSoporte
 from core.models import Reserva
 
+User = get_user_model()
+
 
 class UsuarioBasicoSerializer(serializers.ModelSerializer):
     """Serializer básico para mostrar información del usuario."""
@@ -14,8 +17,8 @@ class UsuarioBasicoSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = User
-        fields = ['id', 'username', 'first_name', 'last_name', 'nombre_completo', 'email']
-        read_only_fields = ['id', 'username', 'email', 'nombre_completo']
+        fields = ['id', 'nombres', 'apellidos', 'nombre_completo', 'email']
+        read_only_fields = ['id', 'email', 'nombre_completo']
 
 
 class ReservaBasicaSerializer(serializers.ModelSerializer):
@@ -45,23 +48,23 @@ class MensajeSoporteSerializer(serializers.ModelSerializer):
     class Meta:
         model = MensajeSoporte
         fields = [
-            'id', 'mensaje', 'remitente', 'created_at', 'es_interno',
+            'id', 'mensaje', 'remitente', 'fecha', 'es_interno',
             'leido_por_cliente', 'leido_por_soporte', 
             'fecha_lectura_cliente', 'fecha_lectura_soporte',
-            'archivo_adjunto', 'nombre_archivo_original',
             'es_del_cliente', 'es_del_soporte', 'tiempo_desde_creacion'
         ]
         read_only_fields = [
-            'id', 'remitente', 'created_at', 'es_del_cliente', 'es_del_soporte',
+            'id', 'remitente', 'fecha', 'es_del_cliente', 'es_del_soporte',
+            'leido_por_cliente', 'leido_por_soporte',
             'fecha_lectura_cliente', 'fecha_lectura_soporte', 'tiempo_desde_creacion'
         ]
     
     def get_tiempo_desde_creacion(self, obj):
         """Calcula tiempo transcurrido desde la creación del mensaje."""
-        if not obj.created_at:
+        if not obj.fecha:
             return None
         
-        delta = timezone.now() - obj.created_at
+        delta = timezone.now() - obj.fecha
         
         if delta.days > 0:
             return f"hace {delta.days} día{'s' if delta.days != 1 else ''}"
@@ -80,19 +83,31 @@ class MensajeSoporteSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class SolicitudSoporteListListSerializer(serializers.ListSerializer):
+    """Carga de una vez los últimos mensajes de la página (ver ``anotar``)."""
+    
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, 'all') else data)
+        if items and all(hasattr(obj, 'ultimo_mensaje_id') for obj in items):
+            self.child.context['ultimos_mensajes'] = MensajeSoporte.objects.select_related('remitente').in_bulk(
+                [obj.ultimo_mensaje_id for obj in items if obj.ultimo_mensaje_id]
+            )
+        return super().to_representation(items)
+
+
 class SolicitudSoporteListSerializer(serializers.ModelSerializer):
     """Serializer para listar solicitudes (vista resumida)."""
     
-    cliente = UsuarioBasicoSerializer(read_only=True)
+    cliente = UsuarioBasicoSerializer(source='usuario', read_only=True)
     agente_soporte = UsuarioBasicoSerializer(read_only=True)
-    reserva = ReservaBasicaSerializer(read_only=True)
     
     tipo_solicitud_display = serializers.CharField(source='get_tipo_solicitud_display', read_only=True)
     estado_display = serializers.CharField(source='get_estado_display', read_only=True)
     prioridad_display = serializers.CharField(source='get_prioridad_display', read_only=True)
     
-    tiempo_respuesta_sla = serializers.BooleanField(read_only=True)
-    esta_vencido = serializers.BooleanField(read_only=True)
+    created_at = serializers.DateTimeField(source='fecha_creacion', read_only=True)
+    tiempo_respuesta_sla = serializers.SerializerMethodField()
+    esta_vencido = serializers.SerializerMethodField()
     tiempo_total_resolucion = serializers.FloatField(read_only=True)
     
     mensajes_no_leidos = serializers.SerializerMethodField()
@@ -100,8 +115,9 @@ class SolicitudSoporteListSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = TicketSoporte
+        list_serializer_class = SolicitudSoporteListListSerializer
         fields = [
-            'id', 'numero_ticket', 'cliente', 'agente_soporte', 'reserva',
+            'id', 'numero_ticket', 'cliente', 'agente_soporte',
             'tipo_solicitud', 'tipo_solicitud_display',
             'estado', 'estado_display',
             'prioridad', 'prioridad_display',
@@ -109,7 +125,7 @@ class SolicitudSoporteListSerializer(serializers.ModelSerializer):
             'fecha_limite_respuesta', 'fecha_primera_respuesta', 
             'fecha_resolucion', 'fecha_cierre',
             'tiempo_respuesta_sla', 'esta_vencido', 'tiempo_total_resolucion',
-            'mensajes_no_leidos', 'ultimo_mensaje', 'tags'
+            'mensajes_no_leidos', 'ultimo_mensaje'
         ]
         read_only_fields = [
             'id', 'numero_ticket', 'created_at', 'updated_at',
@@ -117,32 +133,71 @@ class SolicitudSoporteListSerializer(serializers.ModelSerializer):
             'fecha_resolucion', 'fecha_cierre'
         ]
     
+    @staticmethod
+    def anotar(queryset, es_soporte: bool):
+        """
+        Anota en la misma consulta del listado los mensajes no leídos (según quien
+        mira) y el id del último mensaje visible, para no consultar por fila.
+        """
+        if es_soporte:
+            # Soporte: mensajes del cliente no leídos
+            no_leidos = Q(mensajes__leido_por_soporte=False, mensajes__remitente=F('usuario'))
+        else:
+            # Cliente: mensajes del soporte no leídos (sin notas internas)
+            no_leidos = Q(mensajes__leido_por_cliente=False, mensajes__es_interno=False) & ~Q(mensajes__remitente=F('usuario'))
+        ultimo = MensajeSoporte.objects.filter(
+            ticket=OuterRef('pk'), es_interno=False
+        ).order_by('-fecha', '-id').values('id')[:1]
+        return queryset.annotate(
+            mensajes_no_leidos=Count('mensajes', filter=no_leidos),
+            ultimo_mensaje_id=Subquery(ultimo),
+        )
+    
+    def get_tiempo_respuesta_sla(self, obj):
+        """True si la primera respuesta llegó dentro del límite (None si aún no aplica)."""
+        if not obj.fecha_limite_respuesta or not obj.fecha_primera_respuesta:
+            return None
+        return obj.fecha_primera_respuesta <= obj.fecha_limite_respuesta
+    
+    def get_esta_vencido(self, obj):
+        return bool(
+            obj.fecha_limite_respuesta
+            and obj.fecha_primera_respuesta is None
+            and obj.estado in TicketSoporte.ESTADOS_ACTIVOS
+            and obj.fecha_limite_respuesta < timezone.now()
+        )
+    
     def get_mensajes_no_leidos(self, obj):
         """Cuenta mensajes no leídos según el tipo de usuario."""
-        request_user = self.context['request'].user
+        if hasattr(obj, 'mensajes_no_leidos'):
+            return obj.mensajes_no_leidos
         
-        if request_user == obj.cliente:
+        request_user = self.context['request'].user
+        if request_user == obj.usuario:
             # Cliente: contar mensajes del soporte no leídos
             return obj.mensajes.filter(
                 leido_por_cliente=False,
                 es_interno=False
-            ).exclude(remitente=obj.cliente).count()
+            ).exclude(remitente=obj.usuario).count()
         else:
             # Soporte: contar mensajes del cliente no leídos
             return obj.mensajes.filter(
                 leido_por_soporte=False,
-                remitente=obj.cliente
+                remitente=obj.usuario
             ).count()
     
     def get_ultimo_mensaje(self, obj):
         """Obtiene el último mensaje de la conversación."""
-        ultimo = obj.mensajes.filter(es_interno=False).last()
+        if 'ultimos_mensajes' in self.context:
+            ultimo = self.context['ultimos_mensajes'].get(getattr(obj, 'ultimo_mensaje_id', None))
+        else:
+            ultimo = obj.mensajes.filter(es_interno=False).order_by('fecha', 'id').last()
         if ultimo:
             return {
                 'mensaje': ultimo.mensaje[:100] + '...' if len(ultimo.mensaje) > 100 else ultimo.mensaje,
                 'remitente': ultimo.remitente.get_full_name(),
-                'fecha': ultimo.created_at,
-                'es_del_cliente': ultimo.es_del_cliente
+                'fecha': ultimo.fecha,
+                'es_del_cliente': ultimo.remitente_id == obj.usuario_id
             }
         return None
 
@@ -150,17 +205,17 @@ class SolicitudSoporteListSerializer(serializers.ModelSerializer):
 class SolicitudSoporteDetailSerializer(serializers.ModelSerializer):
     """Serializer detallado para ver/editar una solicitud específica."""
     
-    cliente = UsuarioBasicoSerializer(read_only=True)
+    cliente = UsuarioBasicoSerializer(source='usuario', read_only=True)
     agente_soporte = UsuarioBasicoSerializer(read_only=True)
-    reserva = ReservaBasicaSerializer(read_only=True)
-    mensajes = MensajeSoporteSerializer(many=True, read_only=True)
+    mensajes = serializers.SerializerMethodField()
     
     tipo_solicitud_display = serializers.CharField(source='get_tipo_solicitud_display', read_only=True)
     estado_display = serializers.CharField(source='get_estado_display', read_only=True)
     prioridad_display = serializers.CharField(source='get_prioridad_display', read_only=True)
     
-    tiempo_respuesta_sla = serializers.BooleanField(read_only=True)
-    esta_vencido = serializers.BooleanField(read_only=True)
+    created_at = serializers.DateTimeField(source='fecha_creacion', read_only=True)
+    tiempo_respuesta_sla = serializers.SerializerMethodField()
+    esta_vencido = serializers.SerializerMethodField()
     tiempo_total_resolucion = serializers.FloatField(read_only=True)
     
     estadisticas = serializers.SerializerMethodField()
@@ -168,14 +223,14 @@ class SolicitudSoporteDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model = TicketSoporte
         fields = [
-            'id', 'numero_ticket', 'cliente', 'agente_soporte', 'reserva',
+            'id', 'numero_ticket', 'cliente', 'agente_soporte',
             'tipo_solicitud', 'tipo_solicitud_display',
             'estado', 'estado_display',
             'prioridad', 'prioridad_display',
             'asunto', 'descripcion', 'created_at', 'updated_at',
             'fecha_limite_respuesta', 'fecha_primera_respuesta', 
             'fecha_resolucion', 'fecha_cierre',
-            'canal_origen', 'tags', 'satisfaccion_cliente', 'comentario_interno',
+            'satisfaccion_cliente',
             'tiempo_respuesta_sla', 'esta_vencido', 'tiempo_total_resolucion',
             'mensajes', 'estadisticas'
         ]
@@ -185,10 +240,24 @@ class SolicitudSoporteDetailSerializer(serializers.ModelSerializer):
             'fecha_resolucion', 'fecha_cierre'
         ]
     
+    get_tiempo_respuesta_sla = SolicitudSoporteListSerializer.get_tiempo_respuesta_sla
+    get_esta_vencido = SolicitudSoporteListSerializer.get_esta_vencido
+    
+    def _mensajes_visibles(self, obj):
+        """Mensajes ya precargados (``prefetch_related('mensajes')``); el cliente no ve notas internas."""
+        mensajes = sorted(obj.mensajes.all(), key=lambda m: (m.fecha, m.id))
+        if self.context['request'].user.id == obj.usuario_id:
+            mensajes = [m for m in mensajes if not m.es_interno]
+        return mensajes
+    
+    def get_mensajes(self, obj):
+        return MensajeSoporteSerializer(self._mensajes_visibles(obj), many=True, context=self.context).data
+    
     def get_estadisticas(self, obj):
         """Estadísticas de la solicitud."""
-        total_mensajes = obj.mensajes.count()
-        mensajes_cliente = obj.mensajes.filter(remitente=obj.cliente).count()
+        mensajes = self._mensajes_visibles(obj)
+        total_mensajes = len(mensajes)
+        mensajes_cliente = sum(1 for m in mensajes if m.remitente_id == obj.usuario_id)
         mensajes_soporte = total_mensajes - mensajes_cliente
         
         return {
@@ -196,46 +265,31 @@ class SolicitudSoporteDetailSerializer(serializers.ModelSerializer):
             'mensajes_cliente': mensajes_cliente,
             'mensajes_soporte': mensajes_soporte,
             'tiempo_abierto_horas': obj.tiempo_total_resolucion or (
-                (timezone.now() - obj.created_at).total_seconds() / 3600 
-                if obj.created_at else 0
+                (timezone.now() - obj.fecha_creacion).total_seconds() / 3600 
+                if obj.fecha_creacion else 0
             ),
         }
 
 
 class CrearSolicitudSoporteSerializer(serializers.ModelSerializer):
-    """Serializer para crear una nueva solicitud de soporte."""
-    
-    reserva_id = serializers.IntegerField(required=False, allow_null=True)
+    """
+    Serializer para crear una nueva solicitud de soporte.
+
+    El agente (si hay asignación automática) lo pone la señal post_save, así
+    que la respuesta ya trae a quién quedó asignada.
+    """
     
     class Meta:
         model = TicketSoporte
         fields = [
-            'tipo_solicitud', 'asunto', 'descripcion', 'prioridad', 
-            'reserva_id', 'tags'
+            'id', 'numero_ticket', 'tipo_solicitud', 'asunto', 'descripcion', 'prioridad',
+            'estado', 'agente_soporte'
         ]
-    
-    def validate_reserva_id(self, value):
-        """Validar que la reserva pertenezca al cliente."""
-        if value:
-            try:
-                reserva = Reserva.objects.get(id=value)
-                if reserva.usuario != self.context['request'].user:
-                    raise serializers.ValidationError(
-                        "No tiene permisos para referenciar esta reserva."
-                    )
-                return reserva
-            except Reserva.DoesNotExist:
-                raise serializers.ValidationError("La reserva especificada no existe.")
-        return None
+        read_only_fields = ['id', 'numero_ticket', 'estado', 'agente_soporte']
     
     def create(self, validated_data):
         """Crear solicitud asignando el cliente automáticamente."""
-        reserva = validated_data.pop('reserva_id', None)
-        validated_data['cliente'] = self.context['request'].user
-        
-        if reserva:
-            validated_data['reserva'] = reserva
-        
+        validated_data['usuario'] = self.context['request'].user
         return super().create(validated_data)
 
 
@@ -248,7 +302,7 @@ class GestionSolicitudSoporteSerializer(serializers.ModelSerializer):
         model = TicketSoporte
         fields = [
             'estado', 'prioridad', 'agente_soporte', 'asignar_a_agente_id',
-            'tags', 'comentario_interno', 'satisfaccion_cliente'
+            'satisfaccion_cliente'
         ]
     
     def validate_asignar_a_agente_id(self, value):
@@ -294,6 +348,17 @@ class DashboardSoporteSerializer(serializers.Serializer):
     carga_por_agente = serializers.ListField()
     
     tendencia_semanal = serializers.ListField()
+    generado_en = serializers.DateTimeField()
+
+
+class TendenciaQuerySerializer(serializers.Serializer):
+    """Parámetros de la tendencia histórica (se responde desde las métricas diarias)."""
+
+    dias = serializers.IntegerField(min_value=1, max_value=366, default=90)
+    agrupar = serializers.ChoiceField(choices=['dia', 'semana', 'mes'], default='dia')
+    tipo_solicitud = serializers.ChoiceField(choices=TicketSoporte.TipoSolicitud.choices, required=False)
+    prioridad = serializers.ChoiceField(choices=TicketSoporte.PrioridadSolicitud.choices, required=False)
+    agente = serializers.IntegerField(required=False)
 
 
 class EstadisticasClienteSerializer(serializers.Serializer):
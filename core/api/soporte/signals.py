@@ -1,130 +1,251 @@
 # pyright: reportAttributeAccessIssue=false
 
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
-from django.contrib.auth.models import User, Group
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Q
 from django.core.mail import send_mail
 from django.conf import settings
-from core.models import TicketSoporte, MensajeSoporte
+from django.utils import timezone
+from datetime import timedelta
+from core.models import TicketSoporte, MensajeSoporte, ConfiguracionSoporte
+from core.api.reservas import outbox
+from . import metricas, sla, tiempo_real
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Segundos que espera el aviso de respuesta al cliente: los mensajes de soporte
+# que llegan en ese lapso salen en un solo correo
+VENTANA_AVISO_RESPUESTA = getattr(settings, 'SOPORTE_AVISO_VENTANA', 120)
+
+
+def _encolar_aviso(tipo, solicitud_id, espera=0):
+    """Encola el correo en el outbox al confirmar: el request no espera al SMTP."""
+    transaction.on_commit(lambda: outbox.encolar_aviso_soporte(tipo, solicitud_id, espera))
+
+
+@receiver(pre_save, sender=TicketSoporte)
+def preparar_nueva_solicitud(sender, instance, **kwargs):
+    """
+    Antes del INSERT: lee la configuración una sola vez para todo el alta y
+    sube la prioridad de reprogramaciones urgentes, sin un segundo save().
+    """
+    if not instance._state.adding:
+        return
+    instance._config_soporte = ConfiguracionSoporte.obtener_configuracion()
+
+    # Si la reserva es en menos de 24 horas, prioridad alta
+    reserva = getattr(instance, 'reserva', None)
+    if instance.tipo_solicitud == TicketSoporte.TipoSolicitud.REPROGRAMACION and reserva \
+            and reserva.fecha_inicio <= timezone.now() + timedelta(hours=24):
+        instance.prioridad = TicketSoporte.PrioridadSolicitud.ALTA
+
+
+@receiver(pre_save, sender=TicketSoporte)
+def sellar_plazo_respuesta(sender, instance, update_fields=None, **kwargs):
+    """Calcula el plazo SLA al crear la solicitud o al cambiar su prioridad."""
+    if update_fields is not None and 'prioridad' not in update_fields:
+        return
+    if sla.sellar(instance, getattr(instance, '_config_soporte', None)) and update_fields is not None and 'fecha_limite_respuesta' not in update_fields:
+        # save(update_fields=[...]) no incluye el plazo: se guarda aparte en post_save
+        instance._plazo_pendiente = True
+
+
+@receiver(post_save, sender=TicketSoporte)
+def registrar_cambios_solicitud(sender, instance, created, **kwargs):
+    """Guarda el plazo SLA si quedó fuera de update_fields y actualiza las métricas diarias."""
+    if getattr(instance, '_plazo_pendiente', False):
+        instance._plazo_pendiente = False
+        TicketSoporte.objects.filter(pk=instance.pk).update(fecha_limite_respuesta=instance.fecha_limite_respuesta)
+    metricas.registrar_cambio(instance, creada=created)
+    # Lo guardado pasa a ser el valor original para el próximo save()
+    instance.recordar_valores()
+
+
 @receiver(post_save, sender=TicketSoporte)
 def procesar_nueva_solicitud(sender, instance, created, **kwargs):
     """
     Procesa una nueva solicitud de soporte:
     1. Asigna automáticamente un agente si está configurado
-    2. Envía notificación al cliente
-    3. Determina prioridad automática para reprogramaciones
+    2. Encola la confirmación al cliente (la envía run_outbox_worker)
     """
     if created:
-        from core.models import ConfiguracionSoporte
-        config = ConfiguracionSoporte.objects.first()  # O usa tu método obtener_configuracion()
+        config = getattr(instance, '_config_soporte', None)
 
-        if config and config.asignacion_automatica:
-            agente_disponible = obtener_agente_disponible()
+        # Una solicitud creada ya con agente lo conserva
+        if config and config.asignacion_automatica and not instance.agente_soporte_id:
+            agente_disponible = asignar_agente_disponible(instance, config)
             if agente_disponible:
-                instance.asignar_agente(agente_disponible)
                 logger.info(f"Ticket {instance.id} auto-asignado a {agente_disponible.get_full_name()}")  # type: ignore
 
-        # Prioridad automática para reprogramaciones urgentes
-        if instance.tipo_solicitud == TicketSoporte.TipoSolicitud.REPROGRAMACION and hasattr(instance, 'reserva') and instance.reserva:
-            from datetime import timedelta
-            from django.utils import timezone
+        if config and config.enviar_emails_cliente:
+            _encolar_aviso(outbox.NUEVA_SOLICITUD_SOPORTE, instance.pk)
 
-            # Si la reserva es en menos de 24 horas, prioridad alta
-            if instance.reserva.fecha_inicio <= timezone.now() + timedelta(hours=24):
-                instance.prioridad = TicketSoporte.PrioridadSolicitud.ALTA
-                instance.save(update_fields=['prioridad'])
+        logger.info(f"Nuevo ticket creado: {instance.id} - Tipo: {instance.tipo_solicitud}")
 
-        # Enviar notificación al cliente
-        enviar_notificacion_nueva_solicitud(instance)
 
-        logger.info(f"Nuevo ticket creado: {instance.id} - Tipo: {instance.tipo_solicitud}")
+@receiver(pre_save, sender=MensajeSoporte)
+def marcar_leido_por_remitente(sender, instance, **kwargs):
+    """El remitente ya leyó su propio mensaje: se guarda en el mismo INSERT."""
+    if not instance._state.adding:
+        return
+    ahora = timezone.now()
+    if instance.es_del_cliente:
+        instance.leido_por_cliente = True
+        instance.fecha_lectura_cliente = ahora
+    else:
+        instance.leido_por_soporte = True
+        instance.fecha_lectura_soporte = ahora
+
 
 @receiver(post_save, sender=MensajeSoporte)
 def procesar_nuevo_mensaje(sender, instance, created, **kwargs):
     """
     Procesa un nuevo mensaje:
     1. Actualiza estado del ticket si es necesario
-    2. Marca mensajes como leídos automáticamente según el remitente
+    2. Detiene el plazo SLA con la primera respuesta de soporte
+    3. Encola el aviso al cliente, agrupado por solicitud (VENTANA_AVISO_RESPUESTA)
     """
     if created:
-        ticket = instance.ticket  # Ajusta si tu campo se llama diferente
+        ticket = instance.ticket
         # Si el mensaje es del cliente y el ticket estaba esperando respuesta, cambiar estado
-        if hasattr(instance, 'es_del_cliente') and instance.es_del_cliente and \
-           ticket.estado == TicketSoporte.EstadoSolicitud.ESPERANDO_CLIENTE:
+        if instance.es_del_cliente and ticket.estado == TicketSoporte.EstadoSolicitud.ESPERANDO_CLIENTE:
             ticket.estado = TicketSoporte.EstadoSolicitud.EN_PROCESO
-            ticket.save(update_fields=['estado'])
+            ticket.save(update_fields=['estado', 'updated_at'])
 
-        # Marcar como leído por el remitente automáticamente
-        if hasattr(instance, 'es_del_cliente') and instance.es_del_cliente:
-            instance.leido_por_cliente = True
-            instance.fecha_lectura_cliente = instance.fecha
-        else:
-            instance.leido_por_soporte = True
-            instance.fecha_lectura_soporte = instance.fecha
+        if instance.es_del_soporte and not instance.es_interno:
+            # Primera respuesta visible de soporte: detiene el plazo SLA
+            if ticket.fecha_primera_respuesta is None and TicketSoporte.objects.filter(
+                pk=ticket.pk, fecha_primera_respuesta__isnull=True
+            ).update(fecha_primera_respuesta=instance.fecha):
+                ticket.fecha_primera_respuesta = instance.fecha
+                metricas.registrar_cambio(ticket)
+                ticket.recordar_valores()
 
-        instance.save(update_fields=[
-            'leido_por_cliente', 'leido_por_soporte',
-            'fecha_lectura_cliente', 'fecha_lectura_soporte'
-        ])
+            _encolar_aviso(outbox.RESPUESTA_SOPORTE, ticket.pk, VENTANA_AVISO_RESPUESTA)
 
         logger.info(f"Nuevo mensaje en ticket {ticket.id} de {instance.remitente.get_full_name()}")
 
-def obtener_agente_disponible():
+def _canales(ticket):
+    canales = [tiempo_real.canal_solicitud(ticket.pk)]
+    if ticket.agente_soporte_id:
+        canales.append(tiempo_real.canal_agente(ticket.agente_soporte_id))
+    return canales
+
+
+@receiver(post_save, sender=MensajeSoporte)
+def publicar_nuevo_mensaje(sender, instance, created, **kwargs):
+    """Publica el mensaje en los flujos SSE de la solicitud y de su agente al confirmar."""
+    if not created:
+        return
+
+    def armar():
+        ticket = instance.ticket
+        return _canales(ticket), {
+            'id': instance.pk,
+            'solicitud': ticket.pk,
+            'remitente': {'id': instance.remitente_id, 'nombre_completo': instance.remitente.get_full_name()},
+            'mensaje': instance.mensaje,
+            'fecha': instance.fecha,
+            'es_interno': instance.es_interno,
+            'es_del_cliente': instance.es_del_cliente,
+            'leido_por_cliente': instance.leido_por_cliente,
+            'leido_por_soporte': instance.leido_por_soporte,
+        }
+    tiempo_real.publicar_al_confirmar('mensaje', armar, interno=instance.es_interno)
+
+
+@receiver(post_save, sender=TicketSoporte)
+def publicar_cambio_solicitud(sender, instance, created, **kwargs):
+    """
+    Publica el estado de la solicitud al confirmar. Varios ``save()`` en la
+    misma transacción (creación, auto-asignación, prioridad) salen como un solo evento.
+    """
+    if created:
+        instance._evento_nueva = True
+    if getattr(instance, '_evento_pendiente', False):
+        return
+    instance._evento_pendiente = True
+
+    def armar():
+        instance._evento_pendiente = False
+        nueva, instance._evento_nueva = getattr(instance, '_evento_nueva', False), False
+        return _canales(instance), {
+            'id': instance.pk,
+            'numero_ticket': instance.numero_ticket,
+            'estado': instance.estado,
+            'prioridad': instance.prioridad,
+            'agente_soporte': instance.agente_soporte_id,
+            'updated_at': instance.updated_at,
+            'nueva': nueva,
+        }
+    tiempo_real.publicar_al_confirmar('solicitud', armar)
+
+
+def agentes_por_carga(max_solicitudes=None):
+    """
+    Agentes activos del grupo Soporte anotados con sus solicitudes activas, de
+    menor a mayor carga, en una sola consulta.
+    """
+    agentes = get_user_model().objects.filter(groups__name='Soporte', is_active=True).annotate(
+        solicitudes_activas=Count(
+            'solicitudes_asignadas', filter=Q(solicitudes_asignadas__estado__in=TicketSoporte.ESTADOS_ACTIVOS)
+        )
+    )
+    if max_solicitudes is not None:
+        agentes = agentes.filter(solicitudes_activas__lt=max_solicitudes)
+    return agentes.order_by('solicitudes_activas', 'id')
+
+
+def obtener_agente_disponible(config=None):
     """
     Busca un agente de soporte disponible con menos carga de trabajo.
     """
+    max_solicitudes = config.max_solicitudes_por_agente if config else 10
+    agente = agentes_por_carga(max_solicitudes).first()
+    if agente is None:
+        logger.warning("No hay agentes de soporte disponibles")
+    return agente
+
+
+def asignar_agente_disponible(ticket, config=None):
+    """
+    Asigna el ticket al agente menos cargado respetando ``max_solicitudes_por_agente``.
+
+    La fila del agente elegido se bloquea y su carga se vuelve a contar dentro
+    de la transacción, así dos tickets simultáneos no pueden pasarlo del
+    máximo. Si otro ticket lo llenó entre tanto se prueba el siguiente.
+    """
+    max_solicitudes = config.max_solicitudes_por_agente if config else 10
+    Usuario = get_user_model()
     try:
-        grupo_soporte = Group.objects.get(name='Soporte')
-        agentes = grupo_soporte.user_set.filter(is_active=True)
-
-        if not agentes.exists():
-            logger.warning("No hay agentes de soporte disponibles")
-            return None
-
-        from core.models import ConfiguracionSoporte
-        config = ConfiguracionSoporte.objects.first()  # O usa tu método obtener_configuracion()
-
-        # Si no hay configuración, usa un valor por defecto
-        max_solicitudes = config.max_solicitudes_por_agente if config else 10
-
-        agente_menos_cargado = None
-        min_solicitudes = float('inf')
-
-        for agente in agentes:
-            solicitudes_activas = agente.tickets_soporte.filter(
-    estado__in=[
-        TicketSoporte.EstadoSolicitud.PENDIENTE,
-        TicketSoporte.EstadoSolicitud.EN_PROCESO,
-        TicketSoporte.EstadoSolicitud.ESPERANDO_CLIENTE
-    ]
-).count()  # type: ignore
-            
-            if solicitudes_activas < min_solicitudes and solicitudes_activas < max_solicitudes:
-                min_solicitudes = solicitudes_activas
-                agente_menos_cargado = agente
-
-        return agente_menos_cargado
-
-    except Group.DoesNotExist:
-        logger.error("Grupo 'Soporte' no existe. Crear grupo en Django Admin.")
-        return None
+        with transaction.atomic():
+            for agente in agentes_por_carga(max_solicitudes)[:5]:
+                Usuario.objects.select_for_update().filter(pk=agente.pk).first()
+                activas = TicketSoporte.objects.filter(
+                    agente_soporte=agente, estado__in=TicketSoporte.ESTADOS_ACTIVOS
+                ).count()
+                if activas < max_solicitudes:
+                    ticket.asignar_agente(agente)
+                    return agente
     except Exception as e:
         logger.error(f"Error obteniendo agente disponible: {e}")
         return None
+    logger.warning("No hay agentes de soporte disponibles")
+    return None
 
-def enviar_notificacion_nueva_solicitud(ticket):
+def enviar_notificacion_nueva_solicitud(ticket, config=None):
     """
     Envía notificación por email al cliente sobre la nueva solicitud.
+    Devuelve False si el envío falló (el outbox lo reintenta).
     """
-    from core.models import ConfiguracionSoporte
-    config = ConfiguracionSoporte.objects.first()  # O usa tu método obtener_configuracion()
+    if config is None:
+        config = ConfiguracionSoporte.obtener_configuracion()
 
     if not config or not config.enviar_emails_cliente:
-        return
+        return True
 
     try:
         cliente = ticket.usuario  # O ticket.cliente según tu modelo
@@ -161,24 +282,83 @@ Equipo de Soporte - Sistema UAGRM
         )
 
         logger.info(f"Notificación enviada a {cliente.email} para ticket {ticket.id}")
+        return True
 
     except Exception as e:
         logger.error(f"Error enviando notificación de nueva solicitud: {e}")
+        return False
 
-def enviar_notificacion_mensaje_cliente(mensaje):
+def enviar_recordatorio_cliente(ticket, config=None):
     """
-    Envía notificación al cliente cuando soporte responde.
+    Recuerda al cliente que la solicitud espera su respuesta.
+    Devuelve False si el envío falló (el outbox lo reintenta).
     """
-    if hasattr(mensaje, 'es_del_soporte') and mensaje.es_del_soporte and not getattr(mensaje, 'es_interno', False):
-        try:
-            ticket = mensaje.ticket  # Ajusta si tu campo se llama diferente
-            cliente = ticket.usuario  # O ticket.cliente según tu modelo
-            asunto = f"Nueva respuesta en su solicitud #{ticket.id}"
+    if config is None:
+        config = ConfiguracionSoporte.obtener_configuracion()
+
+    if ticket.estado != TicketSoporte.EstadoSolicitud.ESPERANDO_CLIENTE or (config and not config.enviar_emails_cliente):
+        return True
+
+    try:
+        cliente = ticket.usuario
+        asunto = f"Su solicitud #{ticket.id} espera su respuesta"
 
-            mensaje_texto = f"""
+        mensaje_texto = f"""
 Estimado/a {cliente.get_full_name()},
 
-Hemos respondido a su solicitud de soporte.
+Nuestro equipo de soporte está esperando su respuesta para continuar con su solicitud.
+
+Ticket: #{ticket.id}
+Asunto: {getattr(ticket, 'asunto', '')}
+
+Puede responder ingresando a su panel de cliente en nuestro sistema.
+
+Saludos cordiales,
+Equipo de Soporte - Sistema UAGRM
+"""
+
+        send_mail(
+            subject=asunto,
+            message=mensaje_texto,
+            from_email=f"Soporte UAGRM <{settings.DEFAULT_FROM_EMAIL}>",
+            recipient_list=[cliente.email],
+            fail_silently=False,
+        )
+
+        logger.info(f"Recordatorio enviado a {cliente.email} para ticket {ticket.id}")
+        return True
+
+    except Exception as e:
+        logger.error(f"Error enviando recordatorio de solicitud {ticket.id}: {e}")
+        return False
+
+def enviar_notificacion_mensaje_cliente(ticket, config=None):
+    """
+    Envía notificación al cliente cuando soporte responde. Un solo correo por
+    todas las respuestas que el cliente aún no leyó; si ya las leyó no se envía.
+    Devuelve False si el envío falló (el outbox lo reintenta).
+    """
+    if config is None:
+        config = ConfiguracionSoporte.obtener_configuracion()
+
+    if config and not config.enviar_emails_cliente:
+        return True
+
+    nuevas = ticket.mensajes.filter(es_interno=False, leido_por_cliente=False).exclude(
+        remitente_id=ticket.usuario_id
+    ).count()
+    if not nuevas:
+        return True
+
+    try:
+        cliente = ticket.usuario
+        asunto = f"Nueva respuesta en su solicitud #{ticket.id}"
+        respuestas = "una nueva respuesta" if nuevas == 1 else f"{nuevas} nuevas respuestas"
+
+        mensaje_texto = f"""
+Estimado/a {cliente.get_full_name()},
+
+Tiene {respuestas} en su solicitud de soporte.
 
 Ticket: #{ticket.id}
 Asunto: {getattr(ticket, 'asunto', '')}
@@ -189,15 +369,17 @@ Saludos cordiales,
 Equipo de Soporte - Sistema UAGRM
 """
 
-            send_mail(
-                subject=asunto,
-                message=mensaje_texto,
-                from_email=f"Soporte UAGRM <{settings.DEFAULT_FROM_EMAIL}>",
-                recipient_list=[cliente.email],
-                fail_silently=False,
-            )
+        send_mail(
+            subject=asunto,
+            message=mensaje_texto,
+            from_email=f"Soporte UAGRM <{settings.DEFAULT_FROM_EMAIL}>",
+            recipient_list=[cliente.email],
+            fail_silently=False,
+        )
 
-            logger.info(f"Notificación de respuesta enviada a {cliente.email}")
+        logger.info(f"Notificación de respuesta enviada a {cliente.email} ({nuevas} mensajes)")
+        return True
 
-        except Exception as e:
-            logger.error(f"Error enviando notificación de mensaje: {e}")
\ No newline at end of file
+    except Exception as e:
+        logger.error(f"Error enviando notificación de mensaje: {e}")
+        return False
@@ -0,0 +1,197 @@
+"""
+Plazos de respuesta (SLA) de las solicitudes de soporte.
+
+``sellar`` calcula ``fecha_limite_respuesta`` con las horas de
+``ConfiguracionSoporte.tiempo_respuesta_*`` según la prioridad; se llama desde
+el ``pre_save`` de ``TicketSoporte`` al crear la solicitud y cuando cambia su
+prioridad.
+
+``barrer`` (usado por ``manage.py sla_sweeper``) toma las solicitudes vencidas
+sin primera respuesta en orden de vencimiento, por el índice
+``(estado, fecha_limite_respuesta)``, y las escala con pocos ``UPDATE``
+masivos:
+
+- Prioridad BAJA/MEDIA/ALTA: sube un nivel y recibe un plazo nuevo.
+- Prioridad CRITICA: se reasigna al agente con menos carga y recibe un plazo
+  nuevo.
+
+El costo depende de cuántas solicitudes vencieron, no de cuántas hay abiertas.
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Min, Value, When
+from django.utils import timezone
+
+from core.models import ConfiguracionSoporte, TicketSoporte
+from . import metricas
+
+logger = logging.getLogger(__name__)
+
+TAMANO_LOTE = getattr(settings, 'SOPORTE_SLA_TAMANO_LOTE', 500)
+
+Prioridad = TicketSoporte.PrioridadSolicitud
+Estado = TicketSoporte.EstadoSolicitud
+
+# Estados en los que corre el plazo de respuesta (ESPERANDO_CLIENTE lo pausa)
+ESTADOS_CON_PLAZO = (Estado.PENDIENTE, Estado.EN_PROCESO)
+
+CAMPO_HORAS = {
+    Prioridad.CRITICA: 'tiempo_respuesta_critica',
+    Prioridad.ALTA: 'tiempo_respuesta_alta',
+    Prioridad.MEDIA: 'tiempo_respuesta_media',
+    Prioridad.BAJA: 'tiempo_respuesta_baja',
+}
+
+SIGUIENTE_PRIORIDAD = {
+    Prioridad.BAJA: Prioridad.MEDIA,
+    Prioridad.MEDIA: Prioridad.ALTA,
+    Prioridad.ALTA: Prioridad.CRITICA,
+}
+
+
+class ResumenBarrido(NamedTuple):
+    vencidas: int
+    escaladas: int
+    reasignadas: int
+    # Segundos de atraso de la más vencida del lote (cuánto tarda el barrido en enterarse)
+    atraso_maximo: float
+
+
+def horas(prioridad: str, config: Optional[ConfiguracionSoporte] = None) -> int:
+    campo = CAMPO_HORAS.get(prioridad, CAMPO_HORAS[Prioridad.MEDIA])
+    if config is None:
+        return ConfiguracionSoporte._meta.get_field(campo).default  # type: ignore
+    return getattr(config, campo)
+
+
+def limite(prioridad: str, desde: datetime, config: Optional[ConfiguracionSoporte] = None) -> datetime:
+    return desde + timedelta(hours=horas(prioridad, config))
+
+
+def sellar(ticket: TicketSoporte, config: Optional[ConfiguracionSoporte] = None) -> bool:
+    """
+    Fija ``fecha_limite_respuesta`` si la solicitud es nueva o cambió su
+    prioridad; el plazo se cuenta desde la creación. Devuelve True si lo cambió.
+    Solo consulta la base para leer la configuración cuando hace falta.
+    """
+    if not ticket._state.adding:
+        originales = getattr(ticket, '_originales', None)
+        if originales is None or originales['prioridad'] == ticket.prioridad:
+            return False
+    if config is None:
+        config = ConfiguracionSoporte.obtener_configuracion()
+    desde = ticket.fecha_creacion or timezone.now()
+    ticket.fecha_limite_respuesta = limite(ticket.prioridad, desde, config)
+    return True
+
+
+def vencidas(ahora: Optional[datetime] = None):
+    """Solicitudes con el plazo vencido y sin primera respuesta, la más atrasada primero."""
+    return TicketSoporte.objects.filter(
+        estado__in=ESTADOS_CON_PLAZO,
+        fecha_limite_respuesta__lte=ahora or timezone.now(),
+        fecha_primera_respuesta__isnull=True,
+    ).order_by('fecha_limite_respuesta', 'id')
+
+
+def proximo_vencimiento() -> Optional[datetime]:
+    """Próximo plazo por vencer (consulta indexada), para que el barrido duerma hasta entonces."""
+    return TicketSoporte.objects.filter(
+        estado__in=ESTADOS_CON_PLAZO,
+        fecha_limite_respuesta__gt=timezone.now(),
+        fecha_primera_respuesta__isnull=True,
+    ).aggregate(proximo=Min('fecha_limite_respuesta'))['proximo']
+
+
+def _repartir(tickets: List[Tuple[int, Optional[int]]], config: Optional[ConfiguracionSoporte]) -> Dict[int, int]:
+    """
+    Reparte las solicitudes ``(id, agente_actual)`` entre los agentes de menor
+    carga, sin devolver ninguna a su agente actual: {ticket_id: agente_id}.
+    """
+    from .signals import agentes_por_carga
+
+    maximo = config.max_solicitudes_por_agente if config else 10
+    cupos = {agente.pk: maximo - agente.solicitudes_activas for agente in agentes_por_carga(maximo)}
+    asignacion: Dict[int, int] = {}
+    for ticket_id, actual in tickets:
+        candidatos = [pk for pk, libres in cupos.items() if libres > 0 and pk != actual]
+        if not candidatos:
+            continue
+        elegido = max(candidatos, key=lambda pk: cupos[pk])
+        asignacion[ticket_id] = elegido
+        cupos[elegido] -= 1
+    return asignacion
+
+
+def barrer(tamano_lote: int = TAMANO_LOTE) -> ResumenBarrido:
+    """Escala un lote de solicitudes vencidas. Varios barridos en paralelo no toman las mismas filas."""
+    ahora = timezone.now()
+    config = ConfiguracionSoporte.obtener_configuracion()
+
+    with transaction.atomic():
+        filas = list(
+            vencidas(ahora).select_for_update(skip_locked=True)
+            .values('id', 'fecha_limite_respuesta', *TicketSoporte.CAMPOS_SEGUIDOS)[:tamano_lote]
+        )
+        if not filas:
+            return ResumenBarrido(0, 0, 0, 0)
+
+        por_prioridad: Dict[str, List[int]] = {}
+        agentes: Dict[int, Optional[int]] = {}
+        for fila in filas:
+            por_prioridad.setdefault(fila['prioridad'], []).append(fila['id'])
+            agentes[fila['id']] = fila['agente_soporte_id']
+
+        # Un UPDATE por prioridad destino: sube un nivel y plazo nuevo desde ahora
+        escaladas = 0
+        for prioridad, siguiente in SIGUIENTE_PRIORIDAD.items():
+            ids = por_prioridad.get(prioridad)
+            if ids:
+                escaladas += TicketSoporte.objects.filter(id__in=ids).update(
+                    prioridad=siguiente,
+                    fecha_limite_respuesta=limite(siguiente, ahora, config),
+                    escalamientos=F('escalamientos') + 1,
+                    updated_at=ahora,
+                )
+
+        # Las críticas vencidas cambian de agente en un solo UPDATE con CASE
+        reasignadas = 0
+        asignacion: Dict[int, int] = {}
+        criticas = por_prioridad.get(Prioridad.CRITICA, [])
+        if criticas:
+            asignacion = _repartir([(t, agentes[t]) for t in criticas], config)
+            if asignacion:
+                reasignadas = TicketSoporte.objects.filter(id__in=list(asignacion)).update(
+                    agente_soporte=Case(
+                        *[When(id=t, then=Value(a)) for t, a in asignacion.items()], output_field=IntegerField()
+                    ),
+                )
+            TicketSoporte.objects.filter(id__in=criticas).update(
+                fecha_limite_respuesta=limite(Prioridad.CRITICA, ahora, config),
+                escalamientos=F('escalamientos') + 1,
+                updated_at=ahora,
+            )
+
+        # Los UPDATE no pasan por post_save: las métricas diarias se mueven aquí, en bloque
+        despues = [
+            {
+                **fila,
+                'prioridad': SIGUIENTE_PRIORIDAD.get(fila['prioridad'], fila['prioridad']),
+                'agente_soporte_id': asignacion.get(fila['id'], fila['agente_soporte_id']),
+            }
+            for fila in filas
+        ]
+        metricas.registrar_cambios_masivos(filas, despues)
+
+    atraso = (ahora - filas[0]['fecha_limite_respuesta']).total_seconds()
+    resumen = ResumenBarrido(len(filas), escaladas, reasignadas, atraso)
+    logger.info(
+        f"SLA: {resumen.vencidas} vencidas, {resumen.escaladas} escaladas, "
+        f"{resumen.reasignadas} reasignadas, atraso máximo {resumen.atraso_maximo:.0f}s"
+    )
+    return resumen
@@ -0,0 +1,83 @@
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from authz.models import Usuario
+from core.models import MensajeSoporte, TicketSoporte
+
+URL = '/api/soporte/solicitudes/'
+
+
+class AnotacionesListadoTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agente = Usuario.objects.create(email='agente@test.com', nombres='Ana', apellidos='Soporte')
+        cls.agente.groups.add(Group.objects.create(name='Soporte'))
+        cls.cliente = Usuario.objects.create(email='cliente@test.com', nombres='Carlos', apellidos='Cliente')
+
+    def mensaje(self, ticket, remitente, texto, fecha=None, **campos):
+        mensaje = MensajeSoporte.objects.create(ticket=ticket, remitente=remitente, mensaje=texto, **campos)
+        if fecha is not None:
+            MensajeSoporte.objects.filter(pk=mensaje.pk).update(fecha=fecha)
+        return mensaje
+
+    def listar(self, usuario):
+        api = APIClient(SERVER_NAME='localhost')
+        api.force_authenticate(usuario)
+        respuesta = api.get(URL)
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        return {fila['id']: fila for fila in respuesta.data['results']}
+
+    def test_no_leidos_y_ultimo_mensaje_segun_quien_mira(self):
+        ticket = TicketSoporte.objects.create(usuario=self.cliente, asunto='Pago')
+        vacio = TicketSoporte.objects.create(usuario=self.cliente, asunto='Sin mensajes')
+        self.mensaje(ticket, self.cliente, 'Hola')
+        self.mensaje(ticket, self.cliente, 'Sigo esperando')
+        self.mensaje(ticket, self.agente, 'Ya lo revisamos')
+        # La nota interna es la más reciente, pero nadie la ve como último mensaje ni el cliente la cuenta
+        self.mensaje(ticket, self.agente, 'Cliente insistente', es_interno=True)
+
+        del_cliente = self.listar(self.cliente)
+        self.assertEqual(del_cliente[ticket.pk]['mensajes_no_leidos'], 1)
+        self.assertEqual(del_cliente[ticket.pk]['ultimo_mensaje']['mensaje'], 'Ya lo revisamos')
+        self.assertFalse(del_cliente[ticket.pk]['ultimo_mensaje']['es_del_cliente'])
+        self.assertEqual((del_cliente[vacio.pk]['mensajes_no_leidos'], del_cliente[vacio.pk]['ultimo_mensaje']), (0, None))
+
+        del_agente = self.listar(self.agente)
+        self.assertEqual(del_agente[ticket.pk]['mensajes_no_leidos'], 2)
+        self.assertEqual(del_agente[ticket.pk]['ultimo_mensaje']['remitente'], self.agente.get_full_name())
+
+        # Marcar leídos baja el contador de cada lado por separado
+        MensajeSoporte.objects.filter(ticket=ticket, remitente=self.cliente).update(leido_por_soporte=True)
+        self.assertEqual(self.listar(self.agente)[ticket.pk]['mensajes_no_leidos'], 0)
+        self.assertEqual(self.listar(self.cliente)[ticket.pk]['mensajes_no_leidos'], 1)
+
+    def test_ultimo_mensaje_desempata_por_id(self):
+        ticket = TicketSoporte.objects.create(usuario=self.cliente, asunto='Pago')
+        fecha = timezone.now()
+        self.mensaje(ticket, self.cliente, 'primero', fecha=fecha)
+        self.mensaje(ticket, self.agente, 'segundo', fecha=fecha)
+        self.mensaje(ticket, self.cliente, 'viejo', fecha=fecha.replace(year=fecha.year - 1))
+
+        self.assertEqual(self.listar(self.cliente)[ticket.pk]['ultimo_mensaje']['mensaje'], 'segundo')
+
+    def test_consultas_constantes_por_pagina(self):
+        def consultas():
+            with CaptureQueriesContext(connection) as capturadas:
+                self.listar(self.agente)
+            return len(capturadas)
+
+        for i in range(2):
+            ticket = TicketSoporte.objects.create(usuario=self.cliente, asunto=f'T{i}')
+            self.mensaje(ticket, self.cliente, 'hola')
+        con_dos = consultas()
+
+        for i in range(6):
+            ticket = TicketSoporte.objects.create(usuario=self.cliente, asunto=f'U{i}')
+            self.mensaje(ticket, self.cliente, 'hola')
+            self.mensaje(ticket, self.agente, 'respuesta')
+        self.assertEqual(consultas(), con_dos)
@@ -0,0 +1,84 @@
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from authz.models import Usuario
+from core.models import MensajeSoporte, TicketSoporte
+
+URL = '/api/soporte/solicitudes/'
+
+
+class BusquedaSoporteTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agente = Usuario.objects.create(email='ana@test.com', nombres='Ana', apellidos='Soporte')
+        cls.agente.groups.add(Group.objects.create(name='Soporte'))
+        cls.cliente = Usuario.objects.create(email='cliente@test.com', nombres='Carlos', apellidos='Cliente')
+        cls.otro = Usuario.objects.create(email='otro@test.com', nombres='Olga', apellidos='Cliente')
+
+    def buscar(self, usuario, texto):
+        cliente = APIClient(SERVER_NAME='localhost')
+        cliente.force_authenticate(usuario)
+        respuesta = cliente.get(URL, {'q': texto})
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        return respuesta.data['results']
+
+    def indice(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT rowid, ticket_id, interno, titulo, contenido FROM soporte_busqueda ORDER BY rowid')
+            return cursor.fetchall()
+
+    def test_triggers_mantienen_el_indice(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('índice FTS5 solo en SQLite')
+        ticket = TicketSoporte.objects.create(usuario=self.cliente, asunto='Cobro doble', descripcion='Tarjeta')
+        mensaje = MensajeSoporte.objects.create(ticket=ticket, remitente=self.agente, mensaje='Revisando', es_interno=True)
+        # rowid = id * 2 para la solicitud, id * 2 + 1 para el mensaje
+        self.assertCountEqual(self.indice(), [
+            (ticket.pk * 2, ticket.pk, 0, 'Cobro doble', 'Tarjeta'),
+            (mensaje.pk * 2 + 1, ticket.pk, 1, '', 'Revisando'),
+        ])
+
+        TicketSoporte.objects.filter(pk=ticket.pk).update(asunto='Cobro triple')
+        MensajeSoporte.objects.filter(pk=mensaje.pk).update(mensaje='Listo', es_interno=False)
+        self.assertCountEqual(self.indice(), [
+            (ticket.pk * 2, ticket.pk, 0, 'Cobro triple', 'Tarjeta'),
+            (mensaje.pk * 2 + 1, ticket.pk, 0, '', 'Listo'),
+        ])
+
+        mensaje.delete()
+        self.assertEqual([fila[0] for fila in self.indice()], [ticket.pk * 2])
+        ticket.delete()
+        self.assertEqual(self.indice(), [])
+
+    def test_q_encuentra_por_asunto_y_mensajes(self):
+        por_asunto = TicketSoporte.objects.create(usuario=self.cliente, asunto='Reembolso pendiente')
+        por_mensaje = TicketSoporte.objects.create(usuario=self.cliente, asunto='Consulta general')
+        MensajeSoporte.objects.create(ticket=por_mensaje, remitente=self.cliente, mensaje='¿Cuándo llega el reembolso?')
+        # bm25 necesita un corpus donde el término sea poco frecuente para dar relevancias distintas de cero
+        for asunto in ('Cambio de fecha', 'Factura', 'Equipaje', 'Traslado', 'Hotel', 'Guía'):
+            TicketSoporte.objects.create(usuario=self.cliente, asunto=asunto)
+
+        resultados = self.buscar(self.cliente, 'reembolsó')
+
+        # Sin acentos, y el asunto pesa más que el cuerpo de un mensaje
+        self.assertEqual([r['id'] for r in resultados], [por_asunto.pk, por_mensaje.pk])
+        self.assertGreater(resultados[0]['relevancia'], resultados[1]['relevancia'])
+        self.assertIn('<mark>Reembolso</mark>', resultados[0]['fragmento'])
+        self.assertIn('<mark>reembolso</mark>', resultados[1]['fragmento'])
+        # El último término busca por prefijo
+        self.assertEqual(len(self.buscar(self.cliente, 'reemb')), 2)
+
+    def test_q_respeta_dueño_y_notas_internas(self):
+        propio = TicketSoporte.objects.create(usuario=self.cliente, asunto='Consulta')
+        MensajeSoporte.objects.create(ticket=propio, remitente=self.agente, mensaje='cliente moroso', es_interno=True)
+        ajeno = TicketSoporte.objects.create(usuario=self.otro, asunto='Equipaje moroso')
+
+        self.assertEqual(self.buscar(self.cliente, 'moroso'), [])
+        self.assertEqual([r['id'] for r in self.buscar(self.otro, 'moroso')], [ajeno.pk])
+        self.assertCountEqual([r['id'] for r in self.buscar(self.agente, 'moroso')], [propio.pk, ajeno.pk])
+        # Las comillas y operadores de FTS5 se descartan en vez de romper la consulta
+        self.assertEqual([r['id'] for r in self.buscar(self.agente, '"moroso* OR')], [])
+        self.assertCountEqual([r['id'] for r in self.buscar(self.agente, '"moroso"')], [propio.pk, ajeno.pk])
@@ -0,0 +1,84 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from authz.models import Usuario
+from core.api.reservas import outbox
+from core.api.soporte import cierre
+from core.models import ConfiguracionSoporte, OutboxEvento, TicketSoporte
+
+Estado = TicketSoporte.EstadoSolicitud
+
+
+class MantenimientoSolicitudesTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = Usuario.objects.create(email='cliente@test.com', nombres='Carlos', apellidos='Cliente')
+
+    def setUp(self):
+        self.ahora = timezone.now()
+        # Sin guardar: obtener_configuracion() sigue devolviendo None y no hay asignación ni avisos
+        self.config = ConfiguracionSoporte(dias_auto_cierre_resueltas=7, recordatorio_cliente_dias=2)
+
+    def ticket(self, estado, **campos):
+        ticket = TicketSoporte.objects.create(usuario=self.cliente, asunto='x', estado=estado)
+        TicketSoporte.objects.filter(pk=ticket.pk).update(**campos)
+        return ticket
+
+    def estados(self):
+        return dict(TicketSoporte.objects.values_list('pk', 'estado'))
+
+    def test_cierra_resueltas_desde_el_corte(self):
+        corte = self.ahora - timedelta(days=7)
+        justo = self.ticket(Estado.RESUELTO, fecha_resolucion=corte)
+        reciente = self.ticket(Estado.RESUELTO, fecha_resolucion=corte + timedelta(seconds=1))
+        # Sin fecha_resolucion cuenta la última modificación
+        sin_fecha = self.ticket(Estado.RESUELTO, fecha_resolucion=None, updated_at=corte - timedelta(days=1))
+        sin_fecha_reciente = self.ticket(Estado.RESUELTO, fecha_resolucion=None, updated_at=self.ahora)
+        abierta = self.ticket(Estado.EN_PROCESO, fecha_resolucion=corte - timedelta(days=1))
+
+        cerradas = cierre.cerrar_resueltas(self.config, tamano_lote=1, ahora=self.ahora)
+
+        self.assertEqual(cerradas, 2)
+        self.assertEqual(self.estados(), {
+            justo.pk: Estado.CERRADO, sin_fecha.pk: Estado.CERRADO, reciente.pk: Estado.RESUELTO,
+            sin_fecha_reciente.pk: Estado.RESUELTO, abierta.pk: Estado.EN_PROCESO,
+        })
+        justo.refresh_from_db()
+        self.assertEqual(justo.fecha_cierre, self.ahora)
+        self.assertEqual(cierre.cerrar_resueltas(self.config, ahora=self.ahora), 0)
+
+    def test_recordatorio_una_vez_por_periodo(self):
+        corte = self.ahora - timedelta(days=2)
+        inactiva = self.ticket(Estado.ESPERANDO_CLIENTE, updated_at=corte)
+        reciente = self.ticket(Estado.ESPERANDO_CLIENTE, updated_at=corte + timedelta(seconds=1))
+        self.ticket(Estado.EN_PROCESO, updated_at=corte - timedelta(days=5))
+        avisada = self.ticket(
+            Estado.ESPERANDO_CLIENTE, updated_at=corte - timedelta(days=5), fecha_ultimo_recordatorio=corte + timedelta(hours=1),
+        )
+
+        self.assertEqual(cierre.encolar_recordatorios(self.config, tamano_lote=1, ahora=self.ahora), 1)
+        evento = OutboxEvento.objects.get()
+        self.assertEqual((evento.tipo, evento.payload), (outbox.RECORDATORIO_SOPORTE, {'solicitud_id': inactiva.pk}))
+        inactiva.refresh_from_db()
+        self.assertEqual(inactiva.fecha_ultimo_recordatorio, self.ahora)
+
+        # Volver a correr no repite; pasado otro periodo sin respuesta, sí
+        self.assertEqual(cierre.encolar_recordatorios(self.config, ahora=self.ahora), 0)
+        despues = self.ahora + timedelta(days=2)
+        self.assertEqual(cierre.encolar_recordatorios(self.config, ahora=despues), 3)
+        self.assertCountEqual(
+            [e.payload['solicitud_id'] for e in OutboxEvento.objects.all()],
+            [inactiva.pk, inactiva.pk, reciente.pk, avisada.pk],
+        )
+
+    def test_comando_con_valores_por_defecto(self):
+        self.ticket(Estado.RESUELTO, fecha_resolucion=self.ahora - timedelta(days=8))
+        self.ticket(Estado.ESPERANDO_CLIENTE, updated_at=self.ahora - timedelta(days=3))
+        salida = StringIO()
+        call_command('cerrar_solicitudes_resueltas', stdout=salida)
+        self.assertIn('1 solicitudes cerradas, 1 recordatorios encolados', salida.getvalue())
@@ -0,0 +1,111 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from authz.models import Usuario
+from core.api.soporte import cola
+from core.models import ConfiguracionSoporte, TicketSoporte
+
+URL = '/api/soporte/solicitudes/siguiente/'
+Estado = TicketSoporte.EstadoSolicitud
+
+
+class ColaSoporteTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        soporte = Group.objects.create(name='Soporte')
+        cls.ana = Usuario.objects.create(email='ana@test.com', nombres='Ana', apellidos='Soporte')
+        cls.beto = Usuario.objects.create(email='beto@test.com', nombres='Beto', apellidos='Soporte')
+        for agente in (cls.ana, cls.beto):
+            agente.groups.add(soporte)
+        cls.cliente = Usuario.objects.create(email='cliente@test.com', nombres='Carlos', apellidos='Cliente')
+        cls.config = ConfiguracionSoporte.objects.create(
+            asignacion_automatica=False, max_solicitudes_por_agente=2, enviar_emails_cliente=False,
+        )
+
+    def ticket(self, prioridad, horas_atras=0, **campos):
+        ticket = TicketSoporte.objects.create(usuario=self.cliente, asunto='x', prioridad=prioridad, **campos)
+        TicketSoporte.objects.filter(pk=ticket.pk).update(fecha_creacion=timezone.now() - timedelta(hours=horas_atras))
+        return ticket
+
+    def test_orden_por_prioridad_y_antiguedad(self):
+        for skip_locked in (False, True):
+            with self.subTest(skip_locked=skip_locked):
+                TicketSoporte.objects.all().delete()
+                baja_vieja = self.ticket('BAJA', horas_atras=50)
+                alta_nueva = self.ticket('ALTA', horas_atras=1)
+                alta_vieja = self.ticket('ALTA', horas_atras=5)
+                critica = self.ticket('CRITICA')
+                # Ni las asignadas ni las que no están pendientes entran en la cola
+                self.ticket('CRITICA', horas_atras=99, agente_soporte=self.beto)
+                self.ticket('CRITICA', horas_atras=99, estado=Estado.ESPERANDO_CLIENTE)
+
+                tomadas = []
+                with mock.patch.object(connection.features, 'has_select_for_update_skip_locked', skip_locked):
+                    for _ in range(4):
+                        tomadas.append(cola.reclamar_siguiente(self.ana, config=mock.Mock(max_solicitudes_por_agente=10)))
+                    self.assertIsNone(cola.reclamar_siguiente(self.ana, config=mock.Mock(max_solicitudes_por_agente=10)))
+
+                self.assertEqual([t.pk for t in tomadas], [critica.pk, alta_vieja.pk, alta_nueva.pk, baja_vieja.pk])
+                self.assertEqual(
+                    set(TicketSoporte.objects.filter(pk__in=[t.pk for t in tomadas]).values_list('agente_soporte', 'estado')),
+                    {(self.ana.pk, Estado.EN_PROCESO)},
+                )
+
+    def test_limite_de_activas(self):
+        for _ in range(3):
+            self.ticket('MEDIA')
+        cola.reclamar_siguiente(self.ana)
+        cola.reclamar_siguiente(self.ana)
+        with self.assertRaises(cola.LimiteAlcanzado):
+            cola.reclamar_siguiente(self.ana)
+        self.assertEqual(TicketSoporte.objects.filter(agente_soporte__isnull=True).count(), 1)
+
+        # Al resolver una vuelve a tener lugar
+        TicketSoporte.objects.filter(agente_soporte=self.ana).first().marcar_como_resuelto()
+        self.assertIsNotNone(cola.reclamar_siguiente(self.ana))
+
+    def test_update_condicional_salta_la_que_gano_otro(self):
+        ganada = self.ticket('ALTA', horas_atras=2)
+        libre = self.ticket('ALTA', horas_atras=1)
+        original = cola.sin_asignar
+
+        def con_carrera(prioridad):
+            consulta = original(prioridad)
+            ticket = consulta.first()
+            if ticket is not None and ticket.pk == ganada.pk:
+                # Otro agente la toma entre la lectura y el UPDATE condicional
+                TicketSoporte.objects.filter(pk=ganada.pk).update(agente_soporte=self.beto, estado=Estado.EN_PROCESO)
+                return mock.Mock(first=lambda: ticket)
+            return consulta
+
+        with mock.patch.object(cola, 'sin_asignar', con_carrera):
+            tomada = cola.reclamar_siguiente(self.ana)
+
+        self.assertEqual(tomada.pk, libre.pk)
+        ganada.refresh_from_db()
+        self.assertEqual(ganada.agente_soporte, self.beto)
+
+    def test_endpoint(self):
+        cliente = APIClient(SERVER_NAME='localhost')
+        cliente.force_authenticate(self.ana)
+        self.assertEqual(cliente.post(URL).status_code, 204)
+
+        ticket = self.ticket('MEDIA')
+        respuesta = cliente.post(URL)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data['id'], ticket.pk)
+
+        self.ticket('MEDIA', agente_soporte=self.ana)
+        self.ticket('MEDIA')
+        self.assertEqual(cliente.post(URL).status_code, 409)
+
+        # Un cliente no puede tomar de la cola
+        cliente.force_authenticate(self.cliente)
+        self.assertEqual(cliente.post(URL).status_code, 403)
@@ -0,0 +1,112 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from authz.models import Usuario
+from core.api.soporte import dashboard
+from core.models import TicketSoporte
+
+URL = '/api/soporte/dashboard/'
+Estado = TicketSoporte.EstadoSolicitud
+
+
+class DashboardSoporteTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        soporte = Group.objects.create(name='Soporte')
+        cls.ana = Usuario.objects.create(email='ana@test.com', nombres='Ana', apellidos='Soporte')
+        cls.beto = Usuario.objects.create(email='beto@test.com', nombres='Beto', apellidos='Soporte', is_active=False)
+        for agente in (cls.ana, cls.beto):
+            agente.groups.add(soporte)
+        cls.cliente = Usuario.objects.create(email='cliente@test.com', nombres='Carlos', apellidos='Cliente')
+
+    def setUp(self):
+        cache.delete_many([dashboard.CLAVE, dashboard.CLAVE_RECALCULO])
+        self.addCleanup(cache.delete_many, [dashboard.CLAVE, dashboard.CLAVE_RECALCULO])
+        self.ahora = timezone.now()
+
+    def ticket(self, hace=timedelta(0), **campos):
+        ticket = TicketSoporte.objects.create(usuario=self.cliente, asunto='x')
+        campos.setdefault('fecha_creacion', self.ahora - hace)
+        TicketSoporte.objects.filter(pk=ticket.pk).update(**campos)
+        return ticket
+
+    def test_contadores_promedios_y_distribuciones(self):
+        self.ticket(estado=Estado.PENDIENTE, fecha_limite_respuesta=self.ahora - timedelta(hours=1))
+        self.ticket(estado=Estado.EN_PROCESO, agente_soporte=self.ana, prioridad='ALTA',
+                    fecha_primera_respuesta=self.ahora + timedelta(hours=2))
+        self.ticket(estado=Estado.EN_PROCESO, agente_soporte=self.ana, tipo_solicitud='INCIDENCIA',
+                    fecha_primera_respuesta=self.ahora + timedelta(hours=4))
+        self.ticket(hace=timedelta(days=1), estado=Estado.RESUELTO, fecha_resolucion=self.ahora,
+                    tiempo_total_resolucion=24, satisfaccion_cliente=5, agente_soporte=self.beto)
+        self.ticket(hace=timedelta(days=1), estado=Estado.ESPERANDO_CLIENTE, satisfaccion_cliente=3,
+                    fecha_limite_respuesta=self.ahora - timedelta(hours=1))
+        # Fuera de la semana: cuenta en los estados pero no en promedios ni distribuciones
+        self.ticket(hace=timedelta(days=30), estado=Estado.PENDIENTE, satisfaccion_cliente=1, prioridad='BAJA')
+
+        with self.assertNumQueries(3):
+            datos = dashboard.calcular()
+
+        self.assertEqual(
+            (datos['solicitudes_pendientes'], datos['solicitudes_en_proceso'],
+             datos['solicitudes_vencidas'], datos['solicitudes_resueltas_hoy']),
+            (2, 2, 1, 1),
+        )
+        self.assertEqual(datos['tiempo_promedio_respuesta'], 3)
+        self.assertEqual(datos['tiempo_promedio_resolucion'], 24)
+        self.assertEqual(datos['satisfaccion_promedio'], 4)
+        self.assertEqual(datos['solicitudes_por_tipo'], {'CONSULTA': 4, 'INCIDENCIA': 1})
+        self.assertEqual(datos['solicitudes_por_prioridad'], {'MEDIA': 4, 'ALTA': 1})
+        self.assertEqual([d['solicitudes'] for d in datos['tendencia_semanal']][-2:], [2, 3])
+        self.assertEqual(datos['tendencia_semanal'][-1]['fecha'], timezone.localdate().isoformat())
+        # Solo agentes activos
+        self.assertEqual(datos['carga_por_agente'], [
+            {'agente': self.ana.get_full_name(), 'solicitudes_activas': 2, 'email': 'ana@test.com'},
+        ])
+
+    def test_foto_cacheada_durante_el_ttl(self):
+        self.ticket()
+        reloj = [1000.0]
+        with mock.patch.object(dashboard.time, 'time', lambda: reloj[0]):
+            self.assertEqual(dashboard.obtener()['solicitudes_pendientes'], 1)
+            self.ticket()
+            with self.assertNumQueries(0):
+                self.assertEqual(dashboard.obtener()['solicitudes_pendientes'], 1)
+
+            reloj[0] += dashboard.TTL
+            self.assertEqual(dashboard.obtener()['solicitudes_pendientes'], 2)
+
+    def test_vencida_se_sirve_mientras_un_solo_hilo_recalcula(self):
+        self.ticket()
+        reloj = [1000.0]
+        with mock.patch.object(dashboard.time, 'time', lambda: reloj[0]), \
+                mock.patch.object(dashboard, 'STALE', 60), \
+                mock.patch.object(dashboard.threading, 'Thread') as hilo:
+            dashboard.obtener()
+            self.ticket()
+            reloj[0] += dashboard.TTL
+
+            with self.assertNumQueries(0):
+                self.assertEqual(dashboard.obtener()['solicitudes_pendientes'], 1)
+                self.assertEqual(dashboard.obtener()['solicitudes_pendientes'], 1)
+            self.assertEqual(hilo.call_count, 1)
+            hilo.return_value.start.assert_called_once_with()
+
+    def test_endpoint_solo_soporte(self):
+        api = APIClient(SERVER_NAME='localhost')
+        api.force_authenticate(self.ana)
+        respuesta = api.get(URL)
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        self.assertEqual(respuesta.data['solicitudes_pendientes'], 0)
+        self.assertEqual(len(respuesta.data['tendencia_semanal']), 7)
+
+        # La ruta corta no pasa por el router: no hereda permission_classes de @action
+        api.force_authenticate(self.cliente)
+        self.assertEqual(api.get(URL).status_code, 403)
+        self.assertEqual(api.get('/api/soporte/solicitudes/dashboard/').status_code, 403)
@@ -0,0 +1,67 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import Group
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from authz.models import Usuario
+from core.models import TicketSoporte
+
+URL = '/api/soporte/solicitudes/'
+
+
+class ListadoSolicitudesTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agente = Usuario.objects.create(email='agente@test.com', nombres='Ana', apellidos='Soporte')
+        cls.agente.groups.add(Group.objects.create(name='Soporte'))
+        cls.cliente = Usuario.objects.create(email='cliente@test.com', nombres='Carlos', apellidos='Cliente')
+        cls.otro = Usuario.objects.create(email='otra.persona@test.com', nombres='Otro', apellidos='Cliente')
+        base = timezone.now() - timedelta(days=1)
+        cls.tickets = []
+        for minutos, usuario, agente in ((5, cls.cliente, None), (1, cls.otro, cls.agente), (9, cls.cliente, cls.agente), (5, cls.otro, None)):
+            ticket = TicketSoporte.objects.create(usuario=usuario, agente_soporte=agente, asunto=f'Ticket {minutos}')
+            TicketSoporte.objects.filter(pk=ticket.pk).update(fecha_creacion=base + timedelta(minutes=minutos))
+            cls.tickets.append(ticket.pk)
+
+    def listar(self, usuario, url=URL):
+        api = APIClient(SERVER_NAME='localhost')
+        api.force_authenticate(usuario)
+        ids = []
+        while url:
+            respuesta = api.get(url)
+            self.assertEqual(respuesta.status_code, 200, respuesta.content)
+            ids += [fila['id'] for fila in respuesta.data['results']]
+            url = respuesta.data['next']
+        return ids, respuesta.data['results']
+
+    def test_orden_por_fecha_de_creacion_y_id(self):
+        t5_cliente, t1, t9, t5_otro = self.tickets
+
+        ids, _ = self.listar(self.agente, f'{URL}?page_size=1')
+        self.assertEqual(ids, [t9, t5_otro, t5_cliente, t1])
+
+        ids, _ = self.listar(self.cliente)
+        self.assertEqual(ids, [t9, t5_cliente])
+
+    def test_ordering_created_at_sigue_siendo_aceptado(self):
+        t5_cliente, t1, t9, t5_otro = self.tickets
+
+        ascendente, _ = self.listar(self.agente, f'{URL}?ordering=created_at&page_size=2')
+        self.assertEqual(ascendente[0], t1)
+        self.assertEqual(ascendente[-1], t9)
+        self.assertEqual(self.listar(self.agente, f'{URL}?ordering=-created_at')[0][0], t9)
+
+    def test_busqueda_y_filtros_sobre_campos_reales(self):
+        t5_cliente, t1, t9, t5_otro = self.tickets
+
+        self.assertEqual(sorted(self.listar(self.agente, f'{URL}?search=otra.persona')[0]), sorted([t1, t5_otro]))
+        self.assertEqual(sorted(self.listar(self.agente, f'{URL}?search=Carlos')[0]), sorted([t5_cliente, t9]))
+        self.assertEqual(self.listar(self.agente, f'{URL}?agente_soporte={self.agente.pk}')[0], [t9, t1])
+
+    def test_filas_con_cliente_y_created_at(self):
+        _, filas = self.listar(self.cliente)
+        self.assertEqual(filas[0]['cliente']['id'], self.cliente.pk)
+        self.assertIsNotNone(filas[0]['created_at'])
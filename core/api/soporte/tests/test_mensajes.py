@@ -0,0 +1,97 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import Group
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from authz.models import Usuario
+from core.api.reservas import outbox
+from core.api.soporte import signals
+from core.models import MensajeSoporte, OutboxEvento, TicketSoporte
+
+
+class MensajesSoporteApiTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agente = Usuario.objects.create(email='agente@test.com', nombres='Ana', apellidos='Soporte')
+        cls.agente.groups.add(Group.objects.create(name='Soporte'))
+        cls.cliente = Usuario.objects.create(email='cliente@test.com', nombres='Carlos', apellidos='Cliente')
+        cls.otro = Usuario.objects.create(email='otro@test.com', nombres='Otro', apellidos='Cliente')
+
+    def setUp(self):
+        self.ticket = TicketSoporte.objects.create(usuario=self.cliente, asunto='No puedo pagar')
+        self.url = f'/api/soporte/solicitudes/{self.ticket.pk}/mensajes/'
+
+    def cliente_api(self, usuario):
+        cliente = APIClient(SERVER_NAME='localhost')
+        cliente.force_authenticate(usuario)
+        return cliente
+
+    def avisos(self):
+        return OutboxEvento.objects.filter(tipo=outbox.RESPUESTA_SOPORTE, payload__solicitud_id=self.ticket.pk)
+
+    def test_publicar_y_listar_mensajes(self):
+        respuesta = self.cliente_api(self.cliente).post(self.url, {'mensaje': 'Hola'}, format='json')
+        self.assertEqual(respuesta.status_code, 201, respuesta.content)
+        self.assertEqual(respuesta.data['remitente']['id'], self.cliente.pk)
+        self.assertTrue(respuesta.data['leido_por_cliente'])
+
+        self.cliente_api(self.agente).post(self.url, {'mensaje': 'Nota', 'es_interno': True}, format='json')
+        self.cliente_api(self.agente).post(self.url, {'mensaje': 'Ya lo revisamos'}, format='json')
+
+        lista_cliente = self.cliente_api(self.cliente).get(self.url)
+        self.assertEqual(lista_cliente.status_code, 200)
+        self.assertEqual([m['mensaje'] for m in lista_cliente.data], ['Hola', 'Ya lo revisamos'])
+        lista_agente = self.cliente_api(self.agente).get(self.url)
+        self.assertEqual([m['mensaje'] for m in lista_agente.data], ['Hola', 'Nota', 'Ya lo revisamos'])
+
+    def test_cliente_no_crea_notas_internas_ni_escribe_en_solicitudes_ajenas(self):
+        respuesta = self.cliente_api(self.cliente).post(self.url, {'mensaje': 'x', 'es_interno': True}, format='json')
+        self.assertFalse(MensajeSoporte.objects.get(pk=respuesta.data['id']).es_interno)
+
+        self.assertEqual(self.cliente_api(self.otro).post(self.url, {'mensaje': 'x'}, format='json').status_code, 404)
+        self.assertEqual(self.cliente_api(self.otro).get(self.url).data, [])
+
+    def test_respuesta_de_soporte_encola_aviso_agrupado(self):
+        agente = self.cliente_api(self.agente)
+        with self.captureOnCommitCallbacks(execute=True):
+            agente.post(self.url, {'mensaje': 'Primera respuesta'}, format='json')
+        aviso = self.avisos().get()
+        # El aviso espera la ventana para juntar las respuestas siguientes
+        self.assertGreater(aviso.proximo_intento, timezone.now() + timedelta(seconds=signals.VENTANA_AVISO_RESPUESTA - 10))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            agente.post(self.url, {'mensaje': 'Segunda respuesta'}, format='json')
+        self.assertEqual(self.avisos().count(), 1)
+
+        # Ya procesado el aviso, una respuesta nueva abre otra ventana
+        self.avisos().update(estado='ENVIADO', intentos=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            agente.post(self.url, {'mensaje': 'Tercera respuesta'}, format='json')
+        self.assertEqual(self.avisos().filter(estado='PENDIENTE').count(), 1)
+
+    def test_mensajes_del_cliente_e_internos_no_encolan_aviso(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cliente_api(self.cliente).post(self.url, {'mensaje': 'Hola'}, format='json')
+            self.cliente_api(self.agente).post(self.url, {'mensaje': 'Nota', 'es_interno': True}, format='json')
+        self.assertFalse(self.avisos().exists())
+
+    def test_marcar_leido(self):
+        mensaje = MensajeSoporte.objects.create(ticket=self.ticket, remitente=self.agente, mensaje='Hola')
+        respuesta = self.cliente_api(self.cliente).post(f'{self.url}{mensaje.pk}/marcar_leido/')
+        self.assertEqual(respuesta.status_code, 200)
+        mensaje.refresh_from_db()
+        self.assertTrue(mensaje.leido_por_cliente)
+        self.assertIsNotNone(mensaje.fecha_lectura_cliente)
+
+    def test_respuesta_del_cliente_reactiva_la_solicitud(self):
+        TicketSoporte.objects.filter(pk=self.ticket.pk).update(
+            estado=TicketSoporte.EstadoSolicitud.ESPERANDO_CLIENTE, updated_at=timezone.now() - timedelta(days=3)
+        )
+        self.cliente_api(self.cliente).post(self.url, {'mensaje': 'Aquí está el dato'}, format='json')
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.estado, TicketSoporte.EstadoSolicitud.EN_PROCESO)
+        # La respuesta cuenta como actividad para la paginación, el SLA y el auto-cierre
+        self.assertGreater(self.ticket.updated_at, timezone.now() - timedelta(minutes=1))
@@ -0,0 +1,112 @@
+from collections import defaultdict
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import Group
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from authz.models import Usuario
+from core.api.soporte import metricas, sla
+from core.models import MensajeSoporte, MetricaDiariaSoporte, TicketSoporte
+
+URL = '/api/soporte/solicitudes/tendencia/'
+
+
+class MetricasDiariasTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        soporte = Group.objects.create(name='Soporte')
+        cls.ana = Usuario.objects.create(email='ana@test.com', nombres='Ana', apellidos='Soporte')
+        cls.beto = Usuario.objects.create(email='beto@test.com', nombres='Beto', apellidos='Soporte')
+        for agente in (cls.ana, cls.beto):
+            agente.groups.add(soporte)
+        cls.cliente = Usuario.objects.create(email='cliente@test.com', nombres='Carlos', apellidos='Cliente')
+
+    def setUp(self):
+        self.ahora = timezone.now()
+
+    def crear(self, hace=timedelta(0), **campos):
+        with mock.patch('django.utils.timezone.now', return_value=self.ahora - hace):
+            return TicketSoporte.objects.create(usuario=self.cliente, asunto='x', **campos)
+
+    def filas(self):
+        """Filas diarias sumadas por combinación (puede haber más de una por clave)."""
+        total = defaultdict(lambda: defaultdict(float))
+        for fila in MetricaDiariaSoporte.objects.values('fecha', 'tipo_solicitud', 'prioridad', 'agente_id', *metricas.CONTADORES):
+            clave = (fila['fecha'], fila['tipo_solicitud'], fila['prioridad'], fila['agente_id'])
+            for campo in metricas.CONTADORES:
+                total[clave][campo] += fila[campo]
+        # Los deltas pueden dejar filas en cero: equivalen a que no existan
+        resultado = {clave: {c: round(v, 6) for c, v in contadores.items() if v} for clave, contadores in total.items()}
+        return {clave: contadores for clave, contadores in resultado.items() if contadores}
+
+    def test_incremental_coincide_con_reconstruir(self):
+        # Ciclo completo: cambio de prioridad, agente, respuesta por mensaje, resolución y satisfacción
+        ticket = self.crear(hace=timedelta(days=3), prioridad='MEDIA')
+        ticket.prioridad = 'ALTA'
+        ticket.save()
+        ticket.asignar_agente(self.ana)
+        MensajeSoporte.objects.create(ticket=ticket, remitente=self.ana, mensaje='Hola')
+        ticket.refresh_from_db()
+        ticket.marcar_como_resuelto()
+        ticket.satisfaccion_cliente = 4
+        ticket.save(update_fields=['satisfaccion_cliente', 'updated_at'])
+
+        # Reasignado y calificado sin resolver
+        otro = self.crear(
+            hace=timedelta(days=1), tipo_solicitud='INCIDENCIA', agente_soporte=self.beto, estado='ESPERANDO_CLIENTE',
+        )
+        otro.agente_soporte = self.ana
+        otro.satisfaccion_cliente = 2
+        otro.save()
+
+        # Escalado por el barrido de SLA (UPDATE masivo)
+        vencida = self.crear(prioridad='BAJA')
+        TicketSoporte.objects.filter(pk=vencida.pk).update(fecha_limite_respuesta=self.ahora - timedelta(minutes=1))
+        self.assertEqual(sla.barrer().escaladas, 1)
+
+        incremental = self.filas()
+        metricas.reconstruir()
+        self.maxDiff = None
+        self.assertEqual(incremental, self.filas())
+
+        hoy = timezone.localdate(self.ahora)
+        self.assertEqual(incremental[(hoy, 'CONSULTA', 'MEDIA', None)], {'creadas': 1})
+        creada = timezone.localdate(self.ahora - timedelta(days=3))
+        self.assertEqual(incremental[(creada, 'CONSULTA', 'ALTA', self.ana.pk)], {'creadas': 1})
+        self.assertEqual(incremental[(hoy, 'CONSULTA', 'ALTA', self.ana.pk)]['satisfaccion_suma'], 4)
+
+    def test_reconstruir_desde_una_fecha_conserva_lo_anterior(self):
+        self.crear(hace=timedelta(days=10))
+        self.crear()
+        antes = self.filas()
+        MetricaDiariaSoporte.objects.filter(fecha=timezone.localdate(self.ahora)).update(creadas=99)
+
+        metricas.reconstruir(desde=timezone.localdate(self.ahora) - timedelta(days=1))
+
+        self.assertEqual(self.filas(), antes)
+
+    def test_tendencia(self):
+        self.crear(hace=timedelta(days=40))
+        self.crear(hace=timedelta(days=2), prioridad='ALTA')
+        resuelta = self.crear(prioridad='ALTA')
+        resuelta.marcar_como_resuelto()
+
+        api = APIClient(SERVER_NAME='localhost')
+        api.force_authenticate(self.ana)
+        respuesta = api.get(URL, {'dias': 7})
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        self.assertEqual(len(respuesta.data['serie']), 7)
+        self.assertEqual((respuesta.data['totales']['creadas'], respuesta.data['totales']['resueltas']), (2, 1))
+        self.assertEqual([d['creadas'] for d in respuesta.data['serie']], [0, 0, 0, 0, 1, 0, 1])
+
+        self.assertEqual(api.get(URL, {'dias': 60}).data['totales']['creadas'], 3)
+        self.assertEqual(api.get(URL, {'dias': 60, 'prioridad': 'MEDIA'}).data['totales']['creadas'], 1)
+        por_mes = api.get(URL, {'dias': 60, 'agrupar': 'mes'}).data['serie']
+        self.assertEqual(sum(p['creadas'] for p in por_mes), 3)
+
+        api.force_authenticate(self.cliente)
+        self.assertEqual(api.get(URL).status_code, 403)
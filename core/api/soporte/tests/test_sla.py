@@ -0,0 +1,112 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import Group
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from authz.models import Usuario
+from core.api.soporte import sla
+from core.models import ConfiguracionSoporte, TicketSoporte
+
+Estado = TicketSoporte.EstadoSolicitud
+
+
+class PlazoSlaTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        soporte = Group.objects.create(name='Soporte')
+        cls.ana = Usuario.objects.create(email='ana@test.com', nombres='Ana', apellidos='Soporte')
+        cls.beto = Usuario.objects.create(email='beto@test.com', nombres='Beto', apellidos='Soporte')
+        for agente in (cls.ana, cls.beto):
+            agente.groups.add(soporte)
+        cls.cliente = Usuario.objects.create(email='cliente@test.com', nombres='Carlos', apellidos='Cliente')
+        ConfiguracionSoporte.objects.create(
+            asignacion_automatica=False, enviar_emails_cliente=False, tiempo_respuesta_media=12, tiempo_respuesta_alta=4,
+        )
+
+    def setUp(self):
+        self.ahora = timezone.now().replace(microsecond=0)
+
+    def ticket(self, prioridad='MEDIA', vence_en=None, **campos):
+        ticket = TicketSoporte.objects.create(usuario=self.cliente, asunto='x', prioridad=prioridad, **campos)
+        if vence_en is not None:
+            TicketSoporte.objects.filter(pk=ticket.pk).update(fecha_limite_respuesta=self.ahora + vence_en)
+        return ticket
+
+    def barrer(self, **opciones):
+        with mock.patch('django.utils.timezone.now', return_value=self.ahora):
+            return sla.barrer(**opciones)
+
+    def test_plazo_al_crear_y_al_cambiar_prioridad(self):
+        ticket = self.ticket()
+        # Al crear se sella antes de que auto_now_add fije fecha_creacion: difieren en microsegundos
+        self.assertAlmostEqual(
+            ticket.fecha_limite_respuesta, ticket.fecha_creacion + timedelta(hours=12), delta=timedelta(seconds=1),
+        )
+
+        ticket.prioridad = 'ALTA'
+        ticket.save(update_fields=['prioridad', 'updated_at'])
+        ticket.refresh_from_db()
+        # El plazo se cuenta desde la creación aunque no esté en update_fields
+        self.assertEqual(ticket.fecha_limite_respuesta, ticket.fecha_creacion + timedelta(hours=4))
+
+        ticket.asunto = 'otro'
+        ticket.save()
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.fecha_limite_respuesta, ticket.fecha_creacion + timedelta(hours=4))
+
+    def test_limite_del_barrido(self):
+        justo = self.ticket(vence_en=timedelta(0))
+        self.ticket(vence_en=timedelta(seconds=1))
+        self.ticket(vence_en=-timedelta(hours=1), fecha_primera_respuesta=self.ahora)
+        self.ticket(vence_en=-timedelta(hours=1), estado=Estado.ESPERANDO_CLIENTE)
+        self.ticket(vence_en=-timedelta(hours=1), estado=Estado.RESUELTO)
+
+        resumen = self.barrer()
+
+        self.assertEqual(resumen, sla.ResumenBarrido(1, 1, 0, 0))
+        justo.refresh_from_db()
+        self.assertEqual((justo.prioridad, justo.escalamientos), ('ALTA', 1))
+        self.assertEqual(justo.fecha_limite_respuesta, self.ahora + timedelta(hours=4))
+        # Con el plazo nuevo ya no está vencida
+        self.assertEqual(self.barrer().vencidas, 0)
+
+    def test_lote_toma_las_mas_atrasadas(self):
+        vieja = self.ticket('BAJA', vence_en=-timedelta(hours=3))
+        media = self.ticket('BAJA', vence_en=-timedelta(hours=2))
+        nueva = self.ticket('BAJA', vence_en=-timedelta(hours=1))
+
+        resumen = self.barrer(tamano_lote=2)
+
+        self.assertEqual((resumen.vencidas, resumen.atraso_maximo), (2, 3 * 3600))
+        self.assertEqual(
+            dict(TicketSoporte.objects.values_list('pk', 'prioridad')),
+            {vieja.pk: 'MEDIA', media.pk: 'MEDIA', nueva.pk: 'BAJA'},
+        )
+
+    def test_critica_vencida_cambia_de_agente(self):
+        # Beto tiene menos carga, pero la solicitud no vuelve a su agente actual
+        de_beto = self.ticket('CRITICA', vence_en=-timedelta(minutes=5), agente_soporte=self.beto)
+        self.ticket('MEDIA', agente_soporte=self.ana)
+        self.ticket('MEDIA', agente_soporte=self.ana)
+        sin_agente = self.ticket('CRITICA', vence_en=-timedelta(minutes=1))
+
+        resumen = self.barrer()
+
+        self.assertEqual(resumen, sla.ResumenBarrido(2, 0, 2, 300))
+        de_beto.refresh_from_db()
+        sin_agente.refresh_from_db()
+        self.assertEqual(de_beto.agente_soporte, self.ana)
+        self.assertEqual(sin_agente.agente_soporte, self.beto)
+        self.assertEqual((de_beto.prioridad, de_beto.escalamientos), ('CRITICA', 1))
+        self.assertEqual(de_beto.fecha_limite_respuesta, self.ahora + timedelta(hours=1))
+
+    def test_comando_una_vez(self):
+        self.ticket(vence_en=-timedelta(minutes=1))
+        salida = StringIO()
+        call_command('sla_sweeper', '--una-vez', '--lote', '1', stdout=salida)
+        self.assertIn('1 vencidas, 1 escaladas, 0 reasignadas', salida.getvalue())
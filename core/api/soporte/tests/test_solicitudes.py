@@ -0,0 +1,91 @@
+from django.contrib.auth.models import Group
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from authz.models import Usuario
+from core.models import ConfiguracionSoporte, MensajeSoporte, TicketSoporte
+
+URL = '/api/soporte/solicitudes/'
+
+
+class SolicitudesSoporteApiTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        soporte = Group.objects.create(name='Soporte')
+        cls.agentes = []
+        for nombre in ('Ana', 'Beto', 'Caro', 'Dani'):
+            agente = Usuario.objects.create(email=f'{nombre.lower()}@test.com', nombres=nombre, apellidos='Soporte')
+            agente.groups.add(soporte)
+            cls.agentes.append(agente)
+        cls.ana, cls.beto, cls.caro, cls.dani = cls.agentes
+        cls.dani.is_active = False
+        cls.dani.save()
+        cls.cliente = Usuario.objects.create(email='cliente@test.com', nombres='Carlos', apellidos='Cliente')
+        ConfiguracionSoporte.objects.create(
+            asignacion_automatica=True, max_solicitudes_por_agente=3, enviar_emails_cliente=False,
+        )
+
+    def asignar(self, agente, cantidad, estado=TicketSoporte.EstadoSolicitud.EN_PROCESO):
+        return [
+            TicketSoporte.objects.create(usuario=self.cliente, asunto='previa', agente_soporte=agente, estado=estado).pk
+            for _ in range(cantidad)
+        ]
+
+    def crear(self, **datos):
+        cliente = APIClient(SERVER_NAME='localhost')
+        cliente.force_authenticate(self.cliente)
+        return cliente.post(URL, {'asunto': 'No llegó la confirmación', 'tipo_solicitud': 'CONSULTA', **datos}, format='json')
+
+    def test_crear_asigna_al_agente_con_menos_carga(self):
+        de_ana = self.asignar(self.ana, 2)
+        self.asignar(self.beto, 1)
+        self.asignar(self.caro, 1)
+        # Las cerradas no cuentan como carga
+        self.asignar(self.beto, 4, estado=TicketSoporte.EstadoSolicitud.CERRADO)
+        # Las creadas ya con agente no pasan por la asignación automática
+        self.assertEqual(TicketSoporte.objects.filter(pk__in=de_ana, agente_soporte=self.ana).count(), 2)
+
+        respuesta = self.crear(prioridad='ALTA')
+
+        self.assertEqual(respuesta.status_code, 201, respuesta.content)
+        ticket = TicketSoporte.objects.get(pk=respuesta.data['id'])
+        self.assertEqual(ticket.usuario, self.cliente)
+        self.assertEqual(ticket.prioridad, 'ALTA')
+        # Empate de carga: gana el de menor id
+        self.assertEqual(ticket.agente_soporte, self.beto)
+        self.assertEqual(respuesta.data['agente_soporte'], self.beto.pk)
+
+        self.assertEqual(TicketSoporte.objects.get(pk=self.crear().data['id']).agente_soporte, self.caro)
+
+    def test_agentes_llenos_o_inactivos_no_reciben(self):
+        self.asignar(self.ana, 3)
+        self.asignar(self.beto, 3)
+        self.asignar(self.caro, 3)
+
+        respuesta = self.crear()
+
+        self.assertEqual(respuesta.status_code, 201, respuesta.content)
+        self.assertIsNone(TicketSoporte.objects.get(pk=respuesta.data['id']).agente_soporte)
+
+    def test_ignora_campos_que_no_son_del_cliente(self):
+        respuesta = self.crear(estado='CERRADO', agente_soporte=self.ana.pk, tags=['x'])
+
+        self.assertEqual(respuesta.status_code, 201, respuesta.content)
+        ticket = TicketSoporte.objects.get(pk=respuesta.data['id'])
+        self.assertEqual(ticket.estado, TicketSoporte.EstadoSolicitud.PENDIENTE)
+
+    def test_detalle_oculta_notas_internas_al_cliente(self):
+        ticket = TicketSoporte.objects.create(usuario=self.cliente, asunto='Cambio de fecha', agente_soporte=self.ana)
+        MensajeSoporte.objects.create(ticket=ticket, remitente=self.cliente, mensaje='Hola')
+        MensajeSoporte.objects.create(ticket=ticket, remitente=self.ana, mensaje='Nota', es_interno=True)
+        MensajeSoporte.objects.create(ticket=ticket, remitente=self.ana, mensaje='Listo')
+
+        for usuario, esperados in ((self.cliente, ['Hola', 'Listo']), (self.ana, ['Hola', 'Nota', 'Listo'])):
+            cliente = APIClient(SERVER_NAME='localhost')
+            cliente.force_authenticate(usuario)
+            respuesta = cliente.get(f'{URL}{ticket.pk}/')
+            self.assertEqual(respuesta.status_code, 200, respuesta.content)
+            self.assertEqual([m['mensaje'] for m in respuesta.data['mensajes']], esperados)
+            self.assertEqual(respuesta.data['cliente']['id'], self.cliente.pk)
+            self.assertEqual(respuesta.data['estadisticas']['mensajes_cliente'], 1)
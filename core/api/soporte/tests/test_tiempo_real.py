@@ -0,0 +1,132 @@
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import Group
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from authz.models import Usuario
+from core.api.soporte import tiempo_real
+from core.models import TicketSoporte
+
+
+class BrokerTest(SimpleTestCase):
+
+    def setUp(self):
+        self.broker = tiempo_real.Broker()
+
+    def ids(self, suscripcion):
+        return [evento.id for evento in suscripcion.pendientes]
+
+    async def test_reanuda_despues_de_last_event_id(self):
+        canal = tiempo_real.canal_solicitud(1)
+        for numero in range(3):
+            self.broker.publicar([canal], 'mensaje', {'n': numero})
+        primera = self.broker.suscribir([canal], None)
+        self.assertEqual(primera.pendientes, [])
+
+        historial = list(self.broker._historial[canal])
+        suscripcion = self.broker.suscribir([canal], historial[0].id)
+        self.assertFalse(suscripcion.resincronizar)
+        self.assertEqual(self.ids(suscripcion), [e.id for e in historial[1:]])
+
+    async def test_reanuda_sin_duplicar_eventos_de_dos_canales(self):
+        solicitud, agente = tiempo_real.canal_solicitud(1), tiempo_real.canal_agente(7)
+        self.broker.publicar([solicitud], 'mensaje', {'n': 0})
+        inicio = self.broker._historial[solicitud][-1].id
+        self.broker.publicar([solicitud, agente], 'mensaje', {'n': 1})
+        self.broker.publicar([agente], 'solicitud', {'n': 2})
+        suscripcion = self.broker.suscribir([solicitud, agente], inicio)
+        self.assertEqual(len(suscripcion.pendientes), 2)
+
+    async def test_historial_expulsado_pide_resync(self):
+        canal = tiempo_real.canal_solicitud(1)
+        with mock.patch.object(tiempo_real, 'HISTORIAL', 2):
+            self.broker.publicar([canal], 'mensaje', {'n': 0})
+            inicio = self.broker._historial[canal][-1].id
+            for numero in range(1, 4):
+                self.broker.publicar([canal], 'mensaje', {'n': numero})
+        suscripcion = self.broker.suscribir([canal], inicio)
+        self.assertTrue(suscripcion.resincronizar)
+        self.assertEqual(suscripcion.pendientes, [])
+
+    async def test_id_de_otro_proceso_pide_resync(self):
+        suscripcion = self.broker.suscribir([tiempo_real.canal_solicitud(1)], 'otro-5')
+        self.assertTrue(suscripcion.resincronizar)
+
+    async def test_notas_internas_solo_para_soporte(self):
+        canal = tiempo_real.canal_solicitud(1)
+        cliente = self.broker.suscribir([canal], None)
+        soporte = self.broker.suscribir([canal], None, incluir_internos=True)
+        self.broker.publicar([canal], 'mensaje', {'n': 0}, interno=True)
+        evento = await soporte.cola.get()
+        self.assertTrue(soporte.visible(evento))
+        self.assertFalse(cliente.visible(evento))
+
+
+class EventosSseTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agente = Usuario.objects.create(email='agente@test.com', nombres='Ana', apellidos='Soporte')
+        cls.agente.groups.add(Group.objects.create(name='Soporte'))
+        cls.cliente = Usuario.objects.create(email='cliente@test.com', nombres='Carlos', apellidos='Cliente')
+        cls.otro = Usuario.objects.create(email='otro@test.com', nombres='Otro', apellidos='Cliente')
+        cls.ticket = TicketSoporte.objects.create(usuario=cls.cliente, asunto='Ayuda')
+        cls.url = f'/api/soporte/solicitudes/{cls.ticket.pk}/eventos/'
+
+    def ticket_sse(self, usuario):
+        cliente = APIClient(SERVER_NAME='localhost')
+        cliente.force_authenticate(usuario)
+        respuesta = cliente.post('/api/soporte/eventos/ticket/')
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.data['ticket']
+
+    async def get(self, url, **kwargs):
+        respuesta = await self.async_client.get(url, SERVER_NAME='localhost', **kwargs)
+        if respuesta.streaming:
+            await respuesta.streaming_content.aclose()
+        return respuesta
+
+    async def test_sin_credenciales_401(self):
+        self.assertEqual((await self.get(self.url)).status_code, 401)
+        self.assertEqual((await self.get(self.url + '?ticket=inventado')).status_code, 401)
+
+    async def test_jwt_en_la_url_ya_no_se_acepta(self):
+        token = str(AccessToken.for_user(self.cliente))
+        self.assertEqual((await self.get(f'{self.url}?token={token}')).status_code, 401)
+
+    async def test_ticket_de_un_solo_uso(self):
+        ticket = await sync_to_async(self.ticket_sse)(self.cliente)
+        respuesta = await self.get(f'{self.url}?ticket={ticket}')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['Content-Type'], 'text/event-stream')
+        self.assertEqual((await self.get(f'{self.url}?ticket={ticket}')).status_code, 401)
+
+    async def test_solicitud_ajena_403(self):
+        ticket = await sync_to_async(self.ticket_sse)(self.otro)
+        self.assertEqual((await self.get(f'{self.url}?ticket={ticket}')).status_code, 403)
+
+    async def test_solicitud_inexistente_404(self):
+        ticket = await sync_to_async(self.ticket_sse)(self.agente)
+        respuesta = await self.get(f'/api/soporte/solicitudes/999999/eventos/?ticket={ticket}')
+        self.assertEqual(respuesta.status_code, 404)
+
+    async def test_bandeja_solo_para_soporte(self):
+        ticket = await sync_to_async(self.ticket_sse)(self.cliente)
+        self.assertEqual((await self.get(f'/api/soporte/bandeja/eventos/?ticket={ticket}')).status_code, 403)
+        header = {'headers': {'Authorization': f'Bearer {AccessToken.for_user(self.agente)}'}}
+        self.assertEqual((await self.get('/api/soporte/bandeja/eventos/', **header)).status_code, 200)
+
+    def test_mensaje_por_la_api_publica_evento(self):
+        cliente = APIClient(SERVER_NAME='localhost')
+        cliente.force_authenticate(self.agente)
+        with mock.patch.object(tiempo_real.broker, 'publicar') as publicar:
+            with self.captureOnCommitCallbacks(execute=True):
+                cliente.post(f'/api/soporte/solicitudes/{self.ticket.pk}/mensajes/', {'mensaje': 'Hola'}, format='json')
+        eventos = {llamada.args[1]: llamada.args for llamada in publicar.call_args_list}
+        canales, _, datos, interno = eventos['mensaje']
+        self.assertIn(tiempo_real.canal_solicitud(self.ticket.pk), canales)
+        self.assertEqual(datos['mensaje'], 'Hola')
+        self.assertFalse(interno)
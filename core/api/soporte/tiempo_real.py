@@ -0,0 +1,215 @@
+"""
+Eventos en tiempo real de soporte por Server-Sent Events.
+
+Los receivers de ``signals.py`` publican, en ``transaction.on_commit``, los
+mensajes nuevos y los cambios de las solicitudes en un broker en memoria del
+proceso. Cada conexión SSE es una corrutina que espera en su propia
+``asyncio.Queue``: un cliente sin actividad no consume consultas ni hilos, solo
+un latido cada ``SOPORTE_SSE_LATIDO`` segundos.
+
+Canales:
+- ``solicitud:<id>``: mensajes y cambios de una solicitud.
+- ``agente:<id>``: lo mismo para todas las solicitudes asignadas a ese agente.
+
+Cada canal guarda los últimos ``SOPORTE_SSE_HISTORIAL`` eventos para reanudar
+con ``Last-Event-ID``. Si el id no se puede reanudar (otro proceso, reinicio o
+un hueco más largo que el historial) se envía un evento ``resync`` y el
+cliente debe volver a pedir los mensajes por la API REST.
+
+El broker es por proceso: con varios workers ASGI cada uno recibe solo lo que
+se confirmó en él, así que para desplegar más de uno hay que fijar las
+conexiones de una misma solicitud al mismo worker.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import threading
+import uuid
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+HISTORIAL = getattr(settings, 'SOPORTE_SSE_HISTORIAL', 200)
+LATIDO = getattr(settings, 'SOPORTE_SSE_LATIDO', 15)
+# Eventos sin leer por conexión antes de darla por atrasada y pedir resync
+COLA = getattr(settings, 'SOPORTE_SSE_COLA', 100)
+# Espera sugerida al navegador antes de reconectar (milisegundos)
+REINTENTO_MS = 3000
+# Canales con historial en memoria; se descartan los que llevan más tiempo sin eventos
+MAX_CANALES = getattr(settings, 'SOPORTE_SSE_MAX_CANALES', 10000)
+
+
+def canal_solicitud(solicitud_id: int) -> str:
+    return f'solicitud:{solicitud_id}'
+
+
+def canal_agente(agente_id: int) -> str:
+    return f'agente:{agente_id}'
+
+
+class Evento:
+    """Evento ya codificado en formato SSE; se arma una vez y se comparte entre conexiones."""
+
+    __slots__ = ('secuencia', 'id', 'interno', 'texto')
+
+    def __init__(self, secuencia: int, id: str, tipo: str, datos: dict, interno: bool):
+        self.secuencia = secuencia
+        self.id = id
+        self.interno = interno
+        datos = json.dumps(datos, cls=DjangoJSONEncoder, ensure_ascii=False)
+        self.texto = f'id: {id}\nevent: {tipo}\ndata: {datos}\n\n'
+
+
+class Suscripcion:
+    def __init__(self, canales: Tuple[str, ...], loop: asyncio.AbstractEventLoop, incluir_internos: bool):
+        self.canales = canales
+        self.loop = loop
+        self.incluir_internos = incluir_internos
+        self.cola: asyncio.Queue = asyncio.Queue(maxsize=COLA)
+        self.pendientes: List[Evento] = []
+        self.resincronizar = False
+        self.atrasada = False
+
+    def _entregar(self, evento: Evento):
+        # Corre en el loop de la conexión (call_soon_threadsafe)
+        try:
+            self.cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            self.atrasada = True
+
+    def visible(self, evento: Evento) -> bool:
+        return self.incluir_internos or not evento.interno
+
+
+class Broker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._secuencia = itertools.count(1)
+        # Prefijo de los ids: un Last-Event-ID de otro proceso o de antes de un reinicio no se confunde con uno propio
+        self._instancia = uuid.uuid4().hex[:8]
+        self._historial: 'OrderedDict[str, Deque[Evento]]' = OrderedDict()
+        # Secuencia del último evento que salió del historial de cada canal
+        self._expulsado: Dict[str, int] = {}
+        # Último evento de los canales descartados por MAX_CANALES: antes de eso no se puede reanudar
+        self._piso = 0
+        self._suscriptores: Dict[str, Set[Suscripcion]] = {}
+
+    def publicar(self, canales: Iterable[str], tipo: str, datos: dict, interno: bool = False):
+        canales = set(canales)
+        with self._lock:
+            secuencia = next(self._secuencia)
+            evento = Evento(secuencia, f'{self._instancia}-{secuencia}', tipo, datos, interno)
+            destinatarios: Set[Suscripcion] = set()
+            for canal in canales:
+                historial = self._historial.setdefault(canal, deque(maxlen=HISTORIAL))
+                self._historial.move_to_end(canal)
+                if len(historial) == HISTORIAL:
+                    self._expulsado[canal] = historial[0].secuencia
+                historial.append(evento)
+                destinatarios.update(self._suscriptores.get(canal, ()))
+            while len(self._historial) > MAX_CANALES:
+                canal, historial = self._historial.popitem(last=False)
+                self._expulsado.pop(canal, None)
+                self._piso = max(self._piso, historial[-1].secuencia)
+        for suscripcion in destinatarios:
+            try:
+                suscripcion.loop.call_soon_threadsafe(suscripcion._entregar, evento)
+            except RuntimeError:
+                # El loop de esa conexión ya cerró; se quita al cancelar
+                pass
+
+    def _desde(self, ultimo_id: str) -> Optional[int]:
+        instancia, _, secuencia = ultimo_id.partition('-')
+        if instancia != self._instancia or not secuencia.isdigit():
+            return None
+        return int(secuencia)
+
+    def suscribir(self, canales: Iterable[str], ultimo_id: Optional[str] = None,
+                  incluir_internos: bool = False) -> Suscripcion:
+        """
+        Registra una conexión. Con ``ultimo_id`` deja en ``pendientes`` los
+        eventos posteriores que siguen en el historial, o marca
+        ``resincronizar`` si ya no se pueden recuperar.
+        """
+        suscripcion = Suscripcion(tuple(canales), asyncio.get_running_loop(), incluir_internos)
+        desde = self._desde(ultimo_id) if ultimo_id else None
+        # Registro y lectura del historial bajo el mismo lock que publicar: sin huecos ni duplicados
+        with self._lock:
+            pendientes: Dict[int, Evento] = {}
+            for canal in suscripcion.canales:
+                self._suscriptores.setdefault(canal, set()).add(suscripcion)
+                if not ultimo_id:
+                    continue
+                if desde is None or self._piso > desde or self._expulsado.get(canal, 0) > desde:
+                    suscripcion.resincronizar = True
+                    continue
+                for evento in self._historial.get(canal, ()):
+                    if evento.secuencia > desde:
+                        pendientes[evento.secuencia] = evento
+        if not suscripcion.resincronizar:
+            suscripcion.pendientes = [pendientes[s] for s in sorted(pendientes)]
+        return suscripcion
+
+    def cancelar(self, suscripcion: Suscripcion):
+        with self._lock:
+            for canal in suscripcion.canales:
+                activos = self._suscriptores.get(canal)
+                if activos is not None:
+                    activos.discard(suscripcion)
+                    if not activos:
+                        del self._suscriptores[canal]
+
+    def conexiones(self) -> int:
+        with self._lock:
+            return len({s for activos in self._suscriptores.values() for s in activos})
+
+
+broker = Broker()
+
+
+def publicar_al_confirmar(tipo: str, armar, interno: bool = False):
+    """
+    Publica cuando la transacción se confirma. ``armar()`` devuelve
+    ``(canales, datos)`` y se llama en ese momento, con la fila ya definitiva.
+    """
+    def publicar():
+        try:
+            canales, datos = armar()
+            broker.publicar(canales, tipo, datos, interno)
+        except Exception as e:
+            logger.error(f"Error publicando evento {tipo}: {e}")
+    transaction.on_commit(publicar)
+
+
+async def flujo(suscripcion: Suscripcion):
+    """Iterador asíncrono con el cuerpo de la respuesta SSE de una suscripción."""
+    try:
+        yield f'retry: {REINTENTO_MS}\n\n'
+        if suscripcion.resincronizar:
+            yield 'event: resync\ndata: {}\n\n'
+        for evento in suscripcion.pendientes:
+            if suscripcion.visible(evento):
+                yield evento.texto
+        suscripcion.pendientes = []
+
+        while True:
+            try:
+                evento = await asyncio.wait_for(suscripcion.cola.get(), LATIDO)
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+            if suscripcion.atrasada:
+                # Se perdieron eventos por no leer a tiempo: el cliente debe recargar
+                yield 'event: resync\ndata: {}\n\n'
+                return
+            if suscripcion.visible(evento):
+                yield evento.texto
+    finally:
+        broker.cancelar(suscripcion)
@@ -7,7 +7,10 @@ from rest_framework_nested import routers
 from .views import (
     SolicitudSoporteViewSet,
     MensajeSoporteViewSet,
-    ConfiguracionSoporteViewSet
+    ConfiguracionSoporteViewSet,
+    eventos_solicitud,
+    eventos_bandeja,
+    ticket_eventos,
 )
 
 # Router principal
@@ -20,6 +23,11 @@ solicitudes_router = routers.NestedDefaultRouter(router, r'solicitudes', lookup=
 solicitudes_router.register(r'mensajes', MensajeSoporteViewSet, basename='solicitud-mensajes')
 
 urlpatterns = [
+    # Eventos en tiempo real (SSE)
+    path('eventos/ticket/', ticket_eventos, name='soporte-eventos-ticket'),
+    path('solicitudes/<int:pk>/eventos/', eventos_solicitud, name='soporte-eventos-solicitud'),
+    path('bandeja/eventos/', eventos_bandeja, name='soporte-eventos-bandeja'),
+
     # Rutas principales del sistema de soporte
     path('', include(router.urls)),
     
@@ -44,6 +52,7 @@ Gestión de Solicitudes:
 Acciones específicas de solicitudes:
 - POST   /soporte/solicitudes/{id}/asignar_agente/     - Asignar agente específico
 - POST   /soporte/solicitudes/{id}/cambiar_estado/     - Cambiar estado de solicitud
+- POST   /soporte/solicitudes/siguiente/               - Tomar la siguiente solicitud sin asignar (204 si no hay)
 
 Gestión de Mensajes:
 - GET    /soporte/solicitudes/{id}/mensajes/           - Listar mensajes de solicitud
@@ -56,9 +65,17 @@ Acciones específicas de mensajes:
 - POST   /soporte/solicitudes/{id}/mensajes/{msg_id}/marcar_leido/      - Marcar mensaje como leído
 - POST   /soporte/solicitudes/{id}/mensajes/marcar_todos_leidos/        - Marcar todos como leídos
 
+Eventos en tiempo real (Server-Sent Events, requiere ASGI):
+- POST   /soporte/eventos/ticket/                 - Ticket de un solo uso para abrir un flujo (?ticket=)
+- GET    /soporte/solicitudes/{id}/eventos/       - Mensajes nuevos y cambios de la solicitud
+- GET    /soporte/bandeja/eventos/                - Lo mismo para todas las solicitudes del agente
+  Autenticación con el header Authorization o ?ticket=<ticket> (nunca el JWT en la URL);
+  reanudar con el header Last-Event-ID o ?ultimo_evento=
+
 Estadísticas y Dashboard:
 - GET    /soporte/dashboard/                      - Dashboard completo (solo soporte)
 - GET    /soporte/mis-estadisticas/              - Estadísticas personales (clientes)
+- GET    /soporte/solicitudes/tendencia/?dias=365&agrupar=mes - Tendencia histórica (solo soporte)
 
 Configuración del Sistema:
 - GET    /soporte/configuracion/                 - Obtener configuración actual
@@ -71,5 +88,6 @@ Filtros disponibles en solicitudes:
 - ?prioridad=ALTA                                - Filtrar por prioridad
 - ?agente_soporte=1                              - Filtrar por agente asignado
 - ?search=problema                               - Búsqueda en texto
+- ?q=impresora rota&limite=20                    - Texto completo en solicitudes y mensajes, por relevancia con fragmento
 - ?ordering=-created_at                          - Ordenamiento
 """
\ No newline at end of file
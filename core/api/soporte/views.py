@@ -1,14 +1,23 @@
 # soporte/views.py
 
 from rest_framework import viewsets, status, permissions, serializers
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
-from django.db.models import Q, Count, Avg, F
+from django.db.models import Q, Count, Avg, F, Max
 from django.utils import timezone
-from django.contrib.auth.models import Group, User
+from django.contrib.auth import get_user_model
 from datetime import datetime, timedelta
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.exceptions import AuthenticationFailed, NotFound
+from authz.authentication import JWTRolesAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from django.conf import settings
+from django.utils.crypto import get_random_string
+from authz.almacen import almacen
+import hashlib
 from core.models import TicketSoporte
 from core.models import (
     TicketSoporte, 
@@ -22,10 +31,28 @@ from .serializers import (
     GestionSolicitudSoporteSerializer,
     MensajeSoporteSerializer,
     DashboardSoporteSerializer,
+    TendenciaQuerySerializer,
     EstadisticasClienteSerializer,
     ConfiguracionSoporteSerializer
 )
 from .permissions import EsSoporte, EsClienteOSoporte, EsCliente
+from core.paginacion import CursorPaginacionTickets
+from . import busqueda, cola, dashboard, metricas, tiempo_real
+
+User = get_user_model()
+EstadoSolicitud = TicketSoporte.EstadoSolicitud
+
+
+class OrdenamientoSolicitudes(OrderingFilter):
+    """``?ordering=created_at`` sigue funcionando: es el nombre que la API usaba para ``fecha_creacion``."""
+    alias = {'created_at': 'fecha_creacion'}
+
+    def remove_invalid_fields(self, queryset, fields, view, request):
+        fields = [
+            ('-' if campo.startswith('-') else '') + self.alias.get(campo.lstrip('-'), campo.lstrip('-'))
+            for campo in fields
+        ]
+        return super().remove_invalid_fields(queryset, fields, view, request)
 
 
 class SolicitudSoporteViewSet(viewsets.ModelViewSet):
@@ -36,28 +63,31 @@ class SolicitudSoporteViewSet(viewsets.ModelViewSet):
     - Soporte: puede ver todas las solicitudes y gestionarlas
     """
     
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, SearchFilter, OrdenamientoSolicitudes]
     filterset_fields = ['tipo_solicitud', 'estado', 'prioridad', 'agente_soporte']
-    search_fields = ['numero_ticket', 'asunto', 'descripcion', 'cliente__username', 'cliente__email']
-    ordering_fields = ['created_at', 'updated_at', 'prioridad', 'fecha_limite_respuesta']
-    ordering = ['-created_at']
+    search_fields = ['numero_ticket', 'asunto', 'descripcion', 'usuario__email', 'usuario__nombres', 'usuario__apellidos']
+    ordering_fields = ['fecha_creacion', 'updated_at', 'prioridad', 'fecha_limite_respuesta']
+    ordering = ['-fecha_creacion', '-id']
+    pagination_class = CursorPaginacionTickets
     
     def get_queryset(self):  # type: ignore
         """Filtrar solicitudes según el tipo de usuario."""
         user = self.request.user
+        es_soporte = user.groups.filter(name='Soporte').exists()
         
-        if user.groups.filter(name='Soporte').exists():
+        if es_soporte:
             # Soporte ve todas las solicitudes
-            return TicketSoporte.objects.select_related(
-                'cliente', 'agente_soporte', 'reserva'
-            ).prefetch_related('mensajes')
+            queryset = TicketSoporte.objects.select_related('usuario', 'agente_soporte')
         else:
             # Clientes solo ven sus propias solicitudes
-            return TicketSoporte.objects.filter(
-                cliente=user
-            ).select_related(
-                'agente_soporte', 'reserva'
-            ).prefetch_related('mensajes')
+            queryset = TicketSoporte.objects.filter(
+                usuario=user
+            ).select_related('usuario', 'agente_soporte')
+        
+        if self.action == 'list':
+            # No leídos y último mensaje anotados: número fijo de consultas por página
+            return SolicitudSoporteListSerializer.anotar(queryset, es_soporte)
+        return queryset.prefetch_related('mensajes')
     
     def get_serializer_class(self):  # type: ignore
         """Seleccionar serializer según la acción."""
@@ -74,13 +104,51 @@ class SolicitudSoporteViewSet(viewsets.ModelViewSet):
         """Permisos según la acción."""
         if self.action == 'create':
             permission_classes = [permissions.IsAuthenticated]
-        elif self.action in ['update', 'partial_update', 'destroy', 'asignar_agente', 'cambiar_estado']:
+        elif self.action in ['update', 'partial_update', 'destroy', 'asignar_agente', 'cambiar_estado', 'siguiente', 'tendencia', 'dashboard']:
             permission_classes = [EsSoporte]
         else:
             permission_classes = [EsClienteOSoporte]
         
         return [permission() for permission in permission_classes]
-    
+
+    def list(self, request, *args, **kwargs):
+        """
+        Con ?q= busca en asunto, descripción y mensajes (índice de texto
+        completo, ver busqueda.py): hasta ?limite= (máx. 100) solicitudes de la
+        más a la menos relevante, con `relevancia` y `fragmento` resaltado,
+        sin paginar. Sin ?q= es el listado paginado normal.
+        """
+        texto = request.query_params.get('q', '').strip()
+        if not texto:
+            return super().list(request, *args, **kwargs)
+
+        try:
+            limite = min(max(int(request.query_params.get('limite', 20)), 1), 100)
+        except ValueError:
+            limite = 20
+        es_soporte = request.user.groups.filter(name='Soporte').exists()
+        resultados = busqueda.buscar(
+            texto,
+            usuario_id=None if es_soporte else request.user.id,
+            incluir_internos=es_soporte,
+            limite=limite,
+        )
+        # Los filtros (?estado, ?prioridad...) se aplican sobre los resultados; el orden es el de relevancia
+        solicitudes = {
+            solicitud.id: solicitud
+            for solicitud in self.filter_queryset(self.get_queryset()).filter(id__in=[r.ticket_id for r in resultados])
+        }
+        data = []
+        for resultado in resultados:
+            solicitud = solicitudes.get(resultado.ticket_id)
+            if solicitud is None:
+                continue
+            item = self.get_serializer(solicitud).data
+            item['relevancia'] = resultado.relevancia
+            item['fragmento'] = resultado.fragmento
+            data.append(item)
+        return Response({'count': len(data), 'results': data})
+
     @action(detail=True, methods=['post'], permission_classes=[EsSoporte])
     def asignar_agente(self, request, pk=None):
         """Asignar un agente específico a la solicitud."""
@@ -112,6 +180,19 @@ class SolicitudSoporteViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
     
+    @action(detail=False, methods=['post'], permission_classes=[EsSoporte])
+    def siguiente(self, request):
+        """Tomar la siguiente solicitud sin asignar (mayor prioridad, más antigua). Ver cola.py."""
+        try:
+            solicitud = cola.reclamar_siguiente(request.user)
+        except cola.LimiteAlcanzado as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+
+        if solicitud is None:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        serializer = SolicitudSoporteListSerializer(solicitud, context=self.get_serializer_context())
+        return Response(serializer.data)
+    
     @action(detail=True, methods=['post'], permission_classes=[EsSoporte])
     def cambiar_estado(self, request, pk=None):
         """Cambiar estado de la solicitud."""
@@ -144,189 +225,62 @@ class SolicitudSoporteViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'], permission_classes=[EsSoporte])
     def dashboard(self, request):
-        """Dashboard con estadísticas para el equipo de soporte."""
-        hoy = timezone.now().date()
-        hace_7_dias = hoy - timedelta(days=7)
-        
-        # Métricas básicas
-        solicitudes_pendientes = TicketSoporte.objects.filter(
-            estado=TicketSoporte.EstadoSolicitud.PENDIENTE
-        ).count()
-
-        solicitudes_en_proceso = TicketSoporte.objects.filter(
-            estado=TicketSoporte.EstadoSolicitud.EN_PROCESO
-        ).count()
-
-        solicitudes_vencidas = TicketSoporte.objects.filter(
-            fecha_limite_respuesta__lt=timezone.now(),
-            estado__in=[TicketSoporte.EstadoSolicitud.PENDIENTE, TicketSoporte.EstadoSolicitud.EN_PROCESO]
-        ).count()
-
-        solicitudes_resueltas_hoy = TicketSoporte.objects.filter(
-            fecha_resolucion__date=hoy
-        ).count()
-        
-        # Tiempos promedio
-        solicitudes_con_respuesta = TicketSoporte.objects.filter(
-            fecha_primera_respuesta__isnull=False,
-            created_at__gte=hace_7_dias
-        )
-        
-        tiempo_promedio_respuesta = 0
-        if solicitudes_con_respuesta.exists():
-            tiempos_respuesta = []
-            for sol in solicitudes_con_respuesta:
-                if sol.fecha_primera_respuesta and sol.fecha_creacion:
-                    delta = sol.fecha_primera_respuesta - sol.fecha_creacion
-                    tiempos_respuesta.append(delta.total_seconds() / 3600)
-            
-            if tiempos_respuesta:
-                tiempo_promedio_respuesta = sum(tiempos_respuesta) / len(tiempos_respuesta)
-
-        solicitudes_resueltas = TicketSoporte.objects.filter(
-            fecha_resolucion__isnull=False,
-            created_at__gte=hace_7_dias
-        )
-        
-        tiempo_promedio_resolucion = 0
-        if solicitudes_resueltas.exists():
-            tiempos_resolucion = [sol.tiempo_total_resolucion for sol in solicitudes_resueltas if sol.tiempo_total_resolucion]
-            if tiempos_resolucion:
-                tiempo_promedio_resolucion = sum(tiempos_resolucion) / len(tiempos_resolucion)
-        
-        # Satisfacción promedio
-        satisfaccion_promedio = TicketSoporte.objects.filter(
-            satisfaccion_cliente__isnull=False,
-            created_at__gte=hace_7_dias
-        ).aggregate(
-            promedio=Avg('satisfaccion_cliente')
-        )['promedio'] or 0
-        
-        # Distribución por tipo
-        solicitudes_por_tipo = dict(
-            TicketSoporte.objects.filter(
-                created_at__gte=hace_7_dias
-            ).values('tipo_solicitud').annotate(
-                count=Count('id')
-            ).values_list('tipo_solicitud', 'count')
-        )
-        
-        # Distribución por prioridad
-        solicitudes_por_prioridad = dict(
-            TicketSoporte.objects.filter(
-                created_at__gte=hace_7_dias
-            ).values('prioridad').annotate(
-                count=Count('id')
-            ).values_list('prioridad', 'count')
-        )
-        
-        # Carga por agente
-        agentes_soporte = User.objects.filter(
-            groups__name='Soporte',
-            is_active=True
-        )
-        
-        carga_por_agente = []
-        for agente in agentes_soporte:
-            solicitudes_activas = agente.solicitudes_asignadas.filter(  # type: ignore
-                estado__in=[TicketSoporte.EstadoSolicitud.PENDIENTE, TicketSoporte.EstadoSolicitud.EN_PROCESO, TicketSoporte.EstadoSolicitud.ESPERANDO_CLIENTE]
-            ).count()
-            
-            carga_por_agente.append({
-                'agente': agente.get_full_name(),
-                'solicitudes_activas': solicitudes_activas,
-                'email': agente.email
-            })
-        
-        # Tendencia semanal
-        tendencia_semanal = []
-        for i in range(7):
-            fecha = hoy - timedelta(days=i)
-            count = TicketSoporte.objects.filter(
-                created_at__date=fecha
-            ).count()
-            tendencia_semanal.append({
-                'fecha': fecha.strftime('%Y-%m-%d'),
-                'solicitudes': count
-            })
-        
-        tendencia_semanal.reverse()
-        
-        data = {
-            'solicitudes_pendientes': solicitudes_pendientes,
-            'solicitudes_en_proceso': solicitudes_en_proceso,
-            'solicitudes_vencidas': solicitudes_vencidas,
-            'solicitudes_resueltas_hoy': solicitudes_resueltas_hoy,
-            'tiempo_promedio_respuesta': round(tiempo_promedio_respuesta, 2),
-            'tiempo_promedio_resolucion': round(tiempo_promedio_resolucion, 2),
-            'satisfaccion_promedio': round(satisfaccion_promedio, 2),
-            'solicitudes_por_tipo': solicitudes_por_tipo,
-            'solicitudes_por_prioridad': solicitudes_por_prioridad,
-            'carga_por_agente': carga_por_agente,
-            'tendencia_semanal': tendencia_semanal
-        }
+        """Dashboard con estadísticas para el equipo de soporte (foto cacheada, ver dashboard.py)."""
+        data = dashboard.obtener()
         
         serializer = DashboardSoporteSerializer(data)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'], permission_classes=[EsSoporte])
+    def tendencia(self, request):
+        """
+        Tendencia de 1 a 366 días (?dias=90|365, ?agrupar=dia|semana|mes, filtros
+        ?tipo_solicitud, ?prioridad, ?agente) leída de las métricas diarias, sin
+        recorrer las solicitudes.
+        """
+        parametros = TendenciaQuerySerializer(data=request.query_params)
+        parametros.is_valid(raise_exception=True)
+        datos = parametros.validated_data
+        return Response(metricas.tendencia(
+            datos['dias'], datos['agrupar'],
+            tipo_solicitud=datos.get('tipo_solicitud'),
+            prioridad=datos.get('prioridad'),
+            agente_id=datos.get('agente'),
+        ))
+    
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def mis_estadisticas(self, request):
-        """Estadísticas personales del cliente."""
+        """Estadísticas personales del cliente (contadores y promedios en una consulta)."""
         user = request.user
         hace_30_dias = timezone.now() - timedelta(days=30)
+        solicitudes = TicketSoporte.objects.filter(usuario=user)
 
-        total_solicitudes = TicketSoporte.objects.filter(cliente=user).count()
-        solicitudes_abiertas = TicketSoporte.objects.filter(
-            cliente=user,
-            estado__in=[TicketSoporte.EstadoSolicitud.PENDIENTE, TicketSoporte.EstadoSolicitud.EN_PROCESO, TicketSoporte.EstadoSolicitud.ESPERANDO_CLIENTE]
-        ).count()
-        
-        solicitudes_resueltas = TicketSoporte.objects.filter(
-            cliente=user,
-            estado=TicketSoporte.EstadoSolicitud.RESUELTO
-        ).count()
-        
-        # Tiempo promedio de resolución
-        solicitudes_con_resolucion = TicketSoporte.objects.filter(
-            cliente=user,
-            tiempo_total_resolucion__isnull=False
+        resumen = solicitudes.aggregate(
+            total=Count('id'),
+            abiertas=Count('id', filter=Q(estado__in=TicketSoporte.ESTADOS_ACTIVOS)),
+            resueltas=Count('id', filter=Q(estado=EstadoSolicitud.RESUELTO)),
+            resolucion=Avg('tiempo_total_resolucion'),
+            satisfaccion=Avg('satisfaccion_cliente'),
+            ultima_actividad=Max('updated_at'),
         )
         
-        tiempo_promedio_resolucion = 0
-        if solicitudes_con_resolucion.exists():
-            tiempos = [sol.tiempo_total_resolucion for sol in solicitudes_con_resolucion if sol.tiempo_total_resolucion is not None]
-            if tiempos:
-                tiempo_promedio_resolucion = sum(tiempos) / len(tiempos)
-        
-        # Satisfacción promedio
-        satisfaccion_promedio = TicketSoporte.objects.filter(
-            cliente=user,
-            satisfaccion_cliente__isnull=False
-        ).aggregate(
-            promedio=Avg('satisfaccion_cliente')
-        )['promedio'] or 0
-        
-        # Última actividad
-        ultima_solicitud = TicketSoporte.objects.filter(cliente=user).first()
-        ultima_actividad = ultima_solicitud.updated_at if ultima_solicitud else None
-        
         # Solicitudes recientes
-        solicitudes_recientes = TicketSoporte.objects.filter(
-            cliente=user,
-            created_at__gte=hace_30_dias
-        )[:5]
+        solicitudes_recientes = SolicitudSoporteListSerializer.anotar(
+            solicitudes.filter(fecha_creacion__gte=hace_30_dias).select_related('usuario', 'agente_soporte'),
+            es_soporte=False,
+        ).order_by('-fecha_creacion', '-id')[:5]
         
         data = {
-            'total_solicitudes': total_solicitudes,
-            'solicitudes_abiertas': solicitudes_abiertas,
-            'solicitudes_resueltas': solicitudes_resueltas,
-            'tiempo_promedio_resolucion': round(tiempo_promedio_resolucion, 2),
-            'satisfaccion_promedio': round(satisfaccion_promedio, 2),
-            'ultima_actividad': ultima_actividad,
+            'total_solicitudes': resumen['total'],
+            'solicitudes_abiertas': resumen['abiertas'],
+            'solicitudes_resueltas': resumen['resueltas'],
+            'tiempo_promedio_resolucion': round(resumen['resolucion'] or 0, 2),
+            'satisfaccion_promedio': round(resumen['satisfaccion'] or 0, 2),
+            'ultima_actividad': resumen['ultima_actividad'],
             'solicitudes_recientes': solicitudes_recientes
         }
         
-        serializer = EstadisticasClienteSerializer(data)
+        serializer = EstadisticasClienteSerializer(data, context=self.get_serializer_context())
         return Response(serializer.data)
 
 
@@ -338,63 +292,66 @@ class MensajeSoporteViewSet(viewsets.ModelViewSet):
     serializer_class = MensajeSoporteSerializer
     permission_classes = [EsClienteOSoporte]
     filter_backends = [OrderingFilter]
-    ordering = ['created_at']
+    ordering_fields = ['fecha']
+    ordering = ['fecha', 'id']
+
+    def _acceso(self):
+        """(solicitud, es_soporte) si el usuario puede ver la solicitud de la URL; si no, (None, False)."""
+        if not hasattr(self, '_solicitud_acceso'):
+            user = self.request.user
+            es_soporte = user.groups.filter(name='Soporte').exists()
+            solicitud = TicketSoporte.objects.filter(id=self.kwargs.get('solicitud_pk')).first()
+            if solicitud is None or not (es_soporte or solicitud.usuario_id == user.id):
+                solicitud = None
+            self._solicitud_acceso = (solicitud, es_soporte)
+        return self._solicitud_acceso
     
     def get_queryset(self):  # type: ignore
         """Filtrar mensajes según solicitud y permisos."""
-        solicitud_id = self.kwargs.get('solicitud_pk')
-        user = self.request.user
-        
-        try:
-            solicitud = TicketSoporte.objects.get(id=solicitud_id)
-            
-            # Verificar permisos
-            if user == solicitud.usuario or user.groups.filter(name='Soporte').exists():
-                queryset = MensajeSoporte.objects.filter(solicitud=solicitud)
-                
-                # Si es cliente, no mostrar mensajes internos
-                if user == solicitud.usuario:
-                    queryset = queryset.filter(es_interno=False)
-                
-                return queryset.select_related('remitente', 'solicitud')
-            else:
-                return MensajeSoporte.objects.none()
-
-        except TicketSoporte.DoesNotExist:
+        solicitud, es_soporte = self._acceso()
+        if solicitud is None:
             return MensajeSoporte.objects.none()
+
+        queryset = MensajeSoporte.objects.filter(ticket=solicitud)
+        # Si es cliente, no mostrar mensajes internos
+        if not es_soporte:
+            queryset = queryset.filter(es_interno=False)
+        return queryset.select_related('remitente', 'ticket')
     
     def perform_create(self, serializer):
         """Crear mensaje asociándolo a la solicitud correcta."""
-        solicitud_id = self.kwargs.get('solicitud_pk')
-        try:
-            solicitud = TicketSoporte.objects.get(id=solicitud_id)
-            serializer.save(
-                solicitud=solicitud,
-                remitente=self.request.user
-            )
-        except TicketSoporte.DoesNotExist:
-            raise serializers.ValidationError("Solicitud no encontrada")
+        solicitud, es_soporte = self._acceso()
+        if solicitud is None:
+            raise NotFound("Solicitud no encontrada")
+        datos = {'ticket': solicitud, 'remitente': self.request.user}
+        if not es_soporte:
+            # Las notas internas son solo del equipo de soporte
+            datos['es_interno'] = False
+        serializer.save(**datos)
     
     @action(detail=True, methods=['post'])
     def marcar_leido(self, request, solicitud_pk=None, pk=None):
         """Marcar mensaje como leído."""
         mensaje = self.get_object()
-        user = request.user
-        
-        if user == mensaje.solicitud.cliente:
-            mensaje.marcar_como_leido_por_cliente()
-        elif user.groups.filter(name='Soporte').exists():
-            mensaje.marcar_como_leido_por_soporte()
+        _, es_soporte = self._acceso()
+        if es_soporte:
+            MensajeSoporte.objects.filter(pk=mensaje.pk, leido_por_soporte=False).update(
+                leido_por_soporte=True, fecha_lectura_soporte=timezone.now()
+            )
+        elif request.user.id == mensaje.ticket.usuario_id:
+            MensajeSoporte.objects.filter(pk=mensaje.pk, leido_por_cliente=False).update(
+                leido_por_cliente=True, fecha_lectura_cliente=timezone.now()
+            )
         
         return Response({'message': 'Mensaje marcado como leído'})
     
     @action(detail=False, methods=['post'])
     def marcar_todos_leidos(self, request, solicitud_pk=None):
         """Marcar todos los mensajes de la solicitud como leídos."""
-        user = request.user
         mensajes = self.get_queryset()
+        _, es_soporte = self._acceso()
         
-        if user.groups.filter(name='Soporte').exists():
+        if es_soporte:
             # Marcar como leídos por soporte
             mensajes.filter(leido_por_soporte=False).update(
                 leido_por_soporte=True,
@@ -422,4 +379,112 @@ class ConfiguracionSoporteViewSet(viewsets.ModelViewSet):
     
     def get_object(self):  # type: ignore
         """Siempre devolver la configuración principal."""
-        return ConfiguracionSoporte.obtener_configuracion()
\ No newline at end of file
+        return ConfiguracionSoporte.obtener_configuracion()
+
+
+# ----------------------------------------------------------------------
+# Eventos en tiempo real (SSE, servir con ASGI; ver tiempo_real.py)
+# ----------------------------------------------------------------------
+
+def _clave_ticket_sse(ticket):
+    # Se guarda el hash, igual que los códigos de recuperación (authz/views.py)
+    return 'sse:' + hashlib.sha256(ticket.encode()).hexdigest()
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def ticket_eventos(request):
+    """
+    POST /api/soporte/eventos/ticket/
+
+    ``EventSource`` no permite enviar headers, y un JWT en la URL queda en los
+    logs de proxies y del servidor. Este ticket aleatorio se canjea una sola
+    vez en ``?ticket=`` dentro de ``SOPORTE_SSE_TICKET_TTL`` segundos; para
+    reconectar se pide otro y se pasa ``?ultimo_evento=``.
+    """
+    ticket = get_random_string(48)
+    almacen.guardar(_clave_ticket_sse(ticket), request.user.pk, settings.SOPORTE_SSE_TICKET_TTL)
+    return Response({'ticket': ticket, 'expira_en': settings.SOPORTE_SSE_TICKET_TTL})
+
+
+def _usuario_sse(request):
+    """
+    Autentica con el JWT del header ``Authorization`` o con un ticket de un
+    solo uso (``?ticket=``, ver ``ticket_eventos``).
+    """
+    ticket = request.GET.get('ticket')
+    if ticket:
+        usuario_id = almacen.consumir(_clave_ticket_sse(ticket))
+        return User.objects.filter(pk=usuario_id).first() if usuario_id else None
+    autenticador = JWTRolesAuthentication()
+    try:
+        resultado = autenticador.authenticate(request)
+        return resultado[0] if resultado else None
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None
+
+
+def _acceso_solicitud(request, pk):
+    """(usuario, es_soporte, solicitud) si el usuario puede ver la solicitud; si no, un código de error."""
+    user = _usuario_sse(request)
+    if user is None or not user.is_active:
+        return 401
+    es_soporte = user.groups.filter(name='Soporte').exists()
+    solicitud = TicketSoporte.objects.filter(pk=pk).only('id', 'usuario_id').first()
+    if solicitud is None:
+        return 404
+    if not es_soporte and solicitud.usuario_id != user.id:
+        return 403
+    return user, es_soporte, solicitud
+
+
+def _respuesta_sse(suscripcion):
+    response = StreamingHttpResponse(tiempo_real.flujo(suscripcion), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Sin buffer en nginx para que cada evento salga al momento
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _error_sse(codigo):
+    mensajes = {401: 'No autenticado', 403: 'Sin acceso a esta solicitud', 404: 'Solicitud no encontrada'}
+    return JsonResponse({'error': mensajes[codigo]}, status=codigo)
+
+
+async def eventos_solicitud(request, pk):
+    """
+    GET /api/soporte/solicitudes/{id}/eventos/
+
+    Flujo SSE con los mensajes nuevos (``mensaje``) y los cambios de la
+    solicitud (``solicitud``). El cliente no recibe notas internas.
+    """
+    acceso = await sync_to_async(_acceso_solicitud)(request, pk)
+    if isinstance(acceso, int):
+        return _error_sse(acceso)
+    _, es_soporte, solicitud = acceso
+    suscripcion = tiempo_real.broker.suscribir(
+        [tiempo_real.canal_solicitud(solicitud.pk)],
+        request.headers.get('Last-Event-ID') or request.GET.get('ultimo_evento'),
+        incluir_internos=es_soporte,
+    )
+    return _respuesta_sse(suscripcion)
+
+
+async def eventos_bandeja(request):
+    """
+    GET /api/soporte/bandeja/eventos/
+
+    Flujo SSE del agente autenticado: mensajes y cambios de todas sus
+    solicitudes asignadas. Solo equipo de soporte.
+    """
+    user = await sync_to_async(_usuario_sse)(request)
+    if user is None or not user.is_active:
+        return _error_sse(401)
+    if not await user.groups.filter(name='Soporte').aexists():
+        return JsonResponse({'error': 'Solo para el equipo de soporte'}, status=403)
+    suscripcion = tiempo_real.broker.suscribir(
+        [tiempo_real.canal_agente(user.pk)],
+        request.headers.get('Last-Event-ID') or request.GET.get('ultimo_evento'),
+        incluir_internos=True,
+    )
+    return _respuesta_sse(suscripcion)
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CupoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('capacidad', models.PositiveIntegerField(blank=True, help_text='Vacío = sin límite', null=True)),
+                ('reservados', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('paquete', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='cupos', to='core.paquete')),
+                ('servicio', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='cupos', to='core.servicio')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('paquete', 'fecha'), name='cupo_unico_paquete_fecha'), models.UniqueConstraint(fields=('servicio', 'fecha'), name='cupo_unico_servicio_fecha')],
+            },
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:34
+
+import logging
+
+from django.db import migrations, models
+
+logger = logging.getLogger(__name__)
+
+CAMPOS_COMPLETABLES = ('fecha_nacimiento', 'email', 'telefono', 'nacionalidad')
+
+
+def fusionar_duplicados(apps, schema_editor):
+    """
+    Deja una sola fila por documento (la más antigua) antes de crear el índice único.
+
+    Las asociaciones ``ReservaAcompanante`` de los duplicados pasan a la fila
+    conservada; si esa reserva ya la tenía, se descarta la repetida (conservando
+    la marca de titular). Los datos de contacto vacíos se completan con los del
+    duplicado y cada fusión queda en el log.
+    """
+    Acompanante = apps.get_model('core', 'Acompanante')
+    ReservaAcompanante = apps.get_model('core', 'ReservaAcompanante')
+
+    duplicados = (
+        Acompanante.objects.exclude(documento='')
+        .values('documento')
+        .annotate(total=models.Count('id'), conservar=models.Min('id'))
+        .filter(total__gt=1)
+    )
+    for fila in duplicados:
+        conservado = Acompanante.objects.get(pk=fila['conservar'])
+        otros = list(
+            Acompanante.objects.filter(documento=fila['documento'])
+            .exclude(pk=conservado.pk)
+            .order_by('id')
+        )
+        otros_ids = [otro.pk for otro in otros]
+
+        completados = []
+        for campo in CAMPOS_COMPLETABLES:
+            if getattr(conservado, campo):
+                continue
+            valor = next((getattr(otro, campo) for otro in otros if getattr(otro, campo)), None)
+            if valor:
+                setattr(conservado, campo, valor)
+                completados.append(campo)
+        if completados:
+            conservado.save(update_fields=completados)
+
+        asociadas = {
+            ra.reserva_id: ra
+            for ra in ReservaAcompanante.objects.filter(acompanante_id=conservado.pk)
+        }
+        reasignadas, descartadas = 0, 0
+        for ra in ReservaAcompanante.objects.filter(acompanante_id__in=otros_ids).order_by('id'):
+            existente = asociadas.get(ra.reserva_id)
+            if existente is None:
+                ra.acompanante_id = conservado.pk
+                ra.save(update_fields=['acompanante'])
+                asociadas[ra.reserva_id] = ra
+                reasignadas += 1
+            else:
+                if ra.es_titular and not existente.es_titular:
+                    existente.es_titular = True
+                    existente.save(update_fields=['es_titular'])
+                ra.delete()
+                descartadas += 1
+
+        Acompanante.objects.filter(pk__in=otros_ids).delete()
+        logger.warning(
+            "Acompañante documento=%s: fusionados %s en %s (%s asociaciones reasignadas, "
+            "%s repetidas descartadas, campos completados: %s)",
+            fila['documento'], otros_ids, conservado.pk, reasignadas, descartadas,
+            ', '.join(completados) or 'ninguno',
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_cupodiario'),
+    ]
+
+    operations = [
+        migrations.RunPython(fusionar_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='acompanante',
+            constraint=models.UniqueConstraint(condition=models.Q(('documento', ''), _negated=True), fields=('documento',), name='acompanante_documento_unico'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_acompanante_documento_unico'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(fields=['-created_at', '-id'], name='reserva_creada_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(fields=['usuario', '-created_at', '-id'], name='reserva_usuario_creada_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticketsoporte',
+            index=models.Index(fields=['-fecha_creacion', '-id'], name='ticket_creado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticketsoporte',
+            index=models.Index(fields=['usuario', '-fecha_creacion', '-id'], name='ticket_usuario_creado_idx'),
+        ),
+    ]
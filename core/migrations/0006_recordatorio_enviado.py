@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_outbox_evento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecordatorioEnviado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dias_antes', models.PositiveSmallIntegerField()),
+                ('enviado_at', models.DateTimeField(auto_now_add=True)),
+                ('reserva', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recordatorios', to='core.reserva')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('reserva', 'dias_antes'), name='recordatorio_unico_reserva_dias')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_ticket_agente_limite'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mensajesoporte',
+            name='es_interno',
+            field=models.BooleanField(default=False, help_text='Nota interna, no visible para el cliente'),
+        ),
+        migrations.AddField(
+            model_name='mensajesoporte',
+            name='fecha_lectura_cliente',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='mensajesoporte',
+            name='fecha_lectura_soporte',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='mensajesoporte',
+            name='leido_por_cliente',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='mensajesoporte',
+            name='leido_por_soporte',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='mensajesoporte',
+            index=models.Index(fields=['ticket', '-fecha', '-id'], name='mensaje_ticket_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_mensaje_lectura'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticketsoporte',
+            name='escalamientos',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Veces que venció el plazo de respuesta'),
+        ),
+        migrations.AddIndex(
+            model_name='ticketsoporte',
+            index=models.Index(fields=['estado', 'fecha_limite_respuesta'], name='ticket_estado_limite_idx'),
+        ),
+    ]
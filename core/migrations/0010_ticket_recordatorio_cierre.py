@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_ticket_sla'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticketsoporte',
+            name='fecha_ultimo_recordatorio',
+            field=models.DateTimeField(blank=True, help_text='Último recordatorio al cliente en ESPERANDO_CLIENTE', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='ticketsoporte',
+            index=models.Index(fields=['estado', 'id'], name='ticket_estado_id_idx'),
+        ),
+    ]
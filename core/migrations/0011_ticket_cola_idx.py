@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_ticket_recordatorio_cierre'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticketsoporte',
+            index=models.Index(fields=['estado', 'prioridad', 'fecha_creacion'], name='ticket_cola_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_ticket_cola_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricaDiariaSoporte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('tipo_solicitud', models.CharField(max_length=20)),
+                ('prioridad', models.CharField(max_length=10)),
+                ('creadas', models.IntegerField(default=0)),
+                ('resueltas', models.IntegerField(default=0)),
+                ('primera_respuesta_horas', models.FloatField(default=0)),
+                ('primera_respuesta_cantidad', models.IntegerField(default=0)),
+                ('resolucion_horas', models.FloatField(default=0)),
+                ('resolucion_cantidad', models.IntegerField(default=0)),
+                ('satisfaccion_suma', models.FloatField(default=0)),
+                ('satisfaccion_cantidad', models.IntegerField(default=0)),
+                ('agente', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='metricas_soporte', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['fecha', 'tipo_solicitud', 'prioridad'], name='metrica_soporte_fecha_idx')],
+            },
+        ),
+    ]
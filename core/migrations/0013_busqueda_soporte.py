@@ -0,0 +1,114 @@
+# Índice de búsqueda de texto completo sobre solicitudes y mensajes de soporte.
+# SQLite: tabla FTS5 mantenida por triggers. PostgreSQL: columnas tsvector
+# generadas con índice GIN. Otras bases: sin índice (core.api.soporte.busqueda
+# usa icontains).
+
+from django.db import migrations
+
+# rowid = id * 2 para solicitudes e id * 2 + 1 para mensajes: cada trigger
+# ubica su fila por rowid sin recorrer la tabla
+SQLITE = [
+    """
+    CREATE VIRTUAL TABLE soporte_busqueda USING fts5(
+        titulo, contenido, ticket_id UNINDEXED, interno UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER soporte_busqueda_ticket_ai AFTER INSERT ON core_ticketsoporte BEGIN
+        INSERT INTO soporte_busqueda (rowid, titulo, contenido, ticket_id, interno)
+        VALUES (new.id * 2, new.asunto, new.descripcion, new.id, 0);
+    END
+    """,
+    """
+    CREATE TRIGGER soporte_busqueda_ticket_au AFTER UPDATE OF asunto, descripcion ON core_ticketsoporte BEGIN
+        UPDATE soporte_busqueda SET titulo = new.asunto, contenido = new.descripcion WHERE rowid = new.id * 2;
+    END
+    """,
+    """
+    CREATE TRIGGER soporte_busqueda_ticket_ad AFTER DELETE ON core_ticketsoporte BEGIN
+        DELETE FROM soporte_busqueda WHERE rowid = old.id * 2;
+    END
+    """,
+    """
+    CREATE TRIGGER soporte_busqueda_mensaje_ai AFTER INSERT ON core_mensajesoporte BEGIN
+        INSERT INTO soporte_busqueda (rowid, titulo, contenido, ticket_id, interno)
+        VALUES (new.id * 2 + 1, '', new.mensaje, new.ticket_id, new.es_interno);
+    END
+    """,
+    """
+    CREATE TRIGGER soporte_busqueda_mensaje_au AFTER UPDATE OF mensaje, es_interno ON core_mensajesoporte BEGIN
+        UPDATE soporte_busqueda SET contenido = new.mensaje, interno = new.es_interno WHERE rowid = new.id * 2 + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER soporte_busqueda_mensaje_ad AFTER DELETE ON core_mensajesoporte BEGIN
+        DELETE FROM soporte_busqueda WHERE rowid = old.id * 2 + 1;
+    END
+    """,
+    """
+    INSERT INTO soporte_busqueda (rowid, titulo, contenido, ticket_id, interno)
+    SELECT id * 2, asunto, descripcion, id, 0 FROM core_ticketsoporte
+    """,
+    """
+    INSERT INTO soporte_busqueda (rowid, titulo, contenido, ticket_id, interno)
+    SELECT id * 2 + 1, '', mensaje, ticket_id, es_interno FROM core_mensajesoporte
+    """,
+]
+
+SQLITE_REVERSO = [
+    "DROP TRIGGER IF EXISTS soporte_busqueda_ticket_ai",
+    "DROP TRIGGER IF EXISTS soporte_busqueda_ticket_au",
+    "DROP TRIGGER IF EXISTS soporte_busqueda_ticket_ad",
+    "DROP TRIGGER IF EXISTS soporte_busqueda_mensaje_ai",
+    "DROP TRIGGER IF EXISTS soporte_busqueda_mensaje_au",
+    "DROP TRIGGER IF EXISTS soporte_busqueda_mensaje_ad",
+    "DROP TABLE IF EXISTS soporte_busqueda",
+]
+
+POSTGRESQL = [
+    """
+    ALTER TABLE core_ticketsoporte ADD COLUMN busqueda tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('spanish', coalesce(asunto, '')), 'A') ||
+        setweight(to_tsvector('spanish', coalesce(descripcion, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX ticket_busqueda_gin ON core_ticketsoporte USING GIN (busqueda)",
+    """
+    ALTER TABLE core_mensajesoporte ADD COLUMN busqueda tsvector GENERATED ALWAYS AS (
+        to_tsvector('spanish', coalesce(mensaje, ''))
+    ) STORED
+    """,
+    "CREATE INDEX mensaje_busqueda_gin ON core_mensajesoporte USING GIN (busqueda)",
+]
+
+POSTGRESQL_REVERSO = [
+    "DROP INDEX IF EXISTS mensaje_busqueda_gin",
+    "ALTER TABLE core_mensajesoporte DROP COLUMN IF EXISTS busqueda",
+    "DROP INDEX IF EXISTS ticket_busqueda_gin",
+    "ALTER TABLE core_ticketsoporte DROP COLUMN IF EXISTS busqueda",
+]
+
+
+def _ejecutar(schema_editor, sentencias):
+    for sentencia in sentencias.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sentencia)
+
+
+def crear_indice(apps, schema_editor):
+    _ejecutar(schema_editor, {'sqlite': SQLITE, 'postgresql': POSTGRESQL})
+
+
+def borrar_indice(apps, schema_editor):
+    _ejecutar(schema_editor, {'sqlite': SQLITE_REVERSO, 'postgresql': POSTGRESQL_REVERSO})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_metrica_diaria_soporte'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, borrar_indice),
+    ]
@@ -0,0 +1,75 @@
+# Llena el ledger CupoDiario con las reservas existentes (lo mismo que
+# manage.py reconstruir_cupos) para que hay_cupo/reservar_cupos las vean
+# desde el primer despliegue.
+#
+# La lógica está copiada aquí a propósito: una migración no debe importar
+# código de la aplicación, que puede cambiar después.
+
+from collections import defaultdict
+
+from django.db import migrations
+from django.utils import timezone
+
+ESTADOS_CON_CUPO = ('PENDIENTE', 'CONFIRMADA', 'PAGADA', 'REPROGRAMADA', 'COMPLETADA')
+
+
+def poblar(apps, schema_editor):
+    CupoDiario = apps.get_model('core', 'CupoDiario')
+    Paquete = apps.get_model('core', 'Paquete')
+    ReservaServicio = apps.get_model('core', 'ReservaServicio')
+    desde = timezone.localdate()
+
+    lineas_por_reserva = defaultdict(lambda: defaultdict(int))
+    dia_por_reserva = {}
+    filas = ReservaServicio.objects.filter(
+        reserva__estado__in=ESTADOS_CON_CUPO,
+        reserva__fecha_inicio__date__gte=desde,
+    ).values_list('reserva_id', 'reserva__fecha_inicio', 'servicio_id', 'cantidad').order_by('reserva_id')
+    for reserva_id, fecha_inicio, servicio_id, cantidad in filas.iterator():
+        if timezone.is_aware(fecha_inicio):
+            fecha_inicio = timezone.localtime(fecha_inicio)
+        dia_por_reserva[reserva_id] = fecha_inicio.date()
+        lineas_por_reserva[reserva_id][servicio_id] += cantidad
+
+    servicio_ids = {sid for lineas in lineas_por_reserva.values() for sid in lineas}
+    paquetes = defaultdict(list)
+    for servicio_id, paquete_id in Paquete.servicios.through.objects.filter(
+        servicio_id__in=servicio_ids
+    ).values_list('servicio_id', 'paquete_id'):
+        paquetes[servicio_id].append(paquete_id)
+
+    # Cada servicio suma su cantidad; un paquete cuenta a las personas una vez por reserva
+    totales = defaultdict(int)
+    for reserva_id, lineas in lineas_por_reserva.items():
+        dia = dia_por_reserva[reserva_id]
+        por_paquete = {}
+        for servicio_id, cantidad in lineas.items():
+            totales[(dia, 'servicio', servicio_id)] += cantidad
+            for paquete_id in paquetes.get(servicio_id, []):
+                por_paquete[paquete_id] = max(por_paquete.get(paquete_id, 0), cantidad)
+        for paquete_id, cantidad in por_paquete.items():
+            totales[(dia, 'paquete', paquete_id)] += cantidad
+
+    capacidades = dict(Paquete.objects.values_list('id', 'max_personas'))
+    CupoDiario.objects.filter(fecha__gte=desde).delete()
+    CupoDiario.objects.bulk_create([
+        CupoDiario(
+            fecha=dia,
+            paquete_id=id_ if tipo == 'paquete' else None,
+            servicio_id=id_ if tipo == 'servicio' else None,
+            capacidad=capacidades.get(id_) if tipo == 'paquete' else None,
+            reservados=cantidad,
+        )
+        for (dia, tipo, id_), cantidad in totales.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_busqueda_soporte'),
+    ]
+
+    operations = [
+        migrations.RunPython(poblar, migrations.RunPython.noop),
+    ]
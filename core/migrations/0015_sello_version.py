@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_poblar_cupos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SelloVersion',
+            fields=[
+                ('clave', models.CharField(max_length=150, primary_key=True, serialize=False)),
+                ('version', models.CharField(max_length=32)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from decimal import Decimal
 import json
 
@@ -34,6 +35,13 @@ class Reserva(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Orden de la paginación por cursor (todas / por cliente)
+            models.Index(fields=['-created_at', '-id'], name='reserva_creada_idx'),
+            models.Index(fields=['usuario', '-created_at', '-id'], name='reserva_usuario_creada_idx'),
+        ]
+
     def __str__(self):
         return f"Reserva {self.id} - {self.usuario}"  # type: ignore
 
@@ -46,6 +54,12 @@ class Acompanante(models.Model):
     telefono = models.CharField(max_length=25, null=True, blank=True)
     nacionalidad = models.CharField(max_length=50, null=True, blank=True)
 
+    class Meta:
+        constraints = [
+            # Un documento identifica a una sola persona; se permiten varios sin documento
+            models.UniqueConstraint(fields=['documento'], condition=~models.Q(documento=''), name='acompanante_documento_unico'),
+        ]
+
     def __str__(self):
         return f"{self.nombres} {self.apellidos}"
 
@@ -85,6 +99,87 @@ class HistorialReprogramacion(models.Model):
     def __str__(self):
         return f"Historial {self.reserva} - {self.fecha_nueva}"
 
+class RecordatorioEnviado(models.Model):
+    """Marca de recordatorio ya enviado, para que ``enviar_recordatorios`` no lo repita."""
+    reserva = models.ForeignKey('Reserva', on_delete=models.CASCADE, related_name='recordatorios')
+    dias_antes = models.PositiveSmallIntegerField()
+    enviado_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['reserva', 'dias_antes'], name='recordatorio_unico_reserva_dias'),
+        ]
+
+    def __str__(self):
+        return f"Recordatorio {self.reserva_id} ({self.dias_antes} días antes)"  # type: ignore
+
+class OutboxEvento(models.Model):
+    """
+    Efecto externo (email, aviso a soporte) registrado en la misma transacción
+    que el cambio que lo origina; ``run_outbox_worker`` lo procesa después.
+    """
+    ESTADOS = (
+        ("PENDIENTE", "Pendiente"),
+        ("PROCESANDO", "Procesando"),
+        ("ENVIADO", "Enviado"),
+        ("FALLIDO", "Fallido"),
+    )
+    tipo = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    estado = models.CharField(max_length=12, choices=ESTADOS, default="PENDIENTE")
+    intentos = models.PositiveIntegerField(default=0)
+    proximo_intento = models.DateTimeField(default=timezone.now, help_text="No se procesa antes de esta fecha")
+    ultimo_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    procesado_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['estado', 'proximo_intento'], name='outbox_pendientes_idx')]
+
+    def __str__(self):
+        return f"Outbox {self.tipo} #{self.pk} ({self.estado})"
+
+class CupoDiario(models.Model):
+    """Ledger de cupos por día: personas reservadas por paquete o servicio en una fecha."""
+    paquete = models.ForeignKey('Paquete', on_delete=models.CASCADE, null=True, blank=True, related_name='cupos')
+    servicio = models.ForeignKey('Servicio', on_delete=models.CASCADE, null=True, blank=True, related_name='cupos')
+    fecha = models.DateField()
+    capacidad = models.PositiveIntegerField(null=True, blank=True, help_text="Vacío = sin límite")
+    reservados = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['paquete', 'fecha'], name='cupo_unico_paquete_fecha'),
+            models.UniqueConstraint(fields=['servicio', 'fecha'], name='cupo_unico_servicio_fecha'),
+        ]
+
+    @property
+    def clave(self):
+        if self.paquete_id is not None:  # type: ignore
+            return ('paquete', self.paquete_id)  # type: ignore
+        return ('servicio', self.servicio_id)  # type: ignore
+
+    @property
+    def restantes(self):
+        if self.capacidad is None:
+            return None
+        return max(self.capacidad - self.reservados, 0)
+
+    def __str__(self):
+        tipo, id_ = self.clave
+        return f"Cupo {tipo} {id_} - {self.fecha}: {self.reservados}/{self.capacidad or '∞'}"
+
+
+class SelloVersion(models.Model):
+    """Versión de un dato cacheado en memoria; cada proceso compara la suya antes de usar la copia."""
+    clave = models.CharField(max_length=150, primary_key=True)
+    version = models.CharField(max_length=32)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.clave}: {self.version}"
+
 # =========================
 # MODELOS DE CATALOGO
 # =========================
@@ -235,6 +330,9 @@ class TicketSoporte(models.Model):
         CRITICA = 'CRITICA', 'Crítica'
 
     usuario = models.ForeignKey(USER_MODEL, on_delete=models.CASCADE, related_name='tickets_soporte')
+    agente_soporte = models.ForeignKey(
+        USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='solicitudes_asignadas'
+    )
     tipo_solicitud = models.CharField(max_length=20, choices=TipoSolicitud.choices, default=TipoSolicitud.CONSULTA)
     estado = models.CharField(max_length=20, choices=EstadoSolicitud.choices, default=EstadoSolicitud.PENDIENTE)
     prioridad = models.CharField(max_length=10, choices=PrioridadSolicitud.choices, default=PrioridadSolicitud.MEDIA)
@@ -243,13 +341,66 @@ class TicketSoporte(models.Model):
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_cierre = models.DateTimeField(null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)  
+    fecha_limite_respuesta = models.DateTimeField(null=True, blank=True)
     fecha_primera_respuesta = models.DateTimeField(null=True, blank=True)  
     fecha_resolucion = models.DateTimeField(null=True, blank=True)  
     tiempo_total_resolucion = models.FloatField(null=True, blank=True)  
     satisfaccion_cliente = models.FloatField(null=True, blank=True)
     numero_ticket = models.CharField(max_length=20, unique=True, null=True, blank=True)
-    
-    
+    escalamientos = models.PositiveSmallIntegerField(default=0, help_text="Veces que venció el plazo de respuesta")
+    fecha_ultimo_recordatorio = models.DateTimeField(null=True, blank=True, help_text="Último recordatorio al cliente en ESPERANDO_CLIENTE")
+
+    class Meta:
+        indexes = [
+            # Orden de la paginación por cursor (todas / por cliente)
+            models.Index(fields=['-fecha_creacion', '-id'], name='ticket_creado_idx'),
+            models.Index(fields=['usuario', '-fecha_creacion', '-id'], name='ticket_usuario_creado_idx'),
+            # Barrido de SLA y conteo de vencidas: rango por plazo dentro de cada estado
+            models.Index(fields=['estado', 'fecha_limite_respuesta'], name='ticket_estado_limite_idx'),
+            # Recorrido por bloques de id dentro de un estado (auto-cierre y recordatorios)
+            models.Index(fields=['estado', 'id'], name='ticket_estado_id_idx'),
+            # Cola "tomar la siguiente": más antigua por estado y prioridad
+            models.Index(fields=['estado', 'prioridad', 'fecha_creacion'], name='ticket_cola_idx'),
+        ]
+
+    ESTADOS_ACTIVOS = (EstadoSolicitud.PENDIENTE, EstadoSolicitud.EN_PROCESO, EstadoSolicitud.ESPERANDO_CLIENTE)
+
+    # Campos cuyo valor leído de la base se guarda para detectar cambios al guardar
+    # (plazo SLA por prioridad y métricas diarias)
+    CAMPOS_SEGUIDOS = (
+        'tipo_solicitud', 'prioridad', 'agente_soporte_id', 'fecha_creacion', 'fecha_resolucion',
+        'tiempo_total_resolucion', 'fecha_primera_respuesta', 'satisfaccion_cliente',
+    )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia.recordar_valores()
+        return instancia
+
+    def recordar_valores(self):
+        # None si algún campo seguido no se cargó (.only/.defer): no se sabe qué cambió
+        if all(campo in self.__dict__ for campo in self.CAMPOS_SEGUIDOS):
+            self._originales = {campo: self.__dict__[campo] for campo in self.CAMPOS_SEGUIDOS}
+        else:
+            self._originales = None
+
+    def asignar_agente(self, agente):
+        self.agente_soporte = agente
+        self.save(update_fields=['agente_soporte', 'updated_at'])
+
+    def marcar_como_resuelto(self):
+        ahora = timezone.now()
+        self.estado = self.EstadoSolicitud.RESUELTO
+        self.fecha_resolucion = ahora
+        self.tiempo_total_resolucion = (ahora - self.fecha_creacion).total_seconds() / 3600
+        self.save()
+
+    def cerrar_solicitud(self):
+        self.estado = self.EstadoSolicitud.CERRADO
+        self.fecha_cierre = timezone.now()
+        self.save()
+
     def __str__(self):
         return f"Ticket {self.id} - {self.estado}"  # type: ignore
 
@@ -258,11 +409,58 @@ class MensajeSoporte(models.Model):
     remitente = models.ForeignKey(USER_MODEL, on_delete=models.CASCADE)
     mensaje = models.TextField()
     fecha = models.DateTimeField(auto_now_add=True)
-    # Puedes agregar campos como es_interno, leido_por_cliente, leido_por_soporte, etc.
+    es_interno = models.BooleanField(default=False, help_text="Nota interna, no visible para el cliente")
+    leido_por_cliente = models.BooleanField(default=False)
+    leido_por_soporte = models.BooleanField(default=False)
+    fecha_lectura_cliente = models.DateTimeField(null=True, blank=True)
+    fecha_lectura_soporte = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Último mensaje y no leídos por ticket
+            models.Index(fields=['ticket', '-fecha', '-id'], name='mensaje_ticket_fecha_idx'),
+        ]
+
+    @property
+    def es_del_cliente(self):
+        return self.remitente_id == self.ticket.usuario_id  # type: ignore
+
+    @property
+    def es_del_soporte(self):
+        return not self.es_del_cliente
 
     def __str__(self):
         return f"Mensaje {self.id} - Ticket {self.ticket.id}"  # type: ignore
 
+class MetricaDiariaSoporte(models.Model):
+    """
+    Acumulados diarios de solicitudes por tipo, prioridad y agente, mantenidos
+    por ``core.api.soporte.metricas``. Las filas son aditivas: puede haber más
+    de una por combinación y siempre se leen con ``Sum``.
+    """
+    fecha = models.DateField()
+    tipo_solicitud = models.CharField(max_length=20)
+    prioridad = models.CharField(max_length=10)
+    agente = models.ForeignKey(
+        USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='metricas_soporte'
+    )
+    creadas = models.IntegerField(default=0)
+    resueltas = models.IntegerField(default=0)
+    primera_respuesta_horas = models.FloatField(default=0)
+    primera_respuesta_cantidad = models.IntegerField(default=0)
+    resolucion_horas = models.FloatField(default=0)
+    resolucion_cantidad = models.IntegerField(default=0)
+    satisfaccion_suma = models.FloatField(default=0)
+    satisfaccion_cantidad = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha', 'tipo_solicitud', 'prioridad'], name='metrica_soporte_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"Métricas {self.fecha} {self.tipo_solicitud}/{self.prioridad}"
+
 # =========================
 # MODELOS DEL SEGUNDO SPRINT
 # =========================
@@ -314,11 +512,10 @@ class ReglasReprogramacion(models.Model):
 
     @classmethod
     def obtener_regla_activa(cls, tipo_regla, rol):
-        return cls.objects.filter(
-            tipo_regla=tipo_regla,
-            aplicable_a=rol,
-            activa=True
-        ).order_by('-prioridad', '-created_at').first()
+        # Se resuelve desde la foto compilada en memoria (sin consulta por llamada)
+        from core.api.reservas.reglas import snapshot
+        compilada = snapshot().regla(tipo_regla, rol)
+        return compilada.regla if compilada else None
 
     def __str__(self):
         return self.nombre
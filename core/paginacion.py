@@ -0,0 +1,31 @@
+"""
+Paginación por cursor para los listados que crecen sin límite.
+
+A diferencia de ``PageNumberPagination`` no hace ``COUNT(*)`` ni ``OFFSET``:
+cada página es un ``WHERE orden < cursor ORDER BY orden LIMIT n`` sobre un
+índice, así que el costo no depende del tamaño de la tabla.
+"""
+
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class CursorPaginacion(CursorPagination):
+    """Más recientes primero; el cliente puede pedir ``?page_size=`` hasta el máximo configurado."""
+    ordering = ('-created_at', '-id')
+    page_size = getattr(settings, 'PAGINACION_TAMANO_PAGINA', 20)
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'PAGINACION_TAMANO_MAXIMO', 100)
+
+
+class CursorPaginacionTickets(CursorPaginacion):
+    ordering = ('-fecha_creacion', '-id')
+
+
+class CursorPaginacionUsuarios(CursorPaginacion):
+    ordering = ('-date_joined', '-id')
+
+
+class CursorPaginacionId(CursorPaginacion):
+    """Para modelos sin fecha de creación: el id es creciente."""
+    ordering = ('-id',)